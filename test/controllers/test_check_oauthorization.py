@@ -1,9 +1,13 @@
+import os
 import unittest
+from unittest.mock import patch
 
 from dotenv import load_dotenv
 from werkzeug.exceptions import Unauthorized
 
 from test.controllers.utils import create_test_token, del_env
+from xcube_hub.auth import Auth
+from xcube_hub.controllers import authorization
 from xcube_hub.controllers.authorization import check_oauthorization, validate_scope_oauthorization
 from xcube_hub.core.oauth import create_token
 
@@ -14,6 +18,7 @@ class TestOauthorization(unittest.TestCase):
 
     def setUp(self):
         load_dotenv(dotenv_path='test/.env')
+        authorization._VERIFIED_TOKENS = None
         self._claims, self._token = create_test_token(["manage:users", "manage:cubegens"])
 
         self._claims, self._token = create_test_token(["manage:users", "manage:cubegens"])
@@ -58,6 +63,34 @@ class TestOauthorization(unittest.TestCase):
         self.assertEqual(401, e.exception.code)
         self.assertEqual("401 Unauthorized: Invalid audience", str(e.exception))
 
+    def test_check_oauthorization_cached(self):
+        with patch.object(Auth, 'verify_token', autospec=True, side_effect=Auth.verify_token) as verify_p:
+            res1 = check_oauthorization(self._token)
+            res2 = check_oauthorization(self._token)
+
+            self.assertDictEqual(res1, res2)
+            self.assertEqual(1, verify_p.call_count)
+
+            # Callers may alter the returned token info without affecting the cache
+            res2['scopes'] = []
+            self.assertEqual(['manage:users', 'manage:cubegens'], check_oauthorization(self._token)['scopes'])
+
+            _, token = create_test_token(["manage:users"])
+            check_oauthorization(token)
+
+            self.assertEqual(2, verify_p.call_count)
+
+    def test_check_oauthorization_cache_disabled(self):
+        os.environ['XCUBE_HUB_TOKEN_CACHE_SIZE'] = '0'
+        try:
+            with patch.object(Auth, 'verify_token', autospec=True, side_effect=Auth.verify_token) as verify_p:
+                check_oauthorization(self._token)
+                check_oauthorization(self._token)
+
+                self.assertEqual(2, verify_p.call_count)
+        finally:
+            del os.environ['XCUBE_HUB_TOKEN_CACHE_SIZE']
+
     def test_validate_scope_oauthorization(self):
         required_scopes = ['a', ]
         token_scopes = ['a', 'b']
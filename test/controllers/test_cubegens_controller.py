@@ -276,6 +276,45 @@ class TestCubeGensController(BaseTestCase):
         self.assertEqual(400, res[1])
         self.assertEqual('Error', res[0]['message'])
 
+    @patch('xcube_hub.core.cubegens.estimate_costs', create=True)
+    def test_get_cubegen_costs(self, p):
+        p.return_value = dict(costs=[]), 200
+
+        res = cubegens.get_cubegen_costs(body={'cube_configs': []}, token_info={'email': 'drwho@bbc.org'})
+
+        self.assertEqual(200, res[1])
+        p.assert_called_with(email='drwho@bbc.org', body={'cube_configs': []})
+
+        p.side_effect = api.ApiError(400, 'Error')
+
+        res = cubegens.get_cubegen_costs(body={}, token_info={'email': 'drwho@bbc.org'})
+
+        self.assertEqual(400, res[1])
+        self.assertEqual('Error', res[0]['message'])
+
+        p.reset_mock()
+        with patch.dict('os.environ', {'CUBEGENS_SILENT': '1'}):
+            res = cubegens.get_cubegen_costs(body={'cube_configs': []}, token_info={'email': 'drwho@bbc.org'})
+
+        self.assertEqual(422, res[1])
+        p.assert_not_called()
+
+    @patch('xcube_hub.core.cubegens.get_info_ticket', create=True)
+    def test_get_cubegen_info_ticket(self, p):
+        p.return_value = dict(ticket_id='aticket', status='pending'), 202
+
+        res = cubegens.get_cubegen_info_ticket(ticket_id='aticket', token_info={'user_id': 'drwho'})
+
+        self.assertEqual(202, res[1])
+        p.assert_called_with(user_id='drwho', ticket_id='aticket')
+
+        p.side_effect = api.ApiError(404, 'Error')
+
+        res = cubegens.get_cubegen_info_ticket(ticket_id='aticket', token_info={'user_id': 'drwho'})
+
+        self.assertEqual(404, res[1])
+        self.assertEqual('Error', res[0]['message'])
+
     @patch('xcube_hub.core.cubegens.get', create=True)
     @patch('xcube_hub.core.cubegens.cubegens_result', create=True)
     def test_get_cubegen(self, res_p, p):
@@ -298,18 +337,28 @@ class TestCubeGensController(BaseTestCase):
         self.assertEqual(400, res[1])
         self.assertEqual('Error', res[0]['message'])
 
-    @patch('xcube_hub.core.cubegens.list', create=True)
+    @patch('xcube_hub.core.cubegens.list_page', create=True)
     def test_get_cubegens(self, p):
         """Test case for delete_cubegen
 
         Delete a cubegen
         """
 
-        p.return_value = []
+        p.return_value = [], None
 
         res = cubegens.get_cubegens(token_info={'user_id': 'drwho'})
 
         self.assertEqual(200, res[1])
+        self.assertEqual(2, len(res))
+
+        p.return_value = [{'job_id': 'drwho-1'}], 'next'
+
+        res = cubegens.get_cubegens(token_info={'user_id': 'drwho'}, limit=1, fields=['job_status'])
+
+        self.assertEqual(([{'job_id': 'drwho-1'}], 200), res[0])
+        self.assertEqual(200, res[1])
+        self.assertDictEqual({'X-Cubegens-Cursor': 'next'}, res[2])
+        p.assert_called_with(user_id='drwho', limit=1, cursor=None, fields=['job_status'])
 
         p.side_effect = api.ApiError(400, 'Error')
 
@@ -319,6 +368,48 @@ class TestCubeGensController(BaseTestCase):
         self.assertEqual('Error', res[0]['message'])
 
 
+    @patch('xcube_hub.core.cubegens.follow_logs', create=True)
+    @patch('xcube_hub.core.cubegens.logs_since', create=True)
+    def test_get_cubegen_logs(self, p, follow_p):
+        p.return_value = ['line 3'], 3
+
+        res = cubegens.get_cubegen_logs(cubegen_id='anid', token_info={'user_id': 'drwho'}, since_line=2)
+
+        self.assertEqual(200, res[1])
+        self.assertDictEqual({'job_id': 'anid', 'since_line': 2, 'next_line': 3, 'output': ['line 3']}, res[0])
+
+        follow_p.return_value = iter(['line 3\n'])
+
+        with self.app.test_request_context():
+            res = cubegens.get_cubegen_logs(cubegen_id='anid', token_info={'user_id': 'drwho'}, since_line=2,
+                                            follow=True)
+            self.assertEqual('text/plain; charset=utf-8', res.content_type)
+            self.assertEqual(b'line 3\n', res.get_data())
+
+        p.side_effect = api.ApiError(400, 'Error')
+
+        res = cubegens.get_cubegen_logs(cubegen_id='anid', token_info={'user_id': 'drwho'})
+
+        self.assertEqual(400, res[1])
+        self.assertEqual('Error', res[0]['message'])
+
+    @patch('xcube_hub.core.cubegens.events', create=True)
+    def test_get_cubegen_events(self, p):
+        p.return_value = iter(['event: end\ndata: {}\n\n'])
+
+        with self.app.test_request_context(headers={'Last-Event-ID': '4'}):
+            res = cubegens.get_cubegen_events(cubegen_id='anid', token_info={'user_id': 'drwho'})
+            self.assertEqual('text/event-stream; charset=utf-8', res.content_type)
+            self.assertEqual(b'event: end\ndata: {}\n\n', res.get_data())
+
+        p.assert_called_with(user_id='drwho', job_id='anid', since=5)
+
+        p.side_effect = api.ApiError(404, 'Cubegen anid not found')
+
+        res = cubegens.get_cubegen_events(cubegen_id='anid', token_info={'user_id': 'drwho'})
+
+        self.assertEqual(404, res[1])
+
 if __name__ == '__main__':
     import unittest
 
@@ -2,7 +2,10 @@
 
 from __future__ import absolute_import
 
+from unittest.mock import patch
+
 from test import BaseTestCase
+from xcube_hub.keyvaluedatabase import KeyValueDatabase
 
 
 class TestDefaultController(BaseTestCase):
@@ -18,6 +21,14 @@ class TestDefaultController(BaseTestCase):
             method='GET')
         self.assert200(response, 'Response body is : ' + response.data.decode('utf-8'))
 
+    def test_get_service_readiness(self):
+        response = self.client.open('/api/v2/ready', method='GET')
+        self.assert200(response, 'Response body is : ' + response.data.decode('utf-8'))
+
+        with patch.object(KeyValueDatabase.instance(), 'ping', return_value=False):
+            response = self.client.open('/api/v2/ready', method='GET')
+            self.assertStatus(response, 503)
+
 
 if __name__ == '__main__':
     import unittest
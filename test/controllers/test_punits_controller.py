@@ -0,0 +1,32 @@
+# coding: utf-8
+
+from __future__ import absolute_import
+
+from unittest.mock import patch
+
+from xcube_hub import api
+from xcube_hub.controllers.punits import get_punits_history
+from test import BaseTestCase
+
+
+class TestPunitsController(BaseTestCase):
+    @patch('xcube_hub.core.punits.get_punits_history')
+    def test_get_punits_history(self, p):
+        p.return_value = dict(transactions=[], totals=[], next_cursor=None)
+
+        res = get_punits_history(token_info={'user_id': 'helge', 'email': 'helge@mail.org'}, start='2021-01-01',
+                                 limit=10)
+
+        self.assertEqual((dict(transactions=[], totals=[], next_cursor=None), 200), res)
+        p.assert_called_once_with(user_id='helge@mail.org', start='2021-01-01', end=None, limit=10, cursor=None)
+
+        p.side_effect = api.ApiError(400, 'Invalid start')
+
+        res = get_punits_history(token_info={'user_id': 'helge', 'email': 'helge@mail.org'}, start='yesterday')
+
+        self.assertEqual(400, res[1])
+
+
+if __name__ == '__main__':
+    import unittest
+    unittest.main()
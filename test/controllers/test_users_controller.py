@@ -9,11 +9,12 @@ from xcube_hub.controllers import users
 class TestUsers(BaseTestCase):
     @patch('xcube_hub.core.cate.launch_cate', create=True)
     def test_put_user_webapi(self, p):
-        p.return_value = dict(serverUrl=f'https://test/drwho')
+        p.return_value = dict(launch_id='1', state='Deleting')
 
         res = users.put_user_webapi(user_id='drwho')
 
-        self.assertEqual(200, res[1])
+        self.assertEqual(202, res[1])
+        self.assertEqual('Deleting', res[0]['state'])
 
         p.side_effect = api.ApiError(400, 'Error')
 
@@ -53,5 +54,37 @@ class TestUsers(BaseTestCase):
         self.assertEqual('Error', res[0]['message'])
 
 
+    @patch('xcube_hub.core.cate.record_activity')
+    def test_put_user_webapi_heartbeat(self, p):
+        p.return_value = dict(last_activity=1.)
+
+        res = users.put_user_webapi_heartbeat(user_id='drwho')
+
+        self.assertEqual(200, res[1])
+        self.assertEqual(dict(last_activity=1.), res[0])
+
+        p.side_effect = api.ApiError(400, 'Error')
+
+        res = users.put_user_webapi_heartbeat(user_id='drwho')
+
+        self.assertEqual(400, res[1])
+        self.assertEqual('Error', res[0]['message'])
+
+    @patch('xcube_hub.core.cate.get_usage')
+    def test_get_user_webapi_usage(self, p):
+        p.return_value = dict(pod_hours=1., memory_gib_hours=2., last_activity=None, pods=[])
+
+        res = users.get_user_webapi_usage(user_id='drwho')
+
+        self.assertEqual(200, res[1])
+        self.assertEqual(1., res[0]['pod_hours'])
+
+        p.side_effect = api.ApiError(400, 'Error')
+
+        res = users.get_user_webapi_usage(user_id='drwho')
+
+        self.assertEqual(400, res[1])
+        self.assertEqual('Error', res[0]['message'])
+
 if __name__ == '__main__':
     unittest.main()
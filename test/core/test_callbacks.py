@@ -185,7 +185,7 @@ class TestCallbacks(unittest.TestCase):
         self.assertEqual("Error in callbacks. Invalid input configuration.", str(e.exception))
 
         cache = KeyValueDatabase.instance()
-        with patch.object(cache, 'get') as p:
+        with patch.object(cache, 'append') as p:
             p.side_effect = TimeoutError()
 
             with self.assertRaises(api.ApiError) as e:
@@ -193,6 +193,25 @@ class TestCallbacks(unittest.TestCase):
 
             self.assertEqual("Cache timeout", str(e.exception))
 
+    def test_put_callback_appends(self):
+        self._cache.delete('heinrich3__cubegen__progress')
+        for i in range(3):
+            res = put_callback(user_id='heinrich3', cubegen_id='cubegen', email='heinrich@gmail.com',
+                               value={'state': {'progress': i}, 'sender': 'on_update'})
+            self.assertEqual({'progress': [{'state': {'progress': i}, 'sender': 'on_update'}]}, res)
+
+        res = get_callback('heinrich3', 'cubegen')
+        self.assertEqual([0, 1, 2], [event['state']['progress'] for event in res])
+
+        res = get_callback('heinrich3', 'cubegen', since=2)
+        self.assertEqual([{'state': {'progress': 2}, 'sender': 'on_update'}], res)
+
+        res = get_callback('heinrich3', 'cubegen', since=3)
+        self.assertEqual([], res)
+
+        res = get_callback('heinrich2', 'cubegen', since=1)
+        self.assertEqual([], res)
+
 
 if __name__ == '__main__':
     unittest.main()
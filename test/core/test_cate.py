@@ -1,48 +1,67 @@
+import datetime
+import os
+import threading
 import unittest
-from unittest.mock import patch
+from unittest.mock import patch, call
 
 from dotenv import load_dotenv
-from kubernetes.client import V1ServiceList, V1Service, V1ObjectMeta, V1Pod, V1PodStatus, ApiException, V1Deployment
+from kubernetes.client import V1Service, V1ObjectMeta, V1Pod, V1PodStatus, ApiException, V1Deployment, \
+    V1PodList, V1ContainerStatus, V1DeploymentSpec, V1ServiceSpec, V1PodSpec, V1Container, V1ResourceRequirements
 
 from test.controllers.utils import del_env
 from xcube_hub import api
 from xcube_hub.core import cate
+from xcube_hub.keyvaluedatabase import KeyValueDatabase
 
 
 class TestCubeGens(unittest.TestCase):
     def setUp(self) -> None:
         load_dotenv(dotenv_path='test/.env')
+        KeyValueDatabase.instance(provider='inmemory', refresh=True)
+        # The reaper would request the Kubernetes API in the background
+        reaper_patch = patch('xcube_hub.core.cate.start_idle_reaper')
+        reaper_patch.start()
+        self.addCleanup(reaper_patch.stop)
 
     def tearDown(self) -> None:
         del_env(dotenv_path='test/.env')
 
+    @patch('xcube_hub.core.k8s.delete_pod')
+    @patch('xcube_hub.core.k8s.list_pods')
     @patch('xcube_hub.core.k8s.delete_deployment')
     @patch('xcube_hub.core.k8s.get_deployment')
     @patch('xcube_hub.core.user_namespaces.create_if_not_exists')
-    def test_delete_cate(self, namespace_p, get_p, delete_p):
+    def test_delete_cate(self, namespace_p, get_p, delete_p, list_pods_p, delete_pod_p):
         get_p.return_value = None
+        list_pods_p.return_value = V1PodList(items=[V1Pod(metadata=V1ObjectMeta(name='cate-warm-abc'))])
         res = cate.delete_cate('drwho')
 
         self.assertTrue(res)
+        list_pods_p.assert_called_once_with(namespace='cate-workspace-stage',
+                                            label_selector='app=drwho-cate,pool=bound')
+        delete_pod_p.assert_called_once_with(name='cate-warm-abc', namespace='cate-workspace-stage')
 
         get_p.return_value = ['deployment', ]
         res = cate.delete_cate('drwho')
 
         delete_p.assert_called_once()
+        list_pods_p.assert_called_once()
         self.assertTrue(res)
 
+    @patch('xcube_hub.core.k8s.list_pods', return_value=V1PodList(items=[]))
     @patch('xcube_hub.core.k8s.delete_service')
-    @patch('xcube_hub.core.k8s.list_services')
+    @patch('xcube_hub.core.k8s.get_service')
     @patch('xcube_hub.core.k8s.get_deployment')
     @patch('xcube_hub.core.user_namespaces.create_if_not_exists')
-    def test_delete_cate_with_prune(self, namespace_p, get_p, list_p, service_p):
+    def test_delete_cate_with_prune(self, namespace_p, get_p, get_service_p, service_p, list_pods_p):
         get_p.return_value = None
-        list_p.return_value = V1ServiceList(items=[])
+        get_service_p.return_value = None
         res = cate.delete_cate('drwho', prune=True)
-        list_p.assert_called_once()
+        get_service_p.assert_called_once()
+        service_p.assert_not_called()
         self.assertTrue(res)
 
-        list_p.return_value = V1ServiceList(items=[V1Service(metadata=V1ObjectMeta(name='drwho-cate'))])
+        get_service_p.return_value = V1Service(metadata=V1ObjectMeta(name='drwho-cate'))
         res = cate.delete_cate('drwho', prune=True)
         service_p.assert_called_once()
         self.assertTrue(res)
@@ -58,6 +77,12 @@ class TestCubeGens(unittest.TestCase):
         res = cate.get_status('drwho')
 
         self.assertEqual('Running', res['phase'])
+        self.assertNotIn('launch', res)
+
+        KeyValueDatabase.instance().set('cate_launch__drwho', dict(launch_id='1', state='Creating'))
+        res = cate.get_status('drwho')
+
+        self.assertEqual('Creating', res['launch']['state'])
 
     @patch('xcube_hub.core.k8s.count_pods')
     def test_get_pod_count(self, ct_p):
@@ -66,10 +91,11 @@ class TestCubeGens(unittest.TestCase):
 
         self.assertDictEqual({'running_pods': 10}, res)
 
-
-    @patch('xcube_hub.poller.poll_pod_phase')
-    @patch('xcube_hub.core.k8s.create_ingress')
-    @patch('xcube_hub.core.k8s.get_ingress')
+    @patch('xcube_hub.core.k8s.list_pods', return_value=V1PodList(items=[]))
+    @patch('xcube_hub.core.cate._get_launch_executor')
+    @patch('xcube_hub.poller.wait_for_deployment_deletion')
+    @patch('xcube_hub.poller.wait_for_pod_phase')
+    @patch('xcube_hub.core.k8s.create_ingress_if_not_exists')
     @patch('xcube_hub.core.k8s.create_service_if_not_exists')
     @patch('xcube_hub.core.k8s.create_deployment')
     @patch('xcube_hub.core.k8s.create_deployment_object')
@@ -77,10 +103,13 @@ class TestCubeGens(unittest.TestCase):
     @patch('xcube_hub.core.user_namespaces.create_if_not_exists')
     @patch('xcube_hub.core.k8s.get_deployment')
     @patch('xcube_hub.core.k8s.delete_service')
-    @patch('xcube_hub.core.k8s.list_services')
-    def test_launch_cate(self, list_s, delete_s, get_p, namespace_p, ct_p,
+    @patch('xcube_hub.core.k8s.get_service')
+    def test_launch_cate(self, get_service_p, delete_s, get_p, namespace_p, ct_p,
                          deployment_p, deployment_create_p, service_create_p,
-                         get_ingress_p, ingress_p, poll_p):
+                         ingress_create_p, poll_p, deletion_p, executor_p, list_pods_p):
+        executor = _FakeExecutor()
+        executor_p.return_value = executor
+
         with self.assertRaises(api.ApiError) as e:
             cate.launch_cate('drwho#######')
 
@@ -100,20 +129,428 @@ class TestCubeGens(unittest.TestCase):
         get_p.return_value = None
         deployment_p.return_value = V1Deployment(metadata=V1ObjectMeta(name='drwho-cate'))
         delete_s.return_value = None
-        list_s.return_value = V1ServiceList(items=[])
-        res = cate.launch_cate('drwho')
+        get_service_p.return_value = None
+
+        with patch('xcube_hub.core.cate._schedule', executor.schedule):
+            launch = cate.launch_cate('drwho')
 
-        self.assertDictEqual({'serverUrl': 'https://stage.catehub.climate.esa.int/drwho'}, res)
+            self.assertEqual('Deleting', launch['state'])
+            deployment_create_p.assert_not_called()
 
-        get_ingress_p.return_value = None
-        res = cate.launch_cate('drwho')
+            # Launches in progress are not started again
+            self.assertEqual(launch, cate.launch_cate('drwho'))
+            self.assertEqual(1, len(executor.tasks))
 
-        self.assertDictEqual({'serverUrl': 'https://stage.catehub.climate.esa.int/drwho'}, res)
+            states = []
+            poll_p.side_effect = lambda **kwargs: states.append(cate.get_launch('drwho')['state'])
+            executor.run()
+
+        self.assertEqual(['Scheduling'], states)
+        # The worker does not wait for the grace period
+        self.assertEqual([2], executor.delays)
+        deletion_p.assert_called_with(name='drwho-cate', namespace='cate-workspace-stage', timeout=600)
+        deployment_create_p.assert_called_once()
+        service_create_p.assert_called_once()
+        ingress_create_p.assert_called_once()
+
+        launch = cate.get_launch('drwho')
+        self.assertEqual('Ready', launch['state'])
+        self.assertEqual('https://stage.catehub.climate.esa.int/drwho', launch['serverUrl'])
+
+        # Finished launches are replaced
+        launch2 = cate.launch_cate('drwho')
+        self.assertNotEqual(launch['launch_id'], launch2['launch_id'])
+        self.assertEqual(launch2, cate.get_launch('drwho'))
 
         ct_p.side_effect = ApiException(400, 'test')
+        cate.delete_cate('drwho')
         with self.assertRaises(api.ApiError) as e:
             cate.launch_cate('drwho')
 
         self.assertIn('Reason: test', str(e.exception))
         self.assertEqual('400', str(e.exception.status_code))
 
+    @patch('xcube_hub.core.cate._get_launch_executor')
+    @patch('xcube_hub.poller.wait_for_deployment_deletion')
+    @patch('xcube_hub.core.k8s.create_deployment')
+    @patch('xcube_hub.core.k8s.count_pods', return_value=0)
+    @patch('xcube_hub.core.cate._delete_cate_resources')
+    def test_launch_cate_failed(self, delete_p, ct_p, deployment_create_p, deletion_p, executor_p):
+        executor = _FakeExecutor()
+        executor_p.return_value = executor
+        deployment_create_p.side_effect = api.ApiError(422, 'Invalid deployment')
+
+        cate.launch_cate('drwho')
+        executor.run()
+
+        launch = cate.get_launch('drwho')
+        self.assertEqual('Failed', launch['state'])
+        self.assertEqual(422, launch['status_code'])
+        self.assertEqual('Invalid deployment', launch['message'])
+
+        # Deleting the webapi cancels its launch
+        deployment_create_p.side_effect = None
+        cate.launch_cate('drwho')
+        cate.delete_cate('drwho')
+        executor.run()
+
+        self.assertIsNone(cate.get_launch('drwho'))
+        deployment_create_p.assert_called_once()
+
+    @patch('xcube_hub.core.cate._get_launch_executor')
+    @patch('xcube_hub.poller.wait_for_deployment_deletion')
+    @patch('xcube_hub.core.k8s.create_ingress_if_not_exists')
+    @patch('xcube_hub.core.k8s.create_service_if_not_exists')
+    @patch('xcube_hub.core.k8s.create_deployment')
+    @patch('xcube_hub.core.k8s.count_pods', return_value=0)
+    @patch('xcube_hub.core.cate._delete_cate_resources')
+    def test_launch_cate_deleted_while_creating(self, delete_p, ct_p, deployment_create_p, service_create_p,
+                                                ingress_create_p, deletion_p, executor_p):
+        executor = _FakeExecutor()
+        executor_p.return_value = executor
+        deployment_create_p.side_effect = lambda **kwargs: cate.delete_cate('drwho')
+
+        cate.launch_cate('drwho')
+        executor.run()
+
+        self.assertIsNone(cate.get_launch('drwho'))
+        # The resources created after the deletion are deleted as well
+        self.assertEqual([call('drwho', prune=True), call('drwho', prune=False), call('drwho', prune=True)],
+                         delete_p.call_args_list)
+
+    @patch('xcube_hub.core.cate._get_launch_executor')
+    @patch('xcube_hub.core.k8s.count_pods', return_value=0)
+    def test_launch_cate_lost(self, ct_p, executor_p):
+        executor_p.return_value = _FakeExecutor()
+
+        launch = cate.launch_cate('drwho')
+
+        os.environ['CATE_LAUNCH_TIMEOUT'] = '0'
+        try:
+            self.assertNotEqual(launch['launch_id'], cate.launch_cate('drwho')['launch_id'])
+        finally:
+            del os.environ['CATE_LAUNCH_TIMEOUT']
+
+    @patch('xcube_hub.core.cate._get_launch_executor')
+    @patch('xcube_hub.core.k8s.count_pods', return_value=0)
+    @patch('xcube_hub.core.cate._delete_cate_resources')
+    def test_launch_cate_concurrent(self, delete_p, ct_p, executor_p):
+        executor = _FakeExecutor()
+        executor_p.return_value = executor
+
+        launch = cate.launch_cate('drwho')
+
+        # Requests that read the launch before it was stored do not start another one
+        with patch('xcube_hub.core.cate.get_launch', return_value=None):
+            self.assertEqual(launch, cate.launch_cate('drwho'))
+        self.assertEqual(1, len(executor.tasks))
+
+        # Neither do requests replacing the same finished launch
+        finished = dict(launch, state='Failed')
+        KeyValueDatabase.instance().set('cate_launch__drwho', finished)
+        launch2 = cate.launch_cate('drwho')
+        self.assertNotEqual(launch['launch_id'], launch2['launch_id'])
+        with patch('xcube_hub.core.cate.get_launch', return_value=finished):
+            self.assertEqual(launch2, cate.launch_cate('drwho'))
+        self.assertEqual(2, len(executor.tasks))
+
+        # After a deletion, a new launch is started
+        cate.delete_cate('drwho')
+        launch3 = cate.launch_cate('drwho')
+        self.assertNotIn(launch3['launch_id'], (launch['launch_id'], launch2['launch_id']))
+        self.assertEqual(3, len(executor.tasks))
+
+    @patch('xcube_hub.core.cate._delete_cate_resources')
+    def test_complete_after_grace(self, delete_p):
+        launch, _ = cate._new_launch('drwho', None, ttl=600)
+        completed = threading.Event()
+        with patch('xcube_hub.core.cate.record_activity', side_effect=lambda user_id: completed.set()):
+            cate._schedule(0.01, cate._complete, launch_id=launch['launch_id'], user_id='drwho', server_url='url')
+            self.assertTrue(completed.wait(5))
+
+        self.assertEqual('Ready', cate.get_launch('drwho')['state'])
+
+        # Launches deleted during the grace period are cleaned up
+        cate.delete_cate('drwho')
+        cate._complete(launch_id=launch['launch_id'], user_id='drwho', server_url='url')
+
+        self.assertIsNone(cate.get_launch('drwho'))
+        self.assertEqual([call('drwho', prune=False), call('drwho', prune=True)], delete_p.call_args_list)
+
+    @patch.dict(os.environ, {'CATE_WARM_POOL_MAX': '3', 'CATE_STORAGE_MODE': 'bucket'})
+    @patch('xcube_hub.core.cate._start_warm_pool_refresher')
+    @patch('xcube_hub.core.cate._get_launch_executor')
+    @patch('xcube_hub.poller.wait_for_deployment_deletion')
+    @patch('xcube_hub.poller.wait_for_pod_phase')
+    @patch('xcube_hub.core.k8s.create_or_patch_ingress')
+    @patch('xcube_hub.core.k8s.delete_service')
+    @patch('xcube_hub.core.k8s.patch_service')
+    @patch('xcube_hub.core.k8s.get_service')
+    @patch('xcube_hub.core.k8s.patch_pod')
+    @patch('xcube_hub.core.k8s.list_pods')
+    @patch('xcube_hub.core.k8s.create_deployment')
+    @patch('xcube_hub.core.k8s.count_pods', return_value=0)
+    @patch('xcube_hub.core.k8s.get_deployment', return_value=None)
+    def test_launch_cate_warm(self, get_p, ct_p, deployment_create_p, list_pods_p, patch_pod_p, get_service_p,
+                              patch_service_p, delete_service_p, ingress_p, poll_p, deletion_p, executor_p,
+                              refresher_p):
+        executor = _FakeExecutor()
+        executor_p.return_value = executor
+
+        starting = V1Pod(metadata=V1ObjectMeta(name='cate-warm-1', resource_version='1'),
+                         status=V1PodStatus(phase='Pending'))
+        taken = V1Pod(metadata=V1ObjectMeta(name='cate-warm-2', resource_version='2'),
+                      status=V1PodStatus(phase='Running',
+                                         container_statuses=[V1ContainerStatus(name='cate-warm', ready=True,
+                                                                               image='cate', image_id='cate',
+                                                                               restart_count=0)]))
+        ready = V1Pod(metadata=V1ObjectMeta(name='cate-warm-3', resource_version='3'), status=taken.status)
+        list_pods_p.side_effect = lambda namespace, label_selector: \
+            V1PodList(items=[starting, taken, ready] if label_selector == 'app=cate-warm' else [])
+        # Another launch binds cate-warm-2 first
+        patch_pod_p.side_effect = [api.ApiError(409, 'Conflict'), None]
+        get_service_p.return_value = V1Service(metadata=V1ObjectMeta(name='drwho-cate'),
+                                               spec=V1ServiceSpec(selector={'app': 'cate-warm'}))
+
+        with patch('xcube_hub.core.cate._schedule', executor.schedule):
+            cate.launch_cate('drwho')
+            executor.run()
+
+        launch = cate.get_launch('drwho')
+        self.assertEqual('Ready', launch['state'])
+        self.assertTrue(launch['warm'])
+        self.assertEqual('https://stage.catehub.climate.esa.int/drwho', launch['serverUrl'])
+
+        self.assertEqual(['cate-warm-2', 'cate-warm-3'], [c.kwargs['name'] for c in patch_pod_p.call_args_list])
+        self.assertEqual({'resourceVersion': '3',
+                          'labels': {'app': 'drwho-cate', 'application': 'cate-webapi', 'pool': 'bound'}},
+                         patch_pod_p.call_args.kwargs['body']['metadata'])
+        patch_service_p.assert_called_once_with(name='drwho-cate', body={'spec': {'selector': {'app': 'drwho-cate'}}},
+                                                namespace='cate-workspace-stage')
+        ingress = ingress_p.call_args.args[0]
+        self.assertEqual('/drwho(/|$)(.*)', ingress.spec.rules[0].http.paths[0].path)
+        self.assertEqual('/$2', ingress.metadata.annotations['nginx.ingress.kubernetes.io/rewrite-target'])
+        deployment_create_p.assert_not_called()
+        poll_p.assert_not_called()
+
+        # Cold start if no pod of the pool is ready
+        list_pods_p.side_effect = lambda namespace, label_selector: \
+            V1PodList(items=[starting] if label_selector == 'app=cate-warm' else [])
+        with patch('xcube_hub.core.cate._schedule', executor.schedule):
+            cate.launch_cate('drwho')
+            executor.run()
+
+        launch = cate.get_launch('drwho')
+        self.assertEqual('Ready', launch['state'])
+        self.assertNotIn('warm', launch)
+        deployment_create_p.assert_called_once()
+        self.assertEqual('/drwho/.*', ingress_p.call_args.args[0].spec.rules[0].http.paths[0].path)
+
+    @patch('xcube_hub.core.cate._start_warm_pool_refresher')
+    def test_start_warm_pool(self, refresher_p):
+        cate.start_warm_pool()
+        refresher_p.assert_not_called()
+
+        with patch.dict(os.environ, {'CATE_WARM_POOL_MAX': '3', 'CATE_STORAGE_MODE': 'bucket'}):
+            cate.start_warm_pool()
+        refresher_p.assert_called_once()
+
+    @patch('xcube_hub.core.cate._warm_pool_wakeup')
+    @patch('xcube_hub.core.cate.refresh_warm_pool')
+    def test_refresh_warm_pool_periodically(self, refresh_p, wakeup_p):
+        # Errors do not stop the refresher
+        refresh_p.side_effect = [RuntimeError('test'), KeyboardInterrupt()]
+
+        with self.assertRaises(KeyboardInterrupt):
+            cate._refresh_warm_pool_periodically()
+
+        self.assertEqual(2, refresh_p.call_count)
+
+    @patch.dict(os.environ, {'CATE_WARM_POOL_MAX': '3', 'CATE_WARM_POOL_MIN': '1', 'CATE_STORAGE_MODE': 'bucket',
+                             'CATE_MAX_WEBAPIS': '10'})
+    @patch('xcube_hub.core.cate._start_warm_pool_refresher')
+    @patch('xcube_hub.core.k8s.scale_deployment')
+    @patch('xcube_hub.core.k8s.create_deployment')
+    @patch('xcube_hub.core.k8s.get_deployment')
+    @patch('xcube_hub.core.k8s.count_pods', return_value=0)
+    def test_refresh_warm_pool(self, ct_p, get_p, create_p, scale_p, refresher_p):
+        get_p.return_value = None
+
+        self.assertEqual(1, cate.refresh_warm_pool())
+
+        deployment = create_p.call_args.kwargs['deployment']
+        self.assertEqual('cate-warm', deployment.metadata.name)
+        self.assertEqual(1, deployment.spec.replicas)
+        self.assertEqual('cate-webapi-warm', deployment.spec.template.metadata.labels['application'])
+        env = {e.name: e.value for e in deployment.spec.template.spec.containers[0].env}
+        self.assertEqual('/', env['JUPYTERHUB_SERVICE_PREFIX'])
+        self.assertIsNone(deployment.spec.template.spec.volumes)
+
+        # 6 launches within a few seconds are expected to be followed by 2 more while a pod starts cold
+        for _ in range(6):
+            cate._record_launch()
+        self.assertEqual(2, cate.get_warm_pool_size())
+
+        # Concurrent launches are all counted
+        threads = [threading.Thread(target=cate._record_launch) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertAlmostEqual(12 / 900, cate._get_launch_rate(cate.time.time()))
+        self.assertEqual(3, cate.get_warm_pool_size())
+
+        get_p.return_value = V1Deployment(spec=V1DeploymentSpec(replicas=1, selector={}, template={}))
+        self.assertEqual(3, cate.refresh_warm_pool())
+        scale_p.assert_called_once_with(name='cate-warm', replicas=3, namespace='cate-workspace-stage')
+
+        # The pool leaves room for CATE_MAX_WEBAPIS WebAPIs
+        ct_p.return_value = 9
+        self.assertEqual(1, cate.get_warm_pool_size())
+
+        # Launches of past windows are not counted
+        with patch('time.time', return_value=cate.time.time() + 3600 * 24):
+            ct_p.return_value = 0
+            self.assertEqual(1, cate.get_warm_pool_size())
+
+        with patch.dict(os.environ, {'CATE_STORAGE_MODE': 'pvc'}):
+            self.assertFalse(cate.is_warm_pool_enabled())
+            self.assertEqual(0, cate.get_warm_pool_size())
+
+    @patch.dict(os.environ, {'CATE_IDLE_TIMEOUT': '3600'})
+    @patch('xcube_hub.core.cate.start_idle_reaper')
+    @patch('xcube_hub.core.k8s.delete_pod')
+    @patch('xcube_hub.core.k8s.scale_deployment')
+    @patch('xcube_hub.core.k8s.get_deployment')
+    @patch('xcube_hub.core.k8s.list_pods')
+    def test_reap_idle_webapis(self, list_pods_p, get_p, scale_p, delete_pod_p, reaper_p):
+        now = float(int(cate.time.time()))
+        pods = [_running_pod('drwho-cate-1', 'drwho-cate', started=now - 7200),
+                _running_pod('cate-warm-1', 'amy-cate', started=now - 7200),
+                _running_pod('rose-cate-1', 'rose-cate', started=now - 7200),
+                _running_pod('clara-cate-1', 'clara-cate', started=now - 60)]
+        list_pods_p.side_effect = lambda namespace, label_selector: \
+            V1PodList(items=pods if label_selector == 'application=cate-webapi' else pods[1:2])
+        get_p.side_effect = lambda name, namespace: None if name == 'amy-cate' else V1Deployment()
+
+        cate.record_activity('rose')
+        reaper_p.assert_called_once()
+        KeyValueDatabase.instance().set('cate_launch__drwho', dict(launch_id='1', state='Ready'))
+
+        self.assertEqual(['drwho', 'amy'], cate.reap_idle_webapis())
+
+        scale_p.assert_called_once_with(name='drwho-cate', replicas=0, namespace='cate-workspace-stage')
+        delete_pod_p.assert_called_once_with(name='cate-warm-1', namespace='cate-workspace-stage')
+        self.assertIsNone(cate.get_launch('drwho'))
+
+        # Launches in progress are not reaped
+        KeyValueDatabase.instance().set('cate_launch__clara', dict(launch_id='1', state='Creating'))
+        with patch('time.time', return_value=now + 7200):
+            self.assertEqual(['drwho', 'amy', 'rose'], cate.reap_idle_webapis())
+
+        with patch.dict(os.environ, {'CATE_IDLE_TIMEOUT': '0'}):
+            self.assertEqual([], cate.reap_idle_webapis())
+
+    def test_is_elected_reaper(self):
+        now = float(int(cate.time.time() // 60 * 60))
+
+        self.assertTrue(cate._is_elected_reaper(now, 60))
+        # Another process in the same interval
+        with patch('xcube_hub.core.cate._REAPER_ID', 'other'):
+            self.assertFalse(cate._is_elected_reaper(now + 30, 60))
+            self.assertTrue(cate._is_elected_reaper(now + 60, 60))
+        self.assertFalse(cate._is_elected_reaper(now + 90, 60))
+
+    @patch('time.sleep')
+    @patch('xcube_hub.core.cate._is_elected_reaper', return_value=True)
+    @patch('xcube_hub.core.cate.reap_idle_webapis')
+    def test_reap_idle_webapis_periodically(self, reap_p, elected_p, sleep_p):
+        # Errors do not stop the reaper
+        reap_p.side_effect = [RuntimeError('test'), KeyboardInterrupt()]
+
+        with self.assertRaises(KeyboardInterrupt):
+            cate._reap_idle_webapis_periodically()
+
+        self.assertEqual(2, reap_p.call_count)
+
+        elected_p.return_value = False
+        sleep_p.side_effect = KeyboardInterrupt()
+        with self.assertRaises(KeyboardInterrupt):
+            cate._reap_idle_webapis_periodically()
+
+        self.assertEqual(2, reap_p.call_count)
+
+    @patch('xcube_hub.core.k8s.get_pod_memory_usage', return_value=1024 ** 3)
+    @patch('xcube_hub.core.k8s.list_pods')
+    def test_get_usage(self, list_pods_p, usage_p):
+        now = float(int(cate.time.time()))
+        pod = _running_pod('drwho-cate-1', 'drwho-cate', started=now - 3600)
+        list_pods_p.return_value = V1PodList(items=[pod])
+
+        usage = cate.get_usage('drwho')
+
+        list_pods_p.assert_called_with(namespace='cate-workspace-stage', label_selector='app=drwho-cate')
+        self.assertAlmostEqual(1., usage['pod_hours'], places=2)
+        self.assertAlmostEqual(2., usage['memory_gib_hours'], places=2)
+        self.assertEqual([dict(name='drwho-cate-1', phase='Running', started=now - 3600, memory_request=2 * 1024 ** 3,
+                               memory_limit=16 * 1024 ** 3, memory_usage=1024 ** 3)], usage['pods'])
+
+        # Pods that have ended are kept
+        list_pods_p.return_value = V1PodList(items=[])
+        with patch('time.time', return_value=now + 3600):
+            usage = cate.get_usage('drwho')
+            usage = cate.get_usage('drwho')
+
+        self.assertAlmostEqual(1., usage['pod_hours'], places=2)
+        self.assertEqual([], usage['pods'])
+
+        list_pods_p.return_value = V1PodList(items=[_running_pod('drwho-cate-2', 'drwho-cate', started=now)])
+        with patch('time.time', return_value=now + 1800):
+            usage = cate.get_usage('drwho')
+
+        self.assertAlmostEqual(1.5, usage['pod_hours'], places=2)
+        self.assertIsNone(usage['last_activity'])
+
+    @patch('xcube_hub.core.k8s.get_pod_memory_usage', return_value=None)
+    @patch('xcube_hub.core.k8s.delete_deployment')
+    @patch('xcube_hub.core.k8s.get_deployment', return_value=V1Deployment())
+    @patch('xcube_hub.core.k8s.list_pods')
+    def test_get_usage_deleted(self, list_pods_p, get_p, delete_p, usage_p):
+        now = float(int(cate.time.time()))
+        list_pods_p.return_value = V1PodList(items=[_running_pod('drwho-cate-1', 'drwho-cate', started=now - 3600)])
+        cate.get_usage('drwho')
+
+        # Deleted WebAPIs are charged until their deletion, not until their usage was last updated
+        list_pods_p.return_value = V1PodList(items=[])
+        with patch('time.time', return_value=now + 1800):
+            cate.delete_cate('drwho')
+        with patch('time.time', return_value=now + 3600):
+            usage = cate.get_usage('drwho')
+
+        self.assertAlmostEqual(1.5, usage['pod_hours'], places=2)
+
+
+class _FakeExecutor:
+    def __init__(self):
+        self.tasks = []
+        self.delays = []
+
+    def submit(self, fn, **kwargs):
+        self.tasks.append((fn, kwargs))
+
+    def schedule(self, delay, fn, **kwargs):
+        self.delays.append(delay)
+        self.submit(fn, **kwargs)
+
+    def run(self):
+        while self.tasks:
+            fn, kwargs = self.tasks.pop(0)
+            fn(**kwargs)
+
+def _running_pod(name: str, app: str, started: float) -> V1Pod:
+    resources = V1ResourceRequirements(requests={'memory': '2Gi'}, limits={'memory': '16Gi'})
+    return V1Pod(metadata=V1ObjectMeta(name=name, labels={'app': app, 'application': 'cate-webapi'}),
+                 spec=V1PodSpec(containers=[V1Container(name=app, resources=resources)]),
+                 status=V1PodStatus(phase='Running',
+                                    start_time=datetime.datetime.fromtimestamp(started, tz=datetime.timezone.utc)))
+
@@ -1,11 +1,13 @@
+import copy
 import json
 import os
+import time
 import unittest
 from unittest.mock import patch, MagicMock
 
 from dotenv import load_dotenv
 from kubernetes.client import ApiException, BatchV1Api, V1Pod, V1ObjectMeta, V1JobList, CoreV1Api, V1Status, V1Job, \
-    ApiValueError, V1JobStatus, V1JobCondition
+    ApiValueError, V1JobStatus, V1JobCondition, V1ListMeta, V1PodStatus
 from werkzeug.datastructures import FileStorage
 
 from test.controllers.utils import del_env
@@ -13,6 +15,7 @@ from xcube_hub import api
 from xcube_hub.cfg import Cfg
 from xcube_hub.core import cubegens
 from xcube_hub.core.cubegens import process_user_code, version
+from xcube_hub.informer import Informer
 from xcube_hub.keyvaluedatabase import KeyValueDatabase
 from xcube_hub.models.cubegen_config import CubegenConfig
 
@@ -121,7 +124,7 @@ _OUTPUT = """
 class TestCubeGens(unittest.TestCase):
     def setUp(self) -> None:
         load_dotenv(dotenv_path='test/.env')
-        KeyValueDatabase.instance(provider='inmemory')
+        KeyValueDatabase.instance(provider='inmemory', refresh=True)
         Cfg.load_config()
 
     def tearDown(self) -> None:
@@ -195,6 +198,82 @@ class TestCubeGens(unittest.TestCase):
         self.assertIn("401", str(e.exception))
         self.assertEqual(400, e.exception.status_code)
 
+    @patch('xcube_hub.core.cubegens.get')
+    @patch.object(BatchV1Api, 'list_namespaced_job')
+    def test_list_page(self, batch_p, get_p):
+        batch_p.return_value = V1JobList(metadata=V1ListMeta(_continue='next'),
+                                         items=[V1Job(metadata=V1ObjectMeta(name='drwho-sdav'))])
+        get_p.return_value = {'job_id': 'drwho-sdav', 'job_status': {'active': 1}}, 200
+
+        res, cursor = cubegens.list_page('drwho', limit=1, cursor='prev', fields=['job_status'])
+
+        self.assertEqual([{'job_id': 'drwho-sdav', 'job_status': {'active': 1}}], res)
+        self.assertEqual('next', cursor)
+        batch_p.assert_called_once_with(namespace='cate-workspace-stage', label_selector='typ=cubegen,user-id=drwho',
+                                        limit=1, _continue='prev')
+        get_p.assert_called_once_with(user_id='drwho', cubegen_id='drwho-sdav', fields=['job_status'])
+
+        with self.assertRaises(api.ApiError) as e:
+            cubegens.list_page('drwho', fields=['bla'])
+
+        self.assertEqual(400, e.exception.status_code)
+
+        with self.assertRaises(api.ApiError) as e:
+            cubegens.list_page('drwho', cursor='~drwho-sdav')
+
+        self.assertEqual("Invalid cursor. Please restart listing cubegens without cursor.", str(e.exception))
+
+    @patch.object(BatchV1Api, 'patch_namespaced_job')
+    @patch.object(BatchV1Api, 'list_namespaced_job')
+    def test_label_legacy_jobs(self, list_p, patch_p):
+        list_p.return_value = V1JobList(items=[V1Job(metadata=V1ObjectMeta(name='drwho-7d1c2f0e-1a2b-4c3d')),
+                                               V1Job(metadata=V1ObjectMeta(name='unknown'))])
+
+        self.assertEqual(['drwho-7d1c2f0e-1a2b-4c3d'], cubegens.label_legacy_jobs())
+
+        list_p.assert_called_once_with(namespace='cate-workspace-stage', label_selector='typ=cubegen,!user-id')
+        patch_p.assert_called_once_with(name='drwho-7d1c2f0e-1a2b-4c3d', namespace='cate-workspace-stage',
+                                        body={'metadata': {'labels': {'user-id': 'drwho'}}})
+
+    def test_list_page_from_informer(self):
+        jobs = V1JobList(metadata=V1ListMeta(resource_version='1'),
+                         items=[V1Job(metadata=V1ObjectMeta(name=f'drwho-{i}', labels={'typ': 'cubegen',
+                                                                                        'user-id': 'drwho'}),
+                                      status=V1JobStatus(active=1)) for i in range(3)])
+        informer = Informer(lambda **kwargs: jobs, namespace='test', index_labels=('user-id',))
+        informer.sync()
+        Informer._instances[cubegens._JOBS_INFORMER] = informer
+        os.environ['XCUBE_HUB_CUBEGENS_INFORMER'] = '1'
+
+        try:
+            res, cursor = cubegens.list_page('drwho', limit=2, fields=['job_status'])
+            self.assertEqual(['drwho-0', 'drwho-1'], [job['job_id'] for job in res])
+            self.assertEqual('~drwho-1', cursor)
+
+            res, cursor = cubegens.list_page('drwho', limit=2, cursor=cursor, fields=['job_status'])
+            self.assertEqual(1, len(res))
+            self.assertEqual('drwho-2', res[0]['job_id'])
+            self.assertEqual(1, res[0]['job_status']['active'])
+            self.assertIsNone(cursor)
+        finally:
+            del os.environ['XCUBE_HUB_CUBEGENS_INFORMER']
+            Informer._instances.pop(cubegens._JOBS_INFORMER)
+
+    @patch('xcube_hub.core.callbacks.get_callback')
+    @patch('xcube_hub.core.cubegens.logs')
+    @patch('xcube_hub.core.cubegens.status')
+    @patch('xcube_hub.core.cubegens.cubegens_result', create=True)
+    def test_get_fields(self, res_p, status_p, logs_p, call_p):
+        status_p.return_value = {'active': 1}
+
+        res, status_code = cubegens.get(user_id='drwho', cubegen_id='id', fields=['job_status'])
+
+        self.assertDictEqual({'job_id': 'id', 'job_status': {'active': 1}}, res)
+        self.assertEqual(200, status_code)
+        logs_p.assert_not_called()
+        res_p.assert_not_called()
+        call_p.assert_not_called()
+
     @patch.object(CoreV1Api, 'list_namespaced_pod')
     @patch.object(CoreV1Api, 'read_namespaced_pod_log')
     def test_logs(self, pod_read_p, pod_p):
@@ -215,6 +294,126 @@ class TestCubeGens(unittest.TestCase):
         self.assertIn("401", str(e.exception))
         self.assertEqual(400, e.exception.status_code)
 
+    @patch.object(CoreV1Api, 'list_namespaced_pod')
+    @patch.object(CoreV1Api, 'read_namespaced_pod_log')
+    def test_logs_since(self, pod_read_p, pod_p):
+        pod_p.return_value = V1JobList(items=[V1Pod(metadata=V1ObjectMeta(name='drwho-cubegen-sdav'))])
+        pod_read_p.return_value = '2021-03-01T12:00:00.5Z line 1\n2021-03-01T12:00:01Z line 2'
+
+        res, next_line = cubegens.logs_since('drwho-cubegen', since_line=0)
+
+        self.assertEqual(['line 1', 'line 2'], res)
+        self.assertEqual(2, next_line)
+        self.assertNotIn('since_seconds', pod_read_p.call_args.kwargs)
+
+        # Continuing at the cursor only requests recent output and drops lines already served
+        pod_read_p.return_value = '2021-03-01T12:00:01Z line 2\n2021-03-01T12:00:01.25Z line 3'
+
+        res, next_line = cubegens.logs_since('drwho-cubegen', since_line=2)
+
+        self.assertEqual(['line 3'], res)
+        self.assertEqual(3, next_line)
+        self.assertIn('since_seconds', pod_read_p.call_args.kwargs)
+        self.assertTrue(pod_read_p.call_args.kwargs['timestamps'])
+
+        # Another client continuing at line 2 keeps reading incrementally
+        res, next_line = cubegens.logs_since('drwho-cubegen', since_line=2)
+
+        self.assertEqual(['line 3'], res)
+        self.assertEqual(3, next_line)
+        self.assertIn('since_seconds', pod_read_p.call_args.kwargs)
+
+        # Any other offset reads the full log
+        pod_read_p.return_value = '2021-03-01T12:00:00.5Z line 1\n2021-03-01T12:00:01Z line 2\n' \
+                                  '2021-03-01T12:00:01.25Z line 3'
+
+        res, next_line = cubegens.logs_since('drwho-cubegen', since_line=1)
+
+        self.assertEqual(['line 2', 'line 3'], res)
+        self.assertEqual(3, next_line)
+        self.assertNotIn('since_seconds', pod_read_p.call_args.kwargs)
+
+        with self.assertRaises(api.ApiError) as e:
+            cubegens.logs_since('drwho-cubegen', since_line=-1)
+
+        self.assertEqual(400, e.exception.status_code)
+
+    @patch.object(CoreV1Api, 'list_namespaced_pod')
+    @patch.object(CoreV1Api, 'read_namespaced_pod_log')
+    def test_logs_since_done_pod(self, pod_read_p, pod_p):
+        pod_p.return_value = V1JobList(items=[V1Pod(metadata=V1ObjectMeta(name='drwho-cubegen-sdav'),
+                                                    status=V1PodStatus(phase='Succeeded'))])
+        pod_read_p.return_value = '2021-03-01T12:00:00Z line 1'
+
+        cubegens.logs_since('drwho-cubegen-done', since_line=0)
+        res, next_line = cubegens.logs_since('drwho-cubegen-done', since_line=1)
+
+        self.assertEqual([], res)
+        self.assertEqual(1, next_line)
+        self.assertEqual(1, pod_read_p.call_count)
+
+    @patch.object(CoreV1Api, 'list_namespaced_pod')
+    @patch.object(CoreV1Api, 'read_namespaced_pod_log')
+    def test_follow_logs(self, pod_read_p, pod_p):
+        pod_p.return_value = V1JobList(items=[V1Pod(metadata=V1ObjectMeta(name='drwho-cubegen-sdav'))])
+        stream = MagicMock()
+        stream.stream.return_value = [b'2021-03-01T12:00:00Z line 1\n2021-03-01T12:00:01Z li', b'ne 2\n',
+                                      b'2021-03-01T12:00:02Z line 3']
+        pod_read_p.side_effect = ['2021-03-01T12:00:00Z line 1', stream]
+
+        res = list(cubegens.follow_logs('drwho-cubegen-follow', since_line=0))
+
+        self.assertEqual(['line 1\n', 'line 2\n', 'line 3\n'], res)
+        self.assertTrue(pod_read_p.call_args.kwargs['follow'])
+        stream.release_conn.assert_called_once()
+
+    @patch('xcube_hub.core.cubegens._read_logs')
+    @patch('xcube_hub.core.cubegens._read_logs_since')
+    @patch('xcube_hub.core.cubegens.status')
+    def test_events(self, status_p, logs_since_p, logs_p):
+        os.environ['XCUBE_HUB_CUBEGENS_EVENTS_INTERVAL'] = '0'
+        running = {'active': 1}
+        finished = {'succeeded': 1, 'conditions': [{'type': 'Complete', 'status': 'True'}]}
+        status_p.side_effect = [running, running, finished, finished, finished]
+        cursor = dict(line=1, pods=dict())
+        logs_since_p.return_value = (['line 1'], 1, cursor)
+        logs_p.return_value = ([], cursor)
+
+        from xcube_hub.core.callbacks import put_callback
+        put_callback(user_id='drwho', cubegen_id='drwho-events', value={'sender': 'on_begin', 'state': {}},
+                     email='drwho@mail.org')
+
+        messages = cubegens.events(user_id='drwho', job_id='drwho-events')
+
+        # Published after subscribing, so the callback reaches the stream and must not be sent twice
+        put_callback(user_id='drwho', cubegen_id='drwho-events', value={'sender': 'on_update', 'state': {}},
+                     email='drwho@mail.org')
+
+        messages = list(messages)
+
+        self.assertEqual(['id: 0\nevent: progress\ndata: {"sender": "on_begin", "state": {}}\n\n',
+                          'id: 1\nevent: progress\ndata: {"sender": "on_update", "state": {}}\n\n',
+                          'event: status\ndata: {"active": 1}\n\n',
+                          'event: logs\ndata: {"output": ["line 1"], "next_line": 1}\n\n',
+                          'event: status\ndata: ' + json.dumps(finished) + '\n\n',
+                          'event: end\ndata: {"job_id": "drwho-events"}\n\n'], messages)
+        # Only the first read uses the shared cursors, the stream continues from its own cursor
+        logs_since_p.assert_called_once_with('drwho-events', 0)
+        logs_p.assert_called_once_with('drwho-events', cursor)
+
+        messages = list(cubegens.events(user_id='drwho', job_id='drwho-events', since=1))
+
+        self.assertTrue(messages[0].startswith('id: 1\nevent: progress'))
+
+        status_p.side_effect = None
+        status_p.return_value = {}
+
+        with self.assertRaises(api.ApiError) as e:
+            cubegens.events(user_id='drwho', job_id='drwho-events')
+
+        self.assertEqual(404, e.exception.status_code)
+        del os.environ['XCUBE_HUB_CUBEGENS_EVENTS_INTERVAL']
+
     @patch.object(BatchV1Api, 'delete_namespaced_job')
     def test_delete_one(self, batch_p):
         batch_p.return_value = V1Status(message='Ganz blöd', status=100)
@@ -248,6 +447,36 @@ class TestCubeGens(unittest.TestCase):
 
         self.assertDictEqual({}, res)
 
+    @patch('xcube_hub.core.cubegens.get')
+    @patch.object(BatchV1Api, 'read_namespaced_job_status')
+    @patch.object(BatchV1Api, 'list_namespaced_job')
+    def test_status_and_list_from_informer(self, list_p, read_p, get_p):
+        jobs = V1JobList(metadata=V1ListMeta(resource_version='1'),
+                         items=[V1Job(metadata=V1ObjectMeta(name='drwho-sdav', labels={'typ': 'cubegen',
+                                                                                        'user-id': 'drwho'}),
+                                      status=V1JobStatus(active=1)),
+                                V1Job(metadata=V1ObjectMeta(name='amy-sdav', labels={'typ': 'cubegen',
+                                                                                      'user-id': 'amy'}),
+                                      status=V1JobStatus(active=1))])
+        informer = Informer(lambda **kwargs: jobs, namespace='test', index_labels=('user-id',))
+        informer.sync()
+        Informer._instances[cubegens._JOBS_INFORMER] = informer
+        os.environ['XCUBE_HUB_CUBEGENS_INFORMER'] = '1'
+        get_p.return_value = {'job_id': 'drwho-sdav'}, 200
+
+        try:
+            self.assertEqual(1, cubegens.status('drwho-sdav')['active'])
+            self.assertDictEqual({}, cubegens.status('drwho-unknown'))
+
+            res, status_code = cubegens.list('drwho')
+            self.assertEqual([{'job_id': 'drwho-sdav'}], res)
+
+            read_p.assert_not_called()
+            list_p.assert_not_called()
+        finally:
+            del os.environ['XCUBE_HUB_CUBEGENS_INFORMER']
+            Informer._instances.pop(cubegens._JOBS_INFORMER)
+
     @patch.object(BatchV1Api, 'read_namespaced_job_status')
     def test_info(self, batch_p):
         batch_p.return_value = V1Job(metadata=V1ObjectMeta(name='id-cate'), status=V1Status(message='Ganz blöd',
@@ -275,12 +504,16 @@ class TestCubeGens(unittest.TestCase):
 
         container = cubegen.spec.template.spec.containers[0]
         self.assertEqual('id', cubegen.metadata.name)
+        self.assertDictEqual({'typ': 'cubegen'}, cubegen.metadata.labels)
         self.assertDictEqual({"app": "xcube-gen"}, cubegen.spec.template.metadata.labels)
         self.assertEqual("quay.io/bcdev/xcube-gen:0.7.2.dev0", container.image)
         self.assertEqual(2, len(container.volume_mounts))
         self.assertDictEqual({'mountPath': '/etc/xcube-hub', 'name': 'xcube-hub-stores', 'readOnly': True},
                              container.volume_mounts[0])
 
+        cubegen = cubegens.create_cubegen_object('id', _CFG, user_id='drwho')
+        self.assertDictEqual({'typ': 'cubegen', 'user-id': 'drwho'}, cubegen.metadata.labels)
+
         with self.assertRaises(api.ApiError) as e:
             # noinspection PyTypeChecker
             cubegens.create_cubegen_object('id', None)
@@ -432,12 +665,13 @@ class TestCubeGens(unittest.TestCase):
     @patch('xcube_hub.core.punits.get_punits')
     @patch('xcube_hub.core.cubegens.get')
     @patch('xcube_hub.core.cubegens.create')
-    @patch.object(BatchV1Api, 'read_namespaced_job_status')
+    @patch.object(BatchV1Api, 'list_namespaced_job')
     @patch('xcube_hub.core.cubegens.cubegens_result', create=True)
     def test_info2(self, res_p, status_p, create_p, get_p, punits_p):
         self.maxDiff = None
         res_p.return_value = {'status_code': 200, 'result': json.loads(_OUTPUT)['result']}
-        status_p.return_value = V1Job(status=V1JobStatus(conditions=[V1JobCondition(type='Complete', status='ready')]))
+        status_p.return_value = V1JobList(items=[
+            V1Job(status=V1JobStatus(conditions=[V1JobCondition(type='Complete', status='ready')]))])
         create_p.return_value = {'job_id': 'id', 'status': V1JobStatus().to_dict()}, 200
 
         get_p.return_value = {'job_id': 'id', 'job_status': 'success', 'result': {'status_code': 200},
@@ -489,11 +723,140 @@ class TestCubeGens(unittest.TestCase):
 
         self.assertEqual(expected, res)
 
+    @patch('xcube_hub.core.punits.get_punits')
     @patch('xcube_hub.core.cubegens.get')
     @patch('xcube_hub.core.cubegens.create')
-    @patch.object(BatchV1Api, 'read_namespaced_job_status')
+    @patch.object(BatchV1Api, 'list_namespaced_job')
+    @patch('xcube_hub.core.cubegens.cubegens_result', create=True)
+    def test_info_cache(self, res_p, status_p, create_p, get_p, punits_p):
+        res_p.return_value = {'status_code': 200, 'result': json.loads(_OUTPUT)['result']}
+        status_p.return_value = V1JobList(items=[
+            V1Job(status=V1JobStatus(conditions=[V1JobCondition(type='Complete', status='ready')]))])
+        create_p.return_value = {'job_id': 'id', 'status': V1JobStatus().to_dict()}, 200
+        get_p.return_value = {'job_id': 'id', 'job_status': 'success', 'output': ["bla", ]}, 200
+        punits_p.return_value = dict(count=500)
+
+        cfg = json.loads(json.dumps(_CFG))
+        expected, _ = cubegens.info(user_id='drwho', email='drwho@mail.org', body=cfg, token='fdsvdf')
+
+        self.assertEqual(['bla'], expected['output'])
+
+        # Callback and output configs do not change the info result. The job output of other users is not served.
+        cfg['output_config'] = {'store_id': 's3'}
+        cfg['callback_config'] = {'api_uri': 'http://callback'}
+        res, status_code = cubegens.info(user_id='amy', email='amy@mail.org', body=cfg, token='fdsvdf')
+
+        self.assertEqual(1, create_p.call_count)
+        self.assertEqual([], res['output'])
+        self.assertDictEqual(dict(expected, output=[]), res)
+        self.assertEqual(200, status_code)
+
+        cfg['cube_config']['spatial_res'] = 0.01
+        cubegens.info(user_id='drwho', email='drwho@mail.org', body=cfg, token='fdsvdf')
+
+        self.assertEqual(2, create_p.call_count)
+
+        os.environ['XCUBE_HUB_CUBEGENS_INFO_CACHE_TTL'] = '0'
+        try:
+            cubegens.info(user_id='drwho', email='drwho@mail.org', body=cfg, token='fdsvdf')
+        finally:
+            del os.environ['XCUBE_HUB_CUBEGENS_INFO_CACHE_TTL']
+
+        self.assertEqual(3, create_p.call_count)
+
+    @patch('xcube_hub.core.punits.get_punits')
+    @patch('xcube_hub.core.cubegens._run_info_job')
+    def test_info_asynchronous(self, run_p, punits_p):
+        run_p.return_value = dict(job_result={'status_code': 200, 'result': json.loads(_OUTPUT)['result']},
+                                  output=['bla'])
+        punits_p.return_value = dict(count=500)
+
+        res, status_code = cubegens.info(user_id='drwho', email='drwho@mail.org', body=_CFG, token='fdsvdf',
+                                         asynchronous=True)
+
+        self.assertEqual(202, status_code)
+        self.assertEqual('pending', res['status'])
+        ticket_id = res['ticket_id']
+
+        with self.assertRaises(api.ApiError) as e:
+            cubegens.get_info_ticket(user_id='amy', ticket_id=ticket_id)
+
+        self.assertEqual(404, e.exception.status_code)
+
+        for _ in range(100):
+            res, status_code = cubegens.get_info_ticket(user_id='drwho', ticket_id=ticket_id)
+            if status_code != 202:
+                break
+            time.sleep(0.05)
+
+        self.assertEqual(200, status_code)
+        self.assertEqual(540, res['result']['cost_estimation']['required'])
+
+        # Results are kept until the ticket expires
+        res, status_code = cubegens.get_info_ticket(user_id='drwho', ticket_id=ticket_id)
+        self.assertEqual(200, status_code)
+
+    @patch('xcube_hub.core.cubegens._get_info_executor')
+    def test_info_asynchronous_in_progress(self, executor_p):
+        res, status_code = cubegens.info(user_id='drwho', email='drwho@mail.org', body=_CFG, token='fdsvdf',
+                                         asynchronous=True)
+        ticket_id = res['ticket_id']
+
+        # Identical requests of the user share the run in progress
+        res, status_code = cubegens.info(user_id='drwho', email='drwho@mail.org', body=copy.deepcopy(_CFG),
+                                         token='fdsvdf', asynchronous=True)
+        self.assertEqual((ticket_id, 202), (res['ticket_id'], status_code))
+
+        res, status_code = cubegens.info(user_id='amy', email='amy@mail.org', body=_CFG, token='fdsvdf',
+                                         asynchronous=True)
+        self.assertNotEqual(ticket_id, res['ticket_id'])
+
+        self.assertEqual(2, executor_p.return_value.submit.call_count)
+
+        # Tickets of an inmemory database are not found by other processes
+        with patch('xcube_hub.core.cubegens._get_num_processes', return_value=2):
+            with self.assertRaises(api.ApiError) as e:
+                cubegens.info(user_id='drwho', email='drwho@mail.org', body=_CFG, token='fdsvdf',
+                              asynchronous=True)
+
+        self.assertEqual(503, e.exception.status_code)
+
+    @patch('xcube_hub.core.punits.get_punits')
+    @patch('xcube_hub.core.cubegens.create')
+    def test_estimate_costs(self, create_p, punits_p):
+        punits_p.return_value = dict(count=500)
+        cube_configs = [_CFG['cube_config'], dict(_CFG['cube_config'], bbox=[7, 50, 7.5, 50.5])]
+
+        res, status_code = cubegens.estimate_costs(email='drwho@mail.org',
+                                                   body=dict(input_config=_CFG['input_config'],
+                                                             cube_configs=cube_configs))
+
+        self.assertEqual(200, status_code)
+        self.assertEqual([dict(time=14, lat=5000, lon=2000), dict(time=14, lat=500, lon=500)],
+                         [cost['dims'] for cost in res['costs']])
+        self.assertEqual(dict(required=res['costs'][1]['punits']['total_count'], available=500, limit=1000),
+                         res['costs'][1]['cost_estimation'])
+        create_p.assert_not_called()
+
+        with self.assertRaises(api.ApiError) as e:
+            cubegens.estimate_costs(email='drwho@mail.org', body=dict(cube_configs=cube_configs))
+
+        self.assertEqual("Error. Invalid input configuration.", str(e.exception))
+
+        with patch.dict(os.environ, {'XCUBE_HUB_MAX_COST_CONFIGS': '1'}):
+            with self.assertRaises(api.ApiError) as e:
+                cubegens.estimate_costs(email='drwho@mail.org',
+                                        body=dict(input_config=_CFG['input_config'], cube_configs=cube_configs))
+
+        self.assertEqual(400, e.exception.status_code)
+        self.assertEqual("Error. At most 1 cube configurations can be estimated at once.", str(e.exception))
+
+    @patch('xcube_hub.core.cubegens.get')
+    @patch('xcube_hub.core.cubegens.create')
+    @patch.object(BatchV1Api, 'list_namespaced_job')
     def test_info2_error_response(self, status_p, create_p, get_p):
-        status_p.return_value = V1Job(status=V1JobStatus(conditions=[V1JobCondition(type='Failed', status='error')]))
+        status_p.return_value = V1JobList(items=[
+            V1Job(status=V1JobStatus(conditions=[V1JobCondition(type='Failed', status='error')]))])
         create_p.return_value = \
             {'job_id': 'id', 'status': V1JobStatus().to_dict()}, \
             404
@@ -528,13 +891,14 @@ class TestCubeGens(unittest.TestCase):
         self.assertEqual('(test)\nReason: None\n', str(e.exception))
         self.assertEqual(400, e.exception.status_code)
 
-    @patch.object(BatchV1Api, 'read_namespaced_job_status')
+    @patch.object(BatchV1Api, 'list_namespaced_job')
     @patch('xcube_hub.core.cubegens.create_version')
     @patch('xcube_hub.core.cubegens.logs')
     def test_versions(self, p_logs, p_create_version, p_status):
         p_create_version.return_value = {'job_id': 'drwho-abc'}, 200
         p_logs.return_value = ['xcube: v1.0', '', 'xcube-sh: v1.0', '']
-        p_status.return_value = V1Job(status=V1JobStatus(conditions=[V1JobCondition(status='Ready', type='Complete')]))
+        p_status.return_value = V1JobList(items=[
+            V1Job(status=V1JobStatus(conditions=[V1JobCondition(status='Ready', type='Complete')]))])
 
         res, status_code = version('drwho')
         expected = {'result': ['xcube: v1.0', 'xcube-sh: v1.0']}
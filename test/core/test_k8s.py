@@ -1,4 +1,6 @@
 import base64
+import datetime
+import os
 import unittest
 from unittest.mock import Mock, patch, MagicMock
 
@@ -10,6 +12,7 @@ from kubernetes.client import ApiException, V1ObjectMeta, CoreV1Api, V1Persisten
 from xcube_hub import api
 from xcube_hub.core import k8s
 
+from xcube_hub.informer import Informer
 from xcube_hub.core.k8s import create_pvc, delete_deployment, list_deployments, create_service, \
     delete_service, list_services, create_ingress, patch_ingress, delete_ingress, list_ingresses, list_pods, \
     create_service_object
@@ -51,28 +54,33 @@ class TestK8s(unittest.TestCase):
         res = k8s.create_pvc_object('drwho')
         self.assertEqual('claim-drwho', res.metadata['name'])
 
-    @patch.object(CoreV1Api, 'list_namespaced_persistent_volume_claim')
-    def test_create_pvc_if_not_exists(self, list_p):
+    @patch.object(CoreV1Api, 'read_namespaced_persistent_volume_claim')
+    def test_create_pvc_if_not_exists(self, read_p):
         pvc = V1PersistentVolumeClaim(metadata=V1ObjectMeta(name='tt'))
-        list_p.return_value = V1PersistentVolumeClaimList(items=[pvc])
+        read_p.return_value = pvc
 
         res = k8s.create_pvc_if_not_exists(pvc, 'test_namespace')
 
         self.assertFalse(res)
+        read_p.assert_called_with(name='tt', namespace='test_namespace')
 
-        list_p.return_value = V1PersistentVolumeClaimList(items=[])
+        read_p.side_effect = ApiException(404, 'Not Found')
         with patch('xcube_hub.core.k8s.create_pvc') as p:
             res = k8s.create_pvc_if_not_exists(pvc, 'test_namespace')
             p.assert_called_once()
 
             self.assertTrue(res)
 
-        list_p.side_effect = ApiValueError('Error')
+            core_api = CoreV1Api()
+            k8s.create_pvc_if_not_exists(pvc, 'test_namespace', core_api=core_api)
+            p.assert_called_with(pvc, namespace='test_namespace', core_api=core_api)
+
+        read_p.side_effect = ApiValueError('Error')
 
         with self.assertRaises(api.ApiError) as e:
             k8s.create_pvc_if_not_exists(pvc, 'test_namespace')
 
-        self.assertEqual('Error when creating the pvc tt: Error', str(e.exception))
+        self.assertEqual('Error when reading the pvc tt in namespace test_namespace: Error', str(e.exception))
 
     def test_create_pvc(self):
         self._core_v1_api.create_namespaced_persistent_volume_claim = Mock(side_effect=ApiException(500, 'Test'))
@@ -121,26 +129,26 @@ class TestK8s(unittest.TestCase):
 
         self.assertEqual('Error when listing daemonsets in namespace test: Error', str(e.exception))
 
-    @patch.object(AppsV1Api, 'list_namespaced_daemon_set')
-    def test_get_goofys_daemonset(self, create_p):
+    @patch.object(AppsV1Api, 'read_namespaced_daemon_set')
+    def test_get_goofys_daemonset(self, read_p):
         ds = V1DaemonSet(metadata=V1ObjectMeta(name='test'))
-        create_p.return_value = V1DaemonSetList(items=[ds])
+        read_p.return_value = ds
         res = k8s.get_goofys_daemonset(name='test', namespace='test')
 
         self.assertIsInstance(res, V1DaemonSet)
         self.assertEqual('test', res.metadata.name)
 
-        create_p.return_value = V1DaemonSetList(items=[])
+        read_p.side_effect = ApiException(404, 'Not Found')
         res = k8s.get_goofys_daemonset(name='test', namespace='test')
 
         self.assertIsNone(res)
 
-        create_p.side_effect = ApiValueError('Error')
+        read_p.side_effect = ApiValueError('Error')
 
         with self.assertRaises(api.ApiError) as e:
             k8s.get_goofys_daemonset(name='test', namespace='test')
 
-        self.assertEqual('Error when listing daemonsets in namespace test: Error', str(e.exception))
+        self.assertEqual('Error when reading the daemonset test in namespace test: Error', str(e.exception))
 
     @patch.object(AppsV1Api, 'delete_namespaced_daemon_set')
     def test_delete_goofys_daemonset(self, create_p):
@@ -157,17 +165,17 @@ class TestK8s(unittest.TestCase):
 
         self.assertEqual('Error when deleting the deployment test: Error', str(e.exception))
 
-    @patch.object(AppsV1Api, 'list_namespaced_daemon_set')
-    def test_create_goofys_daemonset_if_not_exists(self, create_p):
+    @patch.object(AppsV1Api, 'read_namespaced_daemon_set')
+    def test_create_goofys_daemonset_if_not_exists(self, read_p):
         ds = V1DaemonSet(metadata=V1ObjectMeta(name='test'))
-        create_p.return_value = V1DaemonSetList(items=[ds])
+        read_p.return_value = ds
 
         with patch('xcube_hub.core.k8s.create_goofys_daemonset') as p:
             k8s.create_goofys_daemonset_if_not_exists(daemonset=ds, namespace='test')
 
             p.assert_not_called()
 
-            create_p.return_value = V1DaemonSetList(items=[])
+            read_p.side_effect = ApiException(404, 'Not Found')
             k8s.create_goofys_daemonset_if_not_exists(daemonset=ds, namespace='test')
 
             p.assert_called_once()
@@ -227,31 +235,55 @@ class TestK8s(unittest.TestCase):
         self.assertEqual(expected, str(e.exception))
         self.assertEqual(400, e.exception.status_code)
 
-    @patch('xcube_hub.core.k8s.list_deployments')
-    def test_get_deployment(self, list_p):
+    @patch.object(AppsV1Api, 'list_namespaced_deployment')
+    @patch.object(AppsV1Api, 'read_namespaced_deployment')
+    def test_get_deployment(self, read_p, list_p):
         deployment = k8s.create_deployment_object(name='test', container_name='test', application='application',
                                                   container_port=8080, image='cate')
 
-        list_p.return_value = V1DeploymentList(items=[deployment])
+        read_p.return_value = deployment
 
         res = k8s.get_deployment(namespace='test', name='test')
 
         self.assertIsInstance(res, V1Deployment)
         self.assertEqual('test', res.metadata.name)
+        read_p.assert_called_once_with(name='test', namespace='test')
+        list_p.assert_not_called()
 
-        list_p.return_value = V1DeploymentList(items=[])
+        read_p.side_effect = ApiException(404, 'Not Found')
 
         res = k8s.get_deployment(namespace='test', name='test')
         self.assertIsNone(res)
 
-        list_p.side_effect = api.ApiError(400, 'Test')
+        read_p.side_effect = ApiException(500, 'Test')
 
         with self.assertRaises(api.ApiError) as e:
             k8s.get_deployment(namespace='test', name='test')
 
-        self.assertEqual('Test', str(e.exception))
+        expected = ("Error when reading the deployment test in namespace test: (500)\n"
+                    "Reason: Test\n")
+        self.assertEqual(expected, str(e.exception))
         self.assertEqual(400, e.exception.status_code)
 
+    @patch.dict(os.environ, {'XCUBE_HUB_K8S_INFORMER': '1'})
+    @patch.object(AppsV1Api, 'read_namespaced_deployment')
+    def test_get_deployment_cached(self, read_p):
+        deployment = k8s.create_deployment_object(name='test', container_name='test', application='application',
+                                                  container_port=8080, image='cate')
+        informer = Informer(Mock(return_value=V1DeploymentList(items=[deployment])), namespace='test')
+        informer.sync()
+
+        with patch('xcube_hub.core.k8s.Informer.instance', return_value=informer) as instance_p:
+            self.assertIs(deployment, k8s.get_deployment(namespace='test', name='test', cached=True))
+            self.assertIsNone(k8s.get_deployment(namespace='test', name='test2', cached=True))
+
+            self.assertEqual('k8s-deployments-test', instance_p.call_args[0][0])
+            read_p.assert_not_called()
+
+            k8s.get_deployment(namespace='test', name='test')
+
+            read_p.assert_called_once()
+
     def test_list_deployments(self):
         self._apps_api.list_namespaced_deployment = Mock(side_effect=ApiException(500, 'Test'))
 
@@ -278,17 +310,18 @@ class TestK8s(unittest.TestCase):
         self.assertEqual(expected, str(e.exception))
         self.assertEqual(400, e.exception.status_code)
 
-    @patch('xcube_hub.core.k8s.list_services')
-    def test_create_service_if_not_exists(self, list_p):
+    @patch.object(CoreV1Api, 'read_namespaced_service')
+    def test_create_service_if_not_exists(self, read_p):
         svc = create_service_object(name='test', port=8000, target_port=8000)
 
         with patch('xcube_hub.core.k8s.create_service') as p:
-            list_p.return_value = V1ServiceList(items=[svc])
+            read_p.return_value = svc
 
             k8s.create_service_if_not_exists(service=svc)
             p.assert_not_called()
+            read_p.assert_called_with(name='test', namespace='default')
 
-            list_p.return_value = V1ServiceList(items=[])
+            read_p.side_effect = ApiException(404, 'Not Found')
             k8s.create_service_if_not_exists(service=svc)
             p.assert_called_once()
 
@@ -373,36 +406,90 @@ class TestK8s(unittest.TestCase):
         self.assertEqual(expected, str(e.exception))
         self.assertEqual(400, e.exception.status_code)
 
-    @patch('xcube_hub.core.k8s.list_ingresses')
-    def test_get_ingress(self, list_p):
+    @patch.object(client.NetworkingV1Api, 'read_namespaced_ingress')
+    def test_get_ingress(self, read_p):
         ingress = k8s.create_ingress_object(name='test', service_name='test', service_port=8000, user_id='drwho',
                                             host_uri='https://test')
 
-        list_p.return_value = client.V1IngressList(items=[ingress])
+        read_p.return_value = ingress
 
         res = k8s.get_ingress(namespace='test', name='test')
 
         self.assertIsInstance(res, client.V1Ingress)
         self.assertEqual('test', res.metadata.name)
 
-        list_p.return_value = client.V1IngressList(items=[])
+        read_p.side_effect = ApiException(404, 'Not Found')
 
         res = k8s.get_ingress(namespace='test', name='test')
         self.assertIsNone(res)
 
-    @patch('xcube_hub.core.k8s.list_ingresses')
-    def test_create_ingress_if_not_exists(self, list_p):
+    @patch.object(client.NetworkingV1Api, 'read_namespaced_ingress')
+    def test_create_ingress_if_not_exists(self, read_p):
         ingress = k8s.create_ingress_object(name='test', service_name='test', service_port=8000, user_id='drwho',
                                             host_uri='https://test')
 
         with patch('xcube_hub.core.k8s.create_ingress') as p:
-            list_p.return_value = client.V1IngressList(items=[ingress])
+            read_p.return_value = ingress
 
             k8s.create_ingress_if_not_exists(ingress=ingress)
             p.assert_not_called()
 
-            list_p.return_value = client.V1IngressList(items=[])
+            read_p.side_effect = ApiException(404, 'Not Found')
             k8s.create_ingress_if_not_exists(ingress=ingress)
+            p.assert_called_once()
+
+    @patch.object(client.NetworkingV1Api, 'read_namespaced_ingress')
+    def test_create_or_patch_ingress(self, read_p):
+        ingress = k8s.create_ingress_object(name='test', service_name='test', service_port=8000, user_id='drwho',
+                                            host_uri='https://test', annotations={'a': '1'})
+
+        with patch('xcube_hub.core.k8s.create_ingress') as create_p, \
+                patch('xcube_hub.core.k8s.patch_ingress') as patch_p:
+            read_p.return_value = k8s.create_ingress_object(name='test', service_name='test', service_port=8000,
+                                                            user_id='drwho', host_uri='https://test',
+                                                            annotations={'a': '2', 'b': '2'})
+
+            k8s.create_or_patch_ingress(ingress=ingress, namespace='test')
+            create_p.assert_not_called()
+            body = patch_p.call_args.kwargs['body']
+            self.assertEqual({'a': '1', 'b': None}, body['metadata']['annotations'])
+            self.assertEqual('/drwho/.*', body['spec']['rules'][0]['http']['paths'][0]['path'])
+
+            read_p.side_effect = ApiException(404, 'Not Found')
+            k8s.create_or_patch_ingress(ingress=ingress, namespace='test')
+            create_p.assert_called_once_with(ingress, 'test')
+
+    @patch.object(CoreV1Api, 'patch_namespaced_pod')
+    def test_patch_pod(self, patch_p):
+        k8s.patch_pod(name='test', namespace='test', body={'metadata': {'labels': {'app': 'test'}}})
+        patch_p.assert_called_once_with(name='test', namespace='test', body={'metadata': {'labels': {'app': 'test'}}})
+
+        patch_p.side_effect = ApiException(409, 'Conflict')
+        with self.assertRaises(api.ApiError) as e:
+            k8s.patch_pod(name='test', namespace='test', body={})
+        self.assertEqual(409, e.exception.status_code)
+
+        patch_p.side_effect = ApiException(500, 'Test')
+        with self.assertRaises(api.ApiError) as e:
+            k8s.patch_pod(name='test', namespace='test', body={})
+        self.assertEqual(400, e.exception.status_code)
+
+    @patch.object(client.CustomObjectsApi, 'get_namespaced_custom_object')
+    def test_get_pod_memory_usage(self, get_p):
+        get_p.return_value = {'containers': [{'name': 'a', 'usage': {'cpu': '1m', 'memory': '1Gi'}},
+                                             {'name': 'b', 'usage': {'cpu': '1m', 'memory': '512Mi'}}]}
+
+        self.assertEqual(1536 * 1024 ** 2, k8s.get_pod_memory_usage(name='test', namespace='test'))
+        get_p.assert_called_once_with(group='metrics.k8s.io', version='v1beta1', namespace='test', plural='pods',
+                                      name='test')
+
+        get_p.side_effect = ApiException(404, 'Not Found')
+        self.assertIsNone(k8s.get_pod_memory_usage(name='test', namespace='test'))
+
+    @patch.object(AppsV1Api, 'patch_namespaced_deployment_scale')
+    def test_scale_deployment(self, patch_p):
+        k8s.scale_deployment(name='test', replicas=3, namespace='test')
+        patch_p.assert_called_once_with(name='test', namespace='test', body={'spec': {'replicas': 3}})
 
     @patch('xcube_hub.core.k8s.list_pods')
     def test_get_pod(self, list_p):
@@ -420,6 +507,22 @@ class TestK8s(unittest.TestCase):
         res = k8s.get_pod(namespace='test', prefix='test')
         self.assertIsNone(res)
 
+        now = datetime.datetime.now(datetime.timezone.utc)
+        newest = V1Pod(metadata=V1ObjectMeta(name='test-b', creation_timestamp=now))
+        deleting = V1Pod(metadata=V1ObjectMeta(name='test-c', creation_timestamp=now + datetime.timedelta(1),
+                                               deletion_timestamp=now))
+        list_p.return_value = V1PodList(items=[
+            newest,
+            V1Pod(metadata=V1ObjectMeta(name='test-a', creation_timestamp=now - datetime.timedelta(1))),
+            deleting,
+        ])
+
+        self.assertIs(newest, k8s.get_pod(namespace='test', prefix='test', cached=True))
+
+        list_p.return_value = V1PodList(items=[deleting])
+
+        self.assertIsNone(k8s.get_pod(namespace='test', prefix='test'))
+
     @patch('xcube_hub.core.k8s.list_pods')
     def test_count_pods(self, list_p):
         pod = V1Pod(metadata=V1ObjectMeta(name='test'))
@@ -514,6 +617,29 @@ class TestK8s(unittest.TestCase):
         self.assertEqual(expected, str(e.exception))
         self.assertEqual(400, e.exception.status_code)
 
+    @patch.dict(os.environ, {'XCUBE_HUB_K8S_INFORMER': '1'})
+    @patch.object(CoreV1Api, 'list_namespaced_pod')
+    def test_list_pods_cached(self, list_p):
+        pods = [V1Pod(metadata=V1ObjectMeta(name='test', namespace='test', labels=dict(app='test-cate'))),
+                V1Pod(metadata=V1ObjectMeta(name='test2', namespace='test', labels=dict(app='test2-cate')))]
+        informer = Informer(Mock(return_value=V1PodList(items=pods)), namespace='test', index_labels=('app',))
+        informer.sync()
+
+        with patch('xcube_hub.core.k8s.Informer.instance', return_value=informer) as instance_p:
+            res = list_pods(namespace='test', label_selector='app=test-cate', cached=True)
+            self.assertEqual([pods[0]], res.items)
+            self.assertEqual(1, k8s.count_pods(namespace='test', label_selector='app=test2-cate', cached=True))
+            self.assertIs(pods[1], k8s.get_pod(prefix='', namespace='test', label_selector='app=test2-cate',
+                                               cached=True))
+
+            self.assertEqual('k8s-pods-test', instance_p.call_args[0][0])
+            list_p.assert_not_called()
+
+            # Other selectors are not answered from the cache
+            list_pods(namespace='test', label_selector='app!=test-cate', cached=True)
+
+            list_p.assert_called_once_with(namespace='test', label_selector='app!=test-cate')
+
     def test_create_configmap_object(self):
         data = {'dr': 'who'}
         res = k8s.create_configmap_object(name='test', data=data)
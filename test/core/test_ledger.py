@@ -0,0 +1,173 @@
+import os
+import unittest
+from unittest.mock import patch
+
+import boto3
+import moto
+
+from xcube_hub import api
+from xcube_hub.core import ledger, punits
+from xcube_hub.database import Database, DatabaseConflict, DEFAULT_DB_BUCKET_NAME
+
+
+def _request(count: int):
+    return dict(punits=dict(total_count=count))
+
+
+class TestLedger(unittest.TestCase):
+    def setUp(self) -> None:
+        self._mock = moto.mock_s3()
+        self._mock.start()
+        s3 = boto3.client('s3')
+        s3.create_bucket(Bucket=DEFAULT_DB_BUCKET_NAME,
+                         CreateBucketConfiguration={'LocationConstraint': 'eu-west-1'})
+        self._database = Database.instance()
+        self._database.clear_cache()
+
+    def tearDown(self) -> None:
+        self._mock.stop()
+
+    def test_update(self):
+        ledger.update('heinrich', 'add', 100, _request(100))
+        balance = ledger.update('heinrich', 'sub', 30, _request(30))
+
+        self.assertEqual(70, balance['count'])
+        self.assertEqual(2, balance['seq'])
+        self.assertEqual(balance, self._database.get_user_data('heinrich', 'punits'))
+
+        transactions = ledger.get_transactions('heinrich')
+        self.assertEqual([1, 2], [tx['seq'] for tx in transactions])
+        self.assertEqual(['add', 'sub'], [tx['op'] for tx in transactions])
+        self.assertEqual([100, 70], [tx['balance'] for tx in transactions])
+
+        balance = ledger.update('heinrich', 'override', 10, _request(10))
+        self.assertEqual(10, balance['count'])
+
+        with self.assertRaises(api.ApiError) as e:
+            ledger.update('heinrich', 'sub', 11, _request(11))
+        self.assertEqual(400, e.exception.status_code)
+
+    def test_get_punits(self):
+        ledger.update('heinrich', 'add', 100, _request(100))
+        ledger.update('heinrich', 'sub', 30, _request(30))
+
+        res = punits.get_punits('heinrich')
+        self.assertEqual(70, res['count'])
+        self.assertNotIn('history', res)
+
+        res = punits.get_punits('heinrich', include_history=True)
+        self.assertEqual([['sub', _request(30)], ['add', _request(100)]],
+                         [[op, request] for _, op, request in res['history']])
+
+    def test_slim_transactions(self):
+        balance = ledger.update('heinrich', 'sub', 0, dict(dataset_descriptor=dict(data_vars=['a'] * 100),
+                                                            punits=dict(input_count=2, total_count=0)))
+
+        self.assertEqual(dict(input_count=2, total_count=0), balance['last_transaction']['punits'])
+        self.assertNotIn('dataset_descriptor', str(self._database.get_user_data('heinrich', 'punits_ledger/tx/'
+                                                                                           '000000000001')))
+
+    def test_get_history(self):
+        self._database.put_user_data('heinrich', 'punits',
+                                     dict(count=60, history=[['2021-01-02 10:00:00', 'sub', _request(20)],
+                                                             ['2021-01-02 09:00:00', 'sub', _request(20)],
+                                                             ['2021-01-01 00:00:00', 'add', _request(100)]]))
+        ledger.update('heinrich', 'sub', 10, _request(10))
+
+        history = punits.get_punits_history('heinrich', limit=2)
+
+        self.assertEqual([1, -1], [tx['seq'] for tx in history['transactions']])
+        self.assertEqual(-1, history['next_cursor'])
+        self.assertEqual([('2021-01-01', 'add', 100, 1), ('2021-01-02', 'sub', 40, 2)],
+                         [(t['date'], t['op'], t['count'], t['transactions']) for t in history['totals']][:2])
+
+        history = punits.get_punits_history('heinrich', limit=2, cursor=-1)
+
+        self.assertEqual([-2, -3], [tx['seq'] for tx in history['transactions']])
+        self.assertIsNone(history['next_cursor'])
+
+        history = punits.get_punits_history('heinrich', start='2021-01-02', end='2021-01-02 10:00:00')
+
+        self.assertEqual([-2], [tx['seq'] for tx in history['transactions']])
+        self.assertEqual([dict(date='2021-01-02', op='sub', count=20, transactions=1)], history['totals'])
+
+        with self.assertRaises(api.ApiError) as e:
+            punits.get_punits_history('heinrich', start='yesterday')
+        self.assertEqual(400, e.exception.status_code)
+
+    def test_concurrent_update(self):
+        ledger.update('heinrich', 'add', 100, _request(100))
+        other = Database(cache_ttl=0)
+        put_user_data = Database.put_user_data
+        conflicts = []
+
+        def _put_user_data(database, user_name, dataset_name, user_data, if_match=None, if_none_match=None):
+            if dataset_name == 'punits' and not conflicts:
+                # Another process subtracts in between read and write, S3 rejects the stale ETag
+                conflicts.append(dataset_name)
+                put_user_data(other, user_name, dataset_name, dict(count=50, seq=2))
+                raise DatabaseConflict('conflict')
+            return put_user_data(database, user_name, dataset_name, user_data, if_match, if_none_match)
+
+        with patch.object(Database, 'put_user_data', _put_user_data):
+            balance = ledger.update('heinrich', 'sub', 30, _request(30))
+
+        self.assertEqual(20, balance['count'])
+        self.assertEqual(3, balance['seq'])
+
+    def test_stale_cached_balance(self):
+        ledger.update('heinrich', 'add', 10, _request(10))
+        # Another process adds punits while the balance is cached
+        other = Database(cache_ttl=0)
+        balance, etag = other.get_user_data_with_etag('heinrich', 'punits')
+        other.put_user_data('heinrich', 'punits', dict(balance, count=100, seq=2), if_match=etag)
+
+        balance = ledger.update('heinrich', 'sub', 30, _request(30))
+
+        self.assertEqual(70, balance['count'])
+        self.assertEqual(3, balance['seq'])
+
+    def test_too_many_conflicts(self):
+        with patch.object(Database, 'put_user_data', side_effect=DatabaseConflict('conflict')):
+            with self.assertRaises(api.ApiError) as e:
+                ledger.update('heinrich', 'add', 100, _request(100))
+        self.assertEqual(409, e.exception.status_code)
+
+    @patch.dict(os.environ, {'XCUBE_HUB_PUNITS_COMPACTION_INTERVAL': '2'})
+    def test_compaction(self):
+        for _ in range(7):
+            ledger.update('heinrich', 'add', 10, _request(10))
+
+        month = ledger.get_transactions('heinrich')[0]['ts'][:7]
+        self.assertEqual(['punits_ledger/segments/' + month],
+                         self._database.list_user_data('heinrich', 'punits_ledger/segments/'))
+        segment = self._database.get_user_data('heinrich', 'punits_ledger/segments/' + month)
+        self.assertEqual([1, 2, 3, 4], [tx['seq'] for tx in segment['transactions']])
+        self.assertEqual(['punits_ledger/tx/000000000005', 'punits_ledger/tx/000000000006',
+                          'punits_ledger/tx/000000000007'],
+                         self._database.list_user_data('heinrich', 'punits_ledger/tx/'))
+
+        transactions = ledger.get_transactions('heinrich')
+        self.assertEqual([1, 2, 3, 4, 5, 6, 7], [tx['seq'] for tx in transactions])
+        self.assertEqual(70, transactions[-1]['balance'])
+
+    def test_migrate_history(self):
+        self._database.put_user_data('heinrich', 'punits',
+                                     dict(count=80, history=[['2021-01-02 00:00:00', 'sub', _request(20)],
+                                                             ['2021-01-01 00:00:00', 'add', _request(100)]]))
+
+        self.assertEqual(['add', 'sub'], [tx['op'] for tx in ledger.get_transactions('heinrich')])
+
+        balance = ledger.update('heinrich', 'sub', 30, _request(30))
+
+        self.assertEqual(50, balance['count'])
+        self.assertNotIn('history', balance)
+        transactions = ledger.get_transactions('heinrich')
+        self.assertEqual(['add', 'sub', 'sub'], [tx['op'] for tx in transactions])
+        self.assertEqual([-2, -1, 1], [tx['seq'] for tx in transactions])
+        self.assertEqual(['punits_ledger/segments/2021-01'],
+                         self._database.list_user_data('heinrich', 'punits_ledger/segments/'))
+
+
+if __name__ == '__main__':
+    unittest.main()
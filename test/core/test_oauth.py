@@ -14,6 +14,8 @@ from xcube_hub.models.user import User
 class TestOauth(unittest.TestCase):
     def setUp(self):
         load_dotenv(dotenv_path='test/.env')
+        oauth._MANAGEMENT_TOKENS.clear()
+        oauth.invalidate_client()
 
     def tearDown(self) -> None:
         del_env(dotenv_path='test/.env')
@@ -88,6 +90,51 @@ class TestOauth(unittest.TestCase):
             self.assertEqual('401 Unauthorized: 401 Client Error: None for url: https://edc.eu.auth0.com/oauth/token',
                              str(e.exception))
 
+    def test_get_management_token_cached(self, m):
+        m.post("https://edc.eu.auth0.com/oauth/token", json={'access_token': 'asdcaswdc', 'expires_in': 86400})
+
+        self.assertEqual('asdcaswdc', oauth._get_management_token())
+        self.assertEqual('asdcaswdc', oauth._get_management_token())
+        self.assertEqual(1, m.call_count)
+
+        # Explicit credentials are always checked by Auth0
+        oauth._get_management_token(client_id='id', client_secret='secret')
+        self.assertEqual(2, m.call_count)
+
+        # Tokens close to expiry are renewed
+        oauth._MANAGEMENT_TOKENS.clear()
+        m.post("https://edc.eu.auth0.com/oauth/token", json={'access_token': 'expiring', 'expires_in': 30})
+
+        self.assertEqual('expiring', oauth._get_management_token())
+        self.assertEqual('expiring', oauth._get_management_token())
+        self.assertEqual(4, m.call_count)
+
+    def test_get_token_client_cached(self, m):
+        user = User(email='drwho@mail.org', user_id='drwho', username='drwho', family_name='who', given_name='dr',
+                    name='drwho', password='dashc', user_metadata={'client_id': 'dfsv'}, connection='Init')
+        users_mock = m.get('https://edc.eu.auth0.com/api/v2/users', json=[user.to_dict()])
+        m.post("https://edc.eu.auth0.com/oauth/token", json={'access_token': 'asdcaswdc', 'expires_in': 86400})
+        permissions_mock = m.get(f"https://edc.eu.auth0.com/api/v2/users/drwho/permissions",
+                                 json=[{'permission_name': 'manage:collections'}, ])
+
+        token = {'client_id': 'dfsv', 'client_secret': 'thdrth', 'aud': 'audience', 'grant_type': 'password'}
+        oauth.get_token(body=token)
+        oauth.get_token(body=token)
+
+        self.assertEqual(1, users_mock.call_count)
+        self.assertEqual(1, permissions_mock.call_count)
+
+        # A different secret is not served from the cache
+        oauth.get_token(body={**token, 'client_secret': 'other'})
+
+        self.assertEqual(2, users_mock.call_count)
+
+        oauth.invalidate_client('dfsv')
+        oauth.get_token(body=token)
+
+        self.assertEqual(3, users_mock.call_count)
+        self.assertEqual(3, permissions_mock.call_count)
+
 
 if __name__ == '__main__':
     unittest.main()
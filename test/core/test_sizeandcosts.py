@@ -234,6 +234,69 @@ class TestCosts(unittest.TestCase):
 
         self.assertEqual('Value must be greater than 0', str(e.exception))
 
+    def test_get_costs(self):
+        cube_config = dict(variable_names=['B01', 'B02'],
+                           bbox=[7.0, 50.0, 9.0, 55.0],
+                           spatial_res=0.001,
+                           time_range=['2016-04-17', '2016-04-30'],
+                           time_period='1D')
+
+        res = costs.get_costs([cube_config], self._datastore.to_dict())
+
+        self.assertEqual([dict(dims=dict(time=14, lat=5000, lon=2000),
+                               num_variables=2,
+                               punits=_EXP['punits'])], res)
+
+        cube_configs = [dict(cube_config, bbox=[7.0, 50.0, 7.0 + 0.1 * i, 50.0 + 0.1 * i], time_period=time_period)
+                        for i in range(1, 20) for time_period in ('1D', '8D', '1W', '1M', '12H')]
+
+        res = costs.get_costs(cube_configs, self._datastore.to_dict())
+
+        self.assertEqual(len(cube_configs), len(res))
+        for cube_config, cost in zip(cube_configs, res):
+            processing_request = dict(dataset_descriptor=dict(data_vars={'B01': {}, 'B02': {}}, dims=cost['dims']),
+                                      size_estimation={})
+            self.assertEqual(costs.get_size_and_cost(processing_request, self._datastore.to_dict())['punits'],
+                             cost['punits'])
+
+        self.assertEqual([14, 2, 2, 1, 27], [cost['dims']['time'] for cost in res[:5]])
+        self.assertEqual([], costs.get_costs([], self._datastore.to_dict()))
+
+        res = costs.get_costs([cube_config], {'cost_params': {'scheme': 'free'}})
+        self.assertEqual(0, res[0]['punits']['total_count'])
+
+    def test_get_costs_invalid(self):
+        cube_config = dict(variable_names=['B01'],
+                           bbox=[7.0, 50.0, 9.0, 55.0],
+                           spatial_res=0.001,
+                           time_range=['2016-04-17', '2016-04-30'],
+                           time_period='1D')
+
+        for key, value, message in (('bbox', [7.0, 50.0], 'value for request key "bbox" must be a list of length 4, '
+                                                          'got length 2'),
+                                    ('bbox', [9.0, 50.0, 7.0, 55.0], 'bbox must be given as [x1, y1, x2, y2] '
+                                                                     'with x2 > x1 and y2 > y1.'),
+                                    ('bbox', [7.0, 50.0, 9.0, 50.0], 'bbox must be given as [x1, y1, x2, y2] '
+                                                                     'with x2 > x1 and y2 > y1.'),
+                                    ('spatial_res', 0, 'Value must be greater than 0'),
+                                    ('time_range', ['2016-04-17', 'tomorrow'], None),
+                                    ('time_range', ['2016-04-30', '2016-04-17'], 'time_range must not end before it '
+                                                                                 'starts.'),
+                                    ('time_period', '1Q', 'Invalid time_period "1Q".'),
+                                    ('time_period', '00D', 'Invalid time_period "00D".'),
+                                    ('variable_names', [], 'Number of variables must be greater than 0.')):
+            with self.assertRaises(api.ApiError) as e:
+                costs.get_costs([cube_config, dict(cube_config, **{key: value})], self._datastore.to_dict())
+
+            self.assertEqual(400, e.exception.status_code)
+            if message is not None:
+                self.assertEqual(message, str(e.exception))
+
+        with self.assertRaises(api.ApiError) as e:
+            costs.get_costs([cube_config], {})
+
+        self.assertEqual('missing request key "cost_params"', str(e.exception))
+
 
 if __name__ == '__main__':
     unittest.main()
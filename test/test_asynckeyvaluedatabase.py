@@ -0,0 +1,117 @@
+import asyncio
+import shutil
+import tempfile
+import unittest
+
+from xcube_hub.asynckeyvaluedatabase import AsyncKeyValueDatabase
+from xcube_hub.keyvaluedatabase import KeyValueDatabase
+
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+
+class AsyncKvDBTestMixin:
+    _kvdb: KeyValueDatabase
+    _db: AsyncKeyValueDatabase
+
+    async def test_get_set(self):
+        self.assertIsNone(await self._db.get('key'))
+
+        await self._db.set('key', {'value': 'value'})
+
+        self.assertEqual({'value': 'value'}, await self._db.get('key'))
+        self.assertEqual({'value': 'value'}, self._kvdb.get('key'))
+
+        await self._db.delete('key')
+
+        self.assertIsNone(self._kvdb.get('key'))
+
+    async def test_shares_data(self):
+        self._kvdb.mset({'key': 'value', 'key2': [1, 2]})
+
+        self.assertEqual(['value', [1, 2], None], await self._db.mget(['key', 'key2', 'key3']))
+
+        await self._db.mset({'key3': 'value3', 'key4': 'value4'})
+        await self._db.delete_many(['key', 'key4'])
+
+        self.assertEqual([None, [1, 2], 'value3', None], self._kvdb.mget(['key', 'key2', 'key3', 'key4']))
+
+    async def test_gather(self):
+        self._kvdb.mset({f'key{i}': i for i in range(10)})
+
+        values = await asyncio.gather(*[self._db.get(f'key{i}') for i in range(10)])
+
+        self.assertEqual(list(range(10)), values)
+
+    async def test_append_get_range(self):
+        self.assertEqual(1, self._kvdb.append('list', {'value': 0}))
+        self.assertEqual(2, await self._db.append('list', {'value': 1}))
+
+        self.assertEqual([{'value': 0}, {'value': 1}], await self._db.get_range('list'))
+        self.assertEqual([{'value': 1}], await self._db.get_range('list', start=1))
+
+    async def test_ttl(self):
+        await self._db.set('key', 'value', ttl=0.05)
+        await self._db.mset({'key2': 'value2'}, ttl=0.05)
+
+        self.assertEqual(['value', 'value2'], await self._db.mget(['key', 'key2']))
+
+        await asyncio.sleep(0.1)
+
+        self.assertEqual([None, None], await self._db.mget(['key', 'key2']))
+
+    async def test_ping(self):
+        self.assertTrue(await self._db.ping())
+
+    async def test_publish_subscribe(self):
+        async with await self._db.subscribe('channel') as subscription:
+            self.assertEqual(1, self._kvdb.publish('channel', {'value': 1}))
+            self.assertEqual(1, await self._db.publish('channel', {'value': 2}))
+
+            self.assertEqual({'value': 1}, await subscription.get_message(timeout=1.))
+            self.assertEqual({'value': 2}, await subscription.get_message(timeout=1.))
+            self.assertIsNone(await subscription.get_message(timeout=0.01))
+
+
+class TestAsyncInMemory(AsyncKvDBTestMixin, unittest.IsolatedAsyncioTestCase):
+    def setUp(self) -> None:
+        self._kvdb = KeyValueDatabase.instance(provider='inmemory', refresh=True)
+        self._db = AsyncKeyValueDatabase.instance()
+
+    def test_instance(self):
+        self.assertIs(self._db, AsyncKeyValueDatabase.instance())
+
+        KeyValueDatabase.instance(provider='inmemory', refresh=True)
+
+        self.assertIsNot(self._db, AsyncKeyValueDatabase.instance())
+
+
+class TestAsyncLevelDb(AsyncKvDBTestMixin, unittest.IsolatedAsyncioTestCase):
+    def setUp(self) -> None:
+        self._dir = tempfile.mkdtemp()
+        self._kvdb = KeyValueDatabase(provider='leveldb', name=self._dir)
+        self._db = AsyncKeyValueDatabase(self._kvdb, max_workers=2)
+
+    def tearDown(self) -> None:
+        self._kvdb._provider._db.close()
+        shutil.rmtree(self._dir)
+
+
+@unittest.skipIf(fakeredis is None, "fakeredis not installed")
+class TestAsyncRedis(AsyncKvDBTestMixin, unittest.IsolatedAsyncioTestCase):
+    def setUp(self) -> None:
+        server = fakeredis.FakeServer()
+        self._kvdb = KeyValueDatabase(provider='redis')
+        self._kvdb._provider._db = fakeredis.FakeRedis(server=server)
+        self._kvdb._provider._pubsub_db = self._kvdb._provider._db
+        self._db = AsyncKeyValueDatabase(self._kvdb)
+        self._db._provider._new_client = lambda pubsub=False: fakeredis.FakeAsyncRedis(server=server)
+
+    async def asyncTearDown(self) -> None:
+        await self._db.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
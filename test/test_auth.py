@@ -1,12 +1,49 @@
+import json
 import os
+import threading
+import time
 import unittest
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from unittest.mock import patch, MagicMock
+from urllib.request import urlopen
 
+import flask
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
 from dotenv import load_dotenv
+from jose import jwt, jwk
 from werkzeug.exceptions import Unauthorized, Forbidden
 
 # noinspection PyProtectedMember
 from xcube_hub import api
-from xcube_hub.auth import Auth, _AuthXcube, _Auth0, _AuthMocker, _Keycloak
+from xcube_hub import auth as auth_module
+from xcube_hub.auth import Auth, _AuthXcube, _Auth0, _AuthMocker, _Keycloak, _KeySetCache
+
+
+def _new_signing_key(kid: str):
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    pem = private_key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                    serialization.NoEncryption()).decode()
+    public_key = jwk.construct(pem, 'RS256').public_key().to_dict()
+    public_key.update(kid=kid, use='sig')
+    return pem, public_key
+
+
+class _JwksHandler(BaseHTTPRequestHandler):
+    jwks = {'keys': []}
+    hits = 0
+
+    def do_GET(self):
+        _JwksHandler.hits += 1
+        body = json.dumps(self.jwks).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
 
 
 class TestAuth(unittest.TestCase):
@@ -157,5 +194,163 @@ class TestAuth(unittest.TestCase):
                          str(e.exception))
 
 
+    def test_auth0_jwks_cache(self):
+        pem, public_key = _new_signing_key('k1')
+        _JwksHandler.jwks = {'keys': [public_key]}
+        _JwksHandler.hits = 0
+        server = HTTPServer(('127.0.0.1', 0), _JwksHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        auth_module._KEY_SETS.clear()
+
+        def _urlopen(url, **kwargs):
+            # Serve the issuer's https JWKS URL from the local stub server
+            self.assertEqual('https://edc.eu.auth0.com/.well-known/jwks.json', url)
+            return urlopen(f'http://127.0.0.1:{server.server_port}/.well-known/jwks.json', **kwargs)
+
+        audience = 'https://xcube-gen.brockmann-consult.de/api/v2/'
+        claims = {'iss': 'https://edc.eu.auth0.com/', 'aud': audience, 'exp': int(time.time()) + 60}
+        token = jwt.encode(claims, pem, algorithm='RS256', headers={'kid': 'k1'})
+        unknown_token = jwt.encode(claims, pem, algorithm='RS256', headers={'kid': 'k2'})
+
+        try:
+            with patch('xcube_hub.auth.urlopen', side_effect=_urlopen), \
+                    flask.Flask(__name__).test_request_context():
+                provider = _Auth0(domain='edc.eu.auth0.com', audience=audience)
+                self.assertEqual(audience, provider.verify_token(token)['aud'])
+                self.assertEqual(audience, _Auth0(domain='edc.eu.auth0.com',
+                                                  audience=audience).verify_token(token)['aud'])
+
+                with self.assertRaises(Unauthorized) as e:
+                    provider.verify_token(unknown_token)
+
+                self.assertEqual("401 Unauthorized: invalid_header: Unable to find appropriate key", str(e.exception))
+        finally:
+            server.shutdown()
+            server.server_close()
+            auth_module._KEY_SETS.clear()
+
+        # The unknown kid does not cause a refresh within the minimum refresh interval
+        self.assertEqual(1, _JwksHandler.hits)
+
+    def test_key_set_cache(self):
+        fetches = []
+        key_sets = [{'keys': [{'kid': 'k1'}]}, {'keys': [{'kid': 'k1'}, {'kid': 'k2'}]}]
+
+        def _fetch():
+            fetches.append(1)
+            return key_sets[min(len(fetches), len(key_sets)) - 1]
+
+        cache = _KeySetCache(_fetch, ttl=3600, min_refresh_interval=0)
+
+        self.assertEqual({'kid': 'k1'}, cache.get_key('k1'))
+        self.assertEqual({'kid': 'k1'}, cache.get_key('k1'))
+        self.assertEqual(1, len(fetches))
+
+        # Key rotation: an unknown kid triggers a refresh
+        self.assertEqual({'kid': 'k2'}, cache.get_key('k2'))
+        self.assertEqual(2, len(fetches))
+
+        # Failing refreshes keep the cached keys
+        cache = _KeySetCache(MagicMock(side_effect=[{'keys': [{'kid': 'k1'}]}, OSError('down')]), ttl=0)
+        self.assertEqual({'kid': 'k1'}, cache.get_key('k1'))
+        time.sleep(0.01)
+        self.assertEqual({'kid': 'k1'}, cache.get_key('k1'))
+
+        with self.assertRaises(Unauthorized):
+            _KeySetCache(MagicMock(side_effect=OSError('down'))).get_key('k1')
+
+    def test_key_set_cache_single_flight(self):
+        release = threading.Event()
+        fetches = []
+
+        def _fetch():
+            fetches.append(1)
+            release.wait(5)
+            return {'keys': [{'kid': 'k1'}]}
+
+        cache = _KeySetCache(_fetch)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get_key('k1'))) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.1)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(1, len(fetches))
+        self.assertEqual([{'kid': 'k1'}] * 5, results)
+
+    def test_key_set_cache_failure_backoff(self):
+        release = threading.Event()
+        fetches = []
+
+        def _fetch():
+            fetches.append(1)
+            if len(fetches) == 1:
+                return {'keys': [{'kid': 'k1'}]}
+            release.wait(5)
+            raise OSError('down')
+
+        cache = _KeySetCache(_fetch, ttl=0, retry_interval=60)
+        self.assertEqual({'kid': 'k1'}, cache.get_key('k1'))
+        time.sleep(0.01)
+
+        # Threads queued behind a failing refresh do not fetch again, nor do later requests within the backoff
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get_key('k1'))) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.1)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual([{'kid': 'k1'}] * 5, results)
+        self.assertEqual({'kid': 'k1'}, cache.get_key('k1'))
+        self.assertEqual(2, len(fetches))
+
+        # Without a key set, requests within the backoff fail without fetching
+        fetch = MagicMock(side_effect=OSError('down'))
+        cache = _KeySetCache(fetch, retry_interval=60)
+        for _ in range(3):
+            with self.assertRaises(Unauthorized):
+                cache.get_key('k1')
+        fetch.assert_called_once()
+
+    def test_keycloak_offline_validation(self):
+        pem, public_key = _new_signing_key('k1')
+        auth_module._KEY_SETS.clear()
+        os.environ['KEYCLOAK_OFFLINE_VALIDATION'] = '1'
+        os.environ['KEYCLOAK_CLIENT_SECRET_ID'] = 'cate'
+        os.environ['KEYCLOAK_REALM'] = 'cate'
+
+        try:
+            provider = _Keycloak(domain='keycloak.test', audience='cate')
+            provider._keycloak_openid = MagicMock(wraps=provider._keycloak_openid)
+            provider._keycloak_openid.certs = MagicMock(return_value={'keys': [public_key]})
+
+            token = jwt.encode({'aud': 'cate', 'email': 'drwho@mail.org', 'exp': int(time.time()) + 60}, pem,
+                               algorithm='RS256', headers={'kid': 'k1'})
+
+            other_token = jwt.encode({'aud': 'cate', 'email': 'amy@mail.org', 'exp': int(time.time()) + 60}, pem,
+                                     algorithm='RS256', headers={'kid': 'k1'})
+
+            claims = provider.verify_token(token)
+            self.assertEqual('amy@mail.org', provider.verify_token(other_token)['email'])
+            self.assertEqual('drwho@mail.org', claims['email'])
+            self.assertEqual('drwho@mail.org', provider.verify_token(token)['email'])
+            # The provider is shared by requests and keeps no claims
+            self.assertFalse(hasattr(provider, '_claims'))
+
+            provider._keycloak_openid.introspect.assert_not_called()
+            provider._keycloak_openid.certs.assert_called_once()
+        finally:
+            del os.environ['KEYCLOAK_OFFLINE_VALIDATION']
+            del os.environ['KEYCLOAK_CLIENT_SECRET_ID']
+            del os.environ['KEYCLOAK_REALM']
+            auth_module._KEY_SETS.clear()
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,55 @@
+import unittest
+
+from xcube_hub.cache import LruCache
+
+
+class TestLruCache(unittest.TestCase):
+    def setUp(self) -> None:
+        self._now = 100.
+
+    def _clock(self):
+        return self._now
+
+    def test_lru_eviction(self):
+        cache = LruCache(maxsize=2, clock=self._clock)
+        cache.put('a', 1)
+        cache.put('b', 2)
+
+        self.assertEqual(1, cache.get('a'))
+
+        cache.put('c', 3)
+
+        self.assertEqual(2, len(cache))
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(1, cache.get('a'))
+        self.assertEqual(3, cache.get('c'))
+
+        cache.delete('a')
+        self.assertEqual('default', cache.get('a', 'default'))
+
+        cache.clear()
+        self.assertEqual(0, len(cache))
+
+    def test_expiry(self):
+        cache = LruCache(maxsize=2, clock=self._clock)
+        cache.put('a', 1, expires_at=110.)
+        cache.put('b', 2)
+
+        self.assertEqual(1, cache.get('a'))
+
+        self._now = 110.
+
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(2, cache.get('b'))
+        self.assertEqual(1, len(cache))
+
+    def test_disabled(self):
+        cache = LruCache(maxsize=0)
+        cache.put('a', 1)
+
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(0, len(cache))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+import json
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from xcube_hub import api
+from xcube_hub.codec import ValueCodec
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+_VALUE = {'progress': [{'sender': 'on_update', 'state': {'progress': 0.5}}] * 100, 'label': 'ä'}
+
+
+class TestValueCodec(unittest.TestCase):
+    def test_json(self):
+        codec = ValueCodec()
+
+        data = codec.encode(_VALUE)
+
+        self.assertEqual(0x11, data[0])
+        self.assertEqual(_VALUE, codec.decode(data))
+        self.assertIsNone(codec.decode(None))
+
+    def test_legacy_json_text(self):
+        codec = ValueCodec(fmt='orjson', compression='zlib')
+
+        self.assertEqual(_VALUE, codec.decode(json.dumps(_VALUE)))
+        self.assertEqual(_VALUE, codec.decode(json.dumps(_VALUE).encode('utf-8')))
+        self.assertEqual([1, 2], codec.decode('[1, 2]'))
+
+    def test_orjson(self):
+        codec = ValueCodec(fmt='orjson')
+
+        data = codec.encode(_VALUE)
+
+        self.assertEqual(_VALUE, codec.decode(data))
+        self.assertEqual(_VALUE, ValueCodec().decode(data))
+
+    def test_compression(self):
+        codec = ValueCodec(compression='zlib', compression_threshold=100)
+
+        small = codec.encode({'value': 1})
+        large = codec.encode(_VALUE)
+
+        self.assertEqual(0x11, small[0])
+        self.assertEqual(0x19, large[0])
+        self.assertLess(len(large), len(json.dumps(_VALUE)))
+        self.assertEqual(_VALUE, codec.decode(large))
+        # Compressed values stay readable when compression is switched off
+        self.assertEqual(_VALUE, ValueCodec().decode(large))
+
+    @unittest.skipIf(zstandard is None, "zstandard not installed")
+    def test_zstd(self):
+        codec = ValueCodec(compression='zstd', compression_threshold=100)
+
+        data = codec.encode(_VALUE)
+
+        self.assertEqual(0x15, data[0])
+        self.assertEqual(_VALUE, codec.decode(data))
+
+    @unittest.skipIf(zstandard is None, "zstandard not installed")
+    def test_zstd_threads(self):
+        codec = ValueCodec(compression='zstd', compression_threshold=100)
+        values = [dict(_VALUE, label=str(i)) for i in range(8)]
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            res = list(executor.map(lambda value: codec.decode(codec.encode(value)), values * 20))
+
+        self.assertEqual(values * 20, res)
+
+    @unittest.skipIf(msgpack is None, "msgpack not installed")
+    def test_msgpack(self):
+        codec = ValueCodec(fmt='msgpack')
+
+        data = codec.encode(_VALUE)
+
+        self.assertEqual(0x12, data[0])
+        self.assertEqual(_VALUE, codec.decode(data))
+        self.assertEqual(_VALUE, ValueCodec().decode(data))
+
+    def test_invalid(self):
+        with self.assertRaises(api.ApiError) as e:
+            ValueCodec(fmt='pickle')
+
+        self.assertEqual("System Error (Cache): Unknown codec pickle.", str(e.exception))
+
+        with self.assertRaises(api.ApiError) as e:
+            ValueCodec().decode('{"value"')
+
+        self.assertEqual(401, e.exception.status_code)
+
+
+if __name__ == '__main__':
+    unittest.main()
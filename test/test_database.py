@@ -1,3 +1,4 @@
+import time
 import unittest
 
 import boto3
@@ -5,6 +6,7 @@ import moto
 
 from xcube_hub.database import DEFAULT_DB_BUCKET_NAME
 from xcube_hub.database import Database
+from xcube_hub.keyvaluedatabase import KeyValueDatabase
 
 
 class DatabaseTest(unittest.TestCase):
@@ -49,4 +51,96 @@ class DatabaseTest(unittest.TestCase):
             self.assertEqual(None, actual_user_data)
 
             # Assert delete_user_data() does not fail on non-existing users
-            database.delete_user_data('sieglinde', dataset_name)
\ No newline at end of file
+            database.delete_user_data('sieglinde', dataset_name)
+
+
+class DatabaseCacheTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self._mock = moto.mock_s3()
+        self._mock.start()
+        s3 = boto3.client('s3')
+        s3.create_bucket(Bucket=DEFAULT_DB_BUCKET_NAME,
+                         CreateBucketConfiguration={'LocationConstraint': 'eu-west-1'})
+
+    def tearDown(self) -> None:
+        self._mock.stop()
+
+    def _count_gets(self, database: Database):
+        calls = []
+        get_object = database._client.get_object
+
+        def _get_object(**kwargs):
+            calls.append(kwargs)
+            return get_object(**kwargs)
+
+        database._client.get_object = _get_object
+        return calls
+
+    def test_cached_reads(self):
+        database = Database(cache_ttl=60)
+        calls = self._count_gets(database)
+
+        database.put_user_data('heinrich', 'punits', dict(count=10))
+
+        user_data = database.get_user_data('heinrich', 'punits')
+        self.assertEqual(dict(count=10), user_data)
+        # Callers get copies
+        user_data['count'] = 0
+        self.assertEqual(dict(count=10), database.get_user_data('heinrich', 'punits'))
+        self.assertEqual(0, len(calls))
+
+        self.assertIsNone(database.get_user_data('sieglinde', 'punits'))
+        self.assertIsNone(database.get_user_data('sieglinde', 'punits'))
+        self.assertEqual(1, len(calls))
+        # Missing user data is cached only briefly
+        self.assertLessEqual(database._cache.get('users/sieglinde/punits.json')[2], time.time() + 1)
+
+        database.delete_user_data('heinrich', 'punits')
+        self.assertIsNone(database.get_user_data('heinrich', 'punits'))
+        self.assertEqual(2, len(calls))
+
+    def test_revalidation(self):
+        database = Database(cache_ttl=60)
+        other = Database(cache_ttl=0)
+        calls = self._count_gets(database)
+
+        database.put_user_data('heinrich', 'punits', dict(count=10))
+        database._cache.put('users/heinrich/punits.json',
+                            database._cache.get('users/heinrich/punits.json')[:2] + (0,))
+
+        self.assertEqual(dict(count=10), database.get_user_data('heinrich', 'punits'))
+        self.assertEqual(1, len(calls))
+        self.assertIn('IfNoneMatch', calls[0])
+
+        # A revalidated entry is not served unchecked again
+        other.put_user_data('heinrich', 'punits', dict(count=20))
+        self.assertEqual(dict(count=20), database.get_user_data('heinrich', 'punits'))
+        self.assertEqual(2, len(calls))
+        self.assertIn('IfNoneMatch', calls[1])
+
+    def test_kvdb(self):
+        KeyValueDatabase.instance(provider='inmemory', refresh=True)
+        database = Database(cache_ttl=60, use_kvdb=True)
+        other = Database(cache_ttl=60, use_kvdb=True)
+        calls = self._count_gets(other)
+
+        database.put_user_data('heinrich', 'punits', dict(count=10))
+
+        self.assertEqual(dict(count=10), other.get_user_data('heinrich', 'punits'))
+        self.assertEqual(0, len(calls))
+
+        database.delete_user_data('heinrich', 'punits')
+        other.clear_cache()
+
+        self.assertIsNone(other.get_user_data('heinrich', 'punits'))
+        self.assertEqual(1, len(calls))
+
+    def test_disabled(self):
+        database = Database(cache_ttl=0)
+        calls = self._count_gets(database)
+
+        database.put_user_data('heinrich', 'punits', dict(count=10))
+        database.get_user_data('heinrich', 'punits')
+        database.get_user_data('heinrich', 'punits')
+
+        self.assertEqual(2, len(calls))
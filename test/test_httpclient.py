@@ -0,0 +1,93 @@
+import threading
+import unittest
+from http.server import HTTPServer, BaseHTTPRequestHandler
+
+import requests_mock
+
+from xcube_hub.httpclient import HttpClient
+
+
+class _FlakyHandler(BaseHTTPRequestHandler):
+    statuses = []
+    hits = 0
+
+    def _respond(self):
+        _FlakyHandler.hits += 1
+        status = self.statuses.pop(0) if self.statuses else 200
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    do_GET = _respond
+    do_POST = _respond
+
+    def log_message(self, *args):
+        pass
+
+
+class TestHttpClient(unittest.TestCase):
+    def setUp(self) -> None:
+        self._client = HttpClient(connect_timeout=1, read_timeout=2, retries=2, backoff_factor=0, pool_size=2)
+
+    def tearDown(self) -> None:
+        self._client.close()
+
+    def test_session_per_host(self):
+        session = self._client.session('https://edc.eu.auth0.com/api/v2/users')
+
+        self.assertIs(session, self._client.session('https://edc.eu.auth0.com/oauth/token'))
+        self.assertIsNot(session, self._client.session('https://geodb.test/rpc'))
+
+    @requests_mock.Mocker()
+    def test_request_timeout_and_metrics(self, m):
+        m.get('https://edc.eu.auth0.com/api/v2/users', json=[])
+        m.post('https://geodb.test/rpc', status_code=500)
+
+        self.assertEqual([], self._client.get('https://edc.eu.auth0.com/api/v2/users').json())
+        self._client.get('https://edc.eu.auth0.com/api/v2/users', timeout=10)
+        self._client.post('https://geodb.test/rpc')
+
+        self.assertEqual((1, 2), m.request_history[0].timeout)
+        self.assertEqual(10, m.request_history[1].timeout)
+
+        metrics = self._client.metrics
+        self.assertEqual(2, metrics['edc.eu.auth0.com']['count'])
+        self.assertEqual(0, metrics['edc.eu.auth0.com']['errors'])
+        self.assertEqual(1, metrics['geodb.test']['errors'])
+        self.assertGreaterEqual(metrics['geodb.test']['max_seconds'], 0)
+
+    def test_retry(self):
+        server = HTTPServer(('127.0.0.1', 0), _FlakyHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f'http://127.0.0.1:{server.server_port}/'
+
+        try:
+            _FlakyHandler.statuses = [503, 429]
+            _FlakyHandler.hits = 0
+            self.assertEqual(200, self._client.get(url).status_code)
+            self.assertEqual(3, _FlakyHandler.hits)
+
+            # POST is not idempotent and therefore not retried
+            _FlakyHandler.statuses = [503]
+            _FlakyHandler.hits = 0
+            self.assertEqual(503, self._client.post(url).status_code)
+            self.assertEqual(1, _FlakyHandler.hits)
+
+            # The last response is returned once retries are exhausted
+            _FlakyHandler.statuses = [503, 503, 503]
+            _FlakyHandler.hits = 0
+            self.assertEqual(503, self._client.get(url).status_code)
+            self.assertEqual(3, _FlakyHandler.hits)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def test_instance(self):
+        client = HttpClient.instance()
+
+        self.assertIs(client, HttpClient.instance())
+        self.assertIsNot(client, HttpClient.instance(refresh=True))
+
+
+if __name__ == '__main__':
+    unittest.main()
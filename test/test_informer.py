@@ -0,0 +1,146 @@
+import time
+import unittest
+from unittest.mock import patch
+
+from kubernetes.client import V1Job, V1JobList, V1JobStatus, V1ListMeta, V1ObjectMeta, ApiException
+from urllib3.exceptions import ReadTimeoutError
+
+from xcube_hub.informer import Informer, wait_until_synced
+
+
+def _job(name: str, rv: str, labels=None, active: int = 1):
+    return V1Job(metadata=V1ObjectMeta(name=name, resource_version=rv, labels=labels or {'typ': 'cubegen'}),
+                 status=V1JobStatus(active=active))
+
+
+class _FakeWatch:
+    """
+    A watch source replaying a list of event batches. Each call of stream() returns the next batch.
+    """
+
+    def __init__(self, batches):
+        self._batches = batches
+        self.calls = []
+
+    def __call__(self):
+        return self
+
+    def stream(self, func, **kwargs):
+        self.calls.append(kwargs)
+        if not self._batches:
+            time.sleep(0.01)
+            return
+        batch = self._batches.pop(0)
+        for event in batch:
+            if isinstance(event, Exception):
+                raise event
+            yield event
+
+    def stop(self):
+        pass
+
+
+class TestInformer(unittest.TestCase):
+    def setUp(self) -> None:
+        self._list_calls = 0
+
+    def _list(self, **kwargs):
+        self._list_calls += 1
+        return V1JobList(metadata=V1ListMeta(resource_version='10'),
+                         items=[_job('drwho-1', '5', {'typ': 'cubegen', 'user-id': 'drwho'}),
+                                _job('amy-1', '6', {'typ': 'cubegen', 'user-id': 'amy'})])
+
+    def test_sync_and_watch(self):
+        fake_watch = _FakeWatch([[
+            {'type': 'ADDED', 'object': _job('drwho-2', '11', {'typ': 'cubegen', 'user-id': 'drwho'})},
+            {'type': 'MODIFIED', 'object': _job('drwho-1', '12', {'typ': 'cubegen', 'user-id': 'drwho'}, 0)},
+            {'type': 'DELETED', 'object': _job('amy-1', '13', {'typ': 'cubegen', 'user-id': 'amy'})},
+        ]])
+        events = []
+        informer = Informer(self._list, namespace='test', label_selector='typ=cubegen', index_labels=('user-id',),
+                            watch_factory=fake_watch, on_event=lambda typ, obj: events.append(typ))
+
+        self.assertFalse(informer.has_synced)
+        self.assertIsNone(wait_until_synced(informer))
+
+        informer.sync()
+        self.assertTrue(informer.has_synced)
+        self.assertEqual('10', informer.resource_version)
+        self.assertEqual(2, len(informer.list()))
+
+        informer.watch()
+
+        self.assertEqual({'namespace': 'test', 'label_selector': 'typ=cubegen', 'timeout_seconds': 300,
+                          '_request_timeout': (5, 330), 'resource_version': '10'}, fake_watch.calls[0])
+        self.assertEqual('13', informer.resource_version)
+        self.assertEqual(['ADDED', 'MODIFIED', 'DELETED'], events)
+        self.assertIsNone(informer.get('amy-1'))
+        self.assertEqual(0, informer.get('drwho-1').status.active)
+        self.assertEqual({'drwho-1', 'drwho-2'}, {job.metadata.name for job in informer.list(**{'user-id': 'drwho'})})
+        self.assertEqual([], informer.list(**{'user-id': 'amy'}))
+        self.assertIs(informer, wait_until_synced(informer))
+
+    def test_resume_after_expired_resource_version(self):
+        fake_watch = _FakeWatch([
+            [{'type': 'ERROR', 'object': None, 'raw_object': {'code': 410, 'message': 'too old'}}],
+            [ApiException(status=500, reason='boom')],
+        ])
+        informer = Informer(self._list, namespace='test', watch_factory=fake_watch)
+
+        # First round: list, watch gets a 410 and the informer relists. Second round: the watch fails and
+        # the informer gives up as no retries are allowed.
+        with self.assertRaises(ApiException):
+            informer.run(max_retries=0)
+
+        self.assertEqual(2, self._list_calls)
+        self.assertEqual(2, len(fake_watch.calls))
+        self.assertEqual('10', fake_watch.calls[1]['resource_version'])
+
+    def test_retries_are_consecutive(self):
+        fake_watch = _FakeWatch([
+            [ApiException(status=500, reason='boom')],
+            [{'type': 'ERROR', 'object': None, 'raw_object': {'code': 410, 'message': 'too old'}}],
+            [ApiException(status=500, reason='boom')],
+            [ApiException(status=500, reason='boom')],
+        ])
+        informer = Informer(self._list, namespace='test', watch_factory=fake_watch)
+
+        # The relist after the expired resource version resets the failures
+        with patch.object(informer._stopped, 'wait'):
+            with self.assertRaises(ApiException):
+                informer.run(max_retries=1)
+
+        self.assertEqual(2, self._list_calls)
+        self.assertEqual(4, len(fake_watch.calls))
+
+    def test_read_timeout(self):
+        fake_watch = _FakeWatch([
+            [{'type': 'ADDED', 'object': _job('drwho-2', '11')}, ReadTimeoutError(None, None, 'timed out')],
+            [ApiException(status=500, reason='boom')],
+        ])
+        informer = Informer(self._list, namespace='test', watch_factory=fake_watch)
+
+        # A silent connection is watched again from the last resource version without counting as failure
+        with self.assertRaises(ApiException):
+            informer.run(max_retries=0)
+
+        self.assertEqual(1, self._list_calls)
+        self.assertEqual(2, len(fake_watch.calls))
+        self.assertEqual('11', fake_watch.calls[1]['resource_version'])
+
+    def test_instance(self):
+        fake_watch = _FakeWatch([])
+        Informer.stop_all()
+        self.assertIsNone(Informer.instance('jobs'))
+
+        informer = Informer.instance('jobs', factory=lambda: Informer(self._list, namespace='test',
+                                                                      watch_factory=fake_watch))
+        self.assertTrue(informer.wait_for_sync(timeout=5))
+        self.assertIs(informer, Informer.instance('jobs'))
+
+        Informer.stop_all()
+        self.assertIsNone(Informer.instance('jobs'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,7 +2,7 @@ import os
 import unittest
 from unittest.mock import patch
 
-from kubernetes import config
+from kubernetes import config, client
 
 from xcube_hub.k8scfg import K8sCfg
 
@@ -27,5 +27,63 @@ class TestK8sCfg(unittest.TestCase):
         incluster_cfg_p.assert_called_once()
 
 
+class TestK8sCfgClients(unittest.TestCase):
+    def setUp(self) -> None:
+        K8sCfg.close_clients()
+
+    def tearDown(self) -> None:
+        K8sCfg.close_clients()
+
+    def test_shared_api_client(self):
+        core_v1_api = K8sCfg.core_v1_api()
+
+        self.assertIsInstance(core_v1_api, client.CoreV1Api)
+        self.assertIs(core_v1_api, K8sCfg.core_v1_api())
+        self.assertIs(K8sCfg.api_client(), core_v1_api.api_client)
+        self.assertIs(K8sCfg.api_client(), K8sCfg.batch_v1_api().api_client)
+        self.assertIs(K8sCfg.api_client(), K8sCfg.apps_v1_api().api_client)
+        self.assertIs(K8sCfg.api_client(), K8sCfg.networking_v1_api().api_client)
+
+        K8sCfg.close_clients()
+
+        self.assertIsNot(core_v1_api, K8sCfg.core_v1_api())
+
+    def test_new_api_client_per_process(self):
+        api_client = K8sCfg.api_client()
+
+        with patch.object(os, 'getpid', return_value=os.getpid() + 1):
+            self.assertIsNot(api_client, K8sCfg.api_client())
+
+    @patch.dict(os.environ, {'XCUBE_HUB_K8S_POOL_SIZE': '20', 'XCUBE_HUB_K8S_RETRIES': '2',
+                             'XCUBE_HUB_K8S_READ_TIMEOUT': '10'})
+    def test_configuration(self):
+        api_client = K8sCfg.api_client()
+
+        self.assertEqual(20, api_client.configuration.connection_pool_maxsize)
+        self.assertEqual(2, api_client.configuration.retries.total)
+        self.assertIn(429, api_client.configuration.retries.status_forcelist)
+        self.assertTrue(api_client.configuration.retries.respect_retry_after_header)
+        self.assertEqual((5, 10), api_client.request_timeout)
+
+        K8sCfg.close_clients()
+
+        with patch.dict(os.environ, {'XCUBE_HUB_K8S_RETRIES': '0'}):
+            self.assertIsNone(K8sCfg.api_client().configuration.retries)
+
+    @patch.object(client.ApiClient, 'call_api')
+    def test_request_timeout(self, call_p):
+        api_client = K8sCfg.api_client()
+
+        api_client.call_api('/api/v1/namespaces', 'GET')
+        self.assertEqual((5, 30), call_p.call_args.kwargs['_request_timeout'])
+
+        api_client.call_api('/api/v1/namespaces', 'GET', _request_timeout=1)
+        self.assertEqual(1, call_p.call_args.kwargs['_request_timeout'])
+
+        # Watches and followed logs stream their response
+        api_client.call_api('/api/v1/namespaces', 'GET', _preload_content=False)
+        self.assertIsNone(call_p.call_args.kwargs.get('_request_timeout'))
+
+
 if __name__ == '__main__':
     unittest.main()
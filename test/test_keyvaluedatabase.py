@@ -1,4 +1,7 @@
 import json
+import shutil
+import tempfile
+import time
 import unittest
 from unittest.mock import patch
 from xcube_hub import api
@@ -33,6 +36,18 @@ class TestRedisCache(unittest.TestCase):
     def setUp(self) -> None:
         self._db = _RedisKvDB()
 
+    def test_unreachable(self):
+        with patch.dict('os.environ', {'XCUBE_HUB_REDIS_RETRIES': '0'}):
+            db = _RedisKvDB(host='localhost', port=1)
+
+        self.assertFalse(db.ping())
+
+        with self.assertRaises(api.ApiError) as e:
+            db.get('key')
+
+        self.assertEqual(503, e.exception.status_code)
+        self.assertEqual("System Error: redis cache not ready.", str(e.exception))
+
     def test_get(self):
         _mock_patch = patch('redis.Redis.get')
         _mock = _mock_patch.start()
@@ -72,6 +87,8 @@ class TestRedisCache(unittest.TestCase):
 
         self.assertEqual({'value': 'testValue'}, res)
 
+        _mock_patch.stop()
+
     def test_delete(self):
         _mock_patch = patch('redis.Redis.delete')
         _mock = _mock_patch.start()
@@ -105,7 +122,7 @@ class TestLevelDbCache(unittest.TestCase):
         value = json.dumps({'value': 'value'})
         _KvDBMocker.return_value = str.encode(value)
         res = self._db.get('key')
-        self.assertEqual(value, res)
+        self.assertEqual(str.encode(value), res)
 
     def test_set(self):
         _KvDBMocker.return_value = True
@@ -116,7 +133,7 @@ class TestLevelDbCache(unittest.TestCase):
         _KvDBMocker.return_value = str.encode(value)
 
         res = self._db.get('testSet')
-        self.assertEqual(value, res)
+        self.assertEqual(str.encode(value), res)
 
     def test_delete(self):
         _KvDBMocker.return_value = True
@@ -157,5 +174,234 @@ class TestInMemoryCache(unittest.TestCase):
         self.assertFalse(res)
 
 
+class TestDefaultTtl(unittest.TestCase):
+    def setUp(self) -> None:
+        self._registered = dict(KeyValueDatabase._default_ttls)
+
+    def tearDown(self) -> None:
+        KeyValueDatabase._default_ttls = self._registered
+
+    def test_default_ttl(self):
+        KeyValueDatabase.register_default_ttl('*__test', 10)
+        db = KeyValueDatabase(provider='inmemory', default_ttls={'user__*__test': 20, 'user__never': 0})
+
+        self.assertEqual(20, db.default_ttl('user__job__test'))
+        self.assertEqual(10, db.default_ttl('other__job__test'))
+        self.assertIsNone(db.default_ttl('user__never'))
+        self.assertIsNone(db.default_ttl('user__job'))
+
+    def test_default_ttl_from_env(self):
+        with patch.dict('os.environ', {'XCUBE_HUB_KV_TTLS': '*__test=30, user__*=40'}):
+            db = KeyValueDatabase(provider='inmemory')
+
+        self.assertEqual(30, db.default_ttl('user__job__test'))
+        self.assertEqual(40, db.default_ttl('user__job'))
+
+    def test_set_uses_default_ttl(self):
+        clock = MockClock()
+        db = KeyValueDatabase(provider='inmemory', default_ttls={'*__test': 10}, sweep_interval=0, clock=clock)
+        db.set('key__test', 'value')
+        db.set('key__other', 'value')
+        db.set('key2__test', 'value', ttl=0)
+
+        clock.now += 11
+
+        self.assertEqual([None, 'value', 'value'], db.mget(['key__test', 'key__other', 'key2__test']))
+
+
+class MockClock:
+    def __init__(self):
+        self.now = 1000.
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestInMemoryEviction(unittest.TestCase):
+    def setUp(self) -> None:
+        self._clock = MockClock()
+        self._db = _InMemoryKvDB(max_bytes=10, sweep_interval=0, clock=self._clock)
+
+    def test_evicts_least_recently_used(self):
+        self._db.set('key', b'1234')
+        self._db.set('key2', b'1234')
+        self.assertEqual(b'1234', self._db.get('key'))
+
+        self._db.set('key3', b'1234')
+
+        self.assertEqual([b'1234', None, b'1234'], self._db.mget(['key', 'key2', 'key3']))
+        self.assertEqual(8, self._db.size)
+
+    def test_size(self):
+        self._db.set('key', b'1234')
+        self._db.set('key', b'12')
+        self._db.append('list', b'123')
+        self._db.append('list', b'123')
+        self.assertEqual(8, self._db.size)
+
+        self._db.delete('list')
+        self.assertEqual(2, self._db.size)
+
+    def test_keeps_value_exceeding_max_bytes(self):
+        self._db.set('key', b'1234')
+        self._db.set('key2', b'123456789012')
+
+        self.assertEqual([None, b'123456789012'], self._db.mget(['key', 'key2']))
+
+    def test_sweep(self):
+        self._db.set('key', b'1', ttl=10)
+        self._db.set('key2', b'2', ttl=20)
+        self._db.append('list', b'3', ttl=10)
+        self._db.set('key3', b'4')
+
+        self._clock.now += 15
+
+        self.assertEqual(2, self._db.sweep())
+        self.assertEqual(2, len(self._db))
+        self.assertEqual(2, self._db.size)
+
+    def test_sweeper_thread(self):
+        db = _InMemoryKvDB(sweep_interval=0.01)
+        db.set('key', b'1', ttl=0.01)
+
+        time.sleep(0.1)
+
+        self.assertEqual(0, len(db))
+
+
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+
+class KvDBBatchTestMixin:
+    _db: KeyValueDatabase
+
+    def test_mget_mset(self):
+        self.assertEqual([], self._db.mget([]))
+
+        self._db.mset({'key': {'value': 'value'}, 'key2': [1, 2]})
+
+        self.assertEqual([{'value': 'value'}, [1, 2], None], self._db.mget(['key', 'key2', 'key3']))
+
+    def test_delete_many(self):
+        self._db.mset({'key': {'value': 'value'}, 'key2': [1, 2], 'key3': 'value3'})
+
+        self._db.delete_many(['key', 'key2', 'key4'])
+
+        self.assertEqual([None, None, 'value3'], self._db.mget(['key', 'key2', 'key3']))
+
+    def test_pipeline(self):
+        self._db.set('key2', 'value2')
+
+        with self._db.pipeline() as pipe:
+            pipe.set('key', {'value': 'value'})
+            pipe.delete('key2')
+
+        self.assertEqual([{'value': 'value'}, None], self._db.mget(['key', 'key2']))
+
+        with self.assertRaises(ValueError):
+            with self._db.pipeline() as pipe:
+                pipe.set('key3', 'value3')
+                raise ValueError('discard')
+
+        self.assertIsNone(self._db.get('key3'))
+
+    def test_append_get_range(self):
+        self.assertEqual([], self._db.get_range('list'))
+
+        self.assertEqual(1, self._db.append('list', {'value': 0}))
+        self.assertEqual(2, self._db.append('list', {'value': 1}))
+        self.assertEqual(3, self._db.append('list', {'value': 2}))
+
+        self.assertEqual([{'value': 0}, {'value': 1}, {'value': 2}], self._db.get_range('list'))
+        self.assertEqual([{'value': 2}], self._db.get_range('list', start=2))
+        self.assertEqual([], self._db.get_range('list', start=3))
+
+        self._db.delete('list')
+
+        self.assertEqual([], self._db.get_range('list'))
+        self.assertEqual(1, self._db.append('list', {'value': 3}))
+
+    def test_ttl(self):
+        self._db.set('key', 'value', ttl=0.05)
+        self._db.mset({'key2': 'value2', 'key3': 'value3'}, ttl=0.05)
+        self._db.append('list', 'value', ttl=0.05)
+        self._db.set('key4', 'value4', ttl=0)
+
+        self.assertEqual(['value', 'value2', 'value3', 'value4'], self._db.mget(['key', 'key2', 'key3', 'key4']))
+        self.assertEqual(['value'], self._db.get_range('list'))
+
+        time.sleep(0.1)
+
+        self.assertEqual([None, None, None, 'value4'], self._db.mget(['key', 'key2', 'key3', 'key4']))
+        self.assertEqual([], self._db.get_range('list'))
+        self.assertEqual(1, self._db.append('list', 'value'))
+
+    def test_legacy_values(self):
+        self._db._provider.set('legacy', json.dumps({'value': 'value'}))
+
+        self.assertEqual({'value': 'value'}, self._db.get('legacy'))
+
+    def test_ping(self):
+        self.assertTrue(self._db.ping())
+
+    def test_publish_subscribe(self):
+        self.assertEqual(0, self._db.publish('channel', {'value': 0}))
+
+        with self._db.subscribe('channel') as subscription:
+            self.assertEqual(1, self._db.publish('channel', {'value': 1}))
+            self._db.publish('other', {'value': 2})
+
+            self.assertEqual({'value': 1}, subscription.get_message(timeout=1.))
+            self.assertIsNone(subscription.get_message(timeout=0.01))
+
+        self.assertEqual(0, self._db.publish('channel', {'value': 3}))
+
+
+class TestInMemoryBatch(KvDBBatchTestMixin, unittest.TestCase):
+    def setUp(self) -> None:
+        self._db = KeyValueDatabase.instance(provider='inmemory', refresh=True)
+
+
+class TestLevelDbBatch(KvDBBatchTestMixin, unittest.TestCase):
+    def setUp(self) -> None:
+        self._dir = tempfile.mkdtemp()
+        self._db = KeyValueDatabase(provider='leveldb', name=self._dir)
+
+    def tearDown(self) -> None:
+        self._db._provider._db.close()
+        shutil.rmtree(self._dir)
+
+
+@unittest.skipIf(fakeredis is None, "fakeredis not installed")
+class TestRedisBatch(KvDBBatchTestMixin, unittest.TestCase):
+    def setUp(self) -> None:
+        self._db = KeyValueDatabase(provider='redis')
+        self._db._provider._db = fakeredis.FakeRedis()
+        self._db._provider._pubsub_db = self._db._provider._db
+
+    def test_subscriptions_do_not_starve_commands(self):
+        env = {'XCUBE_HUB_REDIS_MAX_CONNECTIONS': '2', 'XCUBE_HUB_REDIS_MAX_SUBSCRIPTIONS': '3',
+               'XCUBE_HUB_REDIS_POOL_TIMEOUT': '0.1', 'XCUBE_HUB_REDIS_RETRIES': '0'}
+        with patch.dict('os.environ', env):
+            db = _RedisKvDB(connection_class=fakeredis.FakeConnection, server=fakeredis.FakeServer())
+        db.set('key', 'value')
+
+        subscriptions = [db.subscribe(f'channel{i}') for i in range(3)]
+        try:
+            self.assertEqual(b'value', db.get('key'))
+
+            with self.assertRaises(api.ApiError) as e:
+                db.subscribe('channel3')
+            self.assertEqual(503, e.exception.status_code)
+        finally:
+            for subscription in subscriptions:
+                subscription.close()
+
+        db.subscribe('channel3').close()
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -1,6 +1,8 @@
 import unittest
+from unittest.mock import patch
 
-from kubernetes.client import V1Pod, V1ObjectMeta, V1PodStatus
+from kubernetes.client import V1Pod, V1ObjectMeta, V1PodStatus, V1Job, V1JobList, V1JobStatus, V1JobCondition, \
+    V1ListMeta, V1PodList, CoreV1Api, ApiException, V1Deployment, V1DeploymentList
 
 from xcube_hub import poller
 
@@ -26,5 +28,107 @@ class TestPoller(unittest.TestCase):
         poller.poll_pod_phase(get_pod, prefix='test')
 
 
+    def test_wait_for_event(self):
+        listed = V1JobList(metadata=V1ListMeta(resource_version='10'), items=[_job(complete=False)])
+        done = _job(complete=True)
+        fake_watch = _FakeWatch([{'type': 'MODIFIED', 'object': _job(complete=False)},
+                                 {'type': 'MODIFIED', 'object': done}])
+        list_calls = []
+
+        def list_jobs(**kwargs):
+            list_calls.append(kwargs)
+            return listed
+
+        res = poller.wait_for(list_jobs, check_success=poller._is_job_finished, namespace='test',
+                              field_selector='metadata.name=drwho-1', timeout=10, watch_factory=fake_watch)
+
+        self.assertIs(done, res)
+        self.assertEqual(1, len(list_calls))
+        self.assertEqual('10', fake_watch.kwargs['resource_version'])
+        self.assertEqual('metadata.name=drwho-1', fake_watch.kwargs['field_selector'])
+        self.assertTrue(fake_watch.stopped)
+
+    def test_wait_for_falls_back_to_polling(self):
+        results = [V1JobList(metadata=V1ListMeta(resource_version='10'), items=[_job(complete=False)]),
+                   V1JobList(items=[_job(complete=False)]),
+                   V1JobList(items=[_job(complete=True)])]
+
+        fake_watch = _FakeWatch([ApiException(status=500, reason='dropped')])
+
+        res = poller.wait_for(lambda **kwargs: results.pop(0), check_success=poller._is_job_finished,
+                              namespace='test', timeout=10, watch_factory=fake_watch)
+
+        self.assertTrue(poller._is_job_finished(res))
+        self.assertEqual([], results)
+
+    def test_wait_for_deletion(self):
+        deployment = V1Deployment(metadata=V1ObjectMeta(name='drwho-cate'))
+        fake_watch = _FakeWatch([{'type': 'MODIFIED', 'object': deployment},
+                                 {'type': 'DELETED', 'object': deployment}])
+        list_calls = []
+
+        def list_deployments(**kwargs):
+            list_calls.append(kwargs)
+            return V1DeploymentList(metadata=V1ListMeta(resource_version='10'), items=[deployment])
+
+        poller.wait_for_deletion(list_deployments, name='drwho-cate', namespace='test', timeout=10,
+                                 watch_factory=fake_watch)
+
+        self.assertEqual([dict(namespace='test', field_selector='metadata.name=drwho-cate')], list_calls)
+        self.assertEqual('10', fake_watch.kwargs['resource_version'])
+        self.assertTrue(fake_watch.stopped)
+
+        fake_watch = _FakeWatch([])
+        poller.wait_for_deletion(lambda **kwargs: V1DeploymentList(items=[]), name='drwho-cate', namespace='test',
+                                 watch_factory=fake_watch)
+
+        self.assertIsNone(fake_watch.kwargs)
+
+        results = [V1DeploymentList(items=[deployment]), V1DeploymentList(items=[])]
+        poller.wait_for_deletion(lambda **kwargs: results.pop(0), name='drwho-cate', namespace='test',
+                                 timeout=10, watch_factory=_FakeWatch([ApiException(status=500, reason='dropped')]))
+
+        self.assertEqual([], results)
+
+    @patch.object(CoreV1Api, 'list_namespaced_pod')
+    def test_wait_for_pod_phase(self, list_p):
+        running = V1Pod(metadata=V1ObjectMeta(name='drwho-cate-2'), status=V1PodStatus(phase='Running'))
+        list_p.return_value = V1PodList(items=[
+            V1Pod(metadata=V1ObjectMeta(name='drwho-cate-1', deletion_timestamp='2021-01-01T00:00:00Z'),
+                  status=V1PodStatus(phase='Running')),
+            running,
+        ])
+
+        res = poller.wait_for_pod_phase(namespace='test', label_selector='app=drwho-cate', timeout=10)
+
+        self.assertIs(running, res)
+        list_p.assert_called_once_with(namespace='test', label_selector='app=drwho-cate')
+
+
+def _job(complete: bool) -> V1Job:
+    conditions = [V1JobCondition(type='Complete', status='True')] if complete else None
+    return V1Job(metadata=V1ObjectMeta(name='drwho-1'), status=V1JobStatus(conditions=conditions))
+
+
+class _FakeWatch:
+    def __init__(self, events):
+        self._events = events
+        self.kwargs = None
+        self.stopped = False
+
+    def __call__(self):
+        return self
+
+    def stream(self, func, **kwargs):
+        self.kwargs = kwargs
+        for event in self._events:
+            if isinstance(event, Exception):
+                raise event
+            yield event
+
+    def stop(self):
+        self.stopped = True
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -32,8 +32,10 @@ SERVER_START_TIME = datetime.datetime.now().isoformat()
 class ApiResponse:
 
     @classmethod
-    def success(cls, result: Optional[Any] = None, status_code: int = 200, message: Optional[str] = None) -> \
-            Tuple[AnyDict, int]:
+    def success(cls, result: Optional[Any] = None, status_code: int = 200, message: Optional[str] = None,
+                headers: Optional[Dict[str, str]] = None) -> Union[Tuple[AnyDict, int], Tuple[AnyDict, int, Dict]]:
+        if headers:
+            return result, status_code, headers
         return result, status_code
 
     @classmethod
@@ -0,0 +1,525 @@
+import asyncio
+import functools
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Any, Sequence, Dict, List
+
+from xcube_hub import api, util
+from xcube_hub.keyvaluedatabase import KeyValueDatabase, KeyValueStore, KeyValueSubscription, _RedisKvDB, \
+    _InMemoryKvDB, _KvDBMocker, _new_redis, _redis_errors, _ttl_millis
+from xcube_hub.typedefs import JsonObject
+
+
+class AsyncKeyValueStore(ABC):
+    """
+    Async counterpart of ``KeyValueStore``. Values are bytes encoded by the database's codec.
+    """
+
+    @abstractmethod
+    async def get(self, key):
+        """
+        Get a key value
+        :param key:
+        :return:
+        """
+
+    @abstractmethod
+    async def set(self, key, value, ttl: Optional[float] = None):
+        """
+        Set a key value
+        :param value:
+        :param key:
+        :param ttl: Seconds after which the key expires. Never expires if None.
+        :return:
+        """
+
+    @abstractmethod
+    async def delete(self, key):
+        """
+        Delete a key
+        :param key:
+        :return:
+        """
+
+    @abstractmethod
+    async def mget(self, keys: Sequence[str]) -> List:
+        """
+        Get the values of several keys
+        :param keys:
+        :return:
+        """
+
+    @abstractmethod
+    async def mset(self, mapping: Dict[str, Any], ttl: Optional[float] = None):
+        """
+        Set several key values
+        :param mapping:
+        :param ttl:
+        :return:
+        """
+
+    @abstractmethod
+    async def delete_many(self, keys: Sequence[str]):
+        """
+        Delete several keys
+        :param keys:
+        :return:
+        """
+
+    @abstractmethod
+    async def append(self, key, value, ttl: Optional[float] = None) -> int:
+        """
+        Append a value to the list stored at key
+        :param key:
+        :param value:
+        :param ttl:
+        :return: The length of the list after appending
+        """
+
+    @abstractmethod
+    async def get_range(self, key, start: int = 0) -> List:
+        """
+        Get the values of the list stored at key from index start on
+        :param key:
+        :param start:
+        :return:
+        """
+
+    @abstractmethod
+    async def ping(self) -> bool:
+        """
+        Readiness check
+        :return:
+        """
+
+    @abstractmethod
+    async def publish(self, channel: str, message) -> int:
+        """
+        Publish a message to a channel
+        :param channel:
+        :param message:
+        :return: The number of subscribers that received the message
+        """
+
+    @abstractmethod
+    async def subscribe(self, channel: str) -> "AsyncKeyValueSubscription":
+        """
+        Subscribe to a channel
+        :param channel:
+        :return:
+        """
+
+    async def close(self):
+        """
+        Release connections
+        :return:
+        """
+
+
+class AsyncKeyValueSubscription(ABC):
+    """
+    Messages published to a channel, obtained from ``AsyncKeyValueDatabase.subscribe()``
+    """
+
+    @abstractmethod
+    async def get_message(self, timeout: float = 0.):
+        """
+        Wait at most timeout seconds for the next message
+        :param timeout:
+        :return: The message or None
+        """
+
+    @abstractmethod
+    async def close(self):
+        """
+        Unsubscribe
+        :return:
+        """
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+
+class AsyncKeyValueDatabase:
+    """
+    Async variant of a ``KeyValueDatabase`` for coroutines, e.g. to read the states of several cubegens
+    concurrently. It operates on the same data as the KeyValueDatabase it is created for, and encodes values
+    with its codec and default TTLs.
+
+    Redis is accessed with ``redis.asyncio``, connected like the KeyValueDatabase. Calls to leveldb are run in a
+    thread pool of XCUBE_HUB_KV_EXECUTOR_WORKERS threads (default 4). The in-memory provider does not block and
+    is called directly.
+
+    Example:
+    ```
+        kvdb = AsyncKeyValueDatabase.instance()
+        cfg, progress = await asyncio.gather(kvdb.get(cfg_key), kvdb.get_range(progress_key))
+    ```
+    """
+
+    _instance = None
+
+    def __init__(self, kvdb: KeyValueDatabase, max_workers: Optional[int] = None):
+        """
+        :param kvdb: The database to operate on
+        :param max_workers: Threads running blocking provider calls
+        """
+        self._kvdb = kvdb
+        self._provider = self._new_db(kvdb._provider, max_workers=max_workers)
+
+    @property
+    def kvdb(self) -> KeyValueDatabase:
+        return self._kvdb
+
+    async def get(self, key) -> Optional[JsonObject]:
+        """
+        Get a key value
+        :param key:
+        :return:
+        """
+
+        return self._kvdb.decode(await self._provider.get(key))
+
+    async def set(self, key, value: JsonObject, ttl: Optional[float] = None):
+        """
+        Set a key value
+        :param value:
+        :param key:
+        :param ttl: Seconds after which the key expires. Defaults to the TTL of the key's namespace.
+        :return:
+        """
+
+        return await self._provider.set(key, self._kvdb.codec.encode(value), ttl=self._kvdb.resolve_ttl(key, ttl))
+
+    async def delete(self, key):
+        """
+        Delete a key
+        :param key:
+        :return:
+        """
+
+        return await self._provider.delete(key)
+
+    async def mget(self, keys: Sequence[str]) -> List[Optional[JsonObject]]:
+        """
+        Get the values of several keys in one request
+        :param keys:
+        :return:
+        """
+
+        if not keys:
+            return []
+        return [self._kvdb.decode(res) for res in await self._provider.mget(keys)]
+
+    async def mset(self, mapping: Dict[str, JsonObject], ttl: Optional[float] = None):
+        """
+        Set several key values in one request
+        :param mapping:
+        :param ttl: Seconds after which the keys expire. Defaults to the TTLs of the keys' namespaces.
+        :return:
+        """
+
+        # Keys are grouped by their TTL, as one request sets all keys with the same TTL
+        groups: Dict[Optional[float], Dict[str, bytes]] = dict()
+        for key, value in mapping.items():
+            groups.setdefault(self._kvdb.resolve_ttl(key, ttl), dict())[key] = self._kvdb.codec.encode(value)
+        for group_ttl, group in groups.items():
+            await self._provider.mset(group, ttl=group_ttl)
+        return True
+
+    async def delete_many(self, keys: Sequence[str]):
+        """
+        Delete several keys in one request
+        :param keys:
+        :return:
+        """
+
+        if not keys:
+            return True
+        return await self._provider.delete_many(keys)
+
+    async def append(self, key, value: JsonObject, ttl: Optional[float] = None) -> int:
+        """
+        Append a value to the list stored at key, see ``KeyValueDatabase.append()``
+        :param key:
+        :param value:
+        :param ttl:
+        :return: The length of the list after appending
+        """
+
+        return await self._provider.append(key, self._kvdb.codec.encode(value),
+                                           ttl=self._kvdb.resolve_ttl(key, ttl))
+
+    async def get_range(self, key, start: int = 0) -> List[JsonObject]:
+        """
+        Get the values of the list stored at key from index start on
+        :param key:
+        :param start:
+        :return:
+        """
+
+        return [self._kvdb.decode(res) for res in await self._provider.get_range(key, start=start)]
+
+    async def ping(self) -> bool:
+        """
+        Readiness check. Returns False if the database cannot be reached.
+        :return:
+        """
+
+        return await self._provider.ping()
+
+    async def publish(self, channel: str, message: JsonObject) -> int:
+        """
+        Publish a message to the subscribers of a channel, including subscribers of the KeyValueDatabase
+        :param channel:
+        :param message:
+        :return:
+        """
+
+        return await self._provider.publish(channel, self._kvdb.codec.encode(message))
+
+    async def subscribe(self, channel: str) -> AsyncKeyValueSubscription:
+        """
+        Subscribe to the messages published to a channel from now on.
+
+        Example:
+        ```
+            async with await AsyncKeyValueDatabase.instance().subscribe('channel') as subscription:
+                message = await subscription.get_message(timeout=1.)
+        ```
+        """
+
+        return _CodecSubscription(await self._provider.subscribe(channel), self._kvdb)
+
+    async def close(self):
+        """
+        Release the connections of this event loop
+        :return:
+        """
+
+        await self._provider.close()
+
+    @staticmethod
+    def _new_db(provider: KeyValueStore, max_workers: Optional[int] = None) -> AsyncKeyValueStore:
+        if isinstance(provider, _RedisKvDB) and not isinstance(provider._db, _KvDBMocker):
+            return _AsyncRedisKvDB(provider.connection_kwargs)
+        if isinstance(provider, _InMemoryKvDB):
+            return _SyncKvDBAdapter(provider)
+        max_workers = max_workers or util.maybe_raise_for_env("XCUBE_HUB_KV_EXECUTOR_WORKERS", default=4, typ=int)
+        return _SyncKvDBAdapter(provider, ThreadPoolExecutor(max_workers=max_workers,
+                                                             thread_name_prefix='kvdb-executor'))
+
+    @classmethod
+    def instance(cls, refresh: bool = False) -> "AsyncKeyValueDatabase":
+        """
+        Return the async database for ``KeyValueDatabase.instance()``. A new one is created if that instance
+        changed.
+        """
+        kvdb = KeyValueDatabase.instance()
+        if refresh or cls._instance is None or cls._instance.kvdb is not kvdb:
+            cls._instance = AsyncKeyValueDatabase(kvdb)
+
+        return cls._instance
+
+
+class _CodecSubscription(AsyncKeyValueSubscription):
+    def __init__(self, subscription: AsyncKeyValueSubscription, kvdb: KeyValueDatabase):
+        self._subscription = subscription
+        self._kvdb = kvdb
+
+    async def get_message(self, timeout: float = 0.) -> Optional[JsonObject]:
+        message = await self._subscription.get_message(timeout=timeout)
+        return self._kvdb.codec.decode(message) if message is not None else None
+
+    async def close(self):
+        await self._subscription.close()
+
+
+class _AsyncRedisKvDB(AsyncKeyValueStore):
+    """
+    Redis implementation of AsyncKeyValueStore using ``redis.asyncio``. As its connections belong to an event
+    loop, a client is created per event loop. Subscriptions use a separate client and connection pool.
+    """
+
+    def __init__(self, connection_kwargs: Dict[str, Any]):
+        self._connection_kwargs = connection_kwargs
+        self._clients = dict()
+        self._pubsub_clients = dict()
+
+    @property
+    def _db(self):
+        return self._get_client(self._clients, pubsub=False)
+
+    @property
+    def _pubsub_db(self):
+        return self._get_client(self._pubsub_clients, pubsub=True)
+
+    def _get_client(self, clients: Dict, pubsub: bool):
+        loop = asyncio.get_running_loop()
+        client = clients.get(loop)
+        if client is None:
+            # Drop clients of closed loops
+            for lp in [lp for lp in clients if lp.is_closed()]:
+                del clients[lp]
+            client = self._new_client(pubsub=pubsub)
+            clients[loop] = client
+        return client
+
+    def _new_client(self, pubsub: bool = False):
+        return _new_redis(use_asyncio=True, pubsub=pubsub, **self._connection_kwargs)
+
+    async def get(self, key):
+        with _redis_errors():
+            return await self._db.get(key)
+
+    async def set(self, key, value, ttl: Optional[float] = None):
+        with _redis_errors():
+            return await self._db.set(key, value, px=_ttl_millis(ttl))
+
+    async def delete(self, key):
+        with _redis_errors():
+            return await self._db.delete(key)
+
+    async def mget(self, keys: Sequence[str]) -> List:
+        with _redis_errors():
+            return await self._db.mget(keys)
+
+    async def mset(self, mapping: Dict[str, Any], ttl: Optional[float] = None):
+        with _redis_errors():
+            if ttl is None:
+                return await self._db.mset(mapping)
+            async with self._db.pipeline(transaction=True) as pipe:
+                for key, value in mapping.items():
+                    pipe.set(key, value, px=_ttl_millis(ttl))
+                await pipe.execute()
+        return True
+
+    async def delete_many(self, keys: Sequence[str]):
+        with _redis_errors():
+            await self._db.delete(*keys)
+        return True
+
+    async def append(self, key, value, ttl: Optional[float] = None) -> int:
+        with _redis_errors():
+            if ttl is None:
+                return await self._db.rpush(key, value)
+            async with self._db.pipeline(transaction=True) as pipe:
+                pipe.rpush(key, value)
+                pipe.pexpire(key, _ttl_millis(ttl))
+                return (await pipe.execute())[0]
+
+    async def get_range(self, key, start: int = 0) -> List:
+        with _redis_errors():
+            return await self._db.lrange(key, start, -1)
+
+    async def ping(self) -> bool:
+        try:
+            with _redis_errors():
+                return bool(await self._db.ping())
+        except api.ApiError:
+            return False
+
+    async def publish(self, channel: str, message) -> int:
+        with _redis_errors():
+            return await self._db.publish(channel, message)
+
+    async def subscribe(self, channel: str) -> AsyncKeyValueSubscription:
+        with _redis_errors():
+            pubsub = self._pubsub_db.pubsub(ignore_subscribe_messages=True)
+            await pubsub.subscribe(channel)
+        return _AsyncRedisSubscription(pubsub)
+
+    async def close(self):
+        loop = asyncio.get_running_loop()
+        for clients in (self._clients, self._pubsub_clients):
+            client = clients.pop(loop, None)
+            if client is not None:
+                await client.aclose()
+
+
+class _AsyncRedisSubscription(AsyncKeyValueSubscription):
+    def __init__(self, pubsub):
+        self._pubsub = pubsub
+
+    async def get_message(self, timeout: float = 0.):
+        # Subscribe confirmations are skipped, but still end a single get_message() call
+        deadline = time.monotonic() + timeout
+        while True:
+            with _redis_errors():
+                message = await self._pubsub.get_message(timeout=max(0., deadline - time.monotonic()))
+            if message is not None and message.get('type') == 'message':
+                return message['data']
+            if time.monotonic() >= deadline:
+                return None
+
+    async def close(self):
+        await self._pubsub.aclose()
+
+
+class _SyncKvDBAdapter(AsyncKeyValueStore):
+    """
+    Implementation of AsyncKeyValueStore calling a KeyValueStore. Calls are run in executor if given, otherwise
+    they are called directly, which is only suitable for stores that do not block.
+    """
+
+    def __init__(self, store: KeyValueStore, executor: Optional[ThreadPoolExecutor] = None):
+        self._store = store
+        self._executor = executor
+
+    async def _call(self, func, *args, **kwargs):
+        if self._executor is None:
+            return func(*args, **kwargs)
+        return await asyncio.get_running_loop().run_in_executor(self._executor,
+                                                                functools.partial(func, *args, **kwargs))
+
+    async def get(self, key):
+        return await self._call(self._store.get, key)
+
+    async def set(self, key, value, ttl: Optional[float] = None):
+        return await self._call(self._store.set, key, value, ttl=ttl)
+
+    async def delete(self, key):
+        return await self._call(self._store.delete, key)
+
+    async def mget(self, keys: Sequence[str]) -> List:
+        return await self._call(self._store.mget, keys)
+
+    async def mset(self, mapping: Dict[str, Any], ttl: Optional[float] = None):
+        return await self._call(self._store.mset, mapping, ttl=ttl)
+
+    async def delete_many(self, keys: Sequence[str]):
+        return await self._call(self._store.delete_many, keys)
+
+    async def append(self, key, value, ttl: Optional[float] = None) -> int:
+        return await self._call(self._store.append, key, value, ttl=ttl)
+
+    async def get_range(self, key, start: int = 0) -> List:
+        return await self._call(self._store.get_range, key, start=start)
+
+    async def ping(self) -> bool:
+        return await self._call(self._store.ping)
+
+    async def publish(self, channel: str, message) -> int:
+        # In-process pub/sub does not block
+        return self._store.publish(channel, message)
+
+    async def subscribe(self, channel: str) -> AsyncKeyValueSubscription:
+        return _SyncSubscriptionAdapter(self._store.subscribe(channel))
+
+
+class _SyncSubscriptionAdapter(AsyncKeyValueSubscription):
+    def __init__(self, subscription: KeyValueSubscription):
+        self._subscription = subscription
+
+    async def get_message(self, timeout: float = 0.):
+        if timeout <= 0:
+            return self._subscription.get_message()
+        return await asyncio.get_running_loop().run_in_executor(
+            None, functools.partial(self._subscription.get_message, timeout=timeout))
+
+    async def close(self):
+        self._subscription.close()
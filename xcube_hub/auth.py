@@ -1,8 +1,10 @@
 import hashlib
 import json
 import os
+import threading
+import time
 from abc import abstractmethod, ABC
-from typing import Optional, Any, Dict
+from typing import Optional, Any, Dict, Callable, Tuple
 from urllib.request import urlopen
 
 import flask
@@ -24,8 +26,96 @@ _ISS_TO_PROVIDER = {
 }
 
 
+class _KeySetCache:
+    """
+    Caches a JSON Web Key Set (JWKS) fetched by fetch_func for ttl seconds.
+
+    A key id (kid) that is not in the cached set triggers a refresh, as the issuer may have rotated its keys, but
+    at most once per min_refresh_interval seconds. Concurrent refreshes are de-duplicated: threads waiting for a
+    refresh that completed or failed meanwhile use its result. If a refresh fails, the previous keys are kept and
+    no refresh is attempted for retry_interval seconds.
+
+    :param fetch_func: Returns the key set as dict with entry "keys"
+    :param ttl: Time in seconds a key set is used before it is fetched again
+    :param min_refresh_interval: Minimum time in seconds between refreshes caused by unknown key ids
+    :param retry_interval: Time in seconds after a failed refresh during which no refresh is attempted
+    """
+
+    def __init__(self, fetch_func: Callable[[], Dict], ttl: float = 3600, min_refresh_interval: float = 30,
+                 retry_interval: float = 10):
+        self._fetch_func = fetch_func
+        self._ttl = ttl
+        self._min_refresh_interval = min_refresh_interval
+        self._retry_interval = retry_interval
+        self._keys: Optional[Dict[str, Dict]] = None
+        self._fetched_at = 0.
+        self._attempted_at = float('-inf')
+        self._failed_at = float('-inf')
+        self._error: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def get_key(self, kid: Optional[str]) -> Optional[Dict]:
+        keys = self._keys
+        now = time.monotonic()
+        expired = keys is None or now - self._fetched_at > self._ttl \
+            or (kid not in keys and now - self._fetched_at > self._min_refresh_interval)
+        if expired and now - self._failed_at > self._retry_interval:
+            keys = self._refresh(requested_at=now)
+        if keys is None:
+            raise Unauthorized(description=f"Unable to fetch signing keys: {self._error}")
+        return keys.get(kid)
+
+    def _refresh(self, requested_at: float) -> Optional[Dict[str, Dict]]:
+        with self._lock:
+            if self._attempted_at >= requested_at:
+                # Another thread refreshed or failed to while this one was waiting
+                return self._keys
+            try:
+                key_set = self._fetch_func()
+            except Exception as e:
+                self._attempted_at = self._failed_at = time.monotonic()
+                self._error = str(e)
+                if self._keys is not None:
+                    print(f"Warning: Unable to refresh signing keys, using cached keys: {str(e)}")
+                return self._keys
+            self._keys = {key.get('kid'): key for key in key_set.get('keys', [])}
+            self._attempted_at = self._fetched_at = time.monotonic()
+            return self._keys
+
+
+_KEY_SETS: Dict[str, _KeySetCache] = dict()
+_KEY_SETS_LOCK = threading.Lock()
+
+
+def _get_key_set(url: str, fetch_func: Callable[[], Dict]) -> _KeySetCache:
+    """
+    Return the key set cache for url which is shared by all provider instances. The cache lifetime is configured
+    by XCUBE_HUB_JWKS_TTL (seconds, default 3600).
+    """
+    with _KEY_SETS_LOCK:
+        key_set = _KEY_SETS.get(url)
+        if key_set is None:
+            ttl = util.maybe_raise_for_env("XCUBE_HUB_JWKS_TTL", default=3600, typ=float)
+            key_set = _KeySetCache(fetch_func, ttl=ttl)
+            _KEY_SETS[url] = key_set
+        return key_set
+
+
+def _to_rsa_key(key: Dict) -> Dict:
+    return {
+        "kty": key["kty"],
+        "kid": key["kid"],
+        "use": key["use"],
+        "n": key["n"],
+        "e": key["e"]
+    }
+
+
 class AuthProvider(ABC):
-    _claims = {}
+    """
+    Verifies tokens of an issuer. Providers are shared by concurrent requests, see Auth.for_issuer(), and must
+    not keep state of a request such as its claims.
+    """
 
     @abstractmethod
     def verify_token(self, token):
@@ -54,14 +144,21 @@ class Auth(AuthProvider):
 
     _instance = None
 
-    def __init__(self, iss: Optional[str] = None, audience: Optional[str] = None, **kwargs):
-        auth0_domain = util.maybe_raise_for_env("AUTH0_DOMAIN")
+    _providers: Dict[Tuple[str, Optional[str]], AuthProvider] = dict()
+    _providers_lock = threading.Lock()
+
+    def __init__(self, iss: Optional[str] = None, audience: Optional[str] = None,
+                 auth_provider: Optional[AuthProvider] = None, **kwargs):
+        if auth_provider is None:
+            auth0_domain = util.maybe_raise_for_env("AUTH0_DOMAIN")
+
+            iss = iss or f"https://{auth0_domain}/"
 
-        iss = iss or f"https://{auth0_domain}/"
+            provider = _ISS_TO_PROVIDER.get(iss)
 
-        provider = _ISS_TO_PROVIDER.get(iss)
+            auth_provider = self._new_auth_provider(audience=audience, provider=provider, **kwargs)
 
-        self._provider = self._new_auth_provider(audience=audience, provider=provider, **kwargs)
+        self._provider = auth_provider
         self._claims = dict()
         self._token = ""
 
@@ -131,6 +228,22 @@ class Auth(AuthProvider):
         else:
             raise Unauthorized(description=f"Auth provider unknown.")
 
+    @classmethod
+    def for_issuer(cls, iss: str, audience: Optional[str] = None) -> "Auth":
+        """
+        Return a new Auth for verifying a token of iss. The provider, which may hold clients and key caches, is
+        created once per issuer and audience and reused afterwards.
+        """
+        key = (iss, audience)
+        auth_provider = cls._providers.get(key)
+        if auth_provider is None:
+            with cls._providers_lock:
+                auth_provider = cls._providers.get(key)
+                if auth_provider is None:
+                    auth_provider = Auth(iss=iss, audience=audience)._provider
+                    cls._providers[key] = auth_provider
+        return Auth(iss=iss, audience=audience, auth_provider=auth_provider)
+
     @classmethod
     def instance(cls, iss: Optional[str] = None, audience: Optional[str] = None, refresh: bool = False, **kwargs) \
             -> "Auth":
@@ -182,25 +295,17 @@ class _Auth0(AuthProvider):
         :return:
         """
 
-        json_url = urlopen("https://" + self._domain + "/.well-known/jwks.json")
-        jwks = json.loads(json_url.read())
-
         try:
             unverified_header = jwt.get_unverified_header(token)
         except jwt.JWTError:
             raise Unauthorized(description="invalid_header: Invalid header. Use an RS256 signed JWT Access Token")
         if unverified_header["alg"] == "HS256":
             raise Unauthorized(description="invalid_header: Invalid header. Use an RS256 signed JWT Access Token")
-        rsa_key = {}
-        for key in jwks["keys"]:
-            if key["kid"] == unverified_header["kid"]:
-                rsa_key = {
-                    "kty": key["kty"],
-                    "kid": key["kid"],
-                    "use": key["use"],
-                    "n": key["n"],
-                    "e": key["e"]
-                }
+
+        jwks_url = "https://" + self._domain + "/.well-known/jwks.json"
+        key_set = _get_key_set(jwks_url, lambda: json.loads(urlopen(jwks_url, timeout=10).read()))
+        key = key_set.get_key(unverified_header.get("kid"))
+        rsa_key = _to_rsa_key(key) if key else {}
         if rsa_key:
             try:
                 payload = jwt.decode(
@@ -219,7 +324,6 @@ class _Auth0(AuthProvider):
 
             # noinspection PyProtectedMember
             flask._request_ctx_stack.top.current_user = payload
-            self._claims = payload
             return payload
 
         raise Unauthorized(description="invalid_header: Unable to find appropriate key")
@@ -249,6 +353,8 @@ class _Keycloak(AuthProvider):
         self._realm = os.getenv('KEYCLOAK_REALM')
         self._audience = audience or os.getenv('XCUBE_HUB_OAUTH_AUD')
         self._algorithms = ["RS256"]
+        # Validate tokens by their signature and expiry only, without asking Keycloak whether they were revoked
+        self._offline_validation = os.getenv('KEYCLOAK_OFFLINE_VALIDATION', '0') == '1'
 
         if self._domain is None:
             raise Unauthorized(description="Keycloak error: Domain not set")
@@ -274,28 +380,30 @@ class _Keycloak(AuthProvider):
         :return:
         """
 
+        if not self._offline_validation:
+            try:
+                introspection = self._keycloak_openid.introspect(token)
+            except KeycloakGetError as e:
+                raise Unauthorized(description="invalid token: " + str(e))
+            if isinstance(introspection, dict) and introspection.get('active') is False:
+                raise Unauthorized(description="invalid token: token is not active")
+
         try:
-            self._keycloak_openid.introspect(token)
-        except KeycloakGetError as e:
-            raise Unauthorized(description="invalid token: " + str(e))
-
-        certs = self._keycloak_openid.certs()
-        rsa_key = {}
-        for key in certs["keys"]:
-            rsa_key = {
-                "kty": key["kty"],
-                "kid": key["kid"],
-                "use": key["use"],
-                "n": key["n"],
-                "e": key["e"]
-            }
+            unverified_header = jwt.get_unverified_header(token)
+        except jwt.JWTError as e:
+            raise Unauthorized(description=str(e))
+
+        certs_url = f"https://{self._domain}/auth/realms/{self._realm}"
+        key = _get_key_set(certs_url, self._keycloak_openid.certs).get_key(unverified_header.get("kid"))
+        if not key:
+            raise Unauthorized(description="invalid_header: Unable to find appropriate key")
 
         try:
-            self._claims = self._keycloak_openid.decode_token(token=token, key=rsa_key)
+            claims = self._keycloak_openid.decode_token(token=token, key=_to_rsa_key(key))
         except Exception as e:
             raise Unauthorized(description=str(e))
 
-        return self._claims
+        return claims
 
 
 class _AuthXcube(AuthProvider):
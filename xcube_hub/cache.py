@@ -0,0 +1,59 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+
+class LruCache:
+    """
+    A thread-safe cache holding at most maxsize entries. If full, the least recently used entry is evicted.
+    Entries may expire at a given time, expired entries are dropped when they are accessed.
+
+    :param maxsize: Maximum number of entries. A maxsize of 0 disables the cache.
+    :param clock: Returns the current time in seconds. Defaults to ``time.time``
+    """
+
+    def __init__(self, maxsize: int = 1024, clock: Callable[[], float] = time.time):
+        self._maxsize = maxsize
+        self._clock = clock
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def maxsize(self) -> int:
+        return self._maxsize
+
+    def get(self, key: Hashable, default: Optional[Any] = None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= self._clock():
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: Hashable, value: Any, expires_at: Optional[float] = None):
+        """
+        Add or replace an entry. If expires_at is given, the entry is dropped at that time.
+        """
+        if self._maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: Hashable):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
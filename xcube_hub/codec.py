@@ -0,0 +1,193 @@
+import json
+import os
+import threading
+from typing import Any, Optional, Union
+
+from xcube_hub import api, util
+
+# Encoded values start with a header byte 0b0001ccff: ff is the serialization format, cc the compression.
+# Header bytes are control characters, so values written as plain JSON text by previous versions are told apart
+# and still decoded.
+_HEADER_MARK = 0x10
+
+_FORMATS = {'json': 1, 'orjson': 1, 'msgpack': 2}
+_COMPRESSIONS = {None: 0, 'zstd': 1, 'zlib': 2}
+
+
+class ValueCodec:
+    """
+    Encodes the values of a key-value database to bytes and decodes them.
+
+    :param fmt: Serialization format: json (default), orjson (same encoding as json, but faster) or msgpack
+    :param compression: Compress encoded values larger than compression_threshold bytes with zstd or zlib.
+        Defaults to no compression.
+    :param compression_threshold: Size in bytes above which values are compressed
+    """
+
+    def __init__(self, fmt: str = 'json', compression: Optional[str] = None, compression_threshold: int = 1024):
+        if fmt not in _FORMATS:
+            raise api.ApiError(400, f"System Error (Cache): Unknown codec {fmt}.")
+        if compression not in _COMPRESSIONS:
+            raise api.ApiError(400, f"System Error (Cache): Unknown compression {compression}.")
+
+        self._fmt = fmt
+        self._compression = compression
+        self._compression_threshold = compression_threshold
+        self._serializer = _new_serializer(fmt)
+        self._compressor = _new_compressor(compression) if compression else None
+        self._decoders = dict()
+
+    @property
+    def fmt(self) -> str:
+        return self._fmt
+
+    @property
+    def compression(self) -> Optional[str]:
+        return self._compression
+
+    def encode(self, value: Any) -> bytes:
+        try:
+            data = self._serializer.dumps(value)
+        except (TypeError, ValueError) as e:
+            raise api.ApiError(401, "System error (Cache): Cash contained invalid json " + str(e))
+
+        compression = None
+        if self._compressor is not None and len(data) > self._compression_threshold:
+            data = self._compressor.compress(data)
+            compression = self._compression
+
+        return bytes((_HEADER_MARK | _COMPRESSIONS[compression] << 2 | _FORMATS[self._fmt],)) + data
+
+    def decode(self, data: Union[bytes, str, None]) -> Any:
+        if not data:
+            return data
+
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+
+        header = data[0]
+        if header & 0xF0 != _HEADER_MARK:
+            # Plain JSON text written by previous versions
+            return self._loads(json, data)
+
+        fmt = header & 0x03
+        compression = (header >> 2) & 0x03
+        data = data[1:]
+        if compression:
+            data = self._get_compressor(compression).decompress(data)
+
+        return self._loads(self._get_serializer(fmt), data)
+
+    # Values may have been written with another format or compression than this codec's
+
+    def _get_serializer(self, fmt: int):
+        if fmt == _FORMATS[self._fmt]:
+            return self._serializer
+        key = ('format', fmt)
+        if key not in self._decoders:
+            self._decoders[key] = _new_serializer(_name_of(_FORMATS, fmt))
+        return self._decoders[key]
+
+    def _get_compressor(self, compression: int):
+        if compression == _COMPRESSIONS[self._compression]:
+            return self._compressor
+        key = ('compression', compression)
+        if key not in self._decoders:
+            self._decoders[key] = _new_compressor(_name_of(_COMPRESSIONS, compression))
+        return self._decoders[key]
+
+    @staticmethod
+    def _loads(serializer, data: bytes) -> Any:
+        try:
+            return serializer.loads(data)
+        except ValueError as e:
+            raise api.ApiError(401, "System error (Cache): Cash contained invalid json " + str(e))
+
+    @classmethod
+    def from_env(cls) -> "ValueCodec":
+        """
+        Return the codec configured by XCUBE_HUB_KV_CODEC (json, orjson or msgpack, default json),
+        XCUBE_HUB_KV_COMPRESSION (zstd or zlib, default none) and XCUBE_HUB_KV_COMPRESSION_THRESHOLD
+        (bytes, default 1024).
+        """
+        return cls(fmt=util.maybe_raise_for_env("XCUBE_HUB_KV_CODEC", default='json'),
+                   compression=os.getenv("XCUBE_HUB_KV_COMPRESSION") or None,
+                   compression_threshold=util.maybe_raise_for_env("XCUBE_HUB_KV_COMPRESSION_THRESHOLD",
+                                                                  default=1024, typ=int))
+
+
+def _name_of(ids: dict, key: int) -> str:
+    for name, value in ids.items():
+        if value == key:
+            return name
+    raise api.ApiError(401, f"System error (Cache): Unknown value encoding {key}.")
+
+
+class _JsonSerializer:
+    @staticmethod
+    def dumps(value: Any) -> bytes:
+        return json.dumps(value).encode('utf-8')
+
+    @staticmethod
+    def loads(data: bytes) -> Any:
+        return json.loads(data)
+
+
+class _MsgpackSerializer:
+    def __init__(self, msgpack):
+        self._msgpack = msgpack
+
+    def dumps(self, value: Any) -> bytes:
+        return self._msgpack.packb(value, use_bin_type=True)
+
+    def loads(self, data: bytes) -> Any:
+        return self._msgpack.unpackb(data, raw=False)
+
+
+def _new_serializer(fmt: str):
+    if fmt == 'json':
+        return _JsonSerializer()
+    if fmt == 'orjson':
+        try:
+            import orjson
+        except ImportError:
+            raise api.ApiError(500, "Error: Cannot import orjson. Please install first.")
+        return orjson
+    try:
+        import msgpack
+    except ImportError:
+        raise api.ApiError(500, "Error: Cannot import msgpack. Please install first.")
+    return _MsgpackSerializer(msgpack)
+
+
+class _ZstdCompressor:
+    """
+    zstd (de)compression contexts must not be shared between threads, so each thread gets its own.
+    """
+
+    def __init__(self, zstandard):
+        self._zstandard = zstandard
+        self._local = threading.local()
+
+    def compress(self, data: bytes) -> bytes:
+        compressor = getattr(self._local, 'compressor', None)
+        if compressor is None:
+            compressor = self._local.compressor = self._zstandard.ZstdCompressor()
+        return compressor.compress(data)
+
+    def decompress(self, data: bytes) -> bytes:
+        decompressor = getattr(self._local, 'decompressor', None)
+        if decompressor is None:
+            decompressor = self._local.decompressor = self._zstandard.ZstdDecompressor()
+        return decompressor.decompress(data)
+
+
+def _new_compressor(compression: str):
+    if compression == 'zlib':
+        import zlib
+        return zlib
+    try:
+        import zstandard
+    except ImportError:
+        raise api.ApiError(500, "Error: Cannot import zstandard. Please install first.")
+    return _ZstdCompressor(zstandard)
@@ -1,7 +1,14 @@
+import hashlib
+import time
+from typing import Dict, Optional
+
 from jose import jwt
+from jose.exceptions import JWTError
 from werkzeug.exceptions import Unauthorized
 
+from xcube_hub import util
 from xcube_hub.auth import Auth
+from xcube_hub.cache import LruCache
 from xcube_hub.util import maybe_raise_for_env
 
 """
@@ -9,10 +16,23 @@ controller generated to handled auth operation described at:
 https://connexion.readthedocs.io/en/latest/security.html
 """
 
+_VERIFIED_TOKENS: Optional[LruCache] = None
+
+
+def _get_verified_tokens() -> LruCache:
+    """
+    Return the cache of verified tokens. Its size is configured by XCUBE_HUB_TOKEN_CACHE_SIZE (default 1024,
+    0 disables caching).
+    """
+    global _VERIFIED_TOKENS
+    if _VERIFIED_TOKENS is None:
+        _VERIFIED_TOKENS = LruCache(maxsize=util.maybe_raise_for_env("XCUBE_HUB_TOKEN_CACHE_SIZE", default=1024,
+                                                                     typ=int))
+    return _VERIFIED_TOKENS
 
-def _get_claim_from_token(token: str, tgt: str):
-    unverified_claims = jwt.get_unverified_claims(token)
-    claim = unverified_claims.get(tgt)
+
+def _get_claim(claims: Dict, tgt: str):
+    claim = claims.get(tgt)
 
     if claim is None:
         raise Unauthorized(description=f"Access denied: No {tgt}.")
@@ -20,27 +40,49 @@ def _get_claim_from_token(token: str, tgt: str):
     return claim
 
 
+def _get_claim_from_token(token: str, tgt: str):
+    return _get_claim(jwt.get_unverified_claims(token), tgt)
+
+
 def check_oauthorization(token):
-    iss = _get_claim_from_token(token=token, tgt='iss')
+    # Tokens are kept as verified until they expire, but at most XCUBE_HUB_TOKEN_CACHE_TTL seconds (default 300)
+    # so that revoked tokens are not accepted for long.
+    token_hash = hashlib.sha256(token.encode('utf-8')).hexdigest()
+    verified_tokens = _get_verified_tokens()
+    token_info = verified_tokens.get(token_hash)
+    if token_info is not None:
+        return dict(token_info)
+
+    try:
+        unverified_claims = jwt.get_unverified_claims(token)
+    except JWTError as e:
+        raise Unauthorized(description=str(e))
+
+    iss = _get_claim(unverified_claims, tgt='iss')
 
     # Set audience to auth0 user management audience if token claims to be a user management client token.
     # Otherwise audience wil be None and defined by environment variables
-    aud = _get_claim_from_token(token=token, tgt='aud')
+    aud = _get_claim(unverified_claims, tgt='aud')
     user_management_aud = maybe_raise_for_env("XCUBE_HUB_OAUTH_USER_MANAGEMENT_AUD")
     audience = user_management_aud if user_management_aud == aud else None
 
-    # The auth provider is instantiated as a singleton.
-    auth = Auth(iss=iss, audience=audience)
+    # The auth provider is reused for all tokens of an issuer and audience.
+    auth = Auth.for_issuer(iss=iss, audience=audience)
     # Not implemented yet
     # AuthApi.instance(end_point=iss, token=token)
 
-    auth.verify_token(token=token)
+    claims = auth.verify_token(token=token)
 
-    return {'scopes': auth.permissions, 'user_id': auth.user_id, 'email': auth.email,
-            'token': token, 'iss': iss, 'sub': _get_claim_from_token(token=token, tgt='sub')}
+    token_info = {'scopes': auth.permissions, 'user_id': auth.user_id, 'email': auth.email,
+                  'token': token, 'iss': iss, 'sub': _get_claim(unverified_claims, tgt='sub')}
 
+    exp = claims.get('exp') if isinstance(claims, dict) else None
+    if exp is not None:
+        max_ttl = util.maybe_raise_for_env("XCUBE_HUB_TOKEN_CACHE_TTL", default=300, typ=float)
+        verified_tokens.put(token_hash, token_info, expires_at=min(float(exp), time.time() + max_ttl))
 
-def validate_scope_oauthorization(required_scopes, token_scopes):
-    return set(required_scopes).issubset(set(token_scopes))
+    return dict(token_info)
 
 
+def validate_scope_oauthorization(required_scopes, token_scopes):
+    return set(required_scopes).issubset(set(token_scopes))
@@ -2,6 +2,7 @@ import json
 import os
 from typing import Dict, Tuple
 
+from flask import Response, stream_with_context, request, has_request_context
 from werkzeug.datastructures import FileStorage
 
 from xcube_hub import api
@@ -118,7 +119,7 @@ def delete_cubegens(token_info: JsonObject) -> Tuple:
         return e.response
 
 
-def get_cubegen_info(body, token_info: Dict):
+def get_cubegen_info(body, token_info: Dict, asynchronous=False):
     """Receive cost information for running a cubegen
 
     Receive cost information of using a service
@@ -126,6 +127,8 @@ def get_cubegen_info(body, token_info: Dict):
     :param token_info:
     :param body: Cost configuration
     :type body: dict | bytes
+    :param asynchronous: Return a ticket immediately if the information is not cached
+    :type asynchronous: bool
 
     :rtype: ApiServiceInformationResponse
     """
@@ -136,14 +139,61 @@ def get_cubegen_info(body, token_info: Dict):
         email = token_info['email']
         token = token_info['token']
 
-        result, status_code = cubegens.info(user_id=user_id, email=email, token=token, body=body)
+        result, status_code = cubegens.info(user_id=user_id, email=email, token=token, body=body,
+                                            asynchronous=asynchronous)
 
         return api.ApiResponse.success(result=result, status_code=status_code)
     except api.ApiError as e:
         return e.response
 
 
-def get_cubegen(cubegen_id, token_info):
+def get_cubegen_costs(body, token_info: Dict):
+    """Estimate the costs of many cube configurations
+
+    Estimate the processing units of many candidate cube configurations of one data store without launching
+    info jobs
+
+    :param token_info:
+    :param body: Cost configurations
+    :type body: dict | bytes
+
+    :rtype: ApiCubegenCostsResponse
+    """
+
+    try:
+        _maybe_raise_for_service_silent()
+        email = token_info['email']
+
+        result, status_code = cubegens.estimate_costs(email=email, body=body)
+
+        return api.ApiResponse.success(result=result, status_code=status_code)
+    except api.ApiError as e:
+        return e.response
+
+
+def get_cubegen_info_ticket(ticket_id, token_info: Dict):
+    """Receive the result of an asynchronous cost information request
+
+    Receive the result of an asynchronous cost information request
+
+    :param ticket_id: Ticket ID
+    :type ticket_id: str
+    :param token_info: Token claims
+    :type token_info: Dict
+
+    :rtype: ApiServiceInformationResponse
+    """
+
+    try:
+        _maybe_raise_for_service_silent()
+        user_id = token_info['user_id']
+        result, status_code = cubegens.get_info_ticket(user_id=user_id, ticket_id=ticket_id)
+        return api.ApiResponse.success(result=result, status_code=status_code)
+    except api.ApiError as e:
+        return e.response
+
+
+def get_cubegen(cubegen_id, token_info, fields=None):
     """List specific cubegen
 
     List specific cubegen
@@ -152,6 +202,8 @@ def get_cubegen(cubegen_id, token_info):
     :type cubegen_id: str
     :param token_info: Token claims
     :type token_info: Dict
+    :param fields: Only return these fields of the cubegen
+    :type fields: List[str]
 
     :rtype: ApiCubeGenResponse
     """
@@ -159,19 +211,86 @@ def get_cubegen(cubegen_id, token_info):
     try:
         _maybe_raise_for_service_silent()
         user_id = token_info['user_id']
-        res, status_code = cubegens.get(user_id=user_id, cubegen_id=cubegen_id)
+        res, status_code = cubegens.get(user_id=user_id, cubegen_id=cubegen_id, fields=fields)
         return api.ApiResponse.success(res, status_code=status_code)
     except api.ApiError as e:
         return e.response
 
 
-def get_cubegens(token_info):
+def get_cubegen_logs(cubegen_id, token_info, since_line=0, follow=False):
+    """Get cubegen logs
+
+    Get the log lines of a cubegen starting at line since_line. If follow is set, the lines are streamed as plain
+    text until the cubegen's pod terminates.
+
+    :param cubegen_id: CubeGen ID
+    :type cubegen_id: str
+    :param token_info: Token claims
+    :type token_info: Dict
+    :param since_line: Number of lines already received
+    :type since_line: int
+    :param follow: Stream the log
+    :type follow: bool
+
+    :rtype: ApiCubegenLogsResponse
+    """
+
+    try:
+        _maybe_raise_for_service_silent()
+        if follow:
+            lines = cubegens.follow_logs(job_id=cubegen_id, since_line=since_line)
+            return Response(stream_with_context(lines), mimetype='text/plain')
+
+        lines, next_line = cubegens.logs_since(job_id=cubegen_id, since_line=since_line, raises=True)
+        return api.ApiResponse.success(dict(job_id=cubegen_id, since_line=since_line, next_line=next_line,
+                                            output=lines))
+    except api.ApiError as e:
+        return e.response
+
+
+def get_cubegen_events(cubegen_id, token_info, since=0):
+    """Get cubegen events
+
+    Stream progress callbacks, status changes and new log lines of a cubegen as server-sent events until the
+    cubegen has finished. A reconnecting client's Last-Event-ID header continues after the last progress event.
+
+    :param cubegen_id: CubeGen ID
+    :type cubegen_id: str
+    :param token_info: Token claims
+    :type token_info: Dict
+    :param since: Index of the first progress event to send
+    :type since: int
+
+    :rtype: str
+    """
+
+    try:
+        _maybe_raise_for_service_silent()
+        last_event_id = request.headers.get('Last-Event-ID') if has_request_context() else None
+        if last_event_id is not None and last_event_id.isdigit():
+            since = max(since, int(last_event_id) + 1)
+
+        messages = cubegens.events(user_id=token_info['user_id'], job_id=cubegen_id, since=since)
+        return Response(stream_with_context(messages), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    except api.ApiError as e:
+        return e.response
+
+
+def get_cubegens(token_info, limit=None, cursor=None, fields=None):
     """List cubegens
 
-    List user cubegens
+    List user cubegens. If there are more cubegens than limit, the cursor of the next page is returned in the
+    header X-Cubegens-Cursor.
 
     :param token_info: Token claims
     :type token_info: Dict
+    :param limit: Maximum number of cubegens returned
+    :type limit: int
+    :param cursor: Cursor of the page to return
+    :type cursor: str
+    :param fields: Only return these fields of the cubegens
+    :type fields: List[str]
 
     :rtype: ApiCubeGensResponse
     """
@@ -179,8 +298,10 @@ def get_cubegens(token_info):
     try:
         _maybe_raise_for_service_silent()
         user_id = token_info['user_id']
-        res = cubegens.list(user_id=user_id)
-        return api.ApiResponse.success(res)
+        res, next_cursor = cubegens.list_page(user_id=user_id, limit=limit, cursor=cursor, fields=fields)
+        headers = {'X-Cubegens-Cursor': next_cursor} if next_cursor else None
+        # The body keeps the (cubegens, status code) shape returned by cubegens.list() for client compatibility
+        return api.ApiResponse.success((res, 200), headers=headers)
     except api.ApiError as e:
         return e.response
 
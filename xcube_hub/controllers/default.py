@@ -3,6 +3,7 @@ import os
 
 from xcube_hub import api
 from xcube_hub.api import SERVER_NAME, SERVER_DESCRIPTION, SERVER_START_TIME
+from xcube_hub.keyvaluedatabase import KeyValueDatabase
 from xcube_hub.version import version
 
 
@@ -25,3 +26,16 @@ def get_service_info():
                mockServices=os.getenv("XCUBE_HUB_MOCK_SERVICES"),
                runLocal=os.getenv("XCUBE_HUB_RUN_LOCAL"))
     return api.ApiResponse.success(result=res)
+
+
+def get_service_readiness():
+    """get service readiness
+
+    Readiness probe. Fails if the key-value database cannot be reached.
+
+
+    :rtype: ApiResponse
+    """
+    if not KeyValueDatabase.instance().ping():
+        return api.ApiResponse.error("Key-value database not reachable", status_code=503)
+    return api.ApiResponse.success(result=dict(ready=True))
@@ -1,10 +1,9 @@
 import os
 from typing import Tuple, Dict, Optional
 
-import requests
 from requests import HTTPError
 
-from xcube_hub import api, util
+from xcube_hub import api, util, httpclient
 from xcube_hub.controllers.authorization import _get_claim_from_token
 from xcube_hub.geoservice import GeoService
 from xcube_hub.typedefs import AnyDict
@@ -21,7 +20,7 @@ def _raise_for_no_access(database_id, geodb_user, token):
     geodb_server_url = util.maybe_raise_for_env('GEODB_SERVER_URL')
     url = f"{geodb_server_url}/rpc/geodb_list_databases"
 
-    r = requests.post(url=url, headers={'Authorization': f'Bearer {token}'})
+    r = httpclient.post(url=url, headers={'Authorization': f'Bearer {token}'})
 
     try:
         r.raise_for_status()
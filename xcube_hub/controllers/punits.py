@@ -0,0 +1,29 @@
+from xcube_hub import api
+from xcube_hub.core import punits
+
+
+def get_punits_history(token_info, start=None, end=None, limit=100, cursor=None):
+    """Get the punits history
+
+    Get a page of the punits transactions of the user between start and end, newest first, and the punits added,
+    subtracted and overridden per day.
+
+    :param token_info: Token claims
+    :type token_info: Dict
+    :param start: Only transactions at or after this time
+    :type start: str
+    :param end: Only transactions before this time
+    :type end: str
+    :param limit: Maximum number of transactions
+    :type limit: int
+    :param cursor: The next_cursor of the previous page
+    :type cursor: int
+
+    :rtype: ApiPunitsHistoryResponse
+    """
+    try:
+        result = punits.get_punits_history(user_id=token_info['email'], start=start, end=end, limit=limit,
+                                           cursor=cursor)
+        return api.ApiResponse.success(result=result)
+    except api.ApiError as e:
+        return e.response
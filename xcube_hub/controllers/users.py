@@ -1,5 +1,7 @@
 import os
 
+from flask import request, has_request_context
+
 from xcube_hub import api
 from xcube_hub.core import cate
 
@@ -15,7 +17,9 @@ def put_user_webapi(user_id: str):
     try:
         _maybe_raise_for_service_silent()
         res = cate.launch_cate(user_id=user_id)
-        return api.ApiResponse.success(res)
+        # The launch is followed by getting the webapi
+        headers = {'Location': request.base_url} if has_request_context() else None
+        return api.ApiResponse.success(res, status_code=202, headers=headers)
     except api.ApiError as e:
         return e.response
 
@@ -36,3 +40,21 @@ def delete_user_webapi(user_id: str):
         return api.ApiResponse.success(res)
     except api.ApiError as e:
         return e.response
+
+
+def put_user_webapi_heartbeat(user_id: str):
+    try:
+        _maybe_raise_for_service_silent()
+        res = cate.record_activity(user_id=user_id)
+        return api.ApiResponse.success(res)
+    except api.ApiError as e:
+        return e.response
+
+
+def get_user_webapi_usage(user_id: str):
+    try:
+        _maybe_raise_for_service_silent()
+        res = cate.get_usage(user_id=user_id)
+        return api.ApiResponse.success(res)
+    except api.ApiError as e:
+        return e.response
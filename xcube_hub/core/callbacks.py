@@ -9,17 +9,43 @@ from xcube_hub.keyvaluedatabase import KeyValueDatabase
 
 from xcube_hub.typedefs import AnyDict, JsonObject
 
+# Progress events are dropped a week after the last one
+KeyValueDatabase.register_default_ttl('*__progress', 7 * 24 * 3600)
 
-def get_callback(user_id: str, cubegen_id: str) -> JsonObject:
+
+def _progress_key(user_id: str, cubegen_id: str) -> str:
+    return user_id + '__' + cubegen_id + '__progress'
+
+
+def events_channel(user_id: str, cubegen_id: str) -> str:
+    """
+    The pub/sub channel receiving the progress events of a cubegen as {'index': ..., 'progress': ...}.
+    """
+    return user_id + '__' + cubegen_id + '__events'
+
+
+def get_callback(user_id: str, cubegen_id: str, since: int = 0) -> JsonObject:
+    """
+    Get the progress events of a cubegen.
+
+    :param user_id: The owner of the cubegen
+    :param cubegen_id: The cubegen (job) ID
+    :param since: Only return events from this index on
+    """
     try:
         cache = KeyValueDatabase.instance()
+        progress = cache.get_range(_progress_key(user_id, cubegen_id), start=since)
+        if progress:
+            return progress
+
+        # Cubegens without progress events, or created before progress was stored as a list
         res = cache.get(user_id + '__' + cubegen_id)
 
         if not res:
-            return {}
+            return [] if since > 0 else {}
 
         if 'progress' in res:
-            return res['progress']
+            return res['progress'][since:]
         else:
             return res
     except TimeoutError as r:
@@ -33,14 +59,10 @@ def put_callback(user_id: str, cubegen_id: str, value: AnyDict, email: str):
     try:
         print(f"Calling progress for {cubegen_id}.")
         kvdb = KeyValueDatabase.instance()
-        kv = kvdb.get(user_id + '__' + cubegen_id)
-
-        if kv and 'progress' in kv and isinstance(kv['progress'], list):
-            kv['progress'].append(value)
-        else:
-            kv = dict(progress=[value])
-
-        res = kvdb.set(user_id + '__' + cubegen_id, kv)
+        # Appending does not read the previous events, and concurrent callbacks do not overwrite each other
+        length = kvdb.append(_progress_key(user_id, cubegen_id), value)
+        kvdb.publish(events_channel(user_id, cubegen_id), dict(index=length - 1, progress=value))
+        kv = dict(progress=[value])
 
         sender = get_json_request_value(value, "sender", str)
         state = get_json_request_value(value, 'state', dict)
@@ -18,20 +18,83 @@
 # LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
+import math
 import os
+import threading
 import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, List, Dict, Tuple
 
 from kubernetes import client
 from kubernetes.client.rest import ApiException
+from kubernetes.utils import parse_quantity
 
 from xcube_hub import api, util, poller
 from xcube_hub.core import user_namespaces, k8s
-from xcube_hub.core.k8s import get_pod
+from xcube_hub.keyvaluedatabase import KeyValueDatabase
 from xcube_hub.typedefs import JsonObject
 from xcube_hub.util import maybe_raise_for_invalid_username
 
+# States of a launch, see launch_cate()
+DELETING = 'Deleting'
+CREATING = 'Creating'
+SCHEDULING = 'Scheduling'
+READY = 'Ready'
+FAILED = 'Failed'
+
+_FINAL_STATES = (READY, FAILED)
+
+# Launches are kept for a day after their last transition
+_LAUNCH_TTL = 24 * 3600
+
+KeyValueDatabase.register_default_ttl('cate_launch__*', _LAUNCH_TTL)
+
+_launch_executor: Optional[ThreadPoolExecutor] = None
+_launch_executor_lock = threading.Lock()
+
+# Warm pool of WebAPI pods not yet bound to a user, see refresh_warm_pool()
+WARM_POOL_NAME = 'cate-warm'
+_WARM_POOL_APPLICATION = 'cate-webapi-warm'
+
+_LAUNCH_RATE_KEY_PREFIX = 'cate_warm_pool__launches__'
+_MIN_EXPECTED_LAUNCHES = 0.05
+
+KeyValueDatabase.register_default_ttl('cate_warm_pool__*', _LAUNCH_TTL)
+
+_warm_pool_refresher: Optional[threading.Thread] = None
+_warm_pool_wakeup = threading.Event()
+
+# Last activity and usage of the WebAPIs of users, see reap_idle_webapis() and get_usage()
+_ACTIVITY_TTL = 7 * 24 * 3600
+_USAGE_TTL = 90 * 24 * 3600
+
+_GIB = 1024 ** 3
+
+KeyValueDatabase.register_default_ttl('cate_activity__*', _ACTIVITY_TTL)
+KeyValueDatabase.register_default_ttl('cate_usage__*', _USAGE_TTL)
+KeyValueDatabase.register_default_ttl('cate_usage_closed__*', _USAGE_TTL)
+
+_idle_reaper: Optional[threading.Thread] = None
+
+# Reapers of all processes elect one of them per interval, see _is_elected_reaper()
+_REAPER_KEY_PREFIX = 'cate_reaper__'
+_REAPER_ID = uuid.uuid4().hex
+
 
 def delete_cate(user_id: str, prune: bool = False) -> bool:
+    # A launch in progress stops at its next transition
+    _delete_launch(user_id)
+
+    _delete_cate_resources(user_id, prune=prune)
+
+    now = time.time()
+    _update_usage(user_id, [], now, ended=now)
+
+    return True
+
+
+def _delete_cate_resources(user_id: str, prune: bool = False):
     cate_namespace = util.maybe_raise_for_env("WORKSPACE_NAMESPACE",
                                               default="cate")
 
@@ -39,18 +102,38 @@ def delete_cate(user_id: str, prune: bool = False) -> bool:
 
     if deployment:
         k8s.delete_deployment(name=user_id + '-cate', namespace=cate_namespace)
+    else:
+        _delete_bound_pods(user_id, namespace=cate_namespace)
 
     if prune:
         service_name = user_id + '-cate'
-        services = k8s.list_services(namespace=cate_namespace)
-        services = [service.metadata.name for service in services.items]
-        if service_name in services:
+        if k8s.has_service(name=service_name, namespace=cate_namespace):
             k8s.delete_service(name=service_name, namespace=cate_namespace)
 
-    return True
+
+def _delete_bound_pods(user_id: str, namespace: str):
+    # A pod of the warm pool bound to the user has no deployment
+    pods = k8s.list_pods(namespace=namespace, label_selector=f'app={user_id}-cate,pool=bound')
+    for pod in pods.items:
+        k8s.delete_pod(name=pod.metadata.name, namespace=namespace)
 
 
 def launch_cate(user_id: str) -> JsonObject:
+    """
+    Request the launch of the cate WebAPI of a user and return the launch without waiting for it.
+
+    A background worker provisions the WebAPI and records its progress in the launch, see get_launch():
+    Deleting (the previous deployment), Creating (deployment, service and ingress), Scheduling (waiting for the
+    pod to run), and finally Ready with the serverUrl, or Failed with a message and status_code. If a launch of
+    the user is still in progress, it is returned instead of starting another one. Of concurrent requests, only
+    one starts a launch, the others return it.
+
+    If the warm pool is enabled, a running pod of the pool is bound to the user instead of creating a
+    deployment, see refresh_warm_pool(). The launch is then Ready without Scheduling and has warm=True.
+
+    The number of concurrent launches per process is limited by CATE_LAUNCH_WORKERS (default 4). A launch that
+    has not made progress for CATE_LAUNCH_TIMEOUT seconds (default 600) is considered lost and replaced.
+    """
     try:
         max_pods = util.maybe_raise_for_env("CATE_MAX_WEBAPIS", default=50, typ=int)
 
@@ -58,28 +141,15 @@ def launch_cate(user_id: str) -> JsonObject:
 
         user_id = maybe_raise_for_invalid_username(user_id)
 
-        cate_image = util.maybe_raise_for_env("CATE_IMG", default='quay.io/ccitools/cate')
-        cate_tag = util.maybe_raise_for_env("CATE_TAG", default='2.1.5')
-        cate_hash = os.getenv("CATE_HASH", default=None)
-        cate_debug = os.getenv("CATE_DEBUG", default='0')
-        cate_launch_grace = os.getenv("CATE_LAUNCH_GRACE_PERIOD", default=2)
+        launch_timeout = util.maybe_raise_for_env("CATE_LAUNCH_TIMEOUT", default=600, typ=int)
+
+        previous = get_launch(user_id)
+        if previous is not None and previous['state'] not in _FINAL_STATES \
+                and time.time() - previous['updated'] < launch_timeout:
+            return previous
 
-        cate_mem_limit = util.maybe_raise_for_env("CATE_MEM_LIMIT", default='16Gi')
-        cate_mem_request = util.maybe_raise_for_env("CATE_MEM_REQUEST", default='2Gi')
         cate_webapi_uri = util.maybe_raise_for_env("CATE_WEBAPI_URI", default='dev.catehub.climate.esa.int')
         cate_namespace = util.maybe_raise_for_env("WORKSPACE_NAMESPACE", "cate")
-        cate_stores_config_path = util.maybe_raise_for_env("CATE_STORES_CONFIG_PATH",
-                                                           default="/etc/xcube-hub/stores.yaml")
-        cate_user_root = util.maybe_raise_for_env("CATE_USER_ROOT",
-                                                  "/home/xcube/workspace")
-
-        cate_command = util.maybe_raise_for_env("CATE_COMMAND",
-                                                "cate-webapi-start -v -b -p 4000 "
-                                                "-a 0.0.0.0 -s 86400 -r"
-                                                f"{cate_user_root}")
-
-
-        cate_storage_mode = util.maybe_raise_for_env("CATE_STORAGE_MODE", "pvc")
 
         # Not used as the namespace cate has to be created prior to launching cate instances
         # user_namespaces.create_if_not_exists(user_namespace=cate_namespace)
@@ -87,223 +157,744 @@ def launch_cate(user_id: str) -> JsonObject:
         if get_pod_count().get('running_pods', 0) > max_pods:
             raise api.ApiError(413, "Too many pods running.")
 
-        cate_env_activate_command = "source activate xcube"
+        deployment = _create_webapi_deployment_object(user_id)
 
-        if cate_hash is not None and cate_hash != "null":
-            cate_image = cate_image + '@' + cate_hash
-        else:
-            cate_image = cate_image + ':' + cate_tag
-
-        command = ["/bin/bash", "-c", f"{cate_env_activate_command} && {cate_command}"]
-
-        envs = [client.V1EnvVar(name='CATE_USER_ROOT',
-                                value=cate_user_root),
-                client.V1EnvVar(name='CATE_DEBUG',
-                                value=cate_debug),
-                client.V1EnvVar(name='CATE_STORES_CONFIG_PATH',
-                                value=cate_stores_config_path),
-                client.V1EnvVar(name='JUPYTERHUB_SERVICE_PREFIX',
-                                value=f'/{user_id}/'),
-                client.V1EnvVar(name='CATE_NODE_NAME',
-                                value_from=client.V1EnvVarSource(
-                                    field_ref=client.V1ObjectFieldSelector(
-                                        field_path='spec.nodeName'
-                                    )
-                                )
-                )
-                ]
+        service = k8s.create_service_object(name=user_id + '-cate', port=4000, target_port=4000)
 
-        volume_mounts = None
-        volumes = None
-        init_containers = None
-        if cate_storage_mode == "pvc":
-            volume_mounts = [
-                {
-                    'name': 'workspace-pvc',
-                    'mountPath': '/home/xcube/workspace',
-                    'subPath': user_id + '-scratch'
-                },
-                {
-                    'name': 'workspace-pvc',
-                    'mountPath': '/home/xcube/.cate',
-                    'subPath': user_id + '-cate'
-                },
-                {
-                    'name': 'workspace-pvc',
-                    'mountPath': '/etc/logs',
-                    'subPath': 'logs'
-                },
-                {
-                    'name': 'xcube-hub-stores',
-                    'mountPath': '/etc/xcube-hub',
-                    'readOnly': True
-                },
-            ]
+        ingress = _create_webapi_ingress_object(user_id)
 
-            volumes = [
-                {
-                    'name': 'workspace-pvc',
-                    'persistentVolumeClaim': {
-                        'claimName': 'workspace-pvc',
-                    }
-                },
-                {
-                    'name': 'xcube-hub-stores',
-                    'configMap': {
-                        'name': 'xcube-hub-stores'
-                    }
-                },
-            ]
+        warm_ingress = None
+        if is_warm_pool_enabled():
+            warm_ingress = _create_webapi_ingress_object(user_id, rewrite=True)
 
-            init_containers = [
-                {
-                    "name": "fix-owner",
-                    "image": "quay.io/bcdev/bash:latest",
-                    "command": ["chown",
-                                "-R",
-                                "1000.1000",
-                                "/home/xcube/.cate",
-                                "etc/logs",
-                                "/home/xcube/workspace"],
-                    "volumeMounts": [
-                        {
-                            "mountPath": "/home/xcube/.cate",
-                            "subPath": user_id + '-cate',
-                            "name": "workspace-pvc",
-                        },
-                        {
-                            "mountPath": '/etc/logs',
-                            "subPath": 'logs',
-                            "name": "workspace-pvc",
-                        },
-                        {
-                            "mountPath": "/home/xcube/workspace",
-                            "subPath": user_id + '-scratch',
-                            "name": "workspace-pvc",
-                        },
-                    ]
-                },
+        try:
+            grace = int(grace)
+        except ValueError as e:
+            raise api.ApiError(400, "Grace wait period must be an integer.")
+
+        launch, claimed = _new_launch(user_id, previous, ttl=launch_timeout)
+        if not claimed:
+            return launch
+
+        if warm_ingress is not None:
+            _record_launch()
+
+        start_idle_reaper()
+
+        _get_launch_executor().submit(_provision,
+                                      launch_id=launch['launch_id'],
+                                      user_id=user_id,
+                                      namespace=cate_namespace,
+                                      deployment=deployment,
+                                      service=service,
+                                      ingress=ingress,
+                                      warm_ingress=warm_ingress,
+                                      grace=grace,
+                                      timeout=launch_timeout,
+                                      server_url=f'https://{cate_webapi_uri}/{user_id}')
+        return launch
+    except ApiException as e:
+        raise api.ApiError(e.status, str(e))
+
+
+def _create_webapi_deployment_object(user_id: Optional[str]) -> client.V1Deployment:
+    # user_id is None for the pods of the warm pool, which do not know their user yet
+    cate_image = util.maybe_raise_for_env("CATE_IMG", default='quay.io/ccitools/cate')
+    cate_tag = util.maybe_raise_for_env("CATE_TAG", default='2.1.5')
+    cate_hash = os.getenv("CATE_HASH", default=None)
+    cate_debug = os.getenv("CATE_DEBUG", default='0')
+
+    cate_mem_limit = util.maybe_raise_for_env("CATE_MEM_LIMIT", default='16Gi')
+    cate_mem_request = util.maybe_raise_for_env("CATE_MEM_REQUEST", default='2Gi')
+    cate_stores_config_path = util.maybe_raise_for_env("CATE_STORES_CONFIG_PATH",
+                                                       default="/etc/xcube-hub/stores.yaml")
+    cate_user_root = util.maybe_raise_for_env("CATE_USER_ROOT",
+                                              "/home/xcube/workspace")
+
+    cate_command = util.maybe_raise_for_env("CATE_COMMAND",
+                                            "cate-webapi-start -v -b -p 4000 "
+                                            "-a 0.0.0.0 -s 86400 -r"
+                                            f"{cate_user_root}")
+
+    cate_storage_mode = util.maybe_raise_for_env("CATE_STORAGE_MODE", "pvc")
+
+    cate_env_activate_command = "source activate xcube"
+
+    if cate_hash is not None and cate_hash != "null":
+        cate_image = cate_image + '@' + cate_hash
+    else:
+        cate_image = cate_image + ':' + cate_tag
+
+    command = ["/bin/bash", "-c", f"{cate_env_activate_command} && {cate_command}"]
+
+    if user_id is None:
+        name = WARM_POOL_NAME
+        application = _WARM_POOL_APPLICATION
+        # The ingress of a bound pod strips the user's path, see _create_webapi_ingress_object()
+        service_prefix = '/'
+    else:
+        name = user_id + '-cate'
+        application = 'cate-webapi'
+        service_prefix = f'/{user_id}/'
+
+    envs = [client.V1EnvVar(name='CATE_USER_ROOT',
+                            value=cate_user_root),
+            client.V1EnvVar(name='CATE_DEBUG',
+                            value=cate_debug),
+            client.V1EnvVar(name='CATE_STORES_CONFIG_PATH',
+                            value=cate_stores_config_path),
+            client.V1EnvVar(name='JUPYTERHUB_SERVICE_PREFIX',
+                            value=service_prefix),
+            client.V1EnvVar(name='CATE_NODE_NAME',
+                            value_from=client.V1EnvVarSource(
+                                field_ref=client.V1ObjectFieldSelector(
+                                    field_path='spec.nodeName'
+                                )
+                            )
+            )
             ]
 
-        limits = {'memory': cate_mem_limit}
-        requests = {'memory': cate_mem_request}
-
-        labels = dict(typ="cate")
-
-        lifecycle_handler_command = \
-            'echo $(date +"%Y-%m-%d-%T"),'\
-            '$JUPYTERHUB_SERVICE_PREFIX,'\
-            '$CATE_NODE_NAME,'\
-            '{},'\
-            '$(cat /proc/$(pgrep cate-webapi-sta)/oom_score),'\
-            '$(cat /proc/$(pgrep cate-webapi-sta)/oom_score_adj),'\
-            '$(cat /proc/$(pgrep cate-webapi-sta)/status | grep State),'\
-            '$(dmesg | tail -3) >> /etc/logs/logs.csv'
-
-        lifecycle = client.V1Lifecycle(
-            post_start=client.V1LifecycleHandler(
-                _exec=client.V1ExecAction(
-                    command=["/bin/sh", "-c",
-                             lifecycle_handler_command.format('start')]
-                )
-            ),
-            pre_stop=client.V1LifecycleHandler(
-                _exec=client.V1ExecAction(
-                    command=["/bin/sh", "-c",
-                             lifecycle_handler_command.format('stop')]
-                )
+    volume_mounts = None
+    volumes = None
+    init_containers = None
+    if cate_storage_mode == "pvc" and user_id is not None:
+        volume_mounts = [
+            {
+                'name': 'workspace-pvc',
+                'mountPath': '/home/xcube/workspace',
+                'subPath': user_id + '-scratch'
+            },
+            {
+                'name': 'workspace-pvc',
+                'mountPath': '/home/xcube/.cate',
+                'subPath': user_id + '-cate'
+            },
+            {
+                'name': 'workspace-pvc',
+                'mountPath': '/etc/logs',
+                'subPath': 'logs'
+            },
+            {
+                'name': 'xcube-hub-stores',
+                'mountPath': '/etc/xcube-hub',
+                'readOnly': True
+            },
+        ]
+
+        volumes = [
+            {
+                'name': 'workspace-pvc',
+                'persistentVolumeClaim': {
+                    'claimName': 'workspace-pvc',
+                }
+            },
+            {
+                'name': 'xcube-hub-stores',
+                'configMap': {
+                    'name': 'xcube-hub-stores'
+                }
+            },
+        ]
+
+        init_containers = [
+            {
+                "name": "fix-owner",
+                "image": "quay.io/bcdev/bash:latest",
+                "command": ["chown",
+                            "-R",
+                            "1000.1000",
+                            "/home/xcube/.cate",
+                            "etc/logs",
+                            "/home/xcube/workspace"],
+                "volumeMounts": [
+                    {
+                        "mountPath": "/home/xcube/.cate",
+                        "subPath": user_id + '-cate',
+                        "name": "workspace-pvc",
+                    },
+                    {
+                        "mountPath": '/etc/logs',
+                        "subPath": 'logs',
+                        "name": "workspace-pvc",
+                    },
+                    {
+                        "mountPath": "/home/xcube/workspace",
+                        "subPath": user_id + '-scratch',
+                        "name": "workspace-pvc",
+                    },
+                ]
+            },
+        ]
+
+    limits = {'memory': cate_mem_limit}
+    requests = {'memory': cate_mem_request}
+
+    labels = dict(typ="cate")
+
+    lifecycle_handler_command = \
+        'echo $(date +"%Y-%m-%d-%T"),'\
+        '$JUPYTERHUB_SERVICE_PREFIX,'\
+        '$CATE_NODE_NAME,'\
+        '{},'\
+        '$(cat /proc/$(pgrep cate-webapi-sta)/oom_score),'\
+        '$(cat /proc/$(pgrep cate-webapi-sta)/oom_score_adj),'\
+        '$(cat /proc/$(pgrep cate-webapi-sta)/status | grep State),'\
+        '$(dmesg | tail -3) >> /etc/logs/logs.csv'
+
+    lifecycle = client.V1Lifecycle(
+        post_start=client.V1LifecycleHandler(
+            _exec=client.V1ExecAction(
+                command=["/bin/sh", "-c",
+                         lifecycle_handler_command.format('start')]
+            )
+        ),
+        pre_stop=client.V1LifecycleHandler(
+            _exec=client.V1ExecAction(
+                command=["/bin/sh", "-c",
+                         lifecycle_handler_command.format('stop')]
             )
         )
+    )
+
+    return k8s.create_deployment_object(name=name,
+                                        application=application,
+                                        container_name=name,
+                                        image=cate_image,
+                                        envs=envs,
+                                        container_port=4000,
+                                        command=command,
+                                        volumes=volumes,
+                                        volume_mounts=volume_mounts,
+                                        init_containers=init_containers,
+                                        limits=limits,
+                                        requests=requests,
+                                        labels=labels,
+                                        lifecycle=lifecycle)
+
+
+def _create_webapi_ingress_object(user_id: str, rewrite: bool = False) -> client.V1Ingress:
+    # rewrite is needed by pods of the warm pool, which serve on / instead of /<user_id>/
+    host_uri = os.environ.get("CATE_WEBAPI_URI")
+
+    service_name = user_id + '-cate'
+
+    annotations = {
+        "proxy_set_header": "Upgrade $http_upgrade; Connection \"upgrade\"",
+        "nginx.ingress.kubernetes.io/proxy-connect-timeout": "86400",
+        "nginx.ingress.kubernetes.io/proxy-read-timeout": "86400",
+        "nginx.ingress.kubernetes.io/proxy-send-timeout": "86400",
+        "nginx.ingress.kubernetes.io/send-timeout": "86400",
+        "nginx.ingress.kubernetes.io/proxy-body-size": "2000m",
+        "nginx.ingress.kubernetes.io/enable-cors": "true",
+        "kubernetes.io/ingress.class": "nginx",
+        "nginx.ingress.kubernetes.io/websocket-services": service_name
+    }
+
+    path_regex = "/.*"
+    if rewrite:
+        annotations["nginx.ingress.kubernetes.io/use-regex"] = "true"
+        annotations["nginx.ingress.kubernetes.io/rewrite-target"] = "/$2"
+        path_regex = "(/|$)(.*)"
+
+    return k8s.create_ingress_object(name=service_name,
+                                     service_name=service_name,
+                                     service_port=4000,
+                                     user_id=user_id,
+                                     annotations=annotations,
+                                     host_uri=host_uri,
+                                     path_regex=path_regex)
+
+
+def get_launch(user_id: str) -> Optional[JsonObject]:
+    """
+    Get the last launch of the cate WebAPI of a user, or None.
+    """
+    return KeyValueDatabase.instance().get(_launch_key(user_id))
+
+
+def _provision(launch_id: str, user_id: str, namespace: str, deployment: client.V1Deployment,
+               service: client.V1Service, ingress: client.V1Ingress, grace: int, timeout: int, server_url: str,
+               warm_ingress: Optional[client.V1Ingress] = None):
+    created = False
+    try:
+        # delete previous cate deployment to make sure pod is not restarted
+        _delete_cate_resources(user_id, prune=True)
 
-        deployment = k8s.create_deployment_object(name=user_id + '-cate',
-                                                  application='cate-webapi',
-                                                  container_name=user_id + '-cate',
-                                                  image=cate_image,
-                                                  envs=envs,
-                                                  container_port=4000,
-                                                  command=command,
-                                                  volumes=volumes,
-                                                  volume_mounts=volume_mounts,
-                                                  init_containers=init_containers,
-                                                  limits=limits,
-                                                  requests=requests,
-                                                  labels=labels,
-                                                  lifecycle=lifecycle)
+        # do not create the new deployment while the old one is still there
+        poller.wait_for_deployment_deletion(name=user_id + '-cate', namespace=namespace, timeout=timeout)
 
-        # delete previous cate deployment to make sure pod is not restarted
-        delete_cate(user_id, prune=True)
+        _transition(launch_id, user_id, CREATING)
+        created = True
 
-        while k8s.get_deployment(name=user_id + '-cate', namespace=cate_namespace):
-            # do not create the new deployment while the old one is still there
-            time.sleep(0.1)
+        if warm_ingress is not None and _bind_warm_pod(user_id, namespace=namespace):
+            _apply_service(service, namespace=namespace)
+            k8s.create_or_patch_ingress(warm_ingress, namespace=namespace)
 
-        k8s.create_deployment(namespace=cate_namespace, deployment=deployment)
+            # The ingress controller picks the new path up a moment later
+            _schedule(grace, _complete, launch_id=launch_id, user_id=user_id, server_url=server_url, warm=True)
+            return
 
-        time.sleep(cate_launch_grace)
+        k8s.create_deployment(namespace=namespace, deployment=deployment)
+        k8s.create_service_if_not_exists(service=service, namespace=namespace)
+        if warm_ingress is not None:
+            # The ingress may still strip the path for a pod of the warm pool bound before
+            k8s.create_or_patch_ingress(ingress, namespace=namespace)
+        else:
+            k8s.create_ingress_if_not_exists(ingress, namespace=namespace)
 
-        service = k8s.create_service_object(name=user_id + '-cate', port=4000, target_port=4000)
-        k8s.create_service_if_not_exists(service=service, namespace=cate_namespace)
+        _transition(launch_id, user_id, SCHEDULING)
 
-        host_uri = os.environ.get("CATE_WEBAPI_URI")
+        poller.wait_for_pod_phase(namespace=namespace, label_selector=f"app={user_id}-cate", timeout=timeout)
 
-        service_name = user_id + '-cate'
+        # The WebAPI starts listening a moment after its pod is running
+        _schedule(grace, _complete, launch_id=launch_id, user_id=user_id, server_url=server_url)
+    except (api.ApiError, Exception) as e:
+        _handle_launch_error(e, launch_id, user_id, created=created)
+
+
+def _complete(launch_id: str, user_id: str, server_url: str, **kwargs):
+    try:
+        _transition(launch_id, user_id, READY, serverUrl=server_url, **kwargs)
+        record_activity(user_id)
+    except (api.ApiError, Exception) as e:
+        _handle_launch_error(e, launch_id, user_id, created=True)
+
+
+def _handle_launch_error(e: BaseException, launch_id: str, user_id: str, created: bool):
+    if isinstance(e, _LaunchCancelled):
+        # The WebAPI has been deleted while its resources were created. Resources of a launch that has been
+        # replaced are left to the launch replacing it.
+        if created and get_launch(user_id) is None:
+            _delete_cate_resources(user_id, prune=True)
+    elif isinstance(e, api.ApiError):
+        _fail(launch_id, user_id, e.status_code, str(e))
+    elif isinstance(e, ApiException):
+        _fail(launch_id, user_id, e.status, str(e))
+    else:
+        _fail(launch_id, user_id, 500, str(e))
 
-        annotations = {
-            "proxy_set_header": "Upgrade $http_upgrade; Connection \"upgrade\"",
-            "nginx.ingress.kubernetes.io/proxy-connect-timeout": "86400",
-            "nginx.ingress.kubernetes.io/proxy-read-timeout": "86400",
-            "nginx.ingress.kubernetes.io/proxy-send-timeout": "86400",
-            "nginx.ingress.kubernetes.io/send-timeout": "86400",
-            "nginx.ingress.kubernetes.io/proxy-body-size": "2000m",
-            "nginx.ingress.kubernetes.io/enable-cors": "true",
-            "kubernetes.io/ingress.class": "nginx",
-            "nginx.ingress.kubernetes.io/websocket-services": service_name
-        }
 
-        ingress = k8s.get_ingress(namespace=cate_namespace, name=service_name)
-        if not ingress:
-            ingress = k8s.create_ingress_object(name=service_name,
-                                                service_name=service_name,
-                                                service_port=4000,
-                                                user_id=user_id,
-                                                annotations=annotations,
-                                                host_uri=host_uri)
-            k8s.create_ingress(ingress, namespace=cate_namespace)
-
-        # add_cate_path_to_ingress(
-        #     name='xcubehub-cate',
-        #     namespace=cate_namespace,
-        #     user_id=user_id,
-        #     host_uri=host_uri
-        # )
-
-        poller.poll_pod_phase(get_pod, namespace=cate_namespace, prefix=user_id)
+def _schedule(delay: float, fn, **kwargs):
+    # Waits on a timer thread, so that launch workers are not blocked by grace periods
+    timer = threading.Timer(delay, fn, kwargs=kwargs)
+    timer.daemon = True
+    timer.start()
 
+
+def _bind_warm_pod(user_id: str, namespace: str) -> bool:
+    # Relabelling a pod of the warm pool makes its replica set release it and start a replacement. The patch is
+    # conditional on the pod's resourceVersion, so that a pod is never bound to two users.
+    pods = k8s.list_pods(namespace=namespace, label_selector=f'app={WARM_POOL_NAME}')
+    for pod in pods.items:
+        if not _is_ready(pod):
+            continue
+
+        body = {
+            'metadata': {
+                'resourceVersion': pod.metadata.resource_version,
+                'labels': {'app': user_id + '-cate', 'application': 'cate-webapi', 'pool': 'bound'},
+            }
+        }
         try:
-            grace = int(grace)
-        except ValueError as e:
-            raise api.ApiError(400, "Grace wait period must be an integer.")
+            k8s.patch_pod(name=pod.metadata.name, body=body, namespace=namespace)
+            return True
+        except api.ApiError as e:
+            if e.status_code != 409:
+                raise
+
+    return False
+
+
+def _is_ready(pod: client.V1Pod) -> bool:
+    if pod.metadata.deletion_timestamp is not None or pod.status is None or pod.status.phase != 'Running':
+        return False
+    container_statuses = pod.status.container_statuses or []
+    return len(container_statuses) > 0 and all(status.ready for status in container_statuses)
+
+
+def _apply_service(service: client.V1Service, namespace: str):
+    existing = k8s.get_service(name=service.metadata.name, namespace=namespace)
+    if existing is None:
+        k8s.create_service(service=service, namespace=namespace)
+    elif existing.spec.selector != service.spec.selector:
+        k8s.patch_service(name=service.metadata.name, body={'spec': {'selector': service.spec.selector}},
+                          namespace=namespace)
+
+
+def is_warm_pool_enabled() -> bool:
+    """
+    Whether launches bind pods of the warm pool. The pool is enabled by CATE_WARM_POOL_MAX > 0. It is not used
+    with CATE_STORAGE_MODE "pvc", as a pod mounts the workspace of its user when it is created.
+    """
+    max_size = util.maybe_raise_for_env("CATE_WARM_POOL_MAX", default=0, typ=int)
+    cate_storage_mode = util.maybe_raise_for_env("CATE_STORAGE_MODE", "pvc")
+    return max_size > 0 and cate_storage_mode != "pvc"
+
+
+def get_warm_pool_size() -> int:
+    """
+    Get the number of pods the warm pool should keep ready: the launches expected while a pod starts cold, i.e.
+    the recent launch rate times CATE_WARM_POOL_LEAD_TIME (default 300s), at least CATE_WARM_POOL_MIN
+    (default 0) and at most CATE_WARM_POOL_MAX. The pool never makes the number of WebAPIs exceed
+    CATE_MAX_WEBAPIS.
+    """
+    if not is_warm_pool_enabled():
+        return 0
+
+    min_size = util.maybe_raise_for_env("CATE_WARM_POOL_MIN", default=0, typ=int)
+    max_size = util.maybe_raise_for_env("CATE_WARM_POOL_MAX", default=0, typ=int)
+    lead_time = util.maybe_raise_for_env("CATE_WARM_POOL_LEAD_TIME", default=300, typ=int)
+    max_pods = util.maybe_raise_for_env("CATE_MAX_WEBAPIS", default=50, typ=int)
+
+    # The launches of the previous window fade out gradually
+    expected = math.ceil(_get_launch_rate(time.time()) * lead_time - _MIN_EXPECTED_LAUNCHES)
+    size = min(max(expected, min_size), max_size)
+
+    running_pods = get_pod_count().get('running_pods', 0)
+    return max(0, min(size, max_pods - running_pods))
+
+
+def refresh_warm_pool() -> int:
+    """
+    Scale the warm pool to get_warm_pool_size(), creating its deployment if needed.
+
+    :return: The size of the pool
+    """
+    cate_namespace = util.maybe_raise_for_env("WORKSPACE_NAMESPACE", "cate")
+    size = get_warm_pool_size()
+
+    deployment = k8s.get_deployment(name=WARM_POOL_NAME, namespace=cate_namespace)
+    if deployment is None:
+        if size > 0:
+            deployment = _create_webapi_deployment_object(None)
+            deployment.spec.replicas = size
+            k8s.create_deployment(deployment=deployment, namespace=cate_namespace)
+    elif deployment.spec.replicas != size:
+        k8s.scale_deployment(name=WARM_POOL_NAME, replicas=size, namespace=cate_namespace)
+
+    return size
+
+
+def _get_launch_rate(now: float) -> float:
+    # Launches per second within a sliding window of CATE_WARM_POOL_RATE_WINDOW seconds (default 900), estimated
+    # from the launches of the current fixed window and the overlapping part of the previous one
+    window = util.maybe_raise_for_env("CATE_WARM_POOL_RATE_WINDOW", default=900, typ=int)
+    kvdb = KeyValueDatabase.instance()
+    index, elapsed = divmod(now, window)
+    current = len(kvdb.get_range(_launch_rate_key(int(index))))
+    previous = len(kvdb.get_range(_launch_rate_key(int(index) - 1)))
+    return (current + previous * (1. - elapsed / window)) / window
+
+
+def _record_launch():
+    window = util.maybe_raise_for_env("CATE_WARM_POOL_RATE_WINDOW", default=900, typ=int)
+    now = time.time()
+    # Appending is atomic, so concurrent launches are all counted
+    KeyValueDatabase.instance().append(_launch_rate_key(int(now // window)), dict(launched=now), ttl=2 * window)
+
+    _start_warm_pool_refresher()
+    _warm_pool_wakeup.set()
+
+
+def start_warm_pool():
+    """
+    Start refreshing the warm pool in the background if it is enabled, so that CATE_WARM_POOL_MIN pods are
+    kept ready before the first launch. Called at service start-up.
+    """
+    if is_warm_pool_enabled():
+        _start_warm_pool_refresher()
+
+
+def _start_warm_pool_refresher():
+    global _warm_pool_refresher
+    if _warm_pool_refresher is None:
+        with _launch_executor_lock:
+            if _warm_pool_refresher is None:
+                _warm_pool_refresher = threading.Thread(target=_refresh_warm_pool_periodically,
+                                                        name='cate-warm-pool', daemon=True)
+                _warm_pool_refresher.start()
+
+
+def _refresh_warm_pool_periodically():
+    interval = util.maybe_raise_for_env("CATE_WARM_POOL_REFRESH_INTERVAL", default=60, typ=int)
+    while True:
+        try:
+            refresh_warm_pool()
+        except Exception as e:
+            # The refresher must keep running, whatever the error
+            print("Warning: could not refresh the cate warm pool:", str(e))
+        _warm_pool_wakeup.wait(interval)
+        _warm_pool_wakeup.clear()
 
-        time.sleep(int(grace))
 
-        return dict(serverUrl=f'https://{cate_webapi_uri}/{user_id}')
-    except ApiException as e:
-        raise api.ApiError(e.status, str(e))
+def _launch_rate_key(index: int) -> str:
+    return _LAUNCH_RATE_KEY_PREFIX + str(index)
+
+
+def _launch_key(user_id: str) -> str:
+    return 'cate_launch__' + user_id
+
+
+def _launch_claim_key(user_id: str, previous: Optional[JsonObject]) -> str:
+    return f"cate_launch_claim__{user_id}__{previous['launch_id'] if previous is not None else 'none'}"
+
+
+def _new_launch(user_id: str, previous: Optional[JsonObject], ttl: float) -> Tuple[JsonObject, bool]:
+    # Requests replacing the same previous launch append their new launch to a list keyed by the previous one.
+    # Appending is atomic, unlike a read and a write, so only the first launch is stored and started, and the
+    # other requests return it. The list expires once a launch would be considered lost.
+    now = time.time()
+    launch = dict(launch_id=uuid.uuid4().hex, user_id=user_id, state=DELETING, created=now, updated=now)
+    kvdb = KeyValueDatabase.instance()
+    claim_key = _launch_claim_key(user_id, previous)
+    if kvdb.append(claim_key, launch, ttl=max(ttl, 1)) > 1:
+        return kvdb.get_range(claim_key)[0], False
+    kvdb.set(_launch_key(user_id), launch)
+    return launch, True
+
+
+def _delete_launch(user_id: str):
+    # Without a launch, the next launch is claimed with the key of no previous launch
+    kvdb = KeyValueDatabase.instance()
+    kvdb.delete(_launch_key(user_id))
+    kvdb.delete(_launch_claim_key(user_id, None))
+
+
+def _transition(launch_id: str, user_id: str, state: str, **kwargs):
+    kvdb = KeyValueDatabase.instance()
+    launch = kvdb.get(_launch_key(user_id))
+
+    # The launch has been deleted or replaced by another one
+    if launch is None or launch['launch_id'] != launch_id:
+        raise _LaunchCancelled()
+
+    launch.update(state=state, updated=time.time(), **kwargs)
+    kvdb.set(_launch_key(user_id), launch)
+
+
+def _fail(launch_id: str, user_id: str, status_code: int, message: str):
+    try:
+        _transition(launch_id, user_id, FAILED, status_code=status_code, message=message)
+    except _LaunchCancelled:
+        pass
+
+
+def _get_launch_executor() -> ThreadPoolExecutor:
+    global _launch_executor
+    if _launch_executor is None:
+        with _launch_executor_lock:
+            if _launch_executor is None:
+                max_workers = util.maybe_raise_for_env("CATE_LAUNCH_WORKERS", default=4, typ=int)
+                _launch_executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='cate-launch')
+    return _launch_executor
+
+
+class _LaunchCancelled(Exception):
+    pass
 
 
 def get_status(user_id: str):
     user_id = maybe_raise_for_invalid_username(user_id)
 
     cate_namespace = os.environ.get("WORKSPACE_NAMESPACE", "cate")
-    pod = k8s.get_pod(prefix=user_id + '-cate', namespace=cate_namespace)
+    # Pods of the warm pool bound to the user are not named after the user
+    pod = k8s.get_pod(prefix='', namespace=cate_namespace, label_selector=f'app={user_id}-cate', cached=True)
     if pod:
-        return pod.status.to_dict()
+        status = pod.status.to_dict()
     else:
-        return {'phase': 'Unknown'}
+        status = {'phase': 'Unknown'}
+
+    launch = get_launch(user_id)
+    if launch is not None:
+        status['launch'] = launch
+
+    return status
 
 
 def get_pod_count():
     cate_namespace = os.environ.get("WORKSPACE_NAMESPACE", "cate")
     label_selector = 'application=cate-webapi'
-    ct = k8s.count_pods(label_selector=label_selector, namespace=cate_namespace)
+    ct = k8s.count_pods(label_selector=label_selector, namespace=cate_namespace, cached=True)
     return {'running_pods': ct}
+
+
+def record_activity(user_id: str) -> JsonObject:
+    """
+    Record that the cate WebAPI of a user is in use, e.g. on a heartbeat of its client. WebAPIs without
+    activity are reaped, see reap_idle_webapis().
+    """
+    user_id = maybe_raise_for_invalid_username(user_id)
+
+    now = time.time()
+    KeyValueDatabase.instance().set(_activity_key(user_id), dict(time=now))
+
+    start_idle_reaper()
+
+    return dict(last_activity=now)
+
+
+def get_last_activity(user_id: str) -> Optional[float]:
+    activity = KeyValueDatabase.instance().get(_activity_key(user_id))
+    return activity['time'] if activity is not None else None
+
+
+def reap_idle_webapis() -> List[str]:
+    """
+    Update the usage of all running WebAPIs, and scale the cate WebAPIs to zero that have had no activity for
+    CATE_IDLE_TIMEOUT seconds (default 0, never) since their pod started. WebAPIs being launched are not reaped.
+    The service and ingress of a reaped WebAPI are kept, launching it again creates a new pod.
+
+    :return: The users whose WebAPIs have been reaped
+    """
+    idle_timeout = util.maybe_raise_for_env("CATE_IDLE_TIMEOUT", default=0, typ=int)
+    cate_namespace = util.maybe_raise_for_env("WORKSPACE_NAMESPACE", "cate")
+    now = time.time()
+
+    pods_by_user = dict()
+    for pod in k8s.list_pods(namespace=cate_namespace, label_selector='application=cate-webapi').items:
+        app = (pod.metadata.labels or dict()).get('app', '')
+        if app.endswith('-cate'):
+            pods_by_user.setdefault(app[:-len('-cate')], []).append(pod)
+
+    reaped = []
+    for user_id, pods in pods_by_user.items():
+        running = _update_usage(user_id, pods, now)
+        if idle_timeout <= 0 or not running:
+            continue
+
+        launch = get_launch(user_id)
+        if launch is not None and launch['state'] not in _FINAL_STATES:
+            continue
+
+        last_activity = max([get_last_activity(user_id) or 0.] + [record['started'] for record in running.values()])
+        if now - last_activity < idle_timeout:
+            continue
+
+        _delete_launch(user_id)
+        if k8s.get_deployment(name=user_id + '-cate', namespace=cate_namespace) is not None:
+            k8s.scale_deployment(name=user_id + '-cate', replicas=0, namespace=cate_namespace)
+        else:
+            _delete_bound_pods(user_id, namespace=cate_namespace)
+
+        _update_usage(user_id, [], now, ended=now)
+        reaped.append(user_id)
+
+    return reaped
+
+
+def get_usage(user_id: str) -> JsonObject:
+    """
+    Get the resources used by the cate WebAPIs of a user: the hours their pods have been running, the GiB hours
+    of memory requested by them, and the memory limit, request and current usage of the running pods. The memory
+    usage is taken from the metrics API if available, None otherwise. Usage is kept until 90 days after the last
+    pod of the user has ended.
+    """
+    user_id = maybe_raise_for_invalid_username(user_id)
+    cate_namespace = util.maybe_raise_for_env("WORKSPACE_NAMESPACE", "cate")
+    now = time.time()
+
+    pods = k8s.list_pods(namespace=cate_namespace, label_selector=f'app={user_id}-cate').items
+    running = _update_usage(user_id, pods, now)
+
+    records = {record['name']: record for record in KeyValueDatabase.instance().get_range(_closed_usage_key(user_id))}
+    records.update(running)
+
+    seconds = sum(record['seconds'] for record in records.values())
+    memory_seconds = sum(record['seconds'] * record['memory_request'] for record in records.values())
+
+    return dict(pod_hours=round(seconds / 3600, 3),
+                memory_gib_hours=round(memory_seconds / 3600 / _GIB, 3),
+                last_activity=get_last_activity(user_id),
+                pods=[dict(name=pod.metadata.name,
+                           phase=pod.status.phase,
+                           started=running[pod.metadata.name]['started'],
+                           memory_request=running[pod.metadata.name]['memory_request'],
+                           memory_limit=running[pod.metadata.name]['memory_limit'],
+                           memory_usage=k8s.get_pod_memory_usage(name=pod.metadata.name, namespace=cate_namespace))
+                      for pod in pods if pod.metadata.name in running])
+
+
+def _update_usage(user_id: str, pods: List[client.V1Pod], now: float,
+                  ended: Optional[float] = None) -> Dict[str, JsonObject]:
+    # Running pods are recorded with the seconds they have been running so far. Pods not running anymore are
+    # appended to the closed usage, possibly twice by concurrent updates, which is why they are read by name.
+    # If they are known to have ended at a time, e.g. as they have been deleted, they are charged until then.
+    kvdb = KeyValueDatabase.instance()
+
+    running = dict()
+    for pod in pods:
+        if pod.status is not None and pod.status.phase == 'Running' and pod.status.start_time is not None:
+            running[pod.metadata.name] = _new_usage_record(pod, now)
+
+    usage = kvdb.get(_usage_key(user_id)) or dict(pods=dict())
+    if not running and not usage['pods']:
+        return running
+
+    for name, record in usage['pods'].items():
+        if name not in running:
+            if ended is not None:
+                record = dict(record, seconds=max(record['seconds'], ended - record['started']))
+            kvdb.append(_closed_usage_key(user_id), record)
+
+    kvdb.set(_usage_key(user_id), dict(pods=running))
+    return running
+
+
+def _new_usage_record(pod: client.V1Pod, now: float) -> JsonObject:
+    memory_request = 0
+    memory_limit = 0
+    for container in pod.spec.containers if pod.spec is not None else []:
+        resources = container.resources
+        if resources is not None:
+            memory_request += int(parse_quantity((resources.requests or dict()).get('memory', 0)))
+            memory_limit += int(parse_quantity((resources.limits or dict()).get('memory', 0)))
+
+    started = pod.status.start_time.timestamp()
+    return dict(name=pod.metadata.name, started=started, seconds=max(0., now - started),
+                memory_request=memory_request, memory_limit=memory_limit)
+
+
+def _activity_key(user_id: str) -> str:
+    return 'cate_activity__' + user_id
+
+
+def _usage_key(user_id: str) -> str:
+    return 'cate_usage__' + user_id
+
+
+def _closed_usage_key(user_id: str) -> str:
+    return 'cate_usage_closed__' + user_id
+
+
+def start_idle_reaper():
+    """
+    Start updating the usage of the running WebAPIs in the background, and scaling idle WebAPIs to zero if
+    CATE_IDLE_TIMEOUT > 0, see reap_idle_webapis(). Called at service start-up and on launches.
+    """
+    global _idle_reaper
+    if _idle_reaper is None:
+        with _launch_executor_lock:
+            if _idle_reaper is None:
+                _idle_reaper = threading.Thread(target=_reap_idle_webapis_periodically,
+                                                name='cate-idle-reaper', daemon=True)
+                _idle_reaper.start()
+
+
+def _reap_idle_webapis_periodically():
+    interval = util.maybe_raise_for_env("CATE_IDLE_REAPER_INTERVAL", default=60, typ=int)
+    while True:
+        try:
+            if _is_elected_reaper(time.time(), interval):
+                reap_idle_webapis()
+        except Exception as e:
+            # The reaper must keep running, whatever the error
+            print("Warning: could not reap idle cate WebAPIs:", str(e))
+        # All processes wake up at the start of an interval, so that they compete for the same one
+        time.sleep(interval - time.time() % interval)
+
+
+def _is_elected_reaper(now: float, interval: int) -> bool:
+    # Every process (e.g. uWSGI worker) runs a reaper. Per interval, they append their id to a list that
+    # expires after the interval, and only the first one reaps. Appending is atomic, unlike a read and a write.
+    key = _REAPER_KEY_PREFIX + str(int(now // interval))
+    return KeyValueDatabase.instance().append(key, dict(reaper=_REAPER_ID), ttl=2 * interval) == 1
@@ -1,4 +1,7 @@
-from typing import Dict
+import re
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
 
 from xcube_hub import api
 from xcube_hub.api import get_json_request_value
@@ -36,33 +39,7 @@ def _check_lower_bound(value: Number, bound: Number = 0):
         raise api.ApiError(400, f'Value must be greater than {bound}')
 
 
-def get_size_and_cost(processing_request: JsonObject, datastore: JsonObject) -> JsonObject:
-    dataset_descriptor = get_json_request_value(processing_request, 'dataset_descriptor',
-                                                value_type=dict,
-                                                item_type=dict)
-
-    data_vars = get_json_request_value(dataset_descriptor, 'data_vars',
-                                       value_type=dict,
-                                       item_type=dict)
-
-    num_variables = len(data_vars.keys())
-    if num_variables == 0:
-        raise api.ApiError(400, "Number of variables must be greater than 0.")
-
-    dims = get_json_request_value(dataset_descriptor, 'dims',
-                                  value_type=dict,
-                                  item_type=dict)
-
-    time = get_json_request_value(dims, 'time',
-                                  value_type=int)
-
-    lat = _get_dim(dims, 'lat', 'y')
-    lon = _get_dim(dims, 'lon', 'x')
-
-    size_estimation = get_json_request_value(processing_request, 'size_estimation',
-                                             value_type=dict,
-                                             item_type=dict)
-
+def _get_cost_params(datastore: JsonObject) -> Tuple[int, float, int, float]:
     cost_params = get_json_request_value(datastore, 'cost_params',
                                          value_type=dict,
                                          item_type=dict)
@@ -100,6 +77,39 @@ def get_size_and_cost(processing_request: JsonObject, datastore: JsonObject) ->
 
         _check_lower_bound(output_punits_weight, 0)
 
+    return input_pixels_per_punit, input_punits_weight, output_pixels_per_punit, output_punits_weight
+
+
+def get_size_and_cost(processing_request: JsonObject, datastore: JsonObject) -> JsonObject:
+    dataset_descriptor = get_json_request_value(processing_request, 'dataset_descriptor',
+                                                value_type=dict,
+                                                item_type=dict)
+
+    data_vars = get_json_request_value(dataset_descriptor, 'data_vars',
+                                       value_type=dict,
+                                       item_type=dict)
+
+    num_variables = len(data_vars.keys())
+    if num_variables == 0:
+        raise api.ApiError(400, "Number of variables must be greater than 0.")
+
+    dims = get_json_request_value(dataset_descriptor, 'dims',
+                                  value_type=dict,
+                                  item_type=dict)
+
+    time = get_json_request_value(dims, 'time',
+                                  value_type=int)
+
+    lat = _get_dim(dims, 'lat', 'y')
+    lon = _get_dim(dims, 'lon', 'x')
+
+    size_estimation = get_json_request_value(processing_request, 'size_estimation',
+                                             value_type=dict,
+                                             item_type=dict)
+
+    input_pixels_per_punit, input_punits_weight, output_pixels_per_punit, output_punits_weight = \
+        _get_cost_params(datastore)
+
     input_punits_count = _punits(lat, lon, time, num_variables, input_pixels_per_punit)
     output_punits_count = _punits(lat, lon, time, num_variables, output_pixels_per_punit)
     total_punits_count = round(max(input_punits_weight * input_punits_count,
@@ -115,6 +125,102 @@ def get_size_and_cost(processing_request: JsonObject, datastore: JsonObject) ->
                             total_count=total_punits_count))
 
 
+def get_costs(cube_configs: Sequence[JsonObject], datastore: JsonObject) -> List[JsonObject]:
+    """
+    Estimate the punits of many candidate cube configurations at once, e.g. a grid of bounding boxes, time
+    ranges and variables.
+
+    Unlike get_size_and_cost() the dimensions are not taken from a dataset descriptor produced by an info job,
+    but derived from the bbox, spatial_res, time_range, time_period and variable_names of the cube
+    configurations. All configurations are computed in one pass over arrays.
+
+    :return: For every cube configuration, dict(dims=..., num_variables=..., punits=...)
+    """
+    input_pixels_per_punit, input_punits_weight, output_pixels_per_punit, output_punits_weight = \
+        _get_cost_params(datastore)
+
+    if len(cube_configs) == 0:
+        return []
+
+    bboxes = []
+    spatial_res = []
+    time_ranges = []
+    time_steps = []
+    time_units_monthly = []
+    num_variables = []
+    for cube_config in cube_configs:
+        bboxes.append(get_json_request_value(cube_config, 'bbox', value_type=list, item_type=Number, item_count=4))
+
+        res = get_json_request_value(cube_config, 'spatial_res', value_type=Number)
+        _check_lower_bound(res, 0)
+        spatial_res.append(res)
+
+        time_ranges.append(get_json_request_value(cube_config, 'time_range', value_type=list, item_type=str,
+                                                  item_count=2))
+
+        step, monthly = _parse_time_period(get_json_request_value(cube_config, 'time_period', value_type=str))
+        time_steps.append(step)
+        time_units_monthly.append(monthly)
+
+        variable_names = get_json_request_value(cube_config, 'variable_names', value_type=list, item_type=str)
+        if len(variable_names) == 0:
+            raise api.ApiError(400, "Number of variables must be greater than 0.")
+        num_variables.append(len(variable_names))
+
+    bboxes = np.array(bboxes, dtype=np.float64)
+    if np.any(bboxes[:, 2] <= bboxes[:, 0]) or np.any(bboxes[:, 3] <= bboxes[:, 1]):
+        raise api.ApiError(400, 'bbox must be given as [x1, y1, x2, y2] with x2 > x1 and y2 > y1.')
+    spatial_res = np.array(spatial_res, dtype=np.float64)
+    # Like xcube, a dimension covers the bbox by rounding to whole pixels, at least one pixel
+    width = np.maximum(np.rint((bboxes[:, 2] - bboxes[:, 0]) / spatial_res), 1).astype(np.int64)
+    height = np.maximum(np.rint((bboxes[:, 3] - bboxes[:, 1]) / spatial_res), 1).astype(np.int64)
+
+    try:
+        time_ranges = np.array(time_ranges, dtype='datetime64[s]')
+    except ValueError as e:
+        raise api.ApiError(400, f'Invalid time_range: {e}')
+    seconds = (time_ranges[:, 1] - time_ranges[:, 0]).astype(np.int64)
+    months = (time_ranges[:, 1].astype('datetime64[M]') - time_ranges[:, 0].astype('datetime64[M]')).astype(np.int64)
+    if np.any(seconds < 0):
+        raise api.ApiError(400, 'time_range must not end before it starts.')
+    num_times = np.where(time_units_monthly, months, seconds) // np.array(time_steps, dtype=np.int64) + 1
+
+    num_variables = np.array(num_variables, dtype=np.int64)
+
+    input_punits_counts = _punits(width, height, num_times, num_variables, input_pixels_per_punit)
+    output_punits_counts = _punits(width, height, num_times, num_variables, output_pixels_per_punit)
+    total_punits_counts = np.rint(np.maximum(input_punits_weight * input_punits_counts,
+                                             output_punits_weight * output_punits_counts)).astype(np.int64)
+
+    return [dict(dims=dict(time=t, lat=h, lon=w),
+                 num_variables=v,
+                 punits=dict(input_count=ic,
+                             input_weight=input_punits_weight,
+                             output_count=oc,
+                             output_weight=output_punits_weight,
+                             total_count=tc))
+            for t, h, w, v, ic, oc, tc in zip(num_times.tolist(), height.tolist(), width.tolist(),
+                                              num_variables.tolist(), input_punits_counts.tolist(),
+                                              output_punits_counts.tolist(), total_punits_counts.tolist())]
+
+
+_TIME_PERIOD_RE = re.compile(r'^(\d*)([HDWMY])$')
+_TIME_PERIOD_SECONDS = dict(H=3600, D=86400, W=7 * 86400)
+_TIME_PERIOD_MONTHS = dict(M=1, Y=12)
+
+
+def _parse_time_period(time_period: str) -> Tuple[int, bool]:
+    # Returns the step in seconds, or in months for the monthly and yearly periods
+    match = _TIME_PERIOD_RE.match(time_period.strip().upper())
+    count = int(match.group(1) or 1) if match is not None else 0
+    if count <= 0:
+        raise api.ApiError(400, f'Invalid time_period "{time_period}".')
+    unit = match.group(2)
+    if unit in _TIME_PERIOD_MONTHS:
+        return count * _TIME_PERIOD_MONTHS[unit], True
+    return count * _TIME_PERIOD_SECONDS[unit], False
+
+
 def _punits(width: int, height: int, num_times: int, num_bands: int, pixels_per_punit: int) -> int:
     return num_bands * num_times * _idiv(width * height, pixels_per_punit)
 
@@ -1,8 +1,15 @@
+import copy
+import datetime
+import hashlib
 import json
 import os
+import re
+import threading
+import time
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from pprint import pprint
-from typing import Union, Sequence, Optional, Tuple, Dict
+from typing import Union, Sequence, Optional, Tuple, Dict, List, Iterator
 
 from kubernetes import client
 from kubernetes.client import ApiException, ApiValueError
@@ -13,29 +20,119 @@ from xcube_hub import api, poller, util
 from xcube_hub.api import get_json_request_value
 from xcube_hub.cfg import Cfg
 from xcube_hub.core import callbacks, costs, punits
+from xcube_hub.informer import Informer, wait_until_synced
+from xcube_hub.k8scfg import K8sCfg
 from xcube_hub.keyvaluedatabase import KeyValueDatabase
 from xcube_hub.models.cubegen_config import CubegenConfig
 from xcube_hub.typedefs import AnyDict, Error, JsonObject
 from xcube_hub.util import maybe_raise_for_env
 
+_JOBS_INFORMER = 'cubegens-jobs'
+_PODS_INFORMER = 'cubegens-pods'
 
-def get(user_id: str, cubegen_id: str) -> Tuple[JsonObject, int]:
+_USER_ID_LABEL = 'user-id'
+
+CUBEGEN_FIELDS = ('job_status', 'job_result', 'message', 'output', 'progress')
+
+# Cursors of pages served from the informer cache start with this character. Kubernetes continue tokens never do.
+_INFORMER_CURSOR_PREFIX = '~'
+
+# Cubegen jobs are named after their user and the first 18 characters of a UUID
+_JOB_NAME_PATTERN = re.compile(r'(.+)-[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}')
+
+
+def _new_jobs_informer() -> Informer:
+    xcube_hub_namespace = os.getenv("WORKSPACE_NAMESPACE", "xcube-gen-dev")
+    return Informer(K8sCfg.batch_v1_api().list_namespaced_job,
+                    namespace=xcube_hub_namespace,
+                    label_selector="typ=cubegen",
+                    index_labels=(_USER_ID_LABEL,))
+
+
+def _new_pods_informer() -> Informer:
+    xcube_hub_namespace = os.getenv("WORKSPACE_NAMESPACE", "xcube-gen-dev")
+    return Informer(K8sCfg.core_v1_api().list_namespaced_pod,
+                    namespace=xcube_hub_namespace,
+                    label_selector="app=xcube-gen",
+                    index_labels=('job-name',))
+
+
+# Cubegen state kept in the key-value database is dropped after a week, tickets of info runs after a day. Log
+# cursors are only needed while clients poll.
+_CUBEGEN_TTL = 7 * 24 * 3600
+_INFO_TICKET_TTL = 24 * 3600
+_LOG_CURSOR_TTL = 3600
+# Info runs in progress wait at most an hour for their job, see poller.wait_for_job()
+_INFO_PENDING_TTL = 2 * 3600
+
+KeyValueDatabase.register_default_ttl('*__cfg', _CUBEGEN_TTL)
+KeyValueDatabase.register_default_ttl('*__logs_cursor__*', _LOG_CURSOR_TTL)
+KeyValueDatabase.register_default_ttl('cubegens_info_ticket__*', _INFO_TICKET_TTL)
+KeyValueDatabase.register_default_ttl('cubegens_info_pending__*', _INFO_PENDING_TTL)
+
+_info_executor: Optional[ThreadPoolExecutor] = None
+_info_executor_lock = threading.Lock()
+
+_INFORMER_FACTORIES = {
+    _JOBS_INFORMER: _new_jobs_informer,
+    _PODS_INFORMER: _new_pods_informer,
+}
+
+
+def get_informer(key: str) -> Optional[Informer]:
+    """
+    Return the informer caching cubegen jobs or pods, if informers are enabled by setting
+    XCUBE_HUB_CUBEGENS_INFORMER=1 and the informer's cache has synced. The informers are started on first use.
+    Returns None otherwise, in which case callers request the Kubernetes API directly.
+    """
+    if os.getenv("XCUBE_HUB_CUBEGENS_INFORMER", "0") != "1":
+        return None
+
+    sync_timeout = util.maybe_raise_for_env("XCUBE_HUB_CUBEGENS_INFORMER_SYNC_TIMEOUT", default=5, typ=float)
+    informer = Informer.instance(key, factory=_INFORMER_FACTORIES[key])
+    return wait_until_synced(informer, timeout=sync_timeout)
+
+
+def _maybe_raise_for_invalid_fields(fields: Optional[Sequence[str]]):
+    if fields is None:
+        return
+    invalid = [field for field in fields if field not in CUBEGEN_FIELDS]
+    if invalid:
+        raise api.ApiError(400, f"Invalid fields {', '.join(invalid)}. Valid fields are {', '.join(CUBEGEN_FIELDS)}.")
+
+
+def get(user_id: str, cubegen_id: str, fields: Optional[Sequence[str]] = None) -> Tuple[JsonObject, int]:
+    """
+    Get a cubegen's state.
+
+    :param user_id: The owner of the cubegen
+    :param cubegen_id: The cubegen (job) ID
+    :param fields: Optional projection. If given, only these entries of CUBEGEN_FIELDS are returned and
+        data that is not needed for them (e.g. pod logs or the result file) is not read.
+    """
+    _maybe_raise_for_invalid_fields(fields)
+    fields = CUBEGEN_FIELDS if fields is None else fields
     try:
-        outputs = logs(job_id=cubegen_id)
+        need_result = 'job_result' in fields or 'message' in fields
+        need_outputs = 'output' in fields or 'job_result' in fields
+
+        outputs = logs(job_id=cubegen_id) if need_outputs else []
         stat = status(job_id=cubegen_id)
 
         if not stat:
             raise api.ApiError(404, message=f"Cubegen {cubegen_id} not found")
 
-        progress = callbacks.get_callback(user_id=user_id, cubegen_id=cubegen_id)
+        progress = callbacks.get_callback(user_id=user_id, cubegen_id=cubegen_id) if 'progress' in fields else None
 
-        xcube_hub_result_root_dir = util.maybe_raise_for_env("XCUBE_HUB_RESULT_ROOT_DIR")
-        res = cubegens_result(job_id=cubegen_id, root=xcube_hub_result_root_dir)
+        res = dict()
+        if need_result:
+            xcube_hub_result_root_dir = util.maybe_raise_for_env("XCUBE_HUB_RESULT_ROOT_DIR")
+            res = cubegens_result(job_id=cubegen_id, root=xcube_hub_result_root_dir)
 
-        if 'output' not in res:
-            res['output'] = outputs
-        else:
-            res['output'] += outputs
+            if 'output' not in res:
+                res['output'] = outputs
+            else:
+                res['output'] += outputs
 
         status_code = res['status_code'] if 'status_code' in res else 200
         message = res.get('message', '')
@@ -47,12 +144,13 @@ def get(user_id: str, cubegen_id: str) -> Tuple[JsonObject, int]:
                'output': outputs,
                'progress': progress}
 
-        return res, status_code
+        return {k: v for k, v in res.items() if k == 'job_id' or k in fields}, status_code
     except (ApiException, MaxRetryError) as e:
         raise api.ApiError(400, str(e))
 
 
-def create_cubegen_object(cubegen_id: str, cfg: AnyDict, info_only: bool = False) -> client.V1Job:
+def create_cubegen_object(cubegen_id: str, cfg: AnyDict, info_only: bool = False,
+                          user_id: Optional[str] = None) -> client.V1Job:
     xcube_repo = util.maybe_raise_for_env("XCUBE_REPO")
     xcube_tag = util.maybe_raise_for_env("XCUBE_TAG")
     xcube_hash = os.getenv("XCUBE_HASH", default=None)
@@ -152,11 +250,16 @@ def create_cubegen_object(cubegen_id: str, cfg: AnyDict, info_only: bool = False
     spec = client.V1JobSpec(
         template=template,
         backoff_limit=1)
+
+    labels = dict(typ="cubegen")
+    if user_id is not None:
+        labels[_USER_ID_LABEL] = user_id
+
     # Instantiate the cubegen object
     cubegen = client.V1Job(
         api_version="batch/v1",
         kind="Job",
-        metadata=client.V1ObjectMeta(name=cubegen_id, labels=dict(typ="cubegen")),
+        metadata=client.V1ObjectMeta(name=cubegen_id, labels=labels),
         spec=spec)
 
     return cubegen
@@ -250,13 +353,13 @@ def create(user_id: str, email: str, cfg: AnyDict, token: Optional[str] = None,
         if 'data_id' not in cfg['output_config']:
             cfg['output_config']['data_id'] = job_id + '.zarr'
 
-        job = create_cubegen_object(job_id, cfg=cfg, info_only=info_only)
-        api_instance = client.BatchV1Api()
+        job = create_cubegen_object(job_id, cfg=cfg, info_only=info_only, user_id=user_id)
+        api_instance = K8sCfg.batch_v1_api()
         api_response = api_instance.create_namespaced_job(body=job, namespace=xcube_hub_namespace)
 
         kvdb = KeyValueDatabase.instance()
-        kvdb.set(user_id + '__' + job_id + '__cfg', cfg)
-        kvdb.set(user_id + '__' + job_id, {'progress': []})
+        cfg_key = user_id + '__' + job_id + '__cfg'
+        kvdb.mset({cfg_key: cfg, user_id + '__' + job_id: {'progress': []}}, ttl=kvdb.default_ttl(cfg_key))
 
         job_result = dict(output=[], status_code=200, status='ok')
 
@@ -268,20 +371,73 @@ def create(user_id: str, email: str, cfg: AnyDict, token: Optional[str] = None,
 
 
 # noinspection PyShadowingBuiltins
-def list(user_id: str):
-    api_instance = client.BatchV1Api()
+def list(user_id: str,
+         limit: Optional[int] = None,
+         cursor: Optional[str] = None,
+         fields: Optional[Sequence[str]] = None):
+    """
+    List a user's cubegens. Only jobs labelled with the user's ID are considered.
+
+    :param user_id: The owner of the cubegens
+    :param limit: Maximum number of cubegens returned
+    :param cursor: The cursor returned by the previous page
+    :param fields: Optional projection, see get()
+    :return: A tuple (cubegens, status code). Use list_page() to receive the cursor of the next page.
+    """
+    res, next_cursor = list_page(user_id=user_id, limit=limit, cursor=cursor, fields=fields)
+    return res, 200
+
+
+def list_page(user_id: str,
+              limit: Optional[int] = None,
+              cursor: Optional[str] = None,
+              fields: Optional[Sequence[str]] = None) -> Tuple[Sequence[JsonObject], Optional[str]]:
+    """
+    Return a page of a user's cubegens and the cursor of the next page. The cursor is None if there are no
+    further pages.
+    """
+    _maybe_raise_for_invalid_fields(fields)
+
+    if limit is not None and limit <= 0:
+        raise api.ApiError(400, "Limit must be greater than 0.")
+
+    label_selector = f"typ=cubegen,{_USER_ID_LABEL}={user_id}"
+    is_informer_cursor = cursor is not None and cursor.startswith(_INFORMER_CURSOR_PREFIX)
+
+    informer = get_informer(_JOBS_INFORMER) if cursor is None or is_informer_cursor else None
+
+    if is_informer_cursor and informer is None:
+        raise api.ApiError(400, "Invalid cursor. Please restart listing cubegens without cursor.")
+
+    api_instance = K8sCfg.batch_v1_api()
     xcube_hub_namespace = os.getenv("WORKSPACE_NAMESPACE", "xcube-gen-dev")
     try:
-        api_response = api_instance.list_namespaced_job(namespace=xcube_hub_namespace)
+        if informer is not None:
+            jobs = sorted(informer.list(**{_USER_ID_LABEL: user_id}), key=lambda j: j.metadata.name)
+            if is_informer_cursor:
+                start_after = cursor[len(_INFORMER_CURSOR_PREFIX):]
+                jobs = [job for job in jobs if job.metadata.name > start_after]
+            next_cursor = None
+            if limit is not None and len(jobs) > limit:
+                jobs = jobs[:limit]
+                next_cursor = _INFORMER_CURSOR_PREFIX + jobs[-1].metadata.name
+        else:
+            kwargs = dict(namespace=xcube_hub_namespace, label_selector=label_selector)
+            if limit is not None:
+                kwargs['limit'] = limit
+            if cursor is not None:
+                kwargs['_continue'] = cursor
+            api_response = api_instance.list_namespaced_job(**kwargs)
+            jobs = api_response.items
+            next_cursor = api_response.metadata._continue if api_response.metadata else None
 
         res = []
-        for job in api_response.items:
-            if user_id in job.metadata.name:
-                job, status_code = get(user_id=user_id, cubegen_id=job.metadata.name)
+        for job in jobs:
+            job, status_code = get(user_id=user_id, cubegen_id=job.metadata.name, fields=fields)
 
-                res.append(job)
+            res.append(job)
 
-        return res, 200
+        return res, next_cursor or None
     except (ApiException, MaxRetryError) as e:
         raise api.ApiError(400, str(e))
 
@@ -302,15 +458,27 @@ def cubegens_result(job_id: str, root: str) -> Dict:
         raise api.ApiError(400, str(e))
 
 
+def _list_job_pods(job_id: str) -> List[client.V1Pod]:
+    informer = get_informer(_PODS_INFORMER)
+    if informer is not None:
+        pods = informer.list(**{'job-name': job_id})
+        pods.sort(key=lambda p: (p.metadata.creation_timestamp is not None, p.metadata.creation_timestamp))
+        return pods
+
+    xcube_hub_namespace = os.getenv("WORKSPACE_NAMESPACE", "xcube-gen-dev")
+    return K8sCfg.core_v1_api().list_namespaced_pod(namespace=xcube_hub_namespace,
+                                                  label_selector=f"job-name={job_id}").items
+
+
 def logs(job_id: str, raises: bool = False) -> Sequence:
     xcube_hub_namespace = os.getenv("WORKSPACE_NAMESPACE", "xcube-gen-dev")
-    api_pod_instance = client.CoreV1Api()
+    api_pod_instance = K8sCfg.core_v1_api()
 
     lgs = []
     try:
-        pods = api_pod_instance.list_namespaced_pod(namespace=xcube_hub_namespace, label_selector=f"job-name={job_id}")
+        pods = _list_job_pods(job_id)
 
-        for pod in pods.items:
+        for pod in pods:
             name = pod.metadata.name
 
             lg = api_pod_instance.read_namespaced_pod_log(namespace=xcube_hub_namespace, name=name)
@@ -324,9 +492,304 @@ def logs(job_id: str, raises: bool = False) -> Sequence:
     return lgs
 
 
+# Added to since_seconds when reading logs after a cursor to allow for clock skew between hub and nodes. Lines
+# read twice are dropped by comparing their timestamps with the cursor's.
+_LOG_CURSOR_SLACK_SECONDS = 5
+
+
+def _log_cursor_key(job_id: str, line: int) -> str:
+    # Cursors are kept per line, so that clients polling the same job at different offsets do not replace
+    # each other's cursor
+    return f'{job_id}__logs_cursor__{line}'
+
+
+def _parse_log_line(line: str) -> Tuple[Optional[List[int]], str]:
+    """
+    Split a log line read with timestamps=True into its timestamp [epoch seconds, nanoseconds] and its text.
+    The timestamp is None if the line has none.
+    """
+    ts, _, text = line.partition(' ')
+    seconds, _, fraction = ts.rstrip('Z').partition('.')
+    try:
+        epoch = datetime.datetime.strptime(seconds, '%Y-%m-%dT%H:%M:%S') \
+            .replace(tzinfo=datetime.timezone.utc).timestamp()
+        nanos = int(fraction.ljust(9, '0')[:9]) if fraction else 0
+    except ValueError:
+        return None, line
+    return [int(epoch), nanos], text
+
+
+def _is_pod_done(pod: client.V1Pod) -> bool:
+    return pod.status is not None and pod.status.phase in ('Succeeded', 'Failed')
+
+
+def _read_pod_log_lines(name: str, cursor: Optional[AnyDict] = None) -> Tuple[List[str], Optional[List[int]]]:
+    """
+    Read the log of a pod. If a pod cursor is given, only lines logged after the cursor's timestamp are returned.
+    Returns the lines and the timestamp of the last line.
+    """
+    xcube_hub_namespace = os.getenv("WORKSPACE_NAMESPACE", "xcube-gen-dev")
+    kwargs = dict(namespace=xcube_hub_namespace, name=name, timestamps=True)
+
+    since_ts = last_ts = cursor['ts'] if cursor else None
+    if since_ts is not None:
+        kwargs['since_seconds'] = max(1, int(time.time()) - since_ts[0] + _LOG_CURSOR_SLACK_SECONDS)
+
+    lines = []
+    for line in K8sCfg.core_v1_api().read_namespaced_pod_log(**kwargs).splitlines():
+        ts, text = _parse_log_line(line)
+        if since_ts is not None and (ts is None or ts <= since_ts):
+            continue
+        lines.append(text)
+        if ts is not None:
+            last_ts = ts
+
+    return lines, last_ts
+
+
+def _read_logs(job_id: str, cursor: Optional[AnyDict] = None) -> Tuple[List[str], AnyDict]:
+    """
+    Read the log lines of the pods of a job logged after cursor, or all lines if cursor is None. Returns the
+    lines and a new cursor after them. The given cursor is not modified.
+    """
+    incremental = cursor is not None
+    if incremental:
+        cursor = dict(line=cursor['line'], pods=dict(cursor['pods']))
+    else:
+        cursor = dict(line=0, pods=dict())
+
+    lines = []
+    for pod in _list_job_pods(job_id):
+        name = pod.metadata.name
+        pod_cursor = cursor['pods'].get(name) if incremental else None
+        if pod_cursor is not None and pod_cursor['done']:
+            continue
+
+        # The pod phase is taken before reading, so that a pod marked done has no lines left to read
+        done = _is_pod_done(pod)
+        pod_lines, ts = _read_pod_log_lines(name, pod_cursor)
+        lines += pod_lines
+        cursor['pods'][name] = dict(lines=(pod_cursor['lines'] if pod_cursor else 0) + len(pod_lines),
+                                    ts=ts, done=done)
+
+    cursor['line'] += len(lines)
+    return lines, cursor
+
+
+def _read_logs_since(job_id: str, since_line: int) -> Tuple[List[str], int, AnyDict]:
+    kvdb = KeyValueDatabase.instance()
+    cursor = kvdb.get(_log_cursor_key(job_id, since_line))
+
+    # The cursor only helps if a read stopped at since_line before. Otherwise read everything.
+    if cursor and cursor['line'] == since_line:
+        lines, cursor = _read_logs(job_id, cursor)
+    else:
+        lines, cursor = _read_logs(job_id)
+        lines = lines[since_line:]
+
+    next_line = cursor['line']
+    kvdb.set(_log_cursor_key(job_id, next_line), cursor)
+
+    return lines, next_line, cursor
+
+
+def logs_since(job_id: str, since_line: int = 0, raises: bool = False) -> Tuple[List[str], int]:
+    """
+    Get the log lines of a cubegen starting at line since_line.
+
+    A cursor stored per job and line remembers the timestamp of the last line of each pod when a read stopped at
+    that line. If a read stopped at since_line before, only output logged after its cursor is requested from
+    Kubernetes, so that polling costs are proportional to new output, also for several clients following the
+    same job. Otherwise the full log is read.
+
+    :param job_id: The cubegen (job) ID
+    :param since_line: The number of lines the client has already received
+    :param raises: Raise an ApiError on Kubernetes errors instead of returning no lines
+    :return: The new lines and the line number to pass as since_line next time
+    """
+    if since_line < 0:
+        raise api.ApiError(400, "since_line must not be negative")
+
+    try:
+        lines, next_line, _ = _read_logs_since(job_id, since_line)
+        return lines, next_line
+    except (client.ApiValueError, client.ApiException, MaxRetryError) as e:
+        if raises:
+            raise api.ApiError(400, str(e))
+        pprint(str(e))
+        return [], since_line
+
+
+def follow_logs(job_id: str, since_line: int = 0) -> Iterator[str]:
+    """
+    Yield the log lines of a cubegen starting at line since_line and keep following the log of the job's latest
+    pod until it terminates. Lines are terminated by a newline.
+    """
+    if since_line < 0:
+        raise api.ApiError(400, "since_line must not be negative")
+
+    try:
+        lines, _, cursor = _read_logs_since(job_id, since_line)
+    except (client.ApiValueError, client.ApiException, MaxRetryError) as e:
+        raise api.ApiError(400, str(e))
+
+    return _follow_logs(job_id, lines, cursor)
+
+
+def _follow_logs(job_id: str, lines: List[str], cursor: AnyDict) -> Iterator[str]:
+    for line in lines:
+        yield line + '\n'
+
+    pods = _list_job_pods(job_id)
+    if not pods:
+        return
+
+    name = pods[-1].metadata.name
+    pod_cursor = cursor['pods'].get(name)
+    if pod_cursor is None or pod_cursor['done']:
+        return
+
+    xcube_hub_namespace = os.getenv("WORKSPACE_NAMESPACE", "xcube-gen-dev")
+    kwargs = dict(namespace=xcube_hub_namespace, name=name, timestamps=True, follow=True, _preload_content=False)
+    last_ts = pod_cursor['ts']
+    if last_ts is not None:
+        kwargs['since_seconds'] = max(1, int(time.time()) - last_ts[0] + _LOG_CURSOR_SLACK_SECONDS)
+
+    resp = K8sCfg.core_v1_api().read_namespaced_pod_log(**kwargs)
+    try:
+        buffer = b''
+        for chunk in resp.stream():
+            buffer += chunk
+            *complete, buffer = buffer.split(b'\n')
+            for line in complete:
+                ts, text = _parse_log_line(line.decode('utf-8', errors='replace'))
+                if last_ts is not None and ts is not None and ts <= last_ts:
+                    continue
+                yield text + '\n'
+        if buffer:
+            yield _parse_log_line(buffer.decode('utf-8', errors='replace'))[1] + '\n'
+    finally:
+        resp.release_conn()
+
+
+# Idle event streams send a comment at this interval so that proxies keep the connection open
+_EVENTS_KEEPALIVE_SECONDS = 15
+
+
+def _sse_message(event: str, data: JsonObject, event_id: Optional[int] = None) -> str:
+    message = f"event: {event}\ndata: {json.dumps(data)}\n\n"
+    return f"id: {event_id}\n" + message if event_id is not None else message
+
+
+def _is_status_finished(stat: AnyDict) -> bool:
+    for condition in stat.get('conditions') or []:
+        if condition.get('type') in ('Complete', 'Failed') and condition.get('status') == 'True':
+            return True
+    return False
+
+
+def events(user_id: str, job_id: str, since: int = 0) -> Iterator[str]:
+    """
+    Stream the events of a cubegen as server-sent events until the cubegen has finished:
+
+    - ``progress``: a progress callback, pushed as it arrives. Its id is the callback's index.
+    - ``status``: the job status, whenever it changes
+    - ``logs``: new log lines and the next_line to pass to ``logs_since``
+    - ``end``: the cubegen has finished or is gone
+
+    The job status and logs are checked every XCUBE_HUB_CUBEGENS_EVENTS_INTERVAL seconds (default 2). With
+    informers enabled the status is read from the informer's cache.
+
+    :param user_id: The owner of the cubegen
+    :param job_id: The cubegen (job) ID
+    :param since: Index of the first progress event to send
+    """
+    if since < 0:
+        raise api.ApiError(400, "since must not be negative")
+
+    if not status(job_id):
+        raise api.ApiError(404, message=f"Cubegen {job_id} not found")
+
+    # Subscribe before reading the stored progress so that no callback is missed in between
+    subscription = KeyValueDatabase.instance().subscribe(callbacks.events_channel(user_id, job_id))
+    return _events(user_id, job_id, since, subscription)
+
+
+def _events(user_id: str, job_id: str, since: int, subscription) -> Iterator[str]:
+    interval = util.maybe_raise_for_env("XCUBE_HUB_CUBEGENS_EVENTS_INTERVAL", default=2, typ=float)
+    try:
+        next_index = since
+        progress = callbacks.get_callback(user_id=user_id, cubegen_id=job_id, since=since)
+        # Cubegens without progress list yield a dict
+        if not isinstance(progress, dict):
+            for value in progress:
+                yield _sse_message('progress', value, event_id=next_index)
+                next_index += 1
+
+        last_status = None
+        log_cursor = None
+        next_check = 0.
+        last_sent = time.monotonic()
+        while True:
+            if time.monotonic() >= next_check:
+                stat = status(job_id)
+                if stat != last_status:
+                    yield _sse_message('status', stat)
+                    last_status = stat
+                    last_sent = time.monotonic()
+
+                lines, log_cursor = _tail_logs(job_id, log_cursor)
+                if lines:
+                    yield _sse_message('logs', dict(output=lines, next_line=log_cursor['line']))
+                    last_sent = time.monotonic()
+
+                if not stat or _is_status_finished(stat):
+                    message = subscription.get_message()
+                    while message is not None:
+                        if message['index'] >= next_index:
+                            yield _sse_message('progress', message['progress'], event_id=message['index'])
+                            next_index = message['index'] + 1
+                        message = subscription.get_message()
+                    yield _sse_message('end', dict(job_id=job_id))
+                    return
+
+                next_check = time.monotonic() + interval
+
+            message = subscription.get_message(timeout=max(0., next_check - time.monotonic()))
+            if message is not None and message['index'] >= next_index:
+                yield _sse_message('progress', message['progress'], event_id=message['index'])
+                next_index = message['index'] + 1
+                last_sent = time.monotonic()
+            elif time.monotonic() - last_sent >= _EVENTS_KEEPALIVE_SECONDS:
+                yield ':\n\n'
+                last_sent = time.monotonic()
+    finally:
+        subscription.close()
+
+
+def _tail_logs(job_id: str, cursor: Optional[AnyDict]) -> Tuple[List[str], Optional[AnyDict]]:
+    # A stream keeps its own cursor. Only its first read goes through the cursors shared with polling clients,
+    # so that streams of the same job neither replace them nor read the full log again.
+    try:
+        if cursor is None:
+            lines, _, cursor = _read_logs_since(job_id, 0)
+        else:
+            lines, cursor = _read_logs(job_id, cursor)
+    except (client.ApiValueError, client.ApiException, MaxRetryError) as e:
+        pprint(str(e))
+        return [], cursor
+    return lines, cursor
+
+
 def status(job_id: str) -> AnyDict:
     xcube_hub_namespace = os.getenv("WORKSPACE_NAMESPACE", "xcube-gen-dev")
-    api_instance = client.BatchV1Api()
+
+    informer = get_informer(_JOBS_INFORMER)
+    if informer is not None:
+        job = informer.get(job_id)
+        return job.status.to_dict() if job is not None and job.status is not None else {}
+
+    api_instance = K8sCfg.batch_v1_api()
     try:
         api_response = api_instance.read_namespaced_job_status(namespace=xcube_hub_namespace, name=job_id)
     except (client.ApiValueError, client.ApiException, MaxRetryError) as e:
@@ -337,7 +800,7 @@ def status(job_id: str) -> AnyDict:
 
 
 def delete_one(cubegen_id: str) -> Union[AnyDict, Error]:
-    api_instance = client.BatchV1Api()
+    api_instance = K8sCfg.batch_v1_api()
     xcube_hub_namespace = os.getenv("WORKSPACE_NAMESPACE", "xcube-gen-dev")
     try:
         api_response = api_instance.delete_namespaced_job(
@@ -349,11 +812,42 @@ def delete_one(cubegen_id: str) -> Union[AnyDict, Error]:
         raise api.ApiError(400, str(e))
 
 
+def label_legacy_jobs() -> List[str]:
+    """
+    Label the cubegen jobs created by previous versions, which carry no user ID label, with the user ID their
+    name starts with, so that they are listed and deleted together with the user's other cubegens. Called at
+    service start-up.
+
+    :return: The names of the jobs labelled
+    """
+    xcube_hub_namespace = os.getenv("WORKSPACE_NAMESPACE", "xcube-gen-dev")
+    api_instance = K8sCfg.batch_v1_api()
+    try:
+        jobs = api_instance.list_namespaced_job(namespace=xcube_hub_namespace,
+                                                label_selector=f"typ=cubegen,!{_USER_ID_LABEL}").items
+    except (ApiException, MaxRetryError) as e:
+        raise api.ApiError(400, str(e))
+
+    labelled = []
+    for job in jobs:
+        match = _JOB_NAME_PATTERN.fullmatch(job.metadata.name)
+        if match is None:
+            continue
+        try:
+            api_instance.patch_namespaced_job(name=job.metadata.name, namespace=xcube_hub_namespace,
+                                              body={'metadata': {'labels': {_USER_ID_LABEL: match.group(1)}}})
+            labelled.append(job.metadata.name)
+        except (ApiException, MaxRetryError) as e:
+            print(f"Warning: could not label cubegen {job.metadata.name}:", str(e))
+
+    return labelled
+
+
 def delete_all(user_id: str):
-    jobs, status_code = list(user_id=user_id)
+    jobs, status_code = list(user_id=user_id, fields=[])
 
     for job in jobs:
-        delete_one(job['cubegen_id'])
+        delete_one(job['job_id'])
 
 
 def create_version(user_id: str) -> \
@@ -365,7 +859,7 @@ def create_version(user_id: str) -> \
 
         job = create_cubegen_version_object(job_id)
 
-        api_instance = client.BatchV1Api()
+        api_instance = K8sCfg.batch_v1_api()
         api_response = api_instance.create_namespaced_job(body=job, namespace=xcube_hub_namespace)
 
         job_result = dict(output=[], status_code=200, status='ok')
@@ -383,9 +877,7 @@ def version(user_id: str):
 
         job, status_code = create_version(user_id=user_id)
 
-        apps_v1_api = client.BatchV1Api()
-        poller.poll_job_status(apps_v1_api.read_namespaced_job_status, namespace=xcube_hub_namespace,
-                               name=job['job_id'])
+        poller.wait_for_job(name=job['job_id'], namespace=xcube_hub_namespace)
 
         job_result = logs(job_id=job['job_id'])
         res = dict(result=[])
@@ -401,15 +893,49 @@ def version(user_id: str):
         raise api.ApiError(400, message=str(e))
 
 
-def info(user_id: str, email: str, body: JsonObject, token: Optional[str] = None) -> Tuple[JsonObject, int]:
+# Cfg entries that do not change the result of an info run
+_INFO_CACHE_IGNORED_KEYS = ('callback_config', 'output_config')
+
+
+def _info_cache_key(cfg: AnyDict) -> str:
+    """
+    Content address of an info run: a hash of the canonical cfg without callback and output configs and of the
+    xcube image performing the run.
+    """
+    cfg = {k: v for k, v in cfg.items() if k not in _INFO_CACHE_IGNORED_KEYS}
+    image = f"{os.getenv('XCUBE_REPO')}:{os.getenv('XCUBE_TAG')}@{os.getenv('XCUBE_HASH')}"
+    canonical = json.dumps(dict(cfg=cfg, image=image), sort_keys=True, separators=(',', ':'), default=str)
+    return 'cubegens_info__' + hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def _get_cached_info(cfg: AnyDict) -> Optional[AnyDict]:
+    ttl = util.maybe_raise_for_env("XCUBE_HUB_CUBEGENS_INFO_CACHE_TTL", default=3600, typ=int)
+    if ttl <= 0:
+        return None
+
+    job_result = KeyValueDatabase.instance().get(_info_cache_key(cfg))
+    if not job_result:
+        return None
+    # The output of the info job is not cached, as the cache is shared by all users
+    return dict(job_result=job_result, output=[])
+
+
+def _run_info_job(user_id: str, email: str, body: JsonObject, token: Optional[str] = None) -> AnyDict:
+    """
+    Run xcube gen2 -i as a job and return its result and output. Successful results are cached without the
+    output, which is empty for cached results.
+    """
+    cached = _get_cached_info(body)
+    if cached is not None:
+        return cached
+
     xcube_hub_result_root_dir = util.maybe_raise_for_env("XCUBE_HUB_RESULT_ROOT_DIR")
 
-    job, status_code = create(user_id=user_id, email=email, cfg=body, info_only=True, token=token)
+    # create() amends the cfg by callback and output settings of the info job which must not leak to the caller
+    job, status_code = create(user_id=user_id, email=email, cfg=copy.deepcopy(body), info_only=True, token=token)
 
-    apps_v1_api = client.BatchV1Api()
     xcube_hub_namespace = maybe_raise_for_env("WORKSPACE_NAMESPACE", "xc-gen")
-    poller.poll_job_status(apps_v1_api.read_namespaced_job_status, namespace=xcube_hub_namespace,
-                           name=job['job_id'])
+    poller.wait_for_job(name=job['job_id'], namespace=xcube_hub_namespace)
 
     state, status_code = get(user_id=user_id, cubegen_id=job['job_id'])
 
@@ -420,10 +946,146 @@ def info(user_id: str, email: str, body: JsonObject, token: Optional[str] = None
 
     job_result = cubegens_result(job_id=job['job_id'], root=xcube_hub_result_root_dir)
 
-    output = state['output']
+    ttl = util.maybe_raise_for_env("XCUBE_HUB_CUBEGENS_INFO_CACHE_TTL", default=3600, typ=int)
+    if ttl > 0 and job_result.get('status_code', 200) == 200 and 'result' in job_result:
+        KeyValueDatabase.instance().set(_info_cache_key(body), job_result, ttl=ttl)
+
+    return dict(job_result=job_result, output=state['output'])
+
+
+def _info_ticket_key(ticket_id: str) -> str:
+    return 'cubegens_info_ticket__' + ticket_id
+
+
+def _info_pending_key(user_id: str, cfg: AnyDict) -> str:
+    # The ticket of a user's info request in progress for a cfg
+    return 'cubegens_info_pending__' + user_id + '__' + _info_cache_key(cfg)
+
+
+def _get_info_executor() -> ThreadPoolExecutor:
+    global _info_executor
+    if _info_executor is None:
+        with _info_executor_lock:
+            if _info_executor is None:
+                max_workers = util.maybe_raise_for_env("XCUBE_HUB_CUBEGENS_INFO_WORKERS", default=4, typ=int)
+                _info_executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='cubegens-info')
+    return _info_executor
+
+
+def _get_num_processes() -> int:
+    try:
+        import uwsgi
+    except ImportError:
+        return 1
+    return uwsgi.numproc
+
+
+def _submit_info_ticket(user_id: str, email: str, body: JsonObject, token: Optional[str] = None) -> str:
+    kvdb = KeyValueDatabase.instance()
+    if not kvdb.is_shared and _get_num_processes() > 1:
+        raise api.ApiError(503, "Asynchronous info requests need a key-value database shared by all processes.")
+
+    # Appending is atomic, so of concurrent identical requests of a user only the first one submits a run
+    ticket_id = uuid.uuid4().hex
+    pending_key = _info_pending_key(user_id, body)
+    if kvdb.append(pending_key, dict(ticket_id=ticket_id)) > 1:
+        pending = kvdb.get_range(pending_key)
+        if pending:
+            return pending[0]['ticket_id']
+
+    kvdb.set(_info_ticket_key(ticket_id), dict(user_id=user_id, status='pending'))
+    _get_info_executor().submit(_run_info_ticket, ticket_id, user_id, email, copy.deepcopy(body), token)
+    return ticket_id
+
+
+def _run_info_ticket(ticket_id: str, user_id: str, email: str, body: JsonObject, token: Optional[str] = None):
+    kvdb = KeyValueDatabase.instance()
+    try:
+        result, status_code = info(user_id=user_id, email=email, body=body, token=token)
+        ticket = dict(user_id=user_id, status='done', status_code=status_code, result=result)
+    except api.ApiError as e:
+        ticket = dict(user_id=user_id, status='error', status_code=e.status_code, message=str(e))
+    except Exception as e:
+        ticket = dict(user_id=user_id, status='error', status_code=400, message=str(e))
+
+    kvdb.set(_info_ticket_key(ticket_id), ticket)
+    kvdb.delete(_info_pending_key(user_id, body))
+
+
+def info(user_id: str, email: str, body: JsonObject, token: Optional[str] = None, asynchronous: bool = False) \
+        -> Tuple[JsonObject, int]:
+    """
+    Estimate the size and costs of a cubegen.
+
+    The dataset description is produced by an xcube gen2 -i job. Its result is cached for
+    XCUBE_HUB_CUBEGENS_INFO_CACHE_TTL seconds (default 3600, 0 disables the cache) keyed by the cfg's content,
+    so that repeated requests for the same cube do not launch another job.
+
+    :param asynchronous: If the result is not cached, run the job in the background and return a ticket with
+        status code 202 immediately. The result is then fetched by get_info_ticket(). At most
+        XCUBE_HUB_CUBEGENS_INFO_WORKERS runs (default 4) are performed at once per process, further ones are
+        queued. A request identical to one of the user still in progress gets the ticket of that one. Tickets are
+        kept in the key-value database, so if the service runs several processes it must be shared by them
+        (redis), otherwise asynchronous requests are rejected with 503.
+    """
+    if asynchronous and _get_cached_info(body) is None:
+        ticket_id = _submit_info_ticket(user_id=user_id, email=email, body=body, token=token)
+        return dict(ticket_id=ticket_id, status='pending'), 202
+
+    info_result = _run_info_job(user_id=user_id, email=email, body=body, token=token)
+
+    job_result = info_result['job_result']
+    output = info_result['output']
 
     processing_request = job_result['result']
 
+    data_store = _get_data_store(body)
+    available = _get_available_punits(email)
+
+    cost_est = costs.get_size_and_cost(processing_request=processing_request, datastore=data_store)
+    required = cost_est['punits']['total_count']
+
+    job_result['result']['cost_estimation'] = dict(required=required, available=available, limit=_get_process_limit())
+    job_result['result']['size_estimation'] = cost_est['size_estimation']
+    job_result['output'] = output
+
+    status_code = job_result['status_code']
+
+    return job_result, status_code
+
+
+def estimate_costs(email: str, body: JsonObject) -> Tuple[JsonObject, int]:
+    """
+    Estimate the costs of many candidate cube configurations of one data store at once, without launching
+    info jobs. The dimensions are derived from the cube configurations, see costs.get_costs().
+
+    At most XCUBE_HUB_MAX_COST_CONFIGS cube configurations (default 1000) are accepted.
+    """
+    cube_configs = get_json_request_value(body, 'cube_configs',
+                                          value_type=Sequence,
+                                          item_type=dict)
+
+    max_cube_configs = util.maybe_raise_for_env("XCUBE_HUB_MAX_COST_CONFIGS", default=1000, typ=int)
+    if len(cube_configs) > max_cube_configs:
+        raise api.ApiError(400, f"Error. At most {max_cube_configs} cube configurations can be estimated at once.")
+
+    data_store = _get_data_store(body)
+    available = _get_available_punits(email)
+    limit = _get_process_limit()
+
+    cost_estimations = []
+    for cost in costs.get_costs(cube_configs=cube_configs, datastore=data_store):
+        cost_estimations.append(dict(dims=cost['dims'],
+                                     num_variables=cost['num_variables'],
+                                     punits=cost['punits'],
+                                     cost_estimation=dict(required=cost['punits']['total_count'],
+                                                          available=available,
+                                                          limit=limit)))
+
+    return dict(costs=cost_estimations), 200
+
+
+def _get_data_store(body: JsonObject) -> JsonObject:
     if 'input_configs' in body:
         input_config = body['input_configs'][0]
     elif 'input_config' in body:
@@ -436,30 +1098,45 @@ def info(user_id: str, email: str, body: JsonObject, token: Optional[str] = None
                                       default_value="")
 
     store_id = store_id.replace('@', '')
-    data_store = Cfg.get_datastore(store_id)
+    return Cfg.get_datastore(store_id)
+
 
+def _get_available_punits(email: str) -> int:
     available = punits.get_punits(user_id=email)
 
     if 'count' not in available:
         raise api.ApiError(400, "Error. Cannot handle punit data. Entry 'count' is missing.")
 
-    cost_est = costs.get_size_and_cost(processing_request=processing_request, datastore=data_store)
-    required = cost_est['punits']['total_count']
+    return available['count']
+
 
+def _get_process_limit() -> int:
     limit = os.getenv("XCUBE_HUB_PROCESS_LIMIT", 1000)
 
     try:
-        limit = int(float(limit))
+        return int(float(limit))
     except ValueError as e:
         raise api.ApiError(400, str(e))
 
-    job_result['result']['cost_estimation'] = dict(required=required, available=available['count'], limit=int(limit))
-    job_result['result']['size_estimation'] = cost_est['size_estimation']
-    job_result['output'] = output
 
-    status_code = job_result['status_code']
+def get_info_ticket(user_id: str, ticket_id: str) -> Tuple[JsonObject, int]:
+    """
+    Get the result of an asynchronous info request. Returns the ticket with status code 202 while the
+    request is pending. Results are kept for a day, as identical requests of a user share their ticket.
+    """
+    kvdb = KeyValueDatabase.instance()
+    ticket = kvdb.get(_info_ticket_key(ticket_id))
 
-    return job_result, status_code
+    if not ticket or ticket['user_id'] != user_id:
+        raise api.ApiError(404, f"Info ticket {ticket_id} not found")
+
+    if ticket['status'] == 'pending':
+        return dict(ticket_id=ticket_id, status='pending'), 202
+
+    if ticket['status'] == 'error':
+        raise api.ApiError(ticket['status_code'], ticket['message'])
+
+    return ticket['result'], ticket['status_code']
 
 
 def process_user_code(cfg: CubegenConfig, user_code: Optional[FileStorage] = None):
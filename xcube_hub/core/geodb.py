@@ -1,7 +1,6 @@
-import requests
 from requests import HTTPError
 
-from xcube_hub import api, util
+from xcube_hub import api, util, httpclient
 from xcube_hub.core import oauth
 from xcube_hub.models.subscription import Subscription
 
@@ -27,7 +26,7 @@ def register(subscription: Subscription, raise_on_exist: bool = True):
     token = oauth.get_token(oauth_token)
     headers = {'Authorization': f'Bearer {token}'}
 
-    r = requests.post(f"{server_url}/geodb_user_info", json=user, headers=headers)
+    r = httpclient.post(f"{server_url}/geodb_user_info", json=user, headers=headers)
 
     try:
         r.raise_for_status()
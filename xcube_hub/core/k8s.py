@@ -1,15 +1,60 @@
 import base64
-from typing import Optional, Sequence, Union, Dict
+import os
+from typing import Optional, Sequence, Union, Dict, Callable, Any
 from kubernetes import client
 from kubernetes.client import V1Pod, V1PodList, ApiException, ApiTypeError, ApiValueError, \
     CoreV1Api, V1ServiceBackendPort
+from kubernetes.utils import parse_quantity
+from xcube_hub.informer import Informer, wait_until_synced
+from xcube_hub.k8scfg import K8sCfg
 from xcube_hub.typedefs import JsonObject
 
-from xcube_hub import api
+from xcube_hub import api, util
+
+_INFORMER_LIST_FUNCS = {
+    'deployments': lambda: K8sCfg.apps_v1_api().list_namespaced_deployment,
+    'services': lambda: K8sCfg.core_v1_api().list_namespaced_service,
+    'ingresses': lambda: K8sCfg.networking_v1_api().list_namespaced_ingress,
+    'pods': lambda: K8sCfg.core_v1_api().list_namespaced_pod,
+}
+
+_INFORMER_INDEX_LABELS = {
+    'pods': ('app',),
+}
+
+
+def get_informer(kind: str, namespace: str) -> Optional[Informer]:
+    """
+    Return the informer caching the deployments, services, ingresses or pods of a namespace, if informers are enabled by
+    setting XCUBE_HUB_K8S_INFORMER=1 and the informer's cache has synced. The informers are started on first use
+    and shared by all callers. Returns None otherwise, in which case callers request the Kubernetes API directly.
+
+    :param kind: One of 'deployments', 'services', 'ingresses' and 'pods'
+    :param namespace: The namespace
+    """
+    if os.getenv("XCUBE_HUB_K8S_INFORMER", "0") != "1":
+        return None
+
+    sync_timeout = util.maybe_raise_for_env("XCUBE_HUB_K8S_INFORMER_SYNC_TIMEOUT", default=5, typ=float)
+    informer = Informer.instance(f'k8s-{kind}-{namespace}',
+                                 factory=lambda: Informer(_INFORMER_LIST_FUNCS[kind](), namespace=namespace,
+                                                          index_labels=_INFORMER_INDEX_LABELS.get(kind, ())))
+    return wait_until_synced(informer, timeout=sync_timeout)
+
+
+def _read_namespaced(read_func: Callable, kind: str, name: str, namespace: str) -> Optional[Any]:
+    try:
+        return read_func(name=name, namespace=namespace)
+    except ApiException as e:
+        if e.status == 404:
+            return None
+        raise api.ApiError(400, f"Error when reading the {kind} {name} in namespace {namespace}: {str(e)}")
+    except (ApiTypeError, ApiValueError) as e:
+        raise api.ApiError(400, f"Error when reading the {kind} {name} in namespace {namespace}: {str(e)}")
 
 
 def get_secret(name: str, secret_item: str, namespace: str, v1_client: Optional[CoreV1Api] = None) -> str:
-    v1_client = v1_client or client.CoreV1Api()
+    v1_client = v1_client or K8sCfg.core_v1_api()
 
     try:
         secret = v1_client.read_namespaced_secret(name=name, namespace=namespace)
@@ -53,24 +98,21 @@ def create_pvc_object(user_id: str, storage: str = '2Gi'):
 
 
 def create_pvc(pvc: client.V1PersistentVolumeClaim, namespace: str, core_api: Optional[client.CoreV1Api] = None):
-    core_v1_api = core_api or client.CoreV1Api()
+    core_v1_api = core_api or K8sCfg.core_v1_api()
     try:
         core_v1_api.create_namespaced_persistent_volume_claim(namespace=namespace, body=pvc)
     except (ApiException, ApiTypeError) as e:
         raise api.ApiError(400, f"Error when creating the pvc {pvc.metadata.name}: {str(e)}")
 
 
-def create_pvc_if_not_exists(pvc: client.V1PersistentVolumeClaim, namespace: str):
-    core_v1_api = client.CoreV1Api()
+def create_pvc_if_not_exists(pvc: client.V1PersistentVolumeClaim, namespace: str,
+                             core_api: Optional[client.CoreV1Api] = None):
+    core_v1_api = core_api or K8sCfg.core_v1_api()
 
-    try:
-        pvcs = core_v1_api.list_namespaced_persistent_volume_claim(namespace=namespace)
-    except (ApiException, ApiTypeError, ApiValueError) as e:
-        raise api.ApiError(400, f"Error when creating the pvc {pvc.metadata.name}: {str(e)}")
-
-    pvcs = [pvc.metadata.name for pvc in pvcs.items]
-    if len(pvcs) == 0:
-        create_pvc(pvc, namespace=namespace)
+    existing = _read_namespaced(core_v1_api.read_namespaced_persistent_volume_claim, 'pvc',
+                                name=pvc.metadata.name, namespace=namespace)
+    if existing is None:
+        create_pvc(pvc, namespace=namespace, core_api=core_api)
         return True
 
     return False
@@ -134,7 +176,7 @@ def create_goofys_daemonset(daemonset: client.V1DaemonSet,
                             namespace: str = 'default',
                             core_api: Optional[client.AppsV1Api] = None):
     # Create deployment
-    apps_v1_api = core_api or client.AppsV1Api()
+    apps_v1_api = core_api or K8sCfg.apps_v1_api()
     try:
         api_response = apps_v1_api.create_namespaced_daemon_set(
             body=daemonset,
@@ -145,24 +187,20 @@ def create_goofys_daemonset(daemonset: client.V1DaemonSet,
 
 
 def list_goofys_daemonsets(namespace: str, core_api: Optional[client.AppsV1Api] = None):
-    api_instance = core_api or client.AppsV1Api()
+    api_instance = core_api or K8sCfg.apps_v1_api()
     try:
         return api_instance.list_namespaced_daemon_set(namespace)
     except (ApiException, ApiTypeError, ApiValueError) as e:
         raise api.ApiError(400, f"Error when listing daemonsets in namespace {namespace}: {str(e)}")
 
 
-def get_goofys_daemonset(namespace: str, name: str):
-    daemonsets = list_goofys_daemonsets(namespace=namespace)
-    for daemonset in daemonsets.items:
-        if daemonset.metadata.name == name:
-            return daemonset
-
-    return None
+def get_goofys_daemonset(namespace: str, name: str, core_api: Optional[client.AppsV1Api] = None):
+    apps_v1_api = core_api or K8sCfg.apps_v1_api()
+    return _read_namespaced(apps_v1_api.read_namespaced_daemon_set, 'daemonset', name=name, namespace=namespace)
 
 
 def delete_goofys_daemonset(name: str, namespace: str = 'default', core_api: Optional[client.AppsV1Api] = None):
-    apps_v1_api = core_api or client.AppsV1Api()
+    apps_v1_api = core_api or K8sCfg.apps_v1_api()
 
     try:
         api_response = apps_v1_api.delete_namespaced_daemon_set(
@@ -256,7 +294,7 @@ def create_deployment(deployment: client.V1Deployment,
                       namespace: str = 'default',
                       core_api: Optional[client.AppsV1Api] = None):
     # Create deployment
-    apps_v1_api = core_api or client.AppsV1Api()
+    apps_v1_api = core_api or K8sCfg.apps_v1_api()
     try:
         api_response = apps_v1_api.create_namespaced_deployment(
             body=deployment,
@@ -276,7 +314,7 @@ def create_deployment_if_not_exists(namespace: str, deployment: client.V1Deploym
 
 
 def delete_deployment(name: str, namespace: str = 'default', core_api: Optional[client.AppsV1Api] = None):
-    apps_v1_api = core_api or client.AppsV1Api()
+    apps_v1_api = core_api or K8sCfg.apps_v1_api()
 
     try:
         api_response = apps_v1_api.delete_namespaced_deployment(
@@ -291,21 +329,36 @@ def delete_deployment(name: str, namespace: str = 'default', core_api: Optional[
 
 
 def list_deployments(namespace: str, core_api: Optional[client.AppsV1Api] = None):
-    api_instance = core_api or client.AppsV1Api()
+    api_instance = core_api or K8sCfg.apps_v1_api()
     try:
         return api_instance.list_namespaced_deployment(namespace)
     except (ApiException, ApiTypeError, ApiValueError) as e:
         raise api.ApiError(400, f"Error when listing deployment in namespace {namespace}: {str(e)}")
 
 
-def get_deployment(namespace: str, name: str):
-    deployments = list_deployments(namespace=namespace)
+def get_deployment(namespace: str, name: str, cached: bool = False, core_api: Optional[client.AppsV1Api] = None):
+    """
+    Get a deployment by name, or None if it does not exist.
+
+    :param cached: Look the deployment up in the informer cache if enabled (see get_informer()). The cache may
+        lag behind recent changes, so callers that act on the answer should not use it.
+    """
+    informer = get_informer('deployments', namespace) if cached else None
+    if informer is not None:
+        return informer.get(name)
 
-    for deployment in deployments.items:
-        if deployment.metadata.name == name:
-            return deployment
+    apps_v1_api = core_api or K8sCfg.apps_v1_api()
+    return _read_namespaced(apps_v1_api.read_namespaced_deployment, 'deployment', name=name, namespace=namespace)
 
-    return None
+
+def scale_deployment(name: str, replicas: int, namespace: str = 'default',
+                     core_api: Optional[client.AppsV1Api] = None):
+    apps_v1_api = core_api or K8sCfg.apps_v1_api()
+    try:
+        apps_v1_api.patch_namespaced_deployment_scale(name=name, namespace=namespace,
+                                                      body={'spec': {'replicas': replicas}})
+    except (ApiException, ApiTypeError) as e:
+        raise api.ApiError(400, f"Error when scaling the deployment {name}: {str(e)}")
 
 
 def create_service_object(name: str, port: int, target_port: int):
@@ -322,7 +375,7 @@ def create_service_object(name: str, port: int, target_port: int):
 
 
 def create_service(service, namespace: str = 'default', core_api: Optional[client.CoreV1Api] = None):
-    api_instance = core_api or client.CoreV1Api()
+    api_instance = core_api or K8sCfg.core_v1_api()
     try:
         api_instance.create_namespaced_service(namespace=namespace, body=service)
     except (ApiException, ApiTypeError) as e:
@@ -335,25 +388,46 @@ def create_service_if_not_exists(service, namespace: str = 'default'):
 
 
 def delete_service(name: str, namespace: str = 'default', core_api: Optional[client.CoreV1Api] = None):
-    api_instance = core_api or client.CoreV1Api()
+    api_instance = core_api or K8sCfg.core_v1_api()
     try:
         api_instance.delete_namespaced_service(name=name, namespace=namespace)
     except (ApiException, ApiTypeError) as e:
         raise api.ApiError(400, f"Error when deleting the service {name}: {str(e)}")
 
 
+def patch_service(name: str, body, namespace: str = 'default', core_api: Optional[client.CoreV1Api] = None):
+    api_instance = core_api or K8sCfg.core_v1_api()
+    try:
+        api_instance.patch_namespaced_service(name=name, namespace=namespace, body=body)
+    except (ApiException, ApiTypeError) as e:
+        raise api.ApiError(400, f"Error when patching the service {name}: {str(e)}")
+
+
 def list_services(namespace: str = 'default', core_api: Optional[client.CoreV1Api] = None):
-    api_instance = core_api or client.CoreV1Api()
+    api_instance = core_api or K8sCfg.core_v1_api()
     try:
         return api_instance.list_namespaced_service(namespace=namespace)
     except (ApiException, ApiTypeError) as e:
         raise api.ApiError(400, f"Error when listing services in namespace {namespace}: {str(e)}")
 
 
-def has_service(name: str, namespace: str = 'default'):
-    services = list_services(namespace=namespace)
-    services = [service.metadata.name for service in services.items]
-    return name in services
+def get_service(name: str, namespace: str = 'default', cached: bool = False,
+                core_api: Optional[client.CoreV1Api] = None) -> Optional[client.V1Service]:
+    """
+    Get a service by name, or None if it does not exist.
+
+    :param cached: Look the service up in the informer cache if enabled, see get_deployment()
+    """
+    informer = get_informer('services', namespace) if cached else None
+    if informer is not None:
+        return informer.get(name)
+
+    api_instance = core_api or K8sCfg.core_v1_api()
+    return _read_namespaced(api_instance.read_namespaced_service, 'service', name=name, namespace=namespace)
+
+
+def has_service(name: str, namespace: str = 'default', cached: bool = False):
+    return get_service(name, namespace=namespace, cached=cached) is not None
 
 
 def create_ingress_object(name: str,
@@ -397,7 +471,7 @@ def create_ingress(ingress: client.V1Ingress, namespace: str = 'default',
     # Creation of the Deployment in specified namespace
     # (Can replace "default" with a namespace you may have created)
 
-    networking_v1_beta1_api = core_api or client.NetworkingV1Api()
+    networking_v1_beta1_api = core_api or K8sCfg.networking_v1_api()
 
     try:
         networking_v1_beta1_api.create_namespaced_ingress(
@@ -412,7 +486,7 @@ def patch_ingress(name: str, body, namespace: str = 'default', core_api: Optiona
     # Creation of the Deployment in specified namespace
     # (Can replace "default" with a namespace you may have created)
 
-    networking_v1_beta1_api = core_api or client.NetworkingV1Api()
+    networking_v1_beta1_api = core_api or K8sCfg.networking_v1_api()
     try:
         networking_v1_beta1_api.patch_namespaced_ingress(
             name=name,
@@ -424,17 +498,36 @@ def patch_ingress(name: str, body, namespace: str = 'default', core_api: Optiona
 
 
 def create_ingress_if_not_exists(ingress, namespace: str = 'default'):
-    ingresses = list_ingresses(namespace=namespace)
-    ingresses = [ingress.metadata.name for ingress in ingresses.items]
-    if len(ingresses) == 0:
+    if get_ingress(namespace=namespace, name=ingress.metadata.name) is None:
+        create_ingress(ingress, namespace)
+
+
+def create_or_patch_ingress(ingress: client.V1Ingress, namespace: str = 'default'):
+    """
+    Create an ingress, or patch the rules and annotations of an existing one of the same name. Annotations of
+    the existing ingress that are missing in ingress are removed.
+    """
+    existing = get_ingress(namespace=namespace, name=ingress.metadata.name)
+    if existing is None:
         create_ingress(ingress, namespace)
+        return
+
+    annotations = dict(ingress.metadata.annotations or {})
+    for key in (existing.metadata.annotations or {}):
+        annotations.setdefault(key, None)
+
+    body = {
+        'metadata': {'annotations': annotations},
+        'spec': K8sCfg.api_client().sanitize_for_serialization(ingress.spec),
+    }
+    patch_ingress(ingress.metadata.name, body=body, namespace=namespace)
 
 
 def delete_ingress(name, namespace: str = 'default', core_api: Optional[client.NetworkingV1Api] = None):
     # Creation of the Deployment in specified namespace
     # (Can replace "default" with a namespace you may have created)
 
-    networking_v1_beta1_api = core_api or client.NetworkingV1Api()
+    networking_v1_beta1_api = core_api or K8sCfg.networking_v1_api()
     try:
         networking_v1_beta1_api.delete_namespaced_ingress(
             namespace=namespace,
@@ -448,36 +541,55 @@ def list_ingresses(namespace: str = 'default', core_api: Optional[client.Network
     # Creation of the Deployment in specified namespace
     # (Can replace "default" with a namespace you may have created)
 
-    networking_v1_beta1_api = core_api or client.NetworkingV1Api()
+    networking_v1_beta1_api = core_api or K8sCfg.networking_v1_api()
     try:
         return networking_v1_beta1_api.list_namespaced_ingress(namespace=namespace)
     except (ApiException, ApiTypeError) as e:
         raise api.ApiError(400, f"Error when listing ingresses in namespace {namespace}: {str(e)}")
 
 
-def get_ingress(namespace: str, name: str) -> Optional[client.V1Ingress]:
-    ingresses = list_ingresses(namespace=namespace)
-    for ingress in ingresses.items:
-        if ingress.metadata.name == name:
-            return ingress
+def get_ingress(namespace: str, name: str, cached: bool = False,
+                core_api: Optional[client.NetworkingV1Api] = None) -> Optional[client.V1Ingress]:
+    """
+    Get an ingress by name, or None if it does not exist.
 
-    return None
+    :param cached: Look the ingress up in the informer cache if enabled, see get_deployment()
+    """
+    informer = get_informer('ingresses', namespace) if cached else None
+    if informer is not None:
+        return informer.get(name)
 
+    networking_v1_api = core_api or K8sCfg.networking_v1_api()
+    return _read_namespaced(networking_v1_api.read_namespaced_ingress, 'ingress', name=name, namespace=namespace)
 
-def get_pod(prefix: str, namespace: Optional[str] = None, label_selector: str = None) -> Optional[V1Pod]:
-    pods = list_pods(namespace=namespace, label_selector=label_selector)
 
-    res = None
-    for pod in pods.items:
-        if pod.metadata.name.startswith(prefix):
-            res = pod
+def get_pod(prefix: str, namespace: Optional[str] = None, label_selector: str = None,
+            cached: bool = False) -> Optional[V1Pod]:
+    """
+    Get the newest pod whose name starts with prefix. Pods being deleted are skipped.
+    """
+    pods = [pod for pod in list_pods(namespace=namespace, label_selector=label_selector, cached=cached).items
+            if pod.metadata.name.startswith(prefix) and pod.metadata.deletion_timestamp is None]
+    # Neither the API nor the informer cache lists pods by age
+    pods.sort(key=lambda p: (p.metadata.creation_timestamp is not None, p.metadata.creation_timestamp))
 
-    return res
+    return pods[-1] if pods else None
 
 
 def list_pods(namespace: Optional[str] = None, label_selector: str = None,
-              core_api: Optional[client.CoreV1Api] = None) -> V1PodList:
-    v1 = core_api or client.CoreV1Api()
+              core_api: Optional[client.CoreV1Api] = None, cached: bool = False) -> V1PodList:
+    """
+    List the pods of a namespace, or of all namespaces if namespace is None.
+
+    :param cached: List the pods from the informer cache if enabled, see get_deployment(). Only namespaced
+        lookups with equality label selectors ("key=value,...") are cached.
+    """
+    labels = _parse_label_selector(label_selector) if cached and namespace else None
+    informer = get_informer('pods', namespace) if labels is not None else None
+    if informer is not None:
+        return V1PodList(items=informer.list(**labels))
+
+    v1 = core_api or K8sCfg.core_v1_api()
 
     try:
         if namespace:
@@ -496,14 +608,64 @@ def list_pods(namespace: Optional[str] = None, label_selector: str = None,
     return pods
 
 
-def count_pods(namespace: Optional[str] = None, label_selector: str = None) -> int:
-    pods = list_pods(namespace=namespace, label_selector=label_selector)
+def count_pods(namespace: Optional[str] = None, label_selector: str = None, cached: bool = False) -> int:
+    pods = list_pods(namespace=namespace, label_selector=label_selector, cached=cached)
     if pods:
         return len(pods.items)
     else:
         return 0
 
 
+def _parse_label_selector(label_selector: Optional[str]) -> Optional[Dict[str, str]]:
+    # Returns None for selectors other than equality selectors
+    labels = dict()
+    for term in (label_selector or '').split(','):
+        if not term:
+            continue
+        key, sep, value = term.partition('=')
+        if not sep or not key or '!' in key or value.startswith('=') or ' ' in term:
+            return None
+        labels[key] = value
+    return labels
+
+
+def get_pod_memory_usage(name: str, namespace: str = 'default',
+                         core_api: Optional[client.CustomObjectsApi] = None) -> Optional[int]:
+    """
+    Get the memory used by the containers of a pod in bytes from the metrics API, or None if the pod or its
+    metrics are not available, e.g. if no metrics server is installed.
+    """
+    api_instance = core_api or K8sCfg.api(client.CustomObjectsApi)
+    try:
+        metrics = api_instance.get_namespaced_custom_object(group='metrics.k8s.io', version='v1beta1',
+                                                            namespace=namespace, plural='pods', name=name)
+    except (ApiException, ApiTypeError):
+        return None
+
+    return sum(int(parse_quantity(container['usage']['memory'])) for container in metrics.get('containers', []))
+
+
+def patch_pod(name: str, body, namespace: str = 'default', core_api: Optional[client.CoreV1Api] = None) -> V1Pod:
+    """
+    Patch a pod. If body contains metadata.resourceVersion, the patch fails with an ApiError 409 if the pod has
+    been modified since.
+    """
+    v1 = core_api or K8sCfg.core_v1_api()
+    try:
+        return v1.patch_namespaced_pod(name=name, namespace=namespace, body=body)
+    except (ApiException, ApiTypeError) as e:
+        status = 409 if isinstance(e, ApiException) and e.status == 409 else 400
+        raise api.ApiError(status, f"Error when patching the pod {name}: {str(e)}")
+
+
+def delete_pod(name: str, namespace: str = 'default', core_api: Optional[client.CoreV1Api] = None):
+    v1 = core_api or K8sCfg.core_v1_api()
+    try:
+        v1.delete_namespaced_pod(name=name, namespace=namespace, grace_period_seconds=5)
+    except (ApiException, ApiTypeError) as e:
+        raise api.ApiError(400, f"Error when deleting the pod {name}: {str(e)}")
+
+
 def create_configmap_object(name: str, data: JsonObject) -> client.V1ConfigMap:
     return client.V1ConfigMap(metadata=client.V1ObjectMeta(name=name), data=data)
 
@@ -513,7 +675,7 @@ def create_configmap(namespace: str, body: client.V1ConfigMap, core_api: Optiona
     # (Can replace "default" with a namespace you may have created)
 
     try:
-        core_api = core_api or client.CoreV1Api()
+        core_api = core_api or K8sCfg.core_v1_api()
         core_api.create_namespaced_config_map(namespace=namespace, body=body)
     except (ApiException, ApiValueError) as e:
         raise api.ApiError(400,
@@ -0,0 +1,246 @@
+"""
+Ledger of the processing units of users.
+
+The balance of a user is stored in the user data 'punits'. It is updated by compare-and-swap: the balance is
+written only if it has not been modified since it was read (S3 conditional write on its ETag), otherwise the
+update is retried with the current balance. Concurrent updates therefore never lose a transaction.
+
+Every update is recorded as an immutable transaction 'punits_ledger/tx/<seq>' numbered by the balance's
+sequence number 'seq'. The balance also keeps its last transaction. Transactions only keep the punits of a
+request, not the dataset descriptor or data store it was computed from. They are periodically compacted into
+monthly segments 'punits_ledger/segments/<YYYY-MM>', so that the number of objects stays small and a time
+range is read from few objects. The size of a write does not depend on the number of past transactions.
+
+Balances written by previous versions embed the history as list. It is moved into segments on their first
+update, numbered from -len(history) to -1.
+"""
+
+import datetime
+from typing import List, Optional, Dict, Tuple
+
+from xcube_hub import api, util
+from xcube_hub.database import Database, DatabaseConflict
+from xcube_hub.typedefs import AnyDict, JsonObject
+
+BALANCE_DATASET = 'punits'
+
+_TX_PREFIX = 'punits_ledger/tx/'
+_SEGMENT_PREFIX = 'punits_ledger/segments/'
+
+_OPS = ('add', 'sub', 'override')
+
+
+def update(user_id: str, op: str, count: int, request: JsonObject) -> JsonObject:
+    """
+    Add, subtract or override the punits of a user.
+
+    Updates are retried at most XCUBE_HUB_PUNITS_MAX_ATTEMPTS times (default 10) if they conflict with
+    concurrent updates.
+
+    :return: The new balance
+    :raise ApiError: 400 if the balance would become negative, 409 if concurrent updates keep conflicting
+    """
+    if op not in _OPS:
+        raise api.ApiError(400, f'Unknown punits operation {op}.')
+
+    database = Database.instance()
+    max_attempts = util.maybe_raise_for_env("XCUBE_HUB_PUNITS_MAX_ATTEMPTS", default=10, typ=int)
+
+    revalidate = False
+    for _ in range(max_attempts):
+        # A cached balance may be stale, in which case the write fails and it is read again
+        balance, etag = database.get_user_data_with_etag(user_id, BALANCE_DATASET, revalidate=revalidate)
+        balance = dict(balance or {})
+
+        history = balance.pop('history', None)
+        if history is not None:
+            _migrate_history(user_id, history)
+
+        count_old = balance.get('count', 0)
+        if op == 'add':
+            count_new = count_old + count
+        elif op == 'sub':
+            count_new = count_old - count
+        else:
+            count_new = count
+
+        if count_new < 0:
+            if not revalidate:
+                # Only a current balance is known to be insufficient
+                revalidate = True
+                continue
+            raise api.ApiError(400, 'Out of processing units.')
+
+        seq = balance.get('seq', 0) + 1
+        tx = _new_transaction(seq=seq,
+                              ts=datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                              op=op,
+                              count=count,
+                              balance=count_new,
+                              request=request)
+        balance.update(count=count_new, seq=seq, last_transaction=tx)
+
+        try:
+            database.put_user_data(user_id, BALANCE_DATASET, balance,
+                                   if_match=etag,
+                                   if_none_match='*' if etag is None else None)
+        except DatabaseConflict:
+            revalidate = True
+            continue
+
+        # seq is owned by this update, nobody else writes this transaction
+        database.put_user_data(user_id, _tx_name(seq), tx)
+        _maybe_compact(user_id, seq)
+        return balance
+
+    raise api.ApiError(409, 'Processing units are being updated concurrently. Please try again.')
+
+
+def get_transactions(user_id: str, balance: Optional[JsonObject] = None, start: Optional[str] = None,
+                     end: Optional[str] = None) -> List[AnyDict]:
+    """
+    Get the transactions of a user in ascending order.
+
+    :param balance: The balance of the user if already read
+    :param start: Only transactions at or after this time ("YYYY-MM-DD" or "YYYY-MM-DD hh:mm:ss")
+    :param end: Only transactions before this time
+    """
+    database = Database.instance()
+    if balance is None:
+        balance = database.get_user_data(user_id, BALANCE_DATASET) or dict()
+
+    if 'history' in balance:
+        # Not updated since previous versions
+        transactions = _from_legacy(balance['history'])
+    else:
+        by_seq = dict()
+        for name in database.list_user_data(user_id, _SEGMENT_PREFIX):
+            month = name[len(_SEGMENT_PREFIX):]
+            if (start is None or month >= start[:7]) and (end is None or month <= end[:7]):
+                segment = database.get_user_data(user_id, name) or dict()
+                by_seq.update((tx['seq'], tx) for tx in segment.get('transactions', []))
+
+        for name in database.list_user_data(user_id, _TX_PREFIX):
+            if _seq_of(name) not in by_seq:
+                tx = database.get_user_data(user_id, name)
+                if tx is not None:
+                    by_seq[tx['seq']] = tx
+
+        # The transaction of the balance is missing if the update was interrupted before writing it
+        last_tx = balance.get('last_transaction')
+        if last_tx is not None:
+            by_seq.setdefault(last_tx['seq'], last_tx)
+
+        transactions = [by_seq[seq] for seq in sorted(by_seq)]
+
+    return [tx for tx in transactions
+            if (start is None or tx['ts'] >= start) and (end is None or tx['ts'] < end)]
+
+
+def get_history(user_id: str, start: Optional[str] = None, end: Optional[str] = None, limit: int = 100,
+                cursor: Optional[int] = None) -> AnyDict:
+    """
+    Get a page of the transactions of a user between start and end, newest first, and the punits added,
+    subtracted and overridden per day and operation.
+
+    :param start: Only transactions at or after this time ("YYYY-MM-DD" or "YYYY-MM-DD hh:mm:ss")
+    :param end: Only transactions before this time
+    :param limit: Maximum number of transactions
+    :param cursor: The next_cursor of the previous page
+    :return: dict(transactions=..., totals=..., next_cursor=...). next_cursor is None on the last page.
+    """
+    transactions = get_transactions(user_id, start=start, end=end)
+
+    totals: Dict[Tuple[str, str], AnyDict] = dict()
+    for tx in transactions:
+        total = totals.setdefault((tx['ts'][:10], tx['op']), dict(date=tx['ts'][:10], op=tx['op'], count=0,
+                                                                  transactions=0))
+        total['count'] += tx['count'] or 0
+        total['transactions'] += 1
+
+    newest_first = [tx for tx in reversed(transactions) if cursor is None or tx['seq'] < cursor]
+    page = newest_first[:limit]
+    next_cursor = page[-1]['seq'] if len(newest_first) > limit else None
+
+    return dict(transactions=page,
+                totals=[totals[key] for key in sorted(totals)],
+                next_cursor=next_cursor)
+
+
+def compact(user_id: str, until_seq: int):
+    """
+    Merge the transactions of a user up to until_seq into their monthly segments, and delete them.
+    """
+    database = Database.instance()
+    names = [name for name in database.list_user_data(user_id, _TX_PREFIX) if _seq_of(name) <= until_seq]
+    if not names:
+        return
+
+    transactions = [database.get_user_data(user_id, name) for name in names]
+    _merge_into_segments(user_id, [tx for tx in transactions if tx is not None])
+
+    for name in names:
+        database.delete_user_data(user_id, name)
+
+
+def _maybe_compact(user_id: str, seq: int):
+    # Transactions are compacted an interval behind, so that updates that have swapped the balance but not yet
+    # written their transaction are not missed
+    interval = util.maybe_raise_for_env("XCUBE_HUB_PUNITS_COMPACTION_INTERVAL", default=10, typ=int)
+    if interval > 0 and seq % interval == 0 and seq > interval:
+        compact(user_id, seq - interval)
+
+
+def _merge_into_segments(user_id: str, transactions: List[AnyDict]):
+    database = Database.instance()
+    max_attempts = util.maybe_raise_for_env("XCUBE_HUB_PUNITS_MAX_ATTEMPTS", default=10, typ=int)
+
+    by_month: Dict[str, List[AnyDict]] = dict()
+    for tx in transactions:
+        by_month.setdefault(tx['ts'][:7], []).append(tx)
+
+    for month, month_transactions in by_month.items():
+        name = _SEGMENT_PREFIX + month
+        # Segments are merged by compare-and-swap as well, as several processes may compact at the same time
+        for attempt in range(max_attempts):
+            segment, etag = database.get_user_data_with_etag(user_id, name, revalidate=attempt > 0)
+            by_seq = {tx['seq']: tx for tx in (segment or dict()).get('transactions', [])}
+            by_seq.update((tx['seq'], tx) for tx in month_transactions)
+            try:
+                database.put_user_data(user_id, name, dict(transactions=[by_seq[seq] for seq in sorted(by_seq)]),
+                                       if_match=etag,
+                                       if_none_match='*' if etag is None else None)
+                break
+            except DatabaseConflict:
+                continue
+        else:
+            raise api.ApiError(409, 'Processing units are being updated concurrently. Please try again.')
+
+
+def _migrate_history(user_id: str, history: List):
+    _merge_into_segments(user_id, _from_legacy(history))
+
+
+def _new_transaction(seq: int, ts: str, op: str, count: Optional[int], balance: Optional[int],
+                     request: JsonObject) -> AnyDict:
+    punits = request.get('punits') if isinstance(request, dict) else None
+    return dict(seq=seq, ts=ts, op=op, count=count, balance=balance,
+                punits=punits if isinstance(punits, dict) else None)
+
+
+def _from_legacy(history: List) -> List[AnyDict]:
+    # The legacy history is newest first
+    transactions = []
+    for index, (ts, op, request) in enumerate(reversed(history)):
+        punits = request.get('punits', {}) if isinstance(request, dict) else {}
+        transactions.append(_new_transaction(seq=index - len(history), ts=ts, op=op,
+                                             count=punits.get('total_count'), balance=None, request=request))
+    return transactions
+
+
+def _tx_name(seq: int) -> str:
+    return _TX_PREFIX + '%012d' % seq
+
+
+def _seq_of(name: str) -> int:
+    return int(name.rsplit('/', 1)[1])
@@ -1,13 +1,17 @@
 import datetime
+import hashlib
+import hmac
 import os
-from typing import Sequence, Dict, Optional
+import threading
+import time
+from typing import Sequence, Dict, Optional, Tuple
 from requests.exceptions import HTTPError
 
-import requests
 from jose import jwt
 from werkzeug.exceptions import Unauthorized
 
-from xcube_hub import api, util
+from xcube_hub import api, util, httpclient
+from xcube_hub.cache import LruCache
 from xcube_hub.core import users
 from xcube_hub.models.oauth_token import OauthToken
 from xcube_hub.models.user import User
@@ -18,7 +22,7 @@ def get_user_by_credentials(token: str, client_id: str, client_secret: str) -> S
     q = f'(user_metadata.client_id: "{client_id}") AND (user_metadata.client_secret: "{client_secret}")'
     headers = {'Authorization': f"Bearer {token}"}
 
-    r = requests.get('https://edc.eu.auth0.com/api/v2/users', params={'q': q}, headers=headers)
+    r = httpclient.get('https://edc.eu.auth0.com/api/v2/users', params={'q': q}, headers=headers)
 
     if r.status_code < 200 or r.status_code >= 300:
         raise api.ApiError(400, r.text)
@@ -32,8 +36,44 @@ def get_user_by_credentials(token: str, client_id: str, client_secret: str) -> S
     return res
 
 
+# Management tokens are renewed this number of seconds before they expire
+_MANAGEMENT_TOKEN_EXPIRY_MARGIN = 60
+
+_MANAGEMENT_TOKENS = LruCache(maxsize=16)
+_MANAGEMENT_TOKEN_LOCK = threading.Lock()
+
+# Users and permissions by client ID. Entries are also dropped by invalidate_client() if a subscription changes.
+_CLIENT_USERS = LruCache(maxsize=1024)
+
+
 def _get_management_token(client_id: Optional[str] = None, client_secret: Optional[str] = None,
                           aud: Optional[str] = None):
+    """
+    Get an Auth0 management API token. The token for the service's own credentials (no client_id and
+    client_secret given) is cached until shortly before it expires.
+    """
+    if client_id is not None or client_secret is not None:
+        return _request_management_token(client_id=client_id, client_secret=client_secret, aud=aud)[0]
+
+    key = (os.environ.get("AUTH0_USER_MANAGEMENT_CLIENT_ID"), aud or os.getenv("XCUBE_HUB_OAUTH_USER_MANAGEMENT_AUD"))
+    token = _MANAGEMENT_TOKENS.get(key)
+    if token is not None:
+        return token
+
+    # Concurrent requests wait for a single token request instead of each asking Auth0
+    with _MANAGEMENT_TOKEN_LOCK:
+        token = _MANAGEMENT_TOKENS.get(key)
+        if token is not None:
+            return token
+
+        token, expires_in = _request_management_token(aud=aud)
+        if expires_in is not None:
+            _MANAGEMENT_TOKENS.put(key, token, expires_at=time.time() + expires_in - _MANAGEMENT_TOKEN_EXPIRY_MARGIN)
+        return token
+
+
+def _request_management_token(client_id: Optional[str] = None, client_secret: Optional[str] = None,
+                              aud: Optional[str] = None) -> Tuple[str, Optional[float]]:
     client_id = client_id or os.environ.get("AUTH0_USER_MANAGEMENT_CLIENT_ID", None)
     if client_id is None:
         raise Unauthorized(description="Please configure the env variable AUTH0_USER_MANAGEMENT_CLIENT_ID")
@@ -53,18 +93,60 @@ def _get_management_token(client_id: Optional[str] = None, client_secret: Option
         "grant_type": "client_credentials"
     }
 
-    res = requests.post("https://edc.eu.auth0.com/oauth/token", json=payload)
+    res = httpclient.post("https://edc.eu.auth0.com/oauth/token", json=payload)
 
     try:
         res.raise_for_status()
     except HTTPError as e:
         raise Unauthorized(description=str(e))
 
+    res = res.json()
     try:
-        return res.json()["access_token"]
+        access_token = res["access_token"]
     except KeyError:
         raise Unauthorized(description="System error: Could not find key 'access_token' in auth0's response")
 
+    expires_in = res.get("expires_in")
+    return access_token, float(expires_in) if expires_in is not None else None
+
+
+def _get_client_user(client_id: str, client_secret: str) -> Tuple[User, Sequence[str]]:
+    """
+    Get the user and the names of its permissions by client credentials. Results are cached for
+    XCUBE_HUB_OAUTH_CLIENT_CACHE_TTL seconds (default 60, 0 disables caching).
+    """
+    secret_hash = hashlib.sha256(client_secret.encode('utf-8')).hexdigest()
+    cached = _CLIENT_USERS.get(client_id)
+    if cached is not None and hmac.compare_digest(cached['secret_hash'], secret_hash):
+        return User.from_dict(cached['user']), cached['permissions']
+
+    token = _get_management_token()
+    res = get_user_by_credentials(token=token,
+                                  client_id=client_id,
+                                  client_secret=client_secret)
+
+    user = User.from_dict(res[0])
+    permissions = users.get_permissions_by_user_id(user.user_id, token=token)
+    permissions = users.get_permissions(permissions=permissions)
+
+    ttl = util.maybe_raise_for_env("XCUBE_HUB_OAUTH_CLIENT_CACHE_TTL", default=60, typ=float)
+    if ttl > 0:
+        _CLIENT_USERS.put(client_id, dict(secret_hash=secret_hash, user=res[0], permissions=permissions),
+                          expires_at=time.time() + ttl)
+
+    return user, permissions
+
+
+def invalidate_client(client_id: Optional[str] = None):
+    """
+    Drop the cached user and permissions of client_id, or of all clients if client_id is None. Must be called
+    when a user's subscriptions or roles change.
+    """
+    if client_id is None:
+        _CLIENT_USERS.clear()
+    else:
+        _CLIENT_USERS.delete(client_id)
+
 
 def create_token(claims: Dict, days_valid: int = 90):
     secret = util.maybe_raise_for_env("XCUBE_HUB_TOKEN_SECRET")
@@ -88,14 +170,7 @@ def get_token(body: JsonObject):
         return token
 
     aud = util.maybe_raise_for_env("XCUBE_HUB_OAUTH_AUD")
-    token = _get_management_token()
-    res = get_user_by_credentials(token=token,
-                                  client_id=oauth_token.client_id,
-                                  client_secret=oauth_token.client_secret)
-
-    user = User.from_dict(res[0])
-    permissions = users.get_permissions_by_user_id(user.user_id, token=token)
-    permissions = users.get_permissions(permissions=permissions)
+    user, permissions = _get_client_user(client_id=oauth_token.client_id, client_secret=oauth_token.client_secret)
     claims = {
         "iss": "https://xcube-gen.brockmann-consult.de/",
         "aud": [aud],
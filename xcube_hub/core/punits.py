@@ -3,17 +3,48 @@ from typing import Optional
 
 from xcube_hub import api
 from xcube_hub.api import get_json_request_value
+from xcube_hub.core import ledger
 from xcube_hub.database import Database
 from xcube_hub.typedefs import JsonObject
 
 
 def get_punits(user_id: str, include_history: bool = False) -> JsonObject:
     processing_units = Database.instance().get_user_data(user_id, dataset_name='punits')
-    if processing_units is not None and not include_history and 'history' in processing_units:
-        processing_units.pop('history')
+    if processing_units is None:
+        return processing_units
+    if include_history:
+        # Newest first, as [ts, op, punits_request]. Requests only keep their punits, see get_punits_history().
+        processing_units['history'] = [[tx['ts'], tx['op'], dict(punits=tx['punits'])]
+                                       for tx in reversed(ledger.get_transactions(user_id, processing_units))]
+    else:
+        processing_units.pop('history', None)
     return processing_units
 
 
+def get_punits_history(user_id: str, start: Optional[str] = None, end: Optional[str] = None, limit: int = 100,
+                       cursor: Optional[int] = None) -> JsonObject:
+    """
+    Get a page of the punits transactions of a user, newest first, and the totals per day and operation.
+    See ``ledger.get_history()``.
+    """
+    for name, value in (('start', start), ('end', end)):
+        if value is not None and not _is_time(value):
+            raise api.ApiError(400, f'Invalid {name} {value}. Expected YYYY-MM-DD or YYYY-MM-DD hh:mm:ss.')
+    if limit <= 0:
+        raise api.ApiError(400, 'limit must be greater than zero.')
+    return ledger.get_history(user_id, start=start, end=end, limit=limit, cursor=cursor)
+
+
+def _is_time(value: str) -> bool:
+    for fmt in ("%Y-%m-%d", "%Y-%m-%d %H:%M:%S"):
+        try:
+            datetime.datetime.strptime(value, fmt)
+            return True
+        except ValueError:
+            pass
+    return False
+
+
 def add_punits(user_id: str, punits_request: JsonObject):
     _update_punits(user_id, punits_request, 'add')
 
@@ -31,24 +62,7 @@ def _update_punits(user_id: str, punits_request: JsonObject, op: str):
     update_count = get_json_request_value(update_punits, 'total_count', value_type=int)
     if update_count <= 0:
         raise api.ApiError(400, 'Processing unit counts must be greater than zero.')
-    punits_data_old = get_user_data(user_id, dataset_name='punits') or dict()
-    count_old = punits_data_old.get('count', 0)
-    history_old = punits_data_old.get('history', [])
-
-    if op == 'add':
-        count_new = (count_old + update_count)
-    elif op == "sub":
-        count_new = (count_old - update_count)
-    else:
-        count_new = update_count
-
-    if count_new < 0:
-        raise api.ApiError(400, 'Out of processing units.')
-    history_new = [[datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"), op, punits_request]] + history_old
-    punits_data_new = dict(punits_data_old)
-    punits_data_new['count'] = count_new
-    punits_data_new['history'] = history_new
-    put_user_data(user_id, punits_data_new, dataset_name='punits')
+    ledger.update(user_id, op=op, count=update_count, request=punits_request)
 
 
 def get_user_data(user_id: str, dataset_name: str = 'data') -> Optional[JsonObject]:
@@ -3,10 +3,11 @@ from kubernetes import client
 from kubernetes.client.rest import ApiException
 
 from xcube_hub import api
+from xcube_hub.k8scfg import K8sCfg
 
 
 def create_if_not_exists(user_namespace: Optional[str] = None):
-    api_pod_instance = client.CoreV1Api()
+    api_pod_instance = K8sCfg.core_v1_api()
     body = client.V1Namespace(metadata=client.V1ObjectMeta(name=user_namespace))
 
     try:
@@ -20,7 +21,7 @@ def create_if_not_exists(user_namespace: Optional[str] = None):
 
 
 def exists(user_id: str):
-    api_pod_instance = client.CoreV1Api()
+    api_pod_instance = K8sCfg.core_v1_api()
 
     try:
         namespaces = api_pod_instance.list_namespace()
@@ -31,7 +32,7 @@ def exists(user_id: str):
 
 
 def list():
-    api_pod_instance = client.CoreV1Api()
+    api_pod_instance = K8sCfg.core_v1_api()
 
     try:
         namespaces = api_pod_instance.list_namespace()
@@ -41,7 +42,7 @@ def list():
 
 
 def delete(user_id: str):
-    api_pod_instance = client.CoreV1Api()
+    api_pod_instance = K8sCfg.core_v1_api()
 
     try:
         api_pod_instance.delete_namespace(name=user_id)
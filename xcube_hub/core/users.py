@@ -2,9 +2,8 @@ from datetime import datetime
 from typing import Optional, Sequence
 
 import connexion
-import requests
 
-from xcube_hub import api, util
+from xcube_hub import api, util, httpclient
 from xcube_hub.models.subscription import Subscription
 from xcube_hub.models.user import User
 from xcube_hub.util import create_user_id_from_email, create_secret
@@ -14,7 +13,7 @@ def get_permissions_by_user_id(auth_user_id: str, token: Optional[str] = None):
     token = token or connexion.request.headers["Authorization"]
 
     headers = {'Authorization': f'Bearer {token}'}
-    r = requests.get(f"https://edc.eu.auth0.com/api/v2/users/{auth_user_id}/permissions", headers=headers)
+    r = httpclient.get(f"https://edc.eu.auth0.com/api/v2/users/{auth_user_id}/permissions", headers=headers)
 
     if r.status_code == 404:
         raise api.ApiError(404, "User not found.")
@@ -129,7 +129,7 @@ def create(user_id: str, cfg: JsonObject) -> Tuple[JsonObject, int]:
         k8s.create_deployment(namespace=xcube_namespace, deployment=deployment)
 
         try:
-            poller.poll_pod_phase(k8s.get_pod, namespace=xcube_namespace, prefix=user_id)
+            poller.wait_for_pod_phase(namespace=xcube_namespace, label_selector=f"app={user_id}")
         except (TimeoutException, MaxCallException) as e:
             raise api.ApiError(408, str(e))
 
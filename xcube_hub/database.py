@@ -22,16 +22,23 @@
 import json
 import os
 import threading
-from typing import Optional
+import time
+from typing import Optional, Tuple, List
 
 import boto3
+from botocore.exceptions import ClientError
 
+from xcube_hub import util
+from xcube_hub.cache import LruCache
 from xcube_hub.typedefs import JsonObject
 
 DEFAULT_DB_BUCKET_NAME = 'eurodatacube'
 
 _DB_USER_DATASET_KEY = 'users/{user_name}/{dataset_name}.json'
 
+# Seconds for which a missing user data object is cached
+_NEGATIVE_CACHE_TTL = 1.
+
 
 class Database:
     # noinspection PyUnusedName
@@ -47,6 +54,14 @@ class Database:
     :param profile_name: The AWS credentials profile. 
         If not given, credentials are expected to be given by environment variables
         AWS_ACCESS_KEY_ID and AWS_SECRET_ACCESS_KEY.
+    :param cache_ttl: User data read or written is served from a cache for this many seconds. Then it is
+        revalidated by a conditional GET using its ETag on every read. Missing user data is cached for at most
+        one second. Defaults to XCUBE_HUB_DB_CACHE_TTL (default 10),
+        0 disables the cache.
+    :param cache_size: Maximum number of cached user data objects. Defaults to XCUBE_HUB_DB_CACHE_SIZE
+        (default 1024).
+    :param use_kvdb: Also cache user data in ``KeyValueDatabase.instance()``, shared by all processes using the
+        same key-value database. Enabled by setting XCUBE_HUB_DB_CACHE_KVDB=1.
     """
 
     _instance_lock = threading.Lock()
@@ -54,18 +69,30 @@ class Database:
 
     def __init__(self,
                  bucket_name: str = None,
-                 profile_name: str = None):
+                 profile_name: str = None,
+                 cache_ttl: float = None,
+                 cache_size: int = None,
+                 use_kvdb: bool = None):
 
         self._bucket_name = bucket_name or DEFAULT_DB_BUCKET_NAME
         self._profile_name = profile_name
 
+        self._cache_ttl = cache_ttl if cache_ttl is not None \
+            else util.maybe_raise_for_env("XCUBE_HUB_DB_CACHE_TTL", default=10, typ=float)
+        cache_size = cache_size if cache_size is not None \
+            else util.maybe_raise_for_env("XCUBE_HUB_DB_CACHE_SIZE", default=1024, typ=int)
+        # key -> (JSON text or None if the object does not exist, ETag, time until which it is served unchecked)
+        self._cache = LruCache(maxsize=cache_size if self._cache_ttl > 0 else 0)
+        self._use_kvdb = self._cache_ttl > 0 and (
+            use_kvdb if use_kvdb is not None
+            else os.getenv("XCUBE_HUB_DB_CACHE_KVDB", "0") == "1")
+
         if profile_name is not None:
             self._session = boto3.Session(profile_name=profile_name)
         else:
             self._session = boto3.Session(aws_access_key_id=os.environ.get('AWS_ACCESS_KEY_ID'),
                                           aws_secret_access_key=os.environ.get('AWS_SECRET_ACCESS_KEY'))
 
-        self._session = boto3.Session(profile_name=profile_name)
         self._client = self._session.client('s3')
 
     @classmethod
@@ -91,31 +118,133 @@ class Database:
         return self._bucket_name
 
     def get_user_data(self, user_name: str, dataset_name: str) -> Optional[JsonObject]:
+        user_data, _ = self.get_user_data_with_etag(user_name, dataset_name)
+        return user_data
+
+    def get_user_data_with_etag(self, user_name: str, dataset_name: str, revalidate: bool = False) \
+            -> Tuple[Optional[JsonObject], Optional[str]]:
+        """
+        Get user data and its ETag, to be passed as if_match to ``put_user_data()``.
+        Both are None if the user data does not exist.
+
+        :param revalidate: Check a cached entry with S3 even if it is fresh
+        """
+        kwargs = self._user_data_kwargs(user_name, dataset_name)
+        key = kwargs['Key']
+
+        entry = self._get_cached(key)
+        if entry is not None and entry[2] > time.time() and not revalidate:
+            return _loads(entry[0]), entry[1]
+
+        if entry is not None and entry[1] is not None:
+            kwargs['IfNoneMatch'] = entry[1]
         try:
-            response = self._client.get_object(**self._user_data_kwargs(user_name, dataset_name))
+            response = self._client.get_object(**kwargs)
         except self._client.exceptions.NoSuchKey:
-            return None
+            self._put_cached(key, None, None)
+            return None, None
+        except ClientError as e:
+            if _status_code(e) != 304:
+                raise
+            # Not modified. Its freshness is not extended, so it is revalidated again on the next read.
+            return _loads(entry[0]), entry[1]
+
         object_data = self._check_response(response)
         if object_data is not None:
-            return json.load(object_data)
+            text = object_data.read().decode('utf-8')
+            self._put_cached(key, text, response.get('ETag'))
+            return _loads(text), response.get('ETag')
         else:
             raise DatabaseError('No data found')
 
-    def put_user_data(self, user_name: str, dataset_name: str, user_data: JsonObject, ):
-        object_data = json.dumps(user_data).encode('utf-8')
-        response = self._client.put_object(**self._user_data_kwargs(user_name, dataset_name),
-                                           Body=object_data)
+    def put_user_data(self, user_name: str, dataset_name: str, user_data: JsonObject,
+                      if_match: Optional[str] = None, if_none_match: Optional[str] = None) -> Optional[str]:
+        """
+        Put user data. Returns its new ETag.
+
+        :param if_match: Only write if the user data's current ETag is this ETag (compare-and-swap)
+        :param if_none_match: '*' to only write if the user data does not exist yet
+        :raise DatabaseConflict: If a condition is not met
+        """
+        text = json.dumps(user_data)
+        kwargs = self._user_data_kwargs(user_name, dataset_name)
+        self._delete_cached(kwargs['Key'])
+        if if_match is not None:
+            kwargs['IfMatch'] = if_match
+        if if_none_match is not None:
+            kwargs['IfNoneMatch'] = if_none_match
+        try:
+            response = self._client.put_object(**kwargs, Body=text.encode('utf-8'))
+        except ClientError as e:
+            # 409 is returned if a concurrent conditional write to the same object is in progress
+            if _status_code(e) in (409, 412):
+                raise DatabaseConflict(f'User data {dataset_name} of {user_name} has been modified concurrently')
+            raise
         # print('put_user_data:', response)
         self._check_response(response)
+        self._put_cached(kwargs['Key'], text, response.get('ETag'))
+        return response.get('ETag')
+
+    def list_user_data(self, user_name: str, prefix: str = '') -> List[str]:
+        """
+        List the names of user data starting with prefix, in ascending order.
+        """
+        key_prefix = _DB_USER_DATASET_KEY.format(user_name=user_name, dataset_name=prefix)[:-len('.json')]
+        user_prefix = _DB_USER_DATASET_KEY.format(user_name=user_name, dataset_name='')[:-len('.json')]
+        names = []
+        for page in self._client.get_paginator('list_objects_v2').paginate(Bucket=self._bucket_name,
+                                                                           Prefix=key_prefix):
+            for obj in page.get('Contents', []):
+                if obj['Key'].endswith('.json'):
+                    names.append(obj['Key'][len(user_prefix):-len('.json')])
+        return names
 
     def delete_user_data(self, user_name: str, dataset_name: str):
+        kwargs = self._user_data_kwargs(user_name, dataset_name)
+        self._delete_cached(kwargs['Key'])
         try:
-            response = self._client.delete_object(**self._user_data_kwargs(user_name, dataset_name))
+            response = self._client.delete_object(**kwargs)
         except self._client.exceptions.NoSuchKey:
             return
         # print('delete_user_data:', response)
         self._check_response(response)
 
+    def clear_cache(self):
+        """
+        Drop the cached user data of this process.
+        """
+        self._cache.clear()
+
+    def _get_cached(self, key: str) -> Optional[Tuple[Optional[str], Optional[str], float]]:
+        entry = self._cache.get(key)
+        if (entry is None or entry[2] <= time.time()) and self._use_kvdb:
+            from xcube_hub.keyvaluedatabase import KeyValueDatabase
+            # Entries of the key-value database expire when they need to be revalidated
+            shared = KeyValueDatabase.instance().get(_kvdb_key(self._bucket_name, key))
+            if shared:
+                # Shared entries stay fresh only until the time set by the process that fetched them
+                entry = (shared['text'], shared['etag'], shared.get('fresh_until', 0.))
+                self._cache.put(key, entry)
+        return entry
+
+    def _put_cached(self, key: str, text: Optional[str], etag: Optional[str]):
+        if self._cache_ttl <= 0:
+            return
+        # Missing objects are usually created soon, so they are cached only briefly
+        ttl = self._cache_ttl if text is not None else min(self._cache_ttl, _NEGATIVE_CACHE_TTL)
+        fresh_until = time.time() + ttl
+        self._cache.put(key, (text, etag, fresh_until))
+        if self._use_kvdb:
+            from xcube_hub.keyvaluedatabase import KeyValueDatabase
+            KeyValueDatabase.instance().set(_kvdb_key(self._bucket_name, key),
+                                            dict(text=text, etag=etag, fresh_until=fresh_until), ttl=ttl)
+
+    def _delete_cached(self, key: str):
+        self._cache.delete(key)
+        if self._use_kvdb:
+            from xcube_hub.keyvaluedatabase import KeyValueDatabase
+            KeyValueDatabase.instance().delete(_kvdb_key(self._bucket_name, key))
+
     def _user_data_kwargs(self, user_name: str, dataset_name: str):
         return dict(Bucket=self._bucket_name,
                     Key=_DB_USER_DATASET_KEY.format(user_name=user_name, dataset_name=dataset_name))
@@ -128,8 +257,28 @@ class Database:
         return response.get('Body')
 
 
+def _loads(text: Optional[str]) -> Optional[JsonObject]:
+    # Callers get their own copy of the cached data
+    return json.loads(text) if text is not None else None
+
+
+def _kvdb_key(bucket_name: str, key: str) -> str:
+    return 'database__' + bucket_name + '__' + key
+
+
+def _status_code(e: ClientError) -> int:
+    return e.response.get('ResponseMetadata', {}).get('HTTPStatusCode', 0)
+
+
 class DatabaseError(BaseException):
     """
     Raised by methods of :class:`Database`.
     """
     pass
+
+
+class DatabaseConflict(DatabaseError):
+    """
+    Raised by :meth:`Database.put_user_data` if a write condition is not met.
+    """
+    pass
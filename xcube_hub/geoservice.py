@@ -2,9 +2,7 @@ import os
 from abc import abstractmethod, ABC
 from typing import Optional, Any, Dict, Sequence
 
-import requests
-
-from xcube_hub import api
+from xcube_hub import api, httpclient
 from xcube_hub.models.collection import Collection
 
 
@@ -319,7 +317,7 @@ class _GeoServer(GeoServiceBase, ABC):
                 raise api.ApiError(400, str(e))
 
             url = layer['layer']['resource']['href']
-            r = requests.get(url, auth=(self._username, self._password))
+            r = httpclient.get(url, auth=(self._username, self._password))
             layer_wms = r.json()
 
             if 'featureType' in layer_wms:
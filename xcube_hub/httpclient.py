@@ -0,0 +1,164 @@
+import threading
+import time
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from xcube_hub import util
+
+# Status codes that are retried. Requests with methods that are not idempotent (POST, PATCH) are not retried.
+_RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+class HttpClient:
+    """
+    HTTP client keeping one pooled ``requests.Session`` per upstream host, so that connections are reused
+    (keep-alive) instead of opening a new TCP and TLS connection per request.
+
+    Requests get a default (connect, read) timeout. Idempotent requests are retried with an exponential backoff
+    on connection errors and on the status codes 429 and 5xx, respecting Retry-After headers. The latency of
+    requests is recorded per host, see ``metrics``.
+
+    The configuration is read from the environment if not given:
+    XCUBE_HUB_HTTP_CONNECT_TIMEOUT (default 5s), XCUBE_HUB_HTTP_READ_TIMEOUT (default 30s),
+    XCUBE_HUB_HTTP_RETRIES (default 3), XCUBE_HUB_HTTP_BACKOFF_FACTOR (default 0.5) and
+    XCUBE_HUB_HTTP_POOL_SIZE (default 10 connections per host).
+    """
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self,
+                 connect_timeout: Optional[float] = None,
+                 read_timeout: Optional[float] = None,
+                 retries: Optional[int] = None,
+                 backoff_factor: Optional[float] = None,
+                 pool_size: Optional[int] = None):
+        self._timeout = (
+            connect_timeout if connect_timeout is not None
+            else util.maybe_raise_for_env("XCUBE_HUB_HTTP_CONNECT_TIMEOUT", default=5, typ=float),
+            read_timeout if read_timeout is not None
+            else util.maybe_raise_for_env("XCUBE_HUB_HTTP_READ_TIMEOUT", default=30, typ=float)
+        )
+        self._retries = retries if retries is not None \
+            else util.maybe_raise_for_env("XCUBE_HUB_HTTP_RETRIES", default=3, typ=int)
+        self._backoff_factor = backoff_factor if backoff_factor is not None \
+            else util.maybe_raise_for_env("XCUBE_HUB_HTTP_BACKOFF_FACTOR", default=0.5, typ=float)
+        self._pool_size = pool_size if pool_size is not None \
+            else util.maybe_raise_for_env("XCUBE_HUB_HTTP_POOL_SIZE", default=10, typ=int)
+
+        self._sessions: Dict[str, requests.Session] = dict()
+        self._metrics: Dict[str, Dict] = dict()
+        self._lock = threading.Lock()
+
+    def session(self, url: str) -> requests.Session:
+        """
+        Return the session of the url's host.
+        """
+        parts = urlsplit(url)
+        host = f"{parts.scheme}://{parts.netloc}"
+        session = self._sessions.get(host)
+        if session is None:
+            with self._lock:
+                session = self._sessions.get(host)
+                if session is None:
+                    session = self._new_session()
+                    self._sessions[host] = session
+        return session
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        kwargs.setdefault('timeout', self._timeout)
+        host = urlsplit(url).netloc
+
+        start = time.perf_counter()
+        try:
+            response = self.session(url).request(method, url, **kwargs)
+        except requests.RequestException:
+            self._record(host, time.perf_counter() - start, error=True)
+            raise
+
+        self._record(host, time.perf_counter() - start, error=response.status_code >= 500)
+        return response
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request('POST', url, **kwargs)
+
+    def put(self, url: str, **kwargs) -> requests.Response:
+        return self.request('PUT', url, **kwargs)
+
+    def patch(self, url: str, **kwargs) -> requests.Response:
+        return self.request('PATCH', url, **kwargs)
+
+    def delete(self, url: str, **kwargs) -> requests.Response:
+        return self.request('DELETE', url, **kwargs)
+
+    @property
+    def metrics(self) -> Dict[str, Dict]:
+        """
+        Request metrics per host: number of requests, number of errors (connection errors and status codes
+        >= 500), and the total and maximum latency in seconds.
+        """
+        with self._lock:
+            return {host: dict(m) for host, m in self._metrics.items()}
+
+    def close(self):
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions = dict()
+
+    def _new_session(self) -> requests.Session:
+        retry = Retry(total=self._retries,
+                      backoff_factor=self._backoff_factor,
+                      status_forcelist=_RETRY_STATUS_CODES,
+                      respect_retry_after_header=True,
+                      raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self._pool_size, max_retries=retry)
+        session = requests.Session()
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    def _record(self, host: str, seconds: float, error: bool):
+        with self._lock:
+            m = self._metrics.setdefault(host, dict(count=0, errors=0, total_seconds=0., max_seconds=0.))
+            m['count'] += 1
+            m['errors'] += int(error)
+            m['total_seconds'] += seconds
+            m['max_seconds'] = max(m['max_seconds'], seconds)
+
+    @classmethod
+    def instance(cls, refresh: bool = False) -> "HttpClient":
+        if refresh or cls._instance is None:
+            with cls._instance_lock:
+                if refresh or cls._instance is None:
+                    if cls._instance is not None:
+                        cls._instance.close()
+                    cls._instance = HttpClient()
+        return cls._instance
+
+
+def get(url: str, **kwargs) -> requests.Response:
+    return HttpClient.instance().get(url, **kwargs)
+
+
+def post(url: str, **kwargs) -> requests.Response:
+    return HttpClient.instance().post(url, **kwargs)
+
+
+def put(url: str, **kwargs) -> requests.Response:
+    return HttpClient.instance().put(url, **kwargs)
+
+
+def patch(url: str, **kwargs) -> requests.Response:
+    return HttpClient.instance().patch(url, **kwargs)
+
+
+def delete(url: str, **kwargs) -> requests.Response:
+    return HttpClient.instance().delete(url, **kwargs)
@@ -0,0 +1,275 @@
+import threading
+from typing import Any, Callable, Dict, Optional, Sequence, List
+
+from kubernetes import watch
+from kubernetes.client import ApiException
+from urllib3.exceptions import ReadTimeoutError
+
+from xcube_hub import util
+
+# Seconds a watch may stay silent beyond its server side timeout before its connection is considered dead
+_WATCH_READ_TIMEOUT_SLACK = 30
+
+
+class Informer:
+    """
+    Keeps an in-process cache of Kubernetes objects of one kind up to date.
+
+    The informer lists all matching objects once and afterwards follows a watch stream, resuming from the last
+    seen resourceVersion. If the resourceVersion expired (410 Gone) the objects are listed again.
+    Objects are indexed by name and, optionally, by the values of some of their labels.
+
+    :param list_func: A namespaced list function of the kubernetes client (e.g. BatchV1Api().list_namespaced_job)
+    :param namespace: The namespace to watch
+    :param label_selector: Only objects matching this selector are cached
+    :param index_labels: Label keys that get an index so that objects can be looked up by label value
+    :param watch_factory: Returns a new watch object providing ``stream(func, **kwargs)`` and ``stop()``.
+        Defaults to ``kubernetes.watch.Watch``
+    :param on_event: Optional callable receiving (event_type, obj) after the cache has been updated
+    :param timeout_seconds: Server side timeout of a single watch request. The client gives up on a watch
+        connection that has been silent for 30 seconds longer, e.g. a half-open one, and watches again.
+    """
+
+    _instances: Dict[str, "Informer"] = dict()
+    _instances_lock = threading.Lock()
+
+    def __init__(self,
+                 list_func: Callable,
+                 namespace: str,
+                 label_selector: Optional[str] = None,
+                 index_labels: Sequence[str] = (),
+                 watch_factory: Optional[Callable[[], Any]] = None,
+                 on_event: Optional[Callable[[str, Any], None]] = None,
+                 timeout_seconds: int = 300):
+        self._list_func = list_func
+        self._namespace = namespace
+        self._label_selector = label_selector
+        self._index_labels = tuple(index_labels)
+        self._watch_factory = watch_factory or watch.Watch
+        self._on_event = on_event
+        self._timeout_seconds = timeout_seconds
+
+        self._lock = threading.RLock()
+        self._objects: Dict[str, Any] = dict()
+        self._indexes: Dict[str, Dict[str, set]] = {label: dict() for label in self._index_labels}
+        self._resource_version: Optional[str] = None
+        self._synced = threading.Event()
+        self._stopped = threading.Event()
+        self._watch = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def namespace(self) -> str:
+        return self._namespace
+
+    @property
+    def resource_version(self) -> Optional[str]:
+        return self._resource_version
+
+    @property
+    def has_synced(self) -> bool:
+        return self._synced.is_set()
+
+    def wait_for_sync(self, timeout: Optional[float] = None) -> bool:
+        return self._synced.wait(timeout=timeout)
+
+    def get(self, name: str) -> Optional[Any]:
+        with self._lock:
+            return self._objects.get(name)
+
+    def list(self, **labels) -> List[Any]:
+        """
+        List cached objects. Keyword arguments select objects by label value. Indexed labels are looked up
+        directly, all others are matched by scanning.
+        """
+        with self._lock:
+            names = None
+            for key, value in labels.items():
+                if key in self._indexes:
+                    matches = self._indexes[key].get(value, set())
+                    names = matches if names is None else names & matches
+
+            objs = self._objects.values() if names is None else [self._objects[name] for name in names]
+
+            return [obj for obj in objs if _matches_labels(obj, labels)]
+
+    def start(self) -> "Informer":
+        if self._thread is None:
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self.run, name=f"informer-{self._namespace}", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        w = self._watch
+        if w is not None:
+            w.stop()
+        self._thread = None
+
+    def run(self, max_retries: Optional[int] = None):
+        """
+        Run the list/watch loop until stopped. Errors other than an expired resource version are retried
+        with an exponential backoff capped at 30 seconds.
+
+        :param max_retries: Maximum number of consecutive failures, unlimited if None
+        """
+        retries = 0
+        backoff = 1.
+        while not self._stopped.is_set():
+            try:
+                if self._resource_version is None:
+                    self.sync()
+                    retries = 0
+                    backoff = 1.
+                self.watch()
+                retries = 0
+                backoff = 1.
+            except _ResourceVersionExpired:
+                self._resource_version = None
+            except Exception as e:
+                print(f"Informer for namespace {self._namespace} failed: {str(e)}")
+                retries += 1
+                if max_retries is not None and retries > max_retries:
+                    raise
+                self._stopped.wait(backoff)
+                backoff = min(backoff * 2, 30.)
+
+    def sync(self):
+        """
+        List all objects and replace the cache content.
+        """
+        kwargs = self._request_kwargs()
+        res = self._list_func(**kwargs)
+
+        with self._lock:
+            self._objects = dict()
+            self._indexes = {label: dict() for label in self._index_labels}
+            for obj in res.items:
+                self._add(obj)
+            self._resource_version = res.metadata.resource_version if res.metadata else None
+
+        self._synced.set()
+
+    def watch(self):
+        """
+        Follow the watch stream starting at the current resource version until the stream ends or has been
+        silent for longer than its timeout.
+        """
+        self._watch = self._watch_factory()
+        kwargs = self._request_kwargs()
+        kwargs['timeout_seconds'] = self._timeout_seconds
+        # Streamed responses get no default timeout from K8sCfg
+        connect_timeout = util.maybe_raise_for_env("XCUBE_HUB_K8S_CONNECT_TIMEOUT", default=5, typ=float)
+        kwargs['_request_timeout'] = (connect_timeout, self._timeout_seconds + _WATCH_READ_TIMEOUT_SLACK)
+        if self._resource_version is not None:
+            kwargs['resource_version'] = self._resource_version
+
+        try:
+            for event in self._watch.stream(self._list_func, **kwargs):
+                if self._stopped.is_set():
+                    break
+                self._handle_event(event)
+        except ReadTimeoutError:
+            # Watched again from the last resource version, like a stream that has ended
+            pass
+        except ApiException as e:
+            if e.status == 410:
+                raise _ResourceVersionExpired()
+            raise
+        finally:
+            self._watch = None
+
+    def _handle_event(self, event: Dict):
+        typ = event.get('type')
+        obj = event.get('object')
+
+        if typ == 'ERROR':
+            raw = event.get('raw_object') or obj or {}
+            code = raw.get('code') if isinstance(raw, dict) else None
+            if code == 410:
+                raise _ResourceVersionExpired()
+            raise RuntimeError(f"Watch error: {raw}")
+
+        with self._lock:
+            if typ in ('ADDED', 'MODIFIED'):
+                self._remove(obj.metadata.name)
+                self._add(obj)
+            elif typ == 'DELETED':
+                self._remove(obj.metadata.name)
+
+            if obj is not None and obj.metadata and obj.metadata.resource_version:
+                self._resource_version = obj.metadata.resource_version
+
+        if self._on_event is not None and typ != 'BOOKMARK':
+            self._on_event(typ, obj)
+
+    def _add(self, obj: Any):
+        name = obj.metadata.name
+        self._objects[name] = obj
+        labels = obj.metadata.labels or dict()
+        for label in self._index_labels:
+            if label in labels:
+                self._indexes[label].setdefault(labels[label], set()).add(name)
+
+    def _remove(self, name: str):
+        obj = self._objects.pop(name, None)
+        if obj is None:
+            return
+        labels = obj.metadata.labels or dict()
+        for label in self._index_labels:
+            if label in labels:
+                names = self._indexes[label].get(labels[label])
+                if names is not None:
+                    names.discard(name)
+                    if not names:
+                        del self._indexes[label][labels[label]]
+
+    def _request_kwargs(self) -> Dict:
+        kwargs = dict(namespace=self._namespace)
+        if self._label_selector:
+            kwargs['label_selector'] = self._label_selector
+        return kwargs
+
+    @classmethod
+    def instance(cls, key: str, factory: Optional[Callable[[], "Informer"]] = None) -> Optional["Informer"]:
+        """
+        Return the informer registered under key. If none is registered and a factory is given, the factory's
+        informer is started and registered.
+        """
+        informer = cls._instances.get(key)
+        if informer is None and factory is not None:
+            with cls._instances_lock:
+                informer = cls._instances.get(key)
+                if informer is None:
+                    informer = factory().start()
+                    cls._instances[key] = informer
+        return informer
+
+    @classmethod
+    def stop_all(cls):
+        with cls._instances_lock:
+            for informer in cls._instances.values():
+                informer.stop()
+            cls._instances = dict()
+
+
+class _ResourceVersionExpired(Exception):
+    pass
+
+
+def _matches_labels(obj: Any, labels: Dict[str, str]) -> bool:
+    obj_labels = obj.metadata.labels or dict()
+    return all(obj_labels.get(k) == v for k, v in labels.items())
+
+
+def wait_until_synced(informer: Optional[Informer], timeout: float = 0.) -> Optional[Informer]:
+    """
+    Return the informer if it has synced within timeout, otherwise None. Callers fall back to direct
+    API requests if None is returned.
+    """
+    if informer is None:
+        return None
+    if informer.has_synced or (timeout > 0 and informer.wait_for_sync(timeout)):
+        return informer
+    return None
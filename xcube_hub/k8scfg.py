@@ -1,5 +1,16 @@
 import os
 import threading
+from typing import Any, Dict, Optional, Type, TypeVar
+
+from kubernetes import client
+from urllib3.util.retry import Retry
+
+from xcube_hub import util
+
+# Status codes that are retried. Requests with methods that are not idempotent (POST, PATCH) are not retried.
+_RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+_Api = TypeVar('_Api')
 
 
 class K8sCfgError(ValueError):
@@ -7,9 +18,28 @@ class K8sCfgError(ValueError):
 
 
 class K8sCfg:
+    """
+    Loads the Kubernetes configuration once and owns the Kubernetes API clients of the process.
+
+    All API objects (``CoreV1Api``, ``BatchV1Api``, ...) share one ``ApiClient`` per process, i.e. per uWSGI
+    worker, so that connections to the API server are pooled and reused. Requests get a default
+    (connect, read) timeout unless they pass ``_request_timeout`` or stream their response (watches, followed
+    logs). Idempotent requests are retried with an exponential backoff on the status codes 429 and 5xx,
+    respecting Retry-After headers.
+
+    The configuration is read from the environment: XCUBE_HUB_K8S_POOL_SIZE (default 10 connections),
+    XCUBE_HUB_K8S_CONNECT_TIMEOUT (default 5s), XCUBE_HUB_K8S_READ_TIMEOUT (default 30s),
+    XCUBE_HUB_K8S_RETRIES (default 3, 0 disables) and XCUBE_HUB_K8S_BACKOFF_FACTOR (default 0.5).
+    """
+
     _config_lock = threading.Lock()
     _config_loaded = False
 
+    _clients_lock = threading.Lock()
+    _api_client: Optional[client.ApiClient] = None
+    _api_client_pid: Optional[int] = None
+    _apis: Dict[type, Any] = dict()
+
     @classmethod
     def load_config_once(cls):
         if not cls._config_loaded:
@@ -17,6 +47,8 @@ class K8sCfg:
             if not cls._config_loaded:
                 cls._load_config()
                 cls._config_loaded = True
+                # Clients created before use the default configuration
+                cls.close_clients()
             cls._config_lock.release()
 
     @classmethod
@@ -29,3 +61,93 @@ class K8sCfg:
         else:
             config.load_incluster_config()
 
+    @classmethod
+    def api_client(cls) -> client.ApiClient:
+        """
+        Return the API client of the process. A process forked after the client has been created gets its own
+        client, connections are not shared across processes.
+        """
+        pid = os.getpid()
+        if cls._api_client is None or cls._api_client_pid != pid:
+            with cls._clients_lock:
+                if cls._api_client is None or cls._api_client_pid != pid:
+                    cls._api_client = cls._new_api_client()
+                    cls._api_client_pid = pid
+                    cls._apis = dict()
+        return cls._api_client
+
+    @classmethod
+    def api(cls, api_type: Type[_Api]) -> _Api:
+        """
+        Return the API object of api_type (e.g. ``client.CoreV1Api``) using the API client of the process.
+        """
+        api_client = cls.api_client()
+        api = cls._apis.get(api_type)
+        if api is None:
+            with cls._clients_lock:
+                api = cls._apis.get(api_type)
+                if api is None:
+                    api = api_type(api_client)
+                    cls._apis[api_type] = api
+        return api
+
+    @classmethod
+    def core_v1_api(cls) -> client.CoreV1Api:
+        return cls.api(client.CoreV1Api)
+
+    @classmethod
+    def batch_v1_api(cls) -> client.BatchV1Api:
+        return cls.api(client.BatchV1Api)
+
+    @classmethod
+    def apps_v1_api(cls) -> client.AppsV1Api:
+        return cls.api(client.AppsV1Api)
+
+    @classmethod
+    def networking_v1_api(cls) -> client.NetworkingV1Api:
+        return cls.api(client.NetworkingV1Api)
+
+    @classmethod
+    def close_clients(cls):
+        """
+        Close the API client of the process. API objects requested afterwards use a new client, e.g. after
+        the configuration has been reloaded.
+        """
+        with cls._clients_lock:
+            if cls._api_client is not None and cls._api_client_pid == os.getpid():
+                cls._api_client.close()
+            cls._api_client = None
+            cls._api_client_pid = None
+            cls._apis = dict()
+
+    @classmethod
+    def _new_api_client(cls) -> client.ApiClient:
+        configuration = client.Configuration.get_default_copy()
+        configuration.connection_pool_maxsize = util.maybe_raise_for_env("XCUBE_HUB_K8S_POOL_SIZE", default=10,
+                                                                         typ=int)
+
+        retries = util.maybe_raise_for_env("XCUBE_HUB_K8S_RETRIES", default=3, typ=int)
+        if retries > 0:
+            configuration.retries = Retry(total=retries,
+                                          backoff_factor=util.maybe_raise_for_env("XCUBE_HUB_K8S_BACKOFF_FACTOR",
+                                                                                  default=0.5, typ=float),
+                                          status_forcelist=_RETRY_STATUS_CODES,
+                                          respect_retry_after_header=True,
+                                          raise_on_status=False)
+
+        request_timeout = (util.maybe_raise_for_env("XCUBE_HUB_K8S_CONNECT_TIMEOUT", default=5, typ=float),
+                           util.maybe_raise_for_env("XCUBE_HUB_K8S_READ_TIMEOUT", default=30, typ=float))
+
+        return _ApiClient(configuration, request_timeout=request_timeout)
+
+
+class _ApiClient(client.ApiClient):
+    def __init__(self, configuration: client.Configuration, request_timeout: Any):
+        super().__init__(configuration)
+        self.request_timeout = request_timeout
+
+    def call_api(self, *args, **kwargs):
+        # Streamed responses (watches, followed logs) are read for as long as they last
+        if kwargs.get('_request_timeout') is None and kwargs.get('_preload_content', True):
+            kwargs['_request_timeout'] = self.request_timeout
+        return super().call_api(*args, **kwargs)
@@ -1,9 +1,18 @@
+import fnmatch
 import json
 import os
+import queue
+import struct
+import threading
+import time
+import weakref
 from abc import abstractmethod, ABC
-from json import JSONDecodeError
-from typing import Optional, Any
-from xcube_hub import api
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Optional, Any, Sequence, Dict, List, Iterator, Tuple, Callable
+from xcube_hub import api, util
+from xcube_hub.cache import LruCache
+from xcube_hub.codec import ValueCodec
 from xcube_hub.typedefs import JsonObject
 
 
@@ -17,11 +26,145 @@ class KeyValueStore(ABC):
         """
 
     @abstractmethod
-    def set(self, key, value):
+    def set(self, key, value, ttl: Optional[float] = None):
         """
         Set a key value
         :param value:
         :param key:
+        :param ttl: Seconds after which the key expires. Never expires if None.
+        :return:
+        """
+
+    @abstractmethod
+    def delete(self, key):
+        """
+        Delete a key
+        :param key:
+        :return:
+        """
+
+    def mget(self, keys: Sequence[str]) -> List:
+        """
+        Get the values of several keys. Missing keys yield None.
+        :param keys:
+        :return: The values in the order of keys
+        """
+        return [self.get(key) for key in keys]
+
+    def mset(self, mapping: Dict[str, Any], ttl: Optional[float] = None):
+        """
+        Set several key values
+        :param mapping:
+        :param ttl: Seconds after which the keys expire
+        :return:
+        """
+        with self.pipeline() as pipe:
+            for key, value in mapping.items():
+                pipe.set(key, value, ttl=ttl)
+        return True
+
+    def delete_many(self, keys: Sequence[str]):
+        """
+        Delete several keys
+        :param keys:
+        :return:
+        """
+        with self.pipeline() as pipe:
+            for key in keys:
+                pipe.delete(key)
+        return True
+
+    @abstractmethod
+    def pipeline(self) -> Iterator["KeyValuePipeline"]:
+        """
+        Context manager collecting sets and deletes, which are applied at once when the context exits
+        without error, or discarded otherwise.
+        :return:
+        """
+
+    @abstractmethod
+    def append(self, key, value, ttl: Optional[float] = None) -> int:
+        """
+        Append a value to the list stored at key. Creates the list if it does not exist.
+        :param key:
+        :param value:
+        :param ttl: Seconds after which the whole list expires, counted from this append
+        :return: The length of the list after appending
+        """
+
+    @abstractmethod
+    def get_range(self, key, start: int = 0) -> List:
+        """
+        Get the values of the list stored at key from index start on
+        :param key:
+        :param start:
+        :return:
+        """
+
+    def ping(self) -> bool:
+        """
+        Check whether the store can be reached
+        :return:
+        """
+        return True
+
+    def publish(self, channel: str, message) -> int:
+        """
+        Publish a message to the subscribers of a channel. Stores that are not shared between processes
+        publish to the subscribers in this process.
+        :param channel:
+        :param message:
+        :return: The number of subscribers that received the message
+        """
+        return _LOCAL_PUBSUB.publish(channel, message)
+
+    def subscribe(self, channel: str) -> "KeyValueSubscription":
+        """
+        Subscribe to the messages published to a channel from now on
+        :param channel:
+        :return:
+        """
+        return _LOCAL_PUBSUB.subscribe(channel)
+
+
+class KeyValueSubscription(ABC):
+    """
+    Subscription to a channel obtained from ``KeyValueStore.subscribe()``. Must be closed when done.
+    """
+
+    @abstractmethod
+    def get_message(self, timeout: float = 0.):
+        """
+        Wait for the next message
+        :param timeout: Seconds to wait at most
+        :return: The message or None if no message arrived in time
+        """
+
+    @abstractmethod
+    def close(self):
+        """
+        Stop receiving messages
+        """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class KeyValuePipeline(ABC):
+    """
+    Batch of writes obtained from ``KeyValueStore.pipeline()``
+    """
+
+    @abstractmethod
+    def set(self, key, value, ttl: Optional[float] = None):
+        """
+        Set a key value
+        :param value:
+        :param key:
+        :param ttl: Seconds after which the key expires
         :return:
         """
 
@@ -44,9 +187,62 @@ class KeyValueDatabase(KeyValueStore):
 
     _instance = None
 
-    def __init__(self, provider: str, use_mocker: bool = False, **kwargs):
+    # Default TTLs of key namespaces registered by the modules owning them, see register_default_ttl()
+    _default_ttls: Dict[str, float] = dict()
+
+    def __init__(self, provider: str, use_mocker: bool = False, codec: Optional[ValueCodec] = None,
+                 default_ttls: Optional[Dict[str, float]] = None, **kwargs):
+        """
+        :param provider: Cache provider (redis, leveldb, inmemory)
+        :param codec: Encodes values to bytes. Defaults to the codec configured by the environment,
+            see ``ValueCodec.from_env()``
+        :param default_ttls: TTLs in seconds by key pattern (fnmatch), used when no TTL is given when writing a key.
+            They take precedence over registered defaults. Defaults to XCUBE_HUB_KV_TTLS
+            ("pattern=seconds,pattern=seconds"). A TTL <= 0 disables expiry.
+        """
         use_mocker = os.getenv("XCUBE_GEN_API_USE_KV_MOCK") or use_mocker
+        self._provider_name = provider
         self._provider = self._new_db(provider=provider, use_mocker=use_mocker, **kwargs)
+        self._codec = codec or ValueCodec.from_env()
+        self._ttls = default_ttls if default_ttls is not None else _parse_ttls(os.getenv("XCUBE_HUB_KV_TTLS"))
+
+    @classmethod
+    def register_default_ttl(cls, pattern: str, ttl: float):
+        """
+        Register the default TTL of the keys matching pattern (fnmatch), e.g. '*__cfg'.
+        """
+        cls._default_ttls[pattern] = ttl
+
+    def default_ttl(self, key: str) -> Optional[float]:
+        """
+        The TTL used for key if none is given, or None if the key does not expire.
+        """
+        for ttls in (self._ttls, self._default_ttls):
+            for pattern, ttl in ttls.items():
+                if fnmatch.fnmatchcase(key, pattern):
+                    return ttl if ttl > 0 else None
+        return None
+
+    def resolve_ttl(self, key: str, ttl: Optional[float]) -> Optional[float]:
+        """
+        The TTL to write key with: ttl if given, otherwise the default TTL of the key. None if the key does
+        not expire.
+        """
+        if ttl is None:
+            return self.default_ttl(key)
+        return ttl if ttl > 0 else None
+
+    @property
+    def codec(self) -> ValueCodec:
+        return self._codec
+
+    @property
+    def is_shared(self) -> bool:
+        """
+        Whether the database is shared by all processes of the service, which is only the case for redis.
+        leveldb and inmemory databases belong to a single process.
+        """
+        return self._provider_name == 'redis'
 
     def get(self, key) -> Optional[JsonObject]:
         """
@@ -55,35 +251,19 @@ class KeyValueDatabase(KeyValueStore):
         :return:
         """
 
-        res = self._provider.get(key)
-        if not res:
-            return res
+        return self.decode(self._provider.get(key))
 
-        try:
-            if isinstance(res, str):
-                return json.loads(res)
-            else:
-                return res
-        except JSONDecodeError as e:
-            raise api.ApiError(401, "System error (Cache): Cash contained invalid json " + str(e))
-        except ValueError as e:
-            raise api.ApiError(401, "System error (Cache): Cash contained invalid json " + str(e))
-
-    def set(self, key, value: JsonObject):
+    def set(self, key, value: JsonObject, ttl: Optional[float] = None):
         """
         Set a key value
         :param value:
         :param key:
+        :param ttl: Seconds after which the key expires. Defaults to the TTL of the key's namespace, see
+            ``default_ttl()``. A TTL <= 0 disables expiry.
         :return:
         """
 
-        try:
-            value = json.dumps(value)
-            return self._provider.set(key, value)
-        except JSONDecodeError as e:
-            raise api.ApiError(401, "System error (Cache): Cash contained invalid json " + str(e))
-        except ValueError as e:
-            raise api.ApiError(401, "System error (Cache): Cash contained invalid json " + str(e))
+        return self._provider.set(key, self._codec.encode(value), ttl=self.resolve_ttl(key, ttl))
 
     def delete(self, key):
         """
@@ -94,6 +274,119 @@ class KeyValueDatabase(KeyValueStore):
 
         return self._provider.delete(key)
 
+    def mget(self, keys: Sequence[str]) -> List[Optional[JsonObject]]:
+        """
+        Get the values of several keys in one request. Missing keys yield None.
+        :param keys:
+        :return: The values in the order of keys
+        """
+
+        if not keys:
+            return []
+        return [self.decode(res) for res in self._provider.mget(keys)]
+
+    def mset(self, mapping: Dict[str, JsonObject], ttl: Optional[float] = None):
+        """
+        Set several key values in one request
+        :param mapping:
+        :param ttl: Seconds after which the keys expire. Defaults to the TTLs of the keys' namespaces.
+        :return:
+        """
+
+        if not mapping:
+            return True
+        ttls = {self.resolve_ttl(key, ttl) for key in mapping}
+        if len(ttls) == 1:
+            return self._provider.mset({key: self._codec.encode(value) for key, value in mapping.items()},
+                                       ttl=ttls.pop())
+        with self.pipeline() as pipe:
+            for key, value in mapping.items():
+                pipe.set(key, value, ttl=ttl)
+        return True
+
+    def delete_many(self, keys: Sequence[str]):
+        """
+        Delete several keys in one request
+        :param keys:
+        :return:
+        """
+
+        if not keys:
+            return True
+        return self._provider.delete_many(keys)
+
+    @contextmanager
+    def pipeline(self) -> Iterator["KeyValuePipeline"]:
+        """
+        Context manager collecting sets and deletes. They are sent in one request (a transaction for redis,
+        a write batch for leveldb) when the context exits without error, and discarded otherwise.
+
+        Example:
+        ```
+            with KeyValueDatabase.instance().pipeline() as pipe:
+                pipe.set('key', {'value': 'value'})
+                pipe.delete('key2')
+        ```
+        """
+
+        with self._provider.pipeline() as pipe:
+            yield _CodecPipeline(pipe, self)
+
+    def append(self, key, value: JsonObject, ttl: Optional[float] = None) -> int:
+        """
+        Append a value to the list stored at key in one atomic operation, without reading the list.
+        List keys must not be used with ``get`` and ``set``, but can be deleted.
+        :param key:
+        :param value:
+        :param ttl: Seconds after which the list expires, counted from this append. Defaults to the TTL of the
+            key's namespace.
+        :return: The length of the list after appending
+        """
+
+        return self._provider.append(key, self._codec.encode(value), ttl=self.resolve_ttl(key, ttl))
+
+    def get_range(self, key, start: int = 0) -> List[JsonObject]:
+        """
+        Get the values of the list stored at key from index start on. Returns an empty list for missing keys.
+        :param key:
+        :param start:
+        :return:
+        """
+
+        return [self.decode(res) for res in self._provider.get_range(key, start=start)]
+
+    def ping(self) -> bool:
+        """
+        Readiness check. Returns False if the database cannot be reached.
+        :return:
+        """
+
+        return self._provider.ping()
+
+    def publish(self, channel: str, message: JsonObject) -> int:
+        """
+        Publish a message to the subscribers of a channel. For redis, subscribers of all processes using the
+        same redis receive it, otherwise only subscribers in this process.
+        :param channel:
+        :param message:
+        :return: The number of subscribers that received the message
+        """
+
+        return self._provider.publish(channel, self._codec.encode(message))
+
+    def subscribe(self, channel: str) -> KeyValueSubscription:
+        """
+        Subscribe to the messages published to a channel from now on.
+
+        Example:
+        ```
+            with KeyValueDatabase.instance().subscribe('channel') as subscription:
+                message = subscription.get_message(timeout=1.)
+        ```
+        """
+
+        return _CodecSubscription(self._provider.subscribe(channel), self._codec)
+
     def _new_db(self, provider: Optional[str] = None, use_mocker: bool = False, **kwargs) -> "KeyValueStore":
         """
         Return a new database instance.
@@ -121,6 +414,179 @@ class KeyValueDatabase(KeyValueStore):
 
         return cls._instance
 
+    def decode(self, res) -> Optional[JsonObject]:
+        """
+        Decode a value read from the provider. Values that are not bytes or strings, e.g. of mockers, are
+        returned as they are.
+        """
+        if isinstance(res, (bytes, str)):
+            return self._codec.decode(res)
+        return res
+
+
+def _parse_ttls(ttls: Optional[str]) -> Dict[str, float]:
+    res = dict()
+    for item in (ttls or '').split(','):
+        if item.strip():
+            pattern, ttl = item.rsplit('=', 1)
+            res[pattern.strip()] = float(ttl)
+    return res
+
+
+class _CodecPipeline(KeyValuePipeline):
+    def __init__(self, pipe: KeyValuePipeline, kvdb: KeyValueDatabase):
+        self._pipe = pipe
+        self._kvdb = kvdb
+
+    def set(self, key, value: JsonObject, ttl: Optional[float] = None):
+        self._pipe.set(key, self._kvdb.codec.encode(value), ttl=self._kvdb.resolve_ttl(key, ttl))
+
+    def delete(self, key):
+        self._pipe.delete(key)
+
+
+class _CodecSubscription(KeyValueSubscription):
+    def __init__(self, subscription: KeyValueSubscription, codec: ValueCodec):
+        self._subscription = subscription
+        self._codec = codec
+
+    def get_message(self, timeout: float = 0.) -> Optional[JsonObject]:
+        message = self._subscription.get_message(timeout=timeout)
+        return self._codec.decode(message) if message is not None else None
+
+    def close(self):
+        self._subscription.close()
+
+
+class _LocalPubSub:
+    """
+    Publishes messages to subscribers in this process. Each subscriber has a bounded queue. Messages to
+    subscribers that do not keep up are dropped.
+    """
+
+    def __init__(self, max_queue_size: int = 1000):
+        self._max_queue_size = max_queue_size
+        self._subscriptions: Dict[str, set] = dict()
+        self._lock = threading.Lock()
+
+    def publish(self, channel: str, message) -> int:
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(channel, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.queue.put_nowait(message)
+            except queue.Full:
+                pass
+        return len(subscriptions)
+
+    def subscribe(self, channel: str) -> "_LocalSubscription":
+        subscription = _LocalSubscription(self, channel, queue.Queue(maxsize=self._max_queue_size))
+        with self._lock:
+            self._subscriptions.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: "_LocalSubscription"):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.channel)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.channel]
+
+
+class _LocalSubscription(KeyValueSubscription):
+    def __init__(self, pubsub: _LocalPubSub, channel: str, q: queue.Queue):
+        self._pubsub = pubsub
+        self.channel = channel
+        self.queue = q
+
+    def get_message(self, timeout: float = 0.):
+        try:
+            return self.queue.get(timeout=timeout) if timeout > 0 else self.queue.get_nowait()
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self._pubsub.unsubscribe(self)
+
+
+_LOCAL_PUBSUB = _LocalPubSub()
+
+
+@contextmanager
+def _redis_errors():
+    """
+    Convert errors of an unreachable redis, after retries are exhausted, to an ApiError with status 503.
+    """
+    from redis.exceptions import ConnectionError as RedisConnectionError, TimeoutError as RedisTimeoutError
+    try:
+        yield
+    except (RedisConnectionError, RedisTimeoutError):
+        raise api.ApiError(503, "System Error: redis cache not ready.")
+
+
+def _new_redis(host, port, db, use_asyncio: bool = False, pubsub: bool = False, **kwargs):
+    """
+    Return a redis client using a blocking connection pool of XCUBE_HUB_REDIS_MAX_CONNECTIONS connections
+    (default 10) per process. Requests wait at most XCUBE_HUB_REDIS_POOL_TIMEOUT seconds (default 5) for a free
+    connection.
+
+    If pubsub is True, the client is meant for subscriptions, which hold their connection until they are closed.
+    Its pool has XCUBE_HUB_REDIS_MAX_SUBSCRIPTIONS connections (default 50), so that subscribers cannot starve
+    other commands. Commands failing with connection errors or timeouts are retried XCUBE_HUB_REDIS_RETRIES times
+    (default 3) with a jittered exponential backoff.
+
+    If XCUBE_HUB_REDIS_SENTINELS (host:port,host:port) is set, the master of the service
+    XCUBE_HUB_REDIS_SENTINEL_SERVICE (default mymaster) is used. Otherwise, if XCUBE_HUB_REDIS_URL is set
+    (e.g. rediss://:password@host:6379/0), it takes precedence over host, port and db.
+
+    If use_asyncio is True, a ``redis.asyncio`` client configured the same way is returned.
+    """
+    from redis.backoff import EqualJitterBackoff
+    from redis.exceptions import ConnectionError as RedisConnectionError, TimeoutError as RedisTimeoutError
+    if use_asyncio:
+        from redis.asyncio import Redis, BlockingConnectionPool
+        from redis.asyncio.retry import Retry
+        from redis.asyncio.sentinel import Sentinel
+    else:
+        from redis import Redis, BlockingConnectionPool
+        from redis.retry import Retry
+        from redis.sentinel import Sentinel
+
+    retries = util.maybe_raise_for_env('XCUBE_HUB_REDIS_RETRIES', default=3, typ=int)
+    connection_kwargs = dict(
+        socket_timeout=util.maybe_raise_for_env('XCUBE_HUB_REDIS_SOCKET_TIMEOUT', default=5, typ=float),
+        socket_connect_timeout=util.maybe_raise_for_env('XCUBE_HUB_REDIS_CONNECT_TIMEOUT', default=2, typ=float),
+        # Idle connections are checked before use instead of failing on a dead socket
+        health_check_interval=util.maybe_raise_for_env('XCUBE_HUB_REDIS_HEALTH_CHECK_INTERVAL', default=30,
+                                                       typ=int),
+        retry=Retry(EqualJitterBackoff(cap=1., base=0.05), retries),
+        retry_on_error=[RedisConnectionError, RedisTimeoutError],
+    )
+    connection_kwargs.update(kwargs)
+    if pubsub:
+        max_connections = util.maybe_raise_for_env('XCUBE_HUB_REDIS_MAX_SUBSCRIPTIONS', default=50, typ=int)
+    else:
+        max_connections = util.maybe_raise_for_env('XCUBE_HUB_REDIS_MAX_CONNECTIONS', default=10, typ=int)
+
+    sentinels = os.getenv('XCUBE_HUB_REDIS_SENTINELS')
+    if sentinels:
+        sentinel = Sentinel([(h, int(p)) for h, p in (s.strip().rsplit(':', 1) for s in sentinels.split(','))],
+                            socket_timeout=connection_kwargs['socket_timeout'],
+                            socket_connect_timeout=connection_kwargs['socket_connect_timeout'])
+        return sentinel.master_for(os.getenv('XCUBE_HUB_REDIS_SENTINEL_SERVICE', 'mymaster'), db=db,
+                                   max_connections=max_connections, **connection_kwargs)
+
+    pool_timeout = util.maybe_raise_for_env('XCUBE_HUB_REDIS_POOL_TIMEOUT', default=5, typ=float)
+    url = os.getenv('XCUBE_HUB_REDIS_URL')
+    if url:
+        pool = BlockingConnectionPool.from_url(url, max_connections=max_connections, timeout=pool_timeout,
+                                               **connection_kwargs)
+    else:
+        pool = BlockingConnectionPool(host=host, port=port, db=db, max_connections=max_connections,
+                                      timeout=pool_timeout, **connection_kwargs)
+    return Redis(connection_pool=pool)
+
 
 class _RedisKvDB(KeyValueStore):
     f"""
@@ -138,7 +604,7 @@ class _RedisKvDB(KeyValueStore):
     def __init__(self, host='xcube-gen-stage-redis', port=6379, db=0, use_mocker: bool = False, **kwargs):
         super().__init__()
         try:
-            from redis import Redis
+            import redis
         except ImportError:
             raise api.ApiError(500, "Error: Cannot import redis. Please install first.")
 
@@ -146,11 +612,27 @@ class _RedisKvDB(KeyValueStore):
         port = os.getenv('XCUBE_HUB_REDIS_PORT') or port
         db = os.getenv('XCUBE_HUB_REDIS_DB') or db
 
+        # Kept to connect an AsyncKeyValueDatabase to the same redis
+        self.connection_kwargs = dict(host=host, port=port, db=db, **kwargs)
+
         if use_mocker is True or use_mocker == 1:
             self._db = _KvDBMocker()
+            self._pubsub_db = self._db
         else:
-            self._db = Redis(host=host, port=port, db=db, **kwargs)
-            # self._db.ping()
+            self._db = _new_redis(**self.connection_kwargs)
+            self._pubsub_db = _new_redis(pubsub=True, **self.connection_kwargs)
+
+    def ping(self) -> bool:
+        """
+        Check whether redis answers a PING
+        :return:
+        """
+
+        try:
+            with _redis_errors():
+                return bool(self._db.ping())
+        except api.ApiError:
+            return False
 
     def get(self, key):
         """
@@ -159,28 +641,20 @@ class _RedisKvDB(KeyValueStore):
         :return:
         """
 
-        from redis.exceptions import ConnectionError as RedisConnectionError
-        try:
-            val = self._db.get(key)
-        except RedisConnectionError:
-            raise api.ApiError(400, "System Error: redis cache not ready.")
-        if isinstance(val, bytes):
-            val = val.decode('utf-8')
-        return val
+        with _redis_errors():
+            return self._db.get(key)
 
-    def set(self, key, value):
+    def set(self, key, value, ttl: Optional[float] = None):
         """
         Set a key value
         :param value:
         :param key:
+        :param ttl: Seconds after which redis expires the key
         :return:
         """
 
-        from redis.exceptions import ConnectionError as RedisConnectionError
-        try:
-            return self._db.set(key, value)
-        except RedisConnectionError:
-            raise api.ApiError(400, "System Error: redis cache not ready.")
+        with _redis_errors():
+            return self._db.set(key, value, px=_ttl_millis(ttl))
 
     def delete(self, key):
         """
@@ -189,11 +663,140 @@ class _RedisKvDB(KeyValueStore):
         :return:
         """
 
-        from redis.exceptions import ConnectionError as RedisConnectionError
-        try:
+        with _redis_errors():
             return self._db.delete(key)
-        except RedisConnectionError:
-            raise api.ApiError(400, "System Error: redis cache not ready.")
+
+    def mget(self, keys: Sequence[str]) -> List:
+        """
+        Get the values of several keys
+        :param keys:
+        :return:
+        """
+
+        with _redis_errors():
+            return self._db.mget(keys)
+
+    def mset(self, mapping: Dict[str, Any], ttl: Optional[float] = None):
+        """
+        Set several key values. MSET cannot expire keys, keys with a TTL are set in a transaction.
+        :param mapping:
+        :param ttl:
+        :return:
+        """
+
+        if ttl is not None:
+            return super().mset(mapping, ttl=ttl)
+        with _redis_errors():
+            return self._db.mset(mapping)
+
+    def delete_many(self, keys: Sequence[str]):
+        """
+        Delete several keys
+        :param keys:
+        :return:
+        """
+
+        with _redis_errors():
+            self._db.delete(*keys)
+        return True
+
+    @contextmanager
+    def pipeline(self) -> Iterator[KeyValuePipeline]:
+        """
+        Queue sets and deletes and execute them in a MULTI/EXEC transaction
+        :return:
+        """
+
+        with self._db.pipeline(transaction=True) as pipe:
+            yield _RedisPipeline(pipe)
+            with _redis_errors():
+                pipe.execute()
+
+    def append(self, key, value, ttl: Optional[float] = None) -> int:
+        """
+        Append a value to a redis list (RPUSH). If a TTL is given, the list's expiry is reset in the same
+        transaction (PEXPIRE).
+        :param key:
+        :param value:
+        :param ttl:
+        :return:
+        """
+
+        with _redis_errors():
+            if ttl is None:
+                return self._db.rpush(key, value)
+            with self._db.pipeline(transaction=True) as pipe:
+                pipe.rpush(key, value)
+                pipe.pexpire(key, _ttl_millis(ttl))
+                return pipe.execute()[0]
+
+    def get_range(self, key, start: int = 0) -> List:
+        """
+        Get the values of a redis list from index start on (LRANGE)
+        :param key:
+        :param start:
+        :return:
+        """
+
+        with _redis_errors():
+            return self._db.lrange(key, start, -1)
+
+    def publish(self, channel: str, message) -> int:
+        """
+        Publish a message with redis pub/sub, reaching subscribers of all processes
+        :param channel:
+        :param message:
+        :return:
+        """
+
+        with _redis_errors():
+            return self._db.publish(channel, message)
+
+    def subscribe(self, channel: str) -> KeyValueSubscription:
+        """
+        Subscribe to a redis pub/sub channel. Subscriptions use their own connection pool.
+        :param channel:
+        :return:
+        """
+
+        with _redis_errors():
+            pubsub = self._pubsub_db.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(channel)
+        return _RedisSubscription(pubsub)
+
+
+def _ttl_millis(ttl: Optional[float]) -> Optional[int]:
+    return max(1, int(ttl * 1000)) if ttl is not None else None
+
+
+class _RedisPipeline(KeyValuePipeline):
+    def __init__(self, pipe):
+        self._pipe = pipe
+
+    def set(self, key, value, ttl: Optional[float] = None):
+        self._pipe.set(key, value, px=_ttl_millis(ttl))
+
+    def delete(self, key):
+        self._pipe.delete(key)
+
+
+class _RedisSubscription(KeyValueSubscription):
+    def __init__(self, pubsub):
+        self._pubsub = pubsub
+
+    def get_message(self, timeout: float = 0.):
+        # Subscribe confirmations are skipped, but still end a single get_message() call
+        deadline = time.monotonic() + timeout
+        while True:
+            with _redis_errors():
+                message = self._pubsub.get_message(timeout=max(0., deadline - time.monotonic()))
+            if message is not None and message.get('type') == 'message':
+                return message['data']
+            if time.monotonic() >= deadline:
+                return None
+
+    def close(self):
+        self._pubsub.close()
 
 
 class _LevelDBKvDB(KeyValueStore):
@@ -202,6 +805,9 @@ class _LevelDBKvDB(KeyValueStore):
     
     Defines methods for getting, deleting and putting key value pairs
     
+    Keys with a TTL are stored with their expiry time and deleted when they are read after they expired.
+    Expired keys that are never read again are not removed.
+    
     :param host, port, db (see also https://github.com/andymccurdy/redis-py)
     Example:
     ```
@@ -224,6 +830,10 @@ class _LevelDBKvDB(KeyValueStore):
         else:
             self._db = plyvel.DB(name=name, create_if_missing=create_if_missing, *args, **kwargs)
 
+        # List lengths are known after the first append, so appends need no read
+        self._list_lengths = LruCache(maxsize=1024)
+        self._list_lock = threading.RLock()
+
     def get(self, key):
         """
         Get a key value
@@ -231,20 +841,23 @@ class _LevelDBKvDB(KeyValueStore):
         :return:
         """
 
-        if not self._db.get(str.encode(key)):
+        value = self._db.get(str.encode(key)) or None
+        value, expires_at = _leveldb_unwrap(value)
+        if expires_at is not None and expires_at <= time.time():
+            self.delete(key)
             return None
+        return value
 
-        return self._db.get(str.encode(key)).decode()
-
-    def set(self, key, value):
+    def set(self, key, value, ttl: Optional[float] = None):
         """
         Set a key value
         :param value:
         :param key:
+        :param ttl:
         :return:
         """
 
-        self._db.put(str.encode(key), str.encode(value))
+        self._db.put(str.encode(key), _leveldb_wrap(value, ttl))
 
         return True
 
@@ -255,10 +868,127 @@ class _LevelDBKvDB(KeyValueStore):
         :return:
         """
 
-        self._db.delete(str.encode(key))
+        with self.pipeline() as pipe:
+            pipe.delete(key)
 
         return True
 
+    @contextmanager
+    def pipeline(self) -> Iterator[KeyValuePipeline]:
+        """
+        Collect sets and deletes in a leveldb write batch
+        :return:
+        """
+
+        with self._list_lock:
+            with self._db.write_batch(transaction=True) as batch:
+                yield _LevelDBPipeline(self, batch)
+
+    def append(self, key, value, ttl: Optional[float] = None) -> int:
+        """
+        Append a value to a list. List items are stored as entries with the key, a null byte and the
+        zero-padded index. The expiry time of a list is stored in an entry with the key and two null bytes.
+        :param key:
+        :param value:
+        :param ttl:
+        :return:
+        """
+
+        with self._list_lock:
+            self._delete_list_if_expired(key)
+            length = self._list_lengths.get(key)
+            if length is None:
+                length = self._read_list_length(key)
+            with self._db.write_batch(transaction=True) as batch:
+                batch.put(_leveldb_list_item_key(key, length), _to_bytes(value))
+                if ttl is not None:
+                    batch.put(_leveldb_list_meta_key(key), _leveldb_wrap(b'', ttl))
+            self._list_lengths.put(key, length + 1)
+
+        return length + 1
+
+    def get_range(self, key, start: int = 0) -> List:
+        """
+        Get the values of a list from index start on
+        :param key:
+        :param start:
+        :return:
+        """
+
+        if self._delete_list_if_expired(key):
+            return []
+        vals = self._db.iterator(start=_leveldb_list_item_key(key, start), stop=_leveldb_list_end_key(key),
+                                 include_key=False)
+        return list(vals)
+
+    def _delete_list_if_expired(self, key) -> bool:
+        _, expires_at = _leveldb_unwrap(self._db.get(_leveldb_list_meta_key(key)))
+        if expires_at is None or expires_at > time.time():
+            return False
+        self.delete(key)
+        return True
+
+    def _read_list_length(self, key) -> int:
+        for item_key in self._db.iterator(start=_leveldb_list_item_key(key, 0), stop=_leveldb_list_end_key(key),
+                                          reverse=True, include_value=False):
+            return int(item_key[len(str.encode(key)) + 1:]) + 1
+        return 0
+
+
+def _to_bytes(value) -> bytes:
+    return value if isinstance(value, bytes) else str.encode(value)
+
+
+# Values with a TTL start with this byte and the big-endian expiry time. Values never start with a null byte
+# otherwise, neither JSON text nor values encoded by ValueCodec.
+_LEVELDB_EXPIRING_MARK = b'\x00'
+
+
+def _leveldb_wrap(value, ttl: Optional[float]) -> bytes:
+    if ttl is None:
+        return _to_bytes(value)
+    return _LEVELDB_EXPIRING_MARK + struct.pack('>d', time.time() + ttl) + _to_bytes(value)
+
+
+def _leveldb_unwrap(value) -> Tuple[Any, Optional[float]]:
+    if not isinstance(value, bytes) or not value.startswith(_LEVELDB_EXPIRING_MARK):
+        return value, None
+    expires_at, = struct.unpack('>d', value[1:9])
+    return value[9:] or None, expires_at
+
+
+def _leveldb_list_meta_key(key) -> bytes:
+    return str.encode(key) + b'\x00\x00'
+
+
+def _leveldb_list_item_key(key, index: int) -> bytes:
+    return str.encode(key) + b'\x00' + b'%012d' % index
+
+
+def _leveldb_list_end_key(key) -> bytes:
+    return str.encode(key) + b'\x01'
+
+
+class _LevelDBPipeline(KeyValuePipeline):
+    def __init__(self, kvdb: _LevelDBKvDB, batch):
+        self._kvdb = kvdb
+        self._batch = batch
+
+    def set(self, key, value, ttl: Optional[float] = None):
+        self._batch.put(str.encode(key), _leveldb_wrap(value, ttl))
+
+    def delete(self, key):
+        """
+        Delete a key and the items of a list stored at key
+        """
+        self._batch.delete(str.encode(key))
+        self._batch.delete(_leveldb_list_meta_key(key))
+        item_keys = self._kvdb._db.iterator(start=_leveldb_list_item_key(key, 0), stop=_leveldb_list_end_key(key),
+                                            include_value=False)
+        for item_key in item_keys:
+            self._batch.delete(item_key)
+        self._kvdb._list_lengths.delete(key)
+
 
 class _InMemoryKvDB(KeyValueStore):
     """
@@ -266,25 +996,55 @@ class _InMemoryKvDB(KeyValueStore):
 
     Defines methods for getting, deleting and putting key value pairs
 
+    The database holds at most max_bytes of values. If full, the least recently used keys are evicted. Keys
+    with a TTL are dropped when they are accessed after they expired, and by a background thread sweeping all
+    expired keys every sweep_interval seconds.
+
     :param db_init, use_mocker
+    :param max_bytes: Maximum size of all values in bytes, 0 for no limit. Defaults to
+        XCUBE_HUB_KV_INMEMORY_MAX_BYTES (default 64 MiB).
+    :param sweep_interval: Seconds between sweeps of expired keys, 0 to disable the sweeper. Defaults to
+        XCUBE_HUB_KV_INMEMORY_SWEEP_INTERVAL (default 60).
+    :param clock: Returns the current time in seconds. Defaults to ``time.time``
     Example:
     ```
         db = KeyValueDatabase.instance(provider='inmemory')
     ```
     """
 
-    def __init__(self, db_init: Optional[dict] = None, use_mocker: bool = False):
+    def __init__(self, db_init: Optional[dict] = None, use_mocker: bool = False, max_bytes: Optional[int] = None,
+                 sweep_interval: Optional[float] = None, clock: Callable[[], float] = time.time):
         super().__init__()
 
-        if use_mocker is True or use_mocker == 1:
-            self._db = _KvDBMocker()
-        else:
-            self._db = dict()
+        # The in-memory database needs no mocker, use_mocker is accepted for compatibility
+        self._max_bytes = max_bytes if max_bytes is not None \
+            else util.maybe_raise_for_env("XCUBE_HUB_KV_INMEMORY_MAX_BYTES", default=64 * 1024 * 1024, typ=int)
+        self._clock = clock
+        # key -> [value, expires_at, size]
+        self._db: "OrderedDict[str, list]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.RLock()
 
         if db_init:
             for k, v in db_init.items():
                 self.set(k, json.dumps(v))
 
+        sweep_interval = sweep_interval if sweep_interval is not None \
+            else util.maybe_raise_for_env("XCUBE_HUB_KV_INMEMORY_SWEEP_INTERVAL", default=60, typ=float)
+        if sweep_interval > 0:
+            threading.Thread(target=_sweep_periodically, args=(weakref.ref(self), sweep_interval),
+                             name="kvdb-inmemory-sweeper", daemon=True).start()
+
+    @property
+    def size(self) -> int:
+        """
+        The size of all values in bytes
+        """
+        return self._size
+
+    def __len__(self) -> int:
+        return len(self._db)
+
     def get(self, key):
         """
         Get a key value
@@ -292,16 +1052,21 @@ class _InMemoryKvDB(KeyValueStore):
         :return:
         """
 
-        return self._db.get(key)
+        with self._lock:
+            entry = self._get_entry(key)
+            return entry[0] if entry is not None else None
 
-    def set(self, key, value):
+    def set(self, key, value, ttl: Optional[float] = None):
         """
         Set a key value
         :param value:
         :param key:
+        :param ttl:
         :return:
         """
-        self._db[key] = value
+        with self._lock:
+            self._pop_entry(key)
+            self._put_entry(key, value, _value_size(value), ttl)
 
         return True
 
@@ -312,11 +1077,145 @@ class _InMemoryKvDB(KeyValueStore):
         :return:
         """
 
-        if key in self._db:
-            del self._db[key]
-            return True
+        with self._lock:
+            return self._pop_entry(key) is not None
+
+    def mget(self, keys: Sequence[str]) -> List:
+        """
+        Get the values of several keys
+        :param keys:
+        :return:
+        """
+
+        with self._lock:
+            return [self.get(key) for key in keys]
+
+    def append(self, key, value, ttl: Optional[float] = None) -> int:
+        """
+        Append a value to a list
+        :param key:
+        :param value:
+        :param ttl:
+        :return:
+        """
+
+        with self._lock:
+            entry = self._get_entry(key)
+            if entry is None:
+                entry = self._put_entry(key, [], 0, ttl)
+            elif not isinstance(entry[0], list):
+                raise api.ApiError(400, f"System Error (Cache): {key} does not hold a list.")
+            elif ttl is not None:
+                entry[1] = self._clock() + ttl
+            values = entry[0]
+            values.append(value)
+            size = _value_size(value)
+            entry[2] += size
+            self._size += size
+            self._evict(keep=key)
+            return len(values)
+
+    def get_range(self, key, start: int = 0) -> List:
+        """
+        Get the values of a list from index start on
+        :param key:
+        :param start:
+        :return:
+        """
+
+        with self._lock:
+            entry = self._get_entry(key)
+            return entry[0][start:] if entry is not None and isinstance(entry[0], list) else []
+
+    @contextmanager
+    def pipeline(self) -> Iterator[KeyValuePipeline]:
+        """
+        Collect sets and deletes and apply them while holding the lock
+        :return:
+        """
+
+        pipe = _InMemoryPipeline()
+        yield pipe
+        with self._lock:
+            for op, key, value, ttl in pipe.ops:
+                if op == 'set':
+                    self.set(key, value, ttl=ttl)
+                else:
+                    self.delete(key)
 
-        return False
+    def sweep(self) -> int:
+        """
+        Delete all expired keys
+        :return: The number of deleted keys
+        """
+
+        with self._lock:
+            now = self._clock()
+            expired = [key for key, (_, expires_at, _) in self._db.items()
+                       if expires_at is not None and expires_at <= now]
+            for key in expired:
+                self._pop_entry(key)
+            return len(expired)
+
+    def _get_entry(self, key) -> Optional[list]:
+        entry = self._db.get(key)
+        if entry is None:
+            return None
+        if entry[1] is not None and entry[1] <= self._clock():
+            self._pop_entry(key)
+            return None
+        self._db.move_to_end(key)
+        return entry
+
+    def _put_entry(self, key, value, size: int, ttl: Optional[float]) -> list:
+        entry = [value, self._clock() + ttl if ttl is not None else None, size]
+        self._db[key] = entry
+        self._size += size
+        self._evict(keep=key)
+        return entry
+
+    def _pop_entry(self, key) -> Optional[list]:
+        entry = self._db.pop(key, None)
+        if entry is not None:
+            self._size -= entry[2]
+        return entry
+
+    def _evict(self, keep):
+        # The key just written is kept even if it exceeds max_bytes on its own
+        while 0 < self._max_bytes < self._size and len(self._db) > 1:
+            key = next(iter(self._db))
+            if key == keep:
+                self._db.move_to_end(key)
+                continue
+            self._pop_entry(key)
+
+
+def _value_size(value) -> int:
+    if isinstance(value, (bytes, str)):
+        return len(value)
+    return len(json.dumps(value))
+
+
+def _sweep_periodically(kvdb_ref: "weakref.ref[_InMemoryKvDB]", interval: float):
+    # Holds the database only while sweeping, so that the thread ends once the database is garbage collected
+    while True:
+        time.sleep(interval)
+        kvdb = kvdb_ref()
+        if kvdb is None:
+            return
+        kvdb.sweep()
+        del kvdb
+
+
+class _InMemoryPipeline(KeyValuePipeline):
+    def __init__(self):
+        self.ops = []
+
+    def set(self, key, value, ttl: Optional[float] = None):
+        self.ops.append(('set', key, value, ttl))
+
+    def delete(self, key):
+        self.ops.append(('delete', key, None, None))
 
 
 class _KvDBMocker:
@@ -336,3 +1235,30 @@ class _KvDBMocker:
 
     def put(self, *args, **kwargs):
         return self.return_value
+
+    def mget(self, keys, *args, **kwargs):
+        return [self.return_value for _ in keys]
+
+    def mset(self, *args, **kwargs):
+        return self.return_value
+
+    def execute(self, *args, **kwargs):
+        return [self.return_value]
+
+    def pexpire(self, *args, **kwargs):
+        return self.return_value
+
+    def rpush(self, *args, **kwargs):
+        return self.return_value
+
+    def lrange(self, *args, **kwargs):
+        return []
+
+    def iterator(self, *args, **kwargs):
+        return iter([])
+
+    @contextmanager
+    def pipeline(self, *args, **kwargs):
+        yield self
+
+    write_batch = pipeline
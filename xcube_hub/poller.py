@@ -1,8 +1,12 @@
-from typing import Any, Optional
+import time
+from typing import Any, Optional, Callable
 
 import polling2
+from kubernetes import watch
 from kubernetes.client import V1Pod, V1Job, V1JobList
 
+from xcube_hub.k8scfg import K8sCfg
+
 
 def poll_k8s(poller: Any, check_success: Any, step: int = 1, timeout: int = 3600, **kwargs):
     def _poll():
@@ -30,21 +34,21 @@ def poll_pod_phase(poller: Any, phase='running', **kwargs):
     poll_k8s(poller=poller, check_success=_is_phase, **kwargs)
 
 
-# noinspection DuplicatedCode
-def poll_job_status(poller: Any, status='ready', **kwargs):
-    def _is_status(job: V1Job):
-        if not job:
-            return False
-        """Check that the response returned 'success'"""
-        if job.status.conditions is not None:
-            for st in job.status.conditions:
-                if st.type == 'Complete':
-                    return True
-                if st.type == "Failed":
-                    return True
-
+def _is_job_finished(job: Optional[V1Job]) -> bool:
+    if not job or not job.status:
         return False
+    if job.status.conditions is not None:
+        for st in job.status.conditions:
+            if st.type == 'Complete':
+                return True
+            if st.type == "Failed":
+                return True
+
+    return False
+
 
+# noinspection DuplicatedCode
+def poll_job_status(poller: Any, status='ready', **kwargs):
     def _is_empty(jobs: V1JobList):
         if not jobs:
             return False
@@ -52,4 +56,159 @@ def poll_job_status(poller: Any, status='ready', **kwargs):
         """Check that the response returned 'success'"""
         return len(jobs.items) == 0
 
-    poll_k8s(poller=poller, check_success=_is_status if status == 'ready' else _is_empty, **kwargs)
+    poll_k8s(poller=poller, check_success=_is_job_finished if status == 'ready' else _is_empty, **kwargs)
+
+
+def wait_for(list_func: Callable,
+             check_success: Callable[[Any], bool],
+             namespace: str,
+             field_selector: Optional[str] = None,
+             label_selector: Optional[str] = None,
+             timeout: float = 3600,
+             max_step: float = 30.,
+             watch_factory: Optional[Callable[[], Any]] = None) -> Any:
+    """
+    Wait until an object listed by list_func satisfies check_success and return it.
+
+    The objects are listed once and then watched from the list's resourceVersion, so that the wait returns on the
+    first matching event. If the watch drops before the timeout, the objects are polled with an exponential
+    backoff capped at max_step seconds instead.
+
+    :param list_func: A namespaced list function of the kubernetes client (e.g. BatchV1Api().list_namespaced_job)
+    :param check_success: Returns True for the object waited for
+    :param namespace: The namespace of the object
+    :param field_selector: Restricts the listed objects
+    :param label_selector: Restricts the listed objects
+    :param timeout: Timeout in seconds
+    :param max_step: Maximum polling step in seconds
+    :param watch_factory: Returns a new watch. Defaults to ``kubernetes.watch.Watch``
+    :raise polling2.TimeoutException: If no object satisfied check_success within timeout
+    """
+    deadline = time.monotonic() + timeout
+
+    kwargs = dict(namespace=namespace)
+    if field_selector:
+        kwargs['field_selector'] = field_selector
+    if label_selector:
+        kwargs['label_selector'] = label_selector
+
+    res = list_func(**kwargs)
+    for obj in res.items:
+        if check_success(obj):
+            return obj
+
+    resource_version = res.metadata.resource_version if res.metadata else None
+
+    w = (watch_factory or watch.Watch)()
+    try:
+        for event in w.stream(list_func, resource_version=resource_version,
+                              timeout_seconds=max(1, int(deadline - time.monotonic())), **kwargs):
+            if event['type'] == 'ERROR':
+                break
+            if event['type'] in ('ADDED', 'MODIFIED') and check_success(event['object']):
+                return event['object']
+            if time.monotonic() >= deadline:
+                break
+    except Exception as e:
+        print(f"Watch in namespace {namespace} dropped: {str(e)}. Falling back to polling.")
+    finally:
+        w.stop()
+
+    def _find(objs):
+        return next((obj for obj in objs.items if check_success(obj)), None)
+
+    objs = polling2.poll(lambda: list_func(**kwargs),
+                         step=1,
+                         step_function=lambda step: min(step * 2, max_step),
+                         timeout=max(deadline - time.monotonic(), 0.001),
+                         check_success=lambda objs: _find(objs) is not None)
+    return _find(objs)
+
+
+def wait_for_deletion(list_func: Callable,
+                      name: str,
+                      namespace: str,
+                      timeout: float = 300,
+                      max_step: float = 30.,
+                      watch_factory: Optional[Callable[[], Any]] = None):
+    """
+    Wait until the object name listed by list_func has been deleted.
+
+    Like wait_for(), the object is listed once and then watched until it is deleted, falling back to polling with
+    an exponential backoff capped at max_step seconds if the watch drops.
+
+    :param list_func: A namespaced list function of the kubernetes client (e.g. AppsV1Api().list_namespaced_deployment)
+    :param name: The name of the object
+    :param namespace: The namespace of the object
+    :param timeout: Timeout in seconds
+    :param max_step: Maximum polling step in seconds
+    :param watch_factory: Returns a new watch. Defaults to ``kubernetes.watch.Watch``
+    :raise polling2.TimeoutException: If the object has not been deleted within timeout
+    """
+    deadline = time.monotonic() + timeout
+
+    kwargs = dict(namespace=namespace, field_selector=f"metadata.name={name}")
+
+    res = list_func(**kwargs)
+    if not res.items:
+        return
+
+    resource_version = res.metadata.resource_version if res.metadata else None
+
+    w = (watch_factory or watch.Watch)()
+    try:
+        for event in w.stream(list_func, resource_version=resource_version,
+                              timeout_seconds=max(1, int(deadline - time.monotonic())), **kwargs):
+            if event['type'] == 'ERROR':
+                break
+            if event['type'] == 'DELETED':
+                return
+            if time.monotonic() >= deadline:
+                break
+    except Exception as e:
+        print(f"Watch in namespace {namespace} dropped: {str(e)}. Falling back to polling.")
+    finally:
+        w.stop()
+
+    polling2.poll(lambda: list_func(**kwargs),
+                  step=1,
+                  step_function=lambda step: min(step * 2, max_step),
+                  timeout=max(deadline - time.monotonic(), 0.001),
+                  check_success=lambda objs: not objs.items)
+
+
+def wait_for_job(name: str, namespace: str, **kwargs) -> V1Job:
+    """
+    Wait until the job has completed or failed. Keyword arguments are passed to wait_for().
+    """
+    return wait_for(K8sCfg.batch_v1_api().list_namespaced_job,
+                    check_success=_is_job_finished,
+                    namespace=namespace,
+                    field_selector=f"metadata.name={name}",
+                    **kwargs)
+
+
+def wait_for_deployment_deletion(name: str, namespace: str, **kwargs):
+    """
+    Wait until the deployment has been deleted. Keyword arguments are passed to wait_for_deletion().
+    """
+    wait_for_deletion(K8sCfg.apps_v1_api().list_namespaced_deployment, name=name, namespace=namespace, **kwargs)
+
+
+def wait_for_pod_phase(namespace: str, label_selector: str, phase: str = 'running', **kwargs) -> V1Pod:
+    """
+    Wait until a pod matching label_selector, that is not being deleted, reached phase. Keyword arguments are
+    passed to wait_for().
+    """
+
+    def _is_phase(pod: V1Pod) -> bool:
+        return pod.metadata.deletion_timestamp is None \
+               and pod.status is not None \
+               and pod.status.phase is not None \
+               and pod.status.phase.lower() == phase
+
+    return wait_for(K8sCfg.core_v1_api().list_namespaced_pod,
+                    check_success=_is_phase,
+                    namespace=namespace,
+                    label_selector=label_selector,
+                    **kwargs)
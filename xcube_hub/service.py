@@ -5,8 +5,9 @@ import flask_cors
 from connexion.decorators.validation import ParameterValidator, RequestBodyValidator
 from dotenv import load_dotenv
 
-from xcube_hub import encoder
+from xcube_hub import api, encoder
 from xcube_hub.cfg import Cfg
+from xcube_hub.core import cate, cubegens
 from xcube_hub.core.validations import validate_env
 from xcube_hub.geoservice import GeoService
 from xcube_hub.k8scfg import K8sCfg
@@ -98,4 +99,10 @@ def start(host: str = '0.0.0.0', port: int = 8080, debug: bool = False):
                 pythonic_params=True,
                 validate_responses=False)
     flask_cors.CORS(app.app)
+    try:
+        cubegens.label_legacy_jobs()
+    except api.ApiError as e:
+        print("Warning: could not label the cubegens of previous versions:", str(e))
+    cate.start_warm_pool()
+    cate.start_idle_reaper()
     app.run(host=host, port=port, debug=False, use_reloader=False)
@@ -4,7 +4,6 @@ import os
 from abc import abstractmethod, ABC
 from typing import Optional
 
-import requests
 from botocore.exceptions import ClientError
 from keycloak import KeycloakGetError
 from keycloak.exceptions import KeycloakError
@@ -13,8 +12,8 @@ from requests import HTTPError
 from werkzeug.exceptions import Unauthorized
 from urllib.parse import urlparse
 
-from xcube_hub import api, util
-from xcube_hub.core import users, punits, geodb
+from xcube_hub import api, util, httpclient
+from xcube_hub.core import users, punits, geodb, oauth
 from xcube_hub.core.users import get_request_body_from_user
 from xcube_hub.database import DatabaseError
 from xcube_hub.models.subscription import Subscription
@@ -171,8 +170,8 @@ class _SubscriptionAuth0Api(SubscriptionApiProvider):
             geodb.register(subscription=subscription, raise_on_exist=False)
             roles = {"roles": [role_id_manage, role_id_free, role_id_user]}
 
-            requests.delete(f"https://{self._domain}/users/auth0|{user_id}/roles", json=roles,
-                            headers=self._get_header(token=token))
+            httpclient.delete(f"https://{self._domain}/users/auth0|{user_id}/roles", json=roles,
+                              headers=self._get_header(token=token))
 
         if service_id == "xcube_gen":
             if subscription.unit != "punits" and subscription.unit != "euro":
@@ -196,12 +195,12 @@ class _SubscriptionAuth0Api(SubscriptionApiProvider):
         if new_user:
             user.user_metadata.subscriptions[service_id] = subscription
             user_dict = get_request_body_from_user(user)
-            r = requests.post(f"https://{self._domain}/users", json=user_dict, headers=self._get_header(token=token))
+            r = httpclient.post(f"https://{self._domain}/users", json=user_dict, headers=self._get_header(token=token))
         else:
             user.user_metadata.subscriptions[service_id] = subscription
             user_dict = dict(user_metadata=user.user_metadata.to_dict(), app_metadata=user.app_metadata.to_dict())
-            r = requests.patch(f"https://{self._domain}/users/auth0|{user_id}", json=user_dict,
-                               headers=self._get_header(token=token))
+            r = httpclient.patch(f"https://{self._domain}/users/auth0|{user_id}", json=user_dict,
+                                 headers=self._get_header(token=token))
 
         with open('debug.txt', 'a') as f:
             f.write('__________________________________\n\n')
@@ -216,22 +215,27 @@ class _SubscriptionAuth0Api(SubscriptionApiProvider):
 
         if new_user:
             role = {"roles": [role_id]}
-            r = requests.post(f"https://{self._domain}/users/auth0|{user_id}/roles", json=role,
-                              headers=self._get_header(token=token))
+            r = httpclient.post(f"https://{self._domain}/users/auth0|{user_id}/roles", json=role,
+                                headers=self._get_header(token=token))
         else:
             role = {"roles": [role_id]}
-            r = requests.post(f"https://{self._domain}/users/auth0|{user_id}/roles", json=role,
-                              headers=self._get_header(token=token))
+            r = httpclient.post(f"https://{self._domain}/users/auth0|{user_id}/roles", json=role,
+                                headers=self._get_header(token=token))
 
         try:
             r.raise_for_status()
         except HTTPError as e:
             raise api.ApiError(r.status_code, str(e))
 
+        # The client's cached roles are outdated now
+        if subscription.client_id:
+            oauth.invalidate_client(subscription.client_id)
+
         return subscription
 
     def get_subscription(self, service_id: str, subscription_id: str, token: str):
-        r = requests.get(f"https://{self._domain}/users/auth0|{subscription_id}", headers=self._get_header(token=token))
+        r = httpclient.get(f"https://{self._domain}/users/auth0|{subscription_id}",
+                           headers=self._get_header(token=token))
 
         try:
             r.raise_for_status()
@@ -257,18 +261,21 @@ class _SubscriptionAuth0Api(SubscriptionApiProvider):
 
         payload = dict(user_metadata=user_metadata.to_dict())
 
-        r = requests.patch(f"https://{self._domain}/users/auth0|{subscription_id}", json=payload,
-                           headers=self._get_header(token=token))
+        r = httpclient.patch(f"https://{self._domain}/users/auth0|{subscription_id}", json=payload,
+                             headers=self._get_header(token=token))
 
         try:
             r.raise_for_status()
         except HTTPError as e:
             raise api.ApiError(r.status_code, str(e))
 
+        if user_metadata.client_id:
+            oauth.invalidate_client(user_metadata.client_id)
+
         return subscription_id
 
     def _get_user(self, user_id, token: str, raising=True) -> Optional[User]:
-        r = requests.get(f"https://{self._domain}/users/auth0|{user_id}", headers=self._get_header(token=token))
+        r = httpclient.get(f"https://{self._domain}/users/auth0|{user_id}", headers=self._get_header(token=token))
 
         try:
             r.raise_for_status()